@@ -6,9 +6,14 @@ It provides a web interface for document upload, ingestion, and question-answeri
 using retrieval-augmented generation with vector similarity search.
 
 Features:
-- Document upload and ingestion (PDF, DOCX, TXT)
-- Real-time chat interface for Q&A
+- Multi-file upload with background ingestion jobs (PDF, DOCX, TXT)
+- Live job progress and cancellation, kept across page refreshes
+- Real-time chat interface for Q&A with token-by-token streaming
+- Questions can be restricted to selected documents
+- Follow-up questions reuse the chunks retrieved earlier in the conversation
 - Automatic data folder creation for cloud deployment
+- Background model warm-up so the first question is not slowed by model loading
+- Optional Prometheus metrics endpoint (settings.metrics_port)
 - Error handling with user-friendly messages
 - Session state management for conversation history
 - Responsive UI with sidebar for document management
@@ -18,12 +23,17 @@ processing, vector search, and LLM generation to provide a complete RAG solution
 """
 
 import streamlit as st
+import itertools
 import os
+import threading
 from config import settings
-from logger import logger
-from ingest import ingest_document
-from models import IngestRequest, QueryRequest
-from utils import query_rag
+from logger import logger, enable_file_logging
+from jobs import JobQueue
+from manifest import Manifest
+from models import QueryRequest
+from session import ChatSession
+from utils import query_rag_stream, warm_up
+import metrics
 
 # Configure Streamlit page settings
 st.set_page_config(
@@ -32,6 +42,57 @@ st.set_page_config(
     layout="wide"
 )
 st.title(settings.app_title)
+enable_file_logging()
+
+
+@st.cache_resource
+def start_warm_up() -> threading.Thread:
+    """Load the embedding model in the background once per server process."""
+    thread = threading.Thread(target=warm_up, daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Background ingestion queue shared by every session of this server process."""
+    return JobQueue()
+
+
+@st.fragment(run_every=2)
+def show_jobs() -> None:
+    """Render recent ingestion jobs; reruns on its own so the chat stays usable."""
+    queue = get_job_queue()
+    jobs = queue.list(limit=20)
+    if not jobs:
+        st.caption("No ingestion jobs yet.")
+        return
+
+    for job in jobs:
+        name = os.path.basename(job.file_path)
+        if job.status in ("queued", "running"):
+            total = job.chunks_total if job.chunks_total is not None else "?"
+            st.progress(job.progress, text=f"{name}: {job.status}, {job.pages} pages, {job.chunks_done}/{total} chunks")
+            if st.button("Cancel", key=f"cancel-{job.id}"):
+                queue.cancel(job.id)
+        elif job.status == "done":
+            st.caption(f"✅ {name}: {job.chunks_done} new chunks")
+        elif job.status == "failed":
+            st.caption(f"❌ {name}: {job.error}")
+        else:
+            st.caption(f"⏹️ {name}: cancelled")
+
+    if any(job.finished for job in jobs) and st.button("Clear finished"):
+        queue.clear_finished()
+
+
+# Warm up without blocking the first page render; early queries wait for it
+if settings.warm_up_on_start:
+    start_warm_up()
+
+# Expose Prometheus metrics (once per server process; serve() is idempotent)
+if settings.metrics_port is not None:
+    metrics.serve(settings.metrics_port, settings.metrics_host)
 
 # Ensure data folder exists (critical for cloud deployments)
 if not os.path.exists(settings.data_folder):
@@ -40,34 +101,58 @@ if not os.path.exists(settings.data_folder):
 
 # Sidebar for document ingestion
 with st.sidebar:
-    st.header("Ingest Document")
+    st.header("Ingest Documents")
 
     # File uploader for document ingestion
-    uploaded = st.file_uploader("Upload file", type=["pdf", "docx", "txt"])
-    if uploaded:
-        # Construct file path in data directory
-        filename = uploaded.name
-        path = os.path.join(settings.data_folder, filename)
-
-        # Save uploaded file to disk
-        try:
-            with open(path, "wb") as f:
-                f.write(uploaded.getbuffer())
-            logger.info(f"Saved uploaded file: {path}")
-        except Exception as e:
-            st.error(f"Save error: {e}")
-            st.stop()
-
-        # Ingestion button and processing
-        if st.button("Ingest"):
-            with st.spinner("Ingestion in progress..."):
-                req = IngestRequest(file_path=path)
-                ingest_document(req)
-            st.success(f"Ingested {filename}! Ask questions below.")
+    uploads = st.file_uploader("Upload files", type=["pdf", "docx", "txt"], accept_multiple_files=True)
+    if uploads and st.button("Ingest"):
+        queued = 0
+        for uploaded in uploads:
+            # Construct file path in data directory
+            path = os.path.join(settings.data_folder, uploaded.name)
+
+            # Save uploaded file to disk, then ingest it in the background
+            try:
+                with open(path, "wb") as f:
+                    f.write(uploaded.getbuffer())
+                logger.info(f"Saved uploaded file: {path}")
+            except Exception as e:
+                st.error(f"Save error for {uploaded.name}: {e}")
+                continue
+            get_job_queue().submit(path)
+            queued += 1
+        if queued:
+            st.success(f"Queued {queued} file(s). You can keep asking questions while they ingest.")
+
+    # Progress of background ingestion jobs
+    show_jobs()
+
+    # Retrieval strategy used for every question
+    st.header("Search")
+    retrieval_mode = st.selectbox(
+        "Retrieval mode",
+        ["hybrid", "vector", "keyword"],
+        help="Hybrid combines semantic search with exact keyword (BM25) matching"
+    )
+    # Narrow questions to specific documents (filtered inside the vector search); only
+    # files that were actually ingested are offered, not everything in the data folder
+    sources = st.multiselect(
+        "Only search these documents",
+        sorted({os.path.basename(key) for key in Manifest().entries()}, key=str.lower),
+        help="Leave empty to search every ingested document"
+    )
 
 # Main chat interface
 if "messages" not in st.session_state:
     st.session_state.messages = []
+# Retrieved chunks and token-budgeted history reused by follow-up questions
+if "chat_session" not in st.session_state:
+    st.session_state.chat_session = ChatSession()
+
+with st.sidebar:
+    if st.button("New conversation"):
+        st.session_state.messages = []
+        st.session_state.chat_session.clear()
 
 # Display conversation history
 for msg in st.session_state.messages:
@@ -79,19 +164,25 @@ if prompt := st.chat_input("Ask a question about your documents..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
     st.chat_message("user").markdown(prompt)
 
-    # Generate and display assistant response
+    # Generate and display assistant response, rendering tokens as they arrive
     with st.chat_message("assistant"):
-        with st.spinner("Searching documents..."):
-            # Validate and clean user input
-            clean_prompt = prompt.strip()
-            if len(clean_prompt) < 3:
-                answer = "Please ask more than 2 characters so I can help you properly."
-            else:
-                try:
-                    req = QueryRequest(question=clean_prompt)
-                    answer = query_rag(req)
-                except Exception as e:
-                    answer = f"Sorry, something went wrong: {e}"
-
-        st.markdown(answer)
+        # Validate and clean user input
+        clean_prompt = prompt.strip()
+        if len(clean_prompt) < 3:
+            answer = "Please ask more than 2 characters so I can help you properly."
+            st.markdown(answer)
+        else:
+            try:
+                with st.spinner("Searching documents..."):
+                    req = QueryRequest(
+                        question=clean_prompt, retrieval_mode=retrieval_mode, sources=sources or None
+                    )
+                    tokens = query_rag_stream(req, session=st.session_state.chat_session)
+                    # Retrieval runs until the first token is ready
+                    first = next(tokens, "")
+                answer = st.write_stream(itertools.chain([first], tokens))
+            except Exception as e:
+                answer = f"Sorry, something went wrong: {e}"
+                st.markdown(answer)
+
         st.session_state.messages.append({"role": "assistant", "content": answer})
@@ -0,0 +1,363 @@
+"""
+Batch Query Module
+
+This module answers many stored questions in one run, for regression checks
+and FAQ precomputation. Questions are processed in chunks: each chunk is
+embedded with one batched model call and searched with one bulk vector search
+per collection, then its questions are answered concurrently through the
+pooled async Groq client. Every result is appended to a JSON lines file as
+soon as it is ready, so an interrupted run resumes where it stopped.
+
+Features:
+- JSONL file or in-memory QueryRequest input, callable from Python or the command line
+- One batched embedding call per chunk of questions
+- Bulk vector search per collection, top_k and metadata filter
+- Bounded concurrency for retrieval and LLM calls
+- Streaming JSONL output with per-question stage timings
+- Resumable runs: questions already answered in the output file are skipped
+- Same query cache, retrieval and prompt as query_rag
+
+Usage:
+    python batch_query.py questions.jsonl answers.jsonl --concurrency 8
+
+Each input line is a QueryRequest as JSON, with an optional "id":
+    {"id": "faq-1", "question": "What is the refund policy?", "collection": "docs"}
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from config import settings
+from filters import build_where, where_key
+from logger import logger, enable_file_logging
+from models import BatchQueryReport, BatchQueryResult, QueryRequest
+import metrics
+import utils
+
+
+def load_requests(path: str) -> List[Tuple[str, QueryRequest]]:
+    """
+    Read questions from a JSON lines file.
+
+    Args:
+        path (str): Input file; one QueryRequest object per line, plus an
+            optional "id" (default: the line number)
+
+    Returns:
+        List[Tuple[str, QueryRequest]]: (id, request) pairs in file order
+
+    Raises:
+        ValueError: If a line is not a valid request or repeats an id
+    """
+    items, seen = [], set()
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                fields = json.loads(line)
+                item_id = str(fields.pop("id", line_number))
+                request = QueryRequest(**fields)
+            except (ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"{path}:{line_number}: invalid question: {e}") from e
+            if item_id in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate id {item_id!r}")
+            seen.add(item_id)
+            items.append((item_id, request))
+    return items
+
+
+def _answered_ids(output_path: str) -> Set[str]:
+    """
+    IDs answered successfully by earlier runs into the output file.
+
+    A line cut short by a crash is removed, so appending starts on a clean line.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+            data = data[:end]
+
+    answered = set()
+    for line in data.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("status") == "ok":
+            answered.add(str(record["id"]))
+    return answered
+
+
+class _Item:
+    """A question moving through the batch pipeline."""
+
+    def __init__(self, item_id: str, request: QueryRequest):
+        self.id = item_id
+        self.request = request
+        self.vector: Optional[List[float]] = None
+        self.hits: Optional[list] = None
+        self.answer: Optional[str] = None
+        self.sources: List[str] = []
+        self.cached: Optional[str] = None
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+
+    def result(self) -> BatchQueryResult:
+        timings = {stage: round(ms, 3) for stage, ms in self.timings.items()}
+        timings["total"] = round(sum(self.timings.values()), 3)
+        return BatchQueryResult(
+            id=self.id,
+            question=self.request.question,
+            collection=self.request.collection,
+            status="failed" if self.error else "ok",
+            answer=self.answer,
+            sources=sorted(set(self.sources)),
+            cached=self.cached,
+            error=self.error,
+            timings_ms=timings
+        )
+
+
+def _prepare_chunk(chunk: Sequence[Tuple[str, QueryRequest]]) -> List[_Item]:
+    """
+    Check the query cache, embed and vector-search a chunk of questions in bulk.
+
+    Args:
+        chunk (Sequence[Tuple[str, QueryRequest]]): (id, request) pairs
+
+    Returns:
+        List[_Item]: Items that are answered from the cache, failed, or ready
+            for retrieval and the LLM call
+    """
+    items = [_Item(item_id, request) for item_id, request in chunk]
+
+    # Exact cache hits need neither an embedding nor a search
+    to_embed = []
+    for item in items:
+        if settings.query_cache_enabled:
+            answer = utils.query_cache.get_exact(item.request)
+            if answer is not None:
+                item.answer, item.cached = answer, "exact"
+                metrics.cache_lookups.inc(cache="query", result="exact")
+                continue
+        to_embed.append(item)
+    if not to_embed:
+        return items
+
+    start = time.perf_counter()
+    try:
+        vectors = utils.embed_queries([item.request.question for item in to_embed])
+    except Exception as e:
+        logger.error(f"Batch query embedding failed: {e}")
+        for item in to_embed:
+            item.error = f"Embedding failed: {e}"
+        return items
+    share = (time.perf_counter() - start) * 1000 / len(to_embed)
+
+    to_search = []
+    for item, vector in zip(to_embed, vectors):
+        item.vector = vector
+        item.timings["embed"] = share
+        if settings.query_cache_enabled:
+            answer = utils.query_cache.get_similar(item.request, vector)
+            if answer is not None:
+                item.answer, item.cached = answer, "semantic"
+                metrics.cache_lookups.inc(cache="query", result="semantic")
+                continue
+            metrics.cache_lookups.inc(cache="query", result="miss")
+        to_search.append(item)
+
+    # One bulk vector search per collection, result count and metadata filter
+    groups: Dict[Tuple[str, int, str], List[_Item]] = {}
+    for item in to_search:
+        if item.request.retrieval_mode != "keyword":
+            key = (item.request.collection, item.request.top_k, where_key(build_where(item.request)))
+            groups.setdefault(key, []).append(item)
+    for (collection, k, _), group in groups.items():
+        start = time.perf_counter()
+        try:
+            hits = utils.search_by_vectors(
+                collection, [item.vector for item in group], k, where=build_where(group[0].request), squared_l2=True
+            )
+        except Exception as e:
+            logger.error(f"Batch vector search in {collection} failed: {e}")
+            for item in group:
+                item.error = f"Vector search failed: {e}"
+            continue
+        share = (time.perf_counter() - start) * 1000 / len(group)
+        for item, found in zip(group, hits):
+            item.hits = found
+            item.timings["vector_search"] = share
+    return items
+
+
+async def _answer(item: _Item, semaphore: asyncio.Semaphore) -> BatchQueryResult:
+    """Assemble the context of a prepared question and ask the LLM."""
+    from llm_client import get_async_llm
+
+    if item.answer is not None or item.error is not None:
+        return item.result()
+
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            context, item.sources = await asyncio.to_thread(
+                utils._retrieve_context, item.request, item.vector, item.hits
+            )
+        except Exception as e:
+            item.error = f"Retrieval failed: {e}"
+        item.timings["retrieval"] = (time.perf_counter() - start) * 1000
+        if item.error is not None:
+            return item.result()
+
+        # Handle case where no relevant context was found
+        if not context.strip():
+            item.answer = "No relevant information found in the documents."
+            return item.result()
+
+        start = time.perf_counter()
+        try:
+            with metrics.span("llm"):
+                answer = await get_async_llm().complete(
+                    utils._llm_messages(context, item.request.question),
+                    temperature=0.1,  # Low temperature for consistent, factual answers
+                    max_tokens=1000
+                )
+        except Exception as e:
+            item.error = f"Groq failed: {e}"
+        item.timings["llm"] = (time.perf_counter() - start) * 1000
+        if item.error is not None:
+            logger.error(f"Batch question {item.id}: {item.error}")
+            return item.result()
+
+    item.answer = answer + utils._format_sources(item.sources)
+    if settings.query_cache_enabled:
+        utils.query_cache.put(item.request, item.vector, item.answer)
+    return item.result()
+
+
+def _with_ids(
+    requests: Union[str, Sequence[QueryRequest], Sequence[Tuple[str, QueryRequest]]]
+) -> List[Tuple[str, QueryRequest]]:
+    """Normalize the accepted input forms to (id, request) pairs."""
+    if isinstance(requests, str):
+        return load_requests(requests)
+    return [
+        item if isinstance(item, tuple) else (str(index), item)
+        for index, item in enumerate(requests, 1)
+    ]
+
+
+async def arun_batch(
+    requests: Union[str, Sequence[QueryRequest], Sequence[Tuple[str, QueryRequest]]],
+    output_path: str,
+    concurrency: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> BatchQueryReport:
+    """
+    Answer a batch of questions, appending results to a JSON lines file.
+
+    Questions whose id already has a successful result in ``output_path``
+    are skipped, so rerunning an interrupted or partly failed batch only
+    answers what is missing. Failed questions are recorded with their error
+    and retried by the next run; readers should keep the last line per id.
+
+    Args:
+        requests: JSONL input path, a list of QueryRequests (ids "1", "2", ...)
+            or a list of (id, QueryRequest) pairs
+        output_path (str): JSON lines file of BatchQueryResult records
+        concurrency (Optional[int]): Questions retrieved and answered at once
+            (default: settings.batch_query_concurrency)
+        chunk_size (Optional[int]): Questions embedded and searched together
+            (default: settings.batch_query_chunk_size)
+
+    Returns:
+        BatchQueryReport: Counts and duration of the run
+    """
+    concurrency = concurrency or settings.batch_query_concurrency
+    chunk_size = chunk_size or settings.batch_query_chunk_size
+
+    start = time.perf_counter()
+    items = _with_ids(requests)
+    answered = _answered_ids(output_path)
+    pending = [(item_id, request) for item_id, request in items if item_id not in answered]
+    report = BatchQueryReport(total=len(items), skipped=len(items) - len(pending))
+    logger.info(
+        f"Batch query: {len(pending)} questions to answer, {report.skipped} already answered, "
+        f"concurrency {concurrency}"
+    )
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        for begin in range(0, len(pending), chunk_size):
+            prepared = await asyncio.to_thread(_prepare_chunk, pending[begin:begin + chunk_size])
+            for future in asyncio.as_completed([_answer(item, semaphore) for item in prepared]):
+                result = await future
+                # Written as soon as it is ready, so a crash loses at most the questions in flight
+                out.write(result.model_dump_json() + "\n")
+                out.flush()
+                if result.status == "ok":
+                    report.answered += 1
+                else:
+                    report.failed += 1
+            logger.info(f"Batch query: {report.answered + report.failed}/{len(pending)} questions done")
+
+    report.seconds = time.perf_counter() - start
+    logger.success(
+        f"Batch query complete: {report.answered} answered, {report.failed} failed, "
+        f"{report.skipped} skipped in {report.seconds:.1f}s ({report.questions_per_sec:.2f} questions/sec)"
+    )
+    return report
+
+
+def run_batch(
+    requests: Union[str, Sequence[QueryRequest], Sequence[Tuple[str, QueryRequest]]],
+    output_path: str,
+    concurrency: Optional[int] = None,
+    chunk_size: Optional[int] = None
+) -> BatchQueryReport:
+    """
+    Synchronous entry point of arun_batch; runs it in a new event loop.
+
+    Args:
+        requests: JSONL input path, a list of QueryRequests or of (id, QueryRequest) pairs
+        output_path (str): JSON lines file of BatchQueryResult records
+        concurrency (Optional[int]): Questions answered at once (default: settings)
+        chunk_size (Optional[int]): Questions embedded and searched together (default: settings)
+
+    Returns:
+        BatchQueryReport: Counts and duration of the run
+    """
+    # asyncio.run() also closes the loop's pooled LLM client (see llm_client.get_async_llm)
+    return asyncio.run(arun_batch(requests, output_path, concurrency, chunk_size))
+
+
+def main() -> None:
+    """Command line entry point for batch queries."""
+    parser = argparse.ArgumentParser(description="Answer a JSON lines file of questions in bulk.")
+    parser.add_argument("input", help="JSON lines file with one QueryRequest (plus optional id) per line")
+    parser.add_argument("output", help="JSON lines file results are appended to (resumes if it exists)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Questions answered at once")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Questions embedded and searched together")
+    args = parser.parse_args()
+
+    enable_file_logging()
+    report = run_batch(args.input, args.output, concurrency=args.concurrency, chunk_size=args.chunk_size)
+    raise SystemExit(1 if report.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the RAG Search Engine.
+
+Each module is runnable from the repository root, e.g.:
+    python -m benchmarks.db_handles
+"""
@@ -0,0 +1,115 @@
+"""
+Chat Session Benchmark
+
+Replays synthetic conversations (an opening question followed by
+paraphrased follow-ups on the same topic) against a synthetic collection and
+compares per-turn vector retrieval with and without a session working set
+(latency, store searches, overlap with a fresh top-k and the share of
+results on the conversation's topic), then the history tokens a long conversation sends to the LLM when the whole
+transcript is included versus the session's token budget.
+
+Usage:
+    python -m benchmarks.chat_session --chunks 100000 --conversations 20 --turns 6
+    python -m benchmarks.chat_session --backend chroma --chunks 20000
+"""
+
+import argparse
+import tempfile
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+from benchmarks.common import summarize
+from config import settings
+from logger import logger
+import utils
+
+
+def run(chunks: int, conversations: int, turns: int, backend: str) -> None:
+    """
+    Run both variants and print the comparison.
+
+    Args:
+        chunks (int): Chunks stored in the collection
+        conversations (int): Conversations replayed per variant
+        turns (int): Questions per conversation (the first one is never a follow-up)
+        backend (str): Vector store backend ("chroma" or "flat")
+    """
+    from context_builder import count_tokens
+    from models import QueryRequest
+    from session import ChatSession
+
+    logger.remove()
+    rng = np.random.default_rng(0)
+    dim = settings.embedding_dim
+    k = settings.top_k
+
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        return (matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)).astype(np.float32)
+
+    # Topics of about 50 chunks; a conversation's questions stay near one topic
+    centers = normalize(rng.normal(size=(max(chunks // 50, 1), dim)))
+    chunk_topics = rng.integers(len(centers), size=chunks)
+    vectors = normalize(centers[chunk_topics] + 0.04 * rng.normal(size=(chunks, dim)))
+    topics = rng.choice(len(centers), size=conversations, replace=False)
+    questions = [
+        [normalize(centers[topic] + 0.03 * rng.normal(size=dim)).tolist() for _ in range(turns)] for topic in topics
+    ]
+    docs = [utils.Document(page_content=f"chunk {i}", metadata={"source": "bench.pdf"}) for i in range(chunks)]
+    ids = [str(i) for i in range(chunks)]
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "chroma_path", tmp), \
+            patch.object(settings, "vector_backend", backend):
+        utils.invalidate_db()
+        db = utils.get_db("bench")
+        for i in range(0, chunks, 5000):
+            utils.add_embedded_documents(db, docs[i:i + 5000], vectors[i:i + 5000].tolist(), ids[i:i + 5000])
+        request = QueryRequest(question="Follow-up question", collection="bench", retrieval_mode="vector", top_k=k)
+        db.similarity_search_by_vector_with_relevance_scores(questions[0][0], k=k)
+
+        print(f"{chunks} chunks, {backend} backend, {conversations} conversations of {turns} turns, top_k {k}")
+        for name in ("no session", "session"):
+            samples, overlap, on_topic, store_searches = [], [], [], 0
+            for topic, conversation in zip(topics, questions):
+                session = ChatSession()
+                for vector in conversation:
+                    start = time.perf_counter()
+                    if name == "session":
+                        misses = session.misses
+                        hits = utils._session_vector_hits(request, vector, session)
+                        store_searches += session.misses - misses
+                    else:
+                        hits = db.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+                        store_searches += 1
+                    samples.append(time.perf_counter() - start)
+                    exact = {doc.page_content for doc, _ in db.similarity_search_by_vector_with_relevance_scores(vector, k=k)}
+                    overlap.append(len(exact & {doc.page_content for doc, _ in hits}) / k)
+                    on_topic.append(np.mean([chunk_topics[int(doc.page_content.split()[1])] == topic for doc, _ in hits]))
+            stats = summarize(samples)
+            print(f"  {name:10s}  mean {stats['mean_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  "
+                  f"store searches {store_searches}/{conversations * turns}  "
+                  f"overlap with a fresh search {np.mean(overlap):.2f}  on-topic {np.mean(on_topic):.2f}")
+        utils.invalidate_db()
+
+    # History sent with the last question of a long conversation
+    session = ChatSession()
+    answer = "The manual describes the procedure in detail. " * 25
+    for i in range(20):
+        session.record_turn(f"And what does section {i} say about the valves?", answer)
+    transcript = sum(count_tokens(message["content"]) for message in session.turns)
+    budgeted = sum(count_tokens(message["content"]) for message in session.history())
+    print(f"  history after 20 turns: {transcript} tokens for the full transcript, "
+          f"{budgeted} within SESSION_HISTORY_TOKENS={session.history_tokens}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark follow-up retrieval from a chat session working set.")
+    parser.add_argument("--chunks", type=int, default=100000, help="Chunks stored in the collection")
+    parser.add_argument("--conversations", type=int, default=20, help="Conversations replayed per variant")
+    parser.add_argument("--turns", type=int, default=6, help="Questions per conversation")
+    parser.add_argument("--backend", choices=["chroma", "flat"], default="flat", help="Vector store backend")
+    args = parser.parse_args()
+    run(args.chunks, args.conversations, args.turns, args.backend)
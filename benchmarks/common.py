@@ -0,0 +1,168 @@
+"""
+Shared Benchmark Helpers
+
+This module provides offline stand-ins and small statistics helpers used by
+the benchmark scripts, so they run without network access or a GPU.
+
+Features:
+- Deterministic hashing embedding model (no downloads)
+- Percentile summaries of latency samples
+- Minimal text PDF writer for parsing benchmarks and tests
+- Randomly initialised BERT sentence-transformer for runtime benchmarks and tests
+"""
+
+import hashlib
+import os
+import re
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Settings require an API key even though benchmarks never call Groq
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+_TOKEN = re.compile(r"\w+")
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings built from token hashes.
+
+    Texts sharing words get similar vectors, so retrieval behaves sensibly
+    while costing almost nothing to compute.
+
+    Attributes:
+        dim (int): Dimensionality of the produced vectors
+    """
+
+    def __init__(self, dim: int = 384):
+        """
+        Args:
+            dim (int): Dimensionality of the produced vectors (default: 384)
+        """
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize latency samples given in seconds.
+
+    Args:
+        samples (List[float]): Individual measurements in seconds
+
+    Returns:
+        Dict[str, float]: Mean and p50/p95/p99 in milliseconds
+    """
+    values = np.asarray(samples) * 1000
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99))
+    }
+
+
+def write_pdf(path: str, pages: List[List[str]]) -> None:
+    """
+    Write a PDF with the given lines of text on each page.
+
+    Args:
+        path (str): Output file
+        pages (List[List[str]]): Lines of every page (Latin-1 text without parentheses)
+    """
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica")
+    }))
+    for lines in pages:
+        page = writer.add_blank_page(612, 792)
+        commands = ["BT /F1 10 Tf 12 TL 50 750 Td"] + [f"({line}) '" for line in lines] + ["ET"]
+        content = DecodedStreamObject()
+        content.set_data("\n".join(commands).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+    writer.write(path)
+
+
+def toy_sentence_transformer(
+    folder: str,
+    dim: int = 384,
+    layers: int = 12,
+    heads: int = 12,
+    pooling: str = "cls",
+    max_seq_length: int = 512
+):
+    """
+    Build a randomly initialised BERT sentence-transformer without downloads.
+
+    With the defaults it has the shape of bge-small (384d, 12 layers), so its
+    speed is representative even though its embeddings are meaningless.
+
+    Args:
+        folder (str): Directory the model and its word-level vocabulary are saved in
+        dim (int): Hidden size (default: 384)
+        layers (int): Transformer layers (default: 12)
+        heads (int): Attention heads (default: 12)
+        pooling (str): Sentence pooling mode (default: "cls")
+        max_seq_length (int): Longest tokenized input (default: 512)
+
+    Returns:
+        SentenceTransformer: The model, on CPU
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    torch.manual_seed(0)
+    os.makedirs(folder, exist_ok=True)
+    words = sorted({word for line in _VOCABULARY.split("\n") for word in line.split()})
+    vocab = os.path.join(folder, "vocab.txt")
+    with open(vocab, "w", encoding="utf-8") as f:
+        f.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words + [str(i) for i in range(1000)]))
+    tokenizer = BertTokenizerFast(vocab)
+    config = BertConfig(
+        vocab_size=tokenizer.vocab_size, hidden_size=dim, num_hidden_layers=layers,
+        num_attention_heads=heads, intermediate_size=dim * 4, max_position_embeddings=max(512, max_seq_length)
+    )
+    BertModel(config).save_pretrained(folder)
+    tokenizer.save_pretrained(folder)
+    transformer = models.Transformer(folder, max_seq_length=max_seq_length)
+    dimension = getattr(transformer, "get_embedding_dimension", None) or transformer.get_word_embedding_dimension
+    pooler = models.Pooling(dimension(), pooling_mode=pooling)
+    return SentenceTransformer(modules=[transformer, pooler, models.Normalize()], device="cpu")
+
+
+# Words known to the toy tokenizer; anything else is split into word pieces or [UNK]
+_VOCABULARY = """
+the a an of to in for on with and or is are was be by as at from that this it not
+pump valve seal motor bearing filter pressure flow sensor alarm reset check replace clean
+solar wind grid battery inverter storage panel turbine demand supply energy report
+supplier customer delivery invoice payment term notice liability warranty service contract
+what how when why which who does do should must can will days hours year revenue growth
+"""
@@ -0,0 +1,69 @@
+"""
+Vector Store Handle Benchmark
+
+Measures the per-query overhead of opening a Chroma handle for every request
+(the previous behaviour of get_db) against reusing handles from the
+process-wide registry.
+
+Usage:
+    python -m benchmarks.db_handles --queries 200
+"""
+
+import argparse
+import tempfile
+import time
+from unittest.mock import patch
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from benchmarks.common import HashEmbeddings, summarize
+from config import settings
+import utils
+
+
+def run(queries: int, chunks: int) -> None:
+    """
+    Run the benchmark and print a before/after comparison.
+
+    Args:
+        queries (int): Number of timed queries per mode
+        chunks (int): Number of chunks stored in the benchmark collection
+    """
+    fake = HashEmbeddings(dim=settings.embedding_dim)
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "chroma_path", tmp), \
+            patch.object(utils, "embeddings", fake):
+        utils.invalidate_db()
+        docs = [Document(page_content=f"chunk {i} about topic {i % 50}", metadata={"source": f"doc{i % 20}.pdf"})
+                for i in range(chunks)]
+        utils.get_db("bench").add_documents(docs, ids=[str(i) for i in range(chunks)])
+        vector = fake.embed_query("topic 7")
+
+        def uncached():
+            return Chroma(persist_directory=tmp, embedding_function=fake, collection_name="bench")
+
+        def cached():
+            return utils.get_db("bench")
+
+        results = {}
+        for name, open_db in [("per-call handle (before)", uncached), ("registry handle (after)", cached)]:
+            samples = []
+            for _ in range(queries):
+                start = time.perf_counter()
+                open_db().similarity_search_by_vector_with_relevance_scores(vector, k=settings.top_k)
+                samples.append(time.perf_counter() - start)
+            results[name] = summarize(samples)
+        utils.invalidate_db()
+
+    print(f"{queries} queries against {chunks} chunks")
+    for name, stats in results.items():
+        print(f"{name:28s} mean {stats['mean_ms']:7.2f} ms  p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vector store handle reuse.")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per mode")
+    parser.add_argument("--chunks", type=int, default=2000, help="Chunks stored in the collection")
+    args = parser.parse_args()
+    run(args.queries, args.chunks)
@@ -0,0 +1,136 @@
+"""
+Near-Duplicate Elimination Benchmark
+
+Ingests a synthetic corpus full of boilerplate (the same header and
+disclaimer in every file, and a handful of contracts pasted into many files
+with small edits) with and without near-duplicate elimination, and reports
+the chunks stored, the text bytes saved and the ingestion time of both runs.
+
+Usage:
+    python -m benchmarks.dedup --documents 200 --contracts 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+
+_WORDS = (
+    "agreement party supplier customer delivery invoice payment term notice liability warranty service "
+    "period renewal schedule fee price order product quality inspection claim damage insurance law"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    """Paragraphs of pseudo-random words with numbers, so unrelated texts share few shingles."""
+    tokens = [f"{rng.choice(_WORDS)}{rng.randint(0, 999)}" for _ in range(words)]
+    return "\n\n".join(" ".join(tokens[i:i + 60]) for i in range(0, len(tokens), 60))
+
+
+def write_corpus(folder: str, documents: int, contracts: int, seed: int = 0) -> List[str]:
+    """
+    Write text files that share a header, a disclaimer and pasted contracts.
+
+    Args:
+        folder (str): Target directory
+        documents (int): Files to write
+        contracts (int): Distinct contracts pasted (with one edited word) into the files
+
+    Returns:
+        List[str]: Paths of the written files
+    """
+    rng = random.Random(seed)
+    header = _text(rng, 120)
+    disclaimer = _text(rng, 180)
+    bodies = [_text(rng, 900) for _ in range(contracts)]
+    paths = []
+    for i in range(documents):
+        contract = bodies[i % contracts].split(" ")
+        # Each copy carries its own date or party name
+        contract[rng.randrange(len(contract))] = f"edited{i}"
+        text = "\n\n".join([header, _text(rng, 300), " ".join(contract), disclaimer])
+        path = os.path.join(folder, f"doc_{i:04d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+
+def _ingest(paths: List[str], enabled: bool) -> Dict:
+    """Ingest the corpus into a fresh collection and measure it."""
+    from unittest.mock import patch
+
+    from config import settings
+    from dedup import get_dedup_index
+    from ingest import ingest_document
+    from models import IngestRequest
+    import metrics
+
+    collection = "dedup_on" if enabled else "dedup_off"
+    metrics.reset()
+    with patch.object(settings, "dedup_enabled", enabled):
+        start = time.perf_counter()
+        for path in paths:
+            ingest_document(IngestRequest(file_path=path, collection=collection))
+        seconds = time.perf_counter() - start
+    stats = get_dedup_index(collection).stats() if enabled else {"duplicates": 0, "bytes_saved": 0}
+    dedup_seconds = metrics.stage_seconds.total(stage="dedup")
+    return {
+        "stored": int(metrics.chunks.value(event="stored")),
+        "split": int(metrics.chunks.value(event="split")),
+        "skipped": stats["duplicates"],
+        "bytes_saved": stats["bytes_saved"],
+        "seconds": seconds,
+        "dedup_seconds": dedup_seconds
+    }
+
+
+def run(documents: int, contracts: int, backend: str) -> None:
+    """
+    Ingest the corpus with and without deduplication and print the results.
+
+    Args:
+        documents (int): Files in the corpus
+        contracts (int): Distinct contracts shared by the files
+        backend (str): Vector store backend ("chroma" or "flat")
+    """
+    from unittest.mock import patch
+
+    from benchmarks.common import HashEmbeddings
+    from config import settings
+    from logger import logger
+    import utils
+
+    logger.remove()
+    utils.embedding_model._factory = lambda: HashEmbeddings(dim=settings.embedding_dim)
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "chroma_path", os.path.join(tmp, "db")), \
+            patch.object(settings, "vector_backend", backend), \
+            patch.object(settings, "embedding_cache_enabled", False):
+        corpus = os.path.join(tmp, "corpus")
+        os.makedirs(corpus)
+        paths = write_corpus(corpus, documents, contracts)
+        corpus_mb = sum(os.path.getsize(path) for path in paths) / 2 ** 20
+
+        print(f"{documents} documents ({corpus_mb:.1f} MiB), {contracts} shared contracts, {backend} backend")
+        for enabled in (False, True):
+            result = _ingest(paths, enabled)
+            print(
+                f"  dedup {'on ' if enabled else 'off'}  {result['stored']:6d}/{result['split']} chunks stored  "
+                f"{result['skipped']:6d} skipped  {result['bytes_saved'] / 2 ** 20:6.2f} MiB saved  "
+                f"{result['seconds']:7.2f} s (dedup stage {result['dedup_seconds']:.2f} s)"
+            )
+        utils.invalidate_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate chunk elimination at ingestion.")
+    parser.add_argument("--documents", type=int, default=200, help="Files in the corpus")
+    parser.add_argument("--contracts", type=int, default=5, help="Distinct contracts pasted into the files")
+    parser.add_argument("--backend", choices=["chroma", "flat"], default="chroma", help="Vector store backend")
+    args = parser.parse_args()
+    run(args.documents, args.contracts, args.backend)
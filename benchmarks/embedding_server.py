@@ -0,0 +1,122 @@
+"""
+Embedding Server Benchmark
+
+Compares query embedding under concurrency with the model called directly by
+every thread (batch size 1, as each session does in-process) against the
+shared embedding server, which micro-batches requests from all callers. The
+model is a small randomly initialised transformer encoder built with torch,
+so batching behaves like a real sentence-transformer without any download.
+
+Usage:
+    python -m benchmarks.embedding_server --clients 16 --queries 20
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import List
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+from benchmarks.common import summarize
+from embedding_server import EmbeddingServer, RemoteEmbeddings
+
+
+class TransformerEmbeddings:
+    """Randomly initialised transformer encoder with mean pooling (embeddings are meaningless)."""
+
+    query_encode_kwargs = {}
+
+    def __init__(self, dim: int = 384, layers: int = 4, vocab: int = 30000):
+        import torch
+        torch.manual_seed(0)
+        self.torch = torch
+        self.vocab = vocab
+        self.embedding = torch.nn.Embedding(vocab, dim)
+        layer = torch.nn.TransformerEncoderLayer(dim, nhead=6, dim_feedforward=dim * 4, batch_first=True)
+        self.encoder = torch.nn.TransformerEncoder(layer, num_layers=layers).eval()
+
+    def _tokens(self, text: str) -> List[int]:
+        return [int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % self.vocab for word in text.split()][:128] or [0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        torch = self.torch
+        ids = [self._tokens(text) for text in texts]
+        width = max(len(row) for row in ids)
+        batch = torch.tensor([row + [0] * (width - len(row)) for row in ids])
+        padding = torch.tensor([[False] * len(row) + [True] * (width - len(row)) for row in ids])
+        with torch.inference_mode():
+            hidden = self.encoder(self.embedding(batch), src_key_padding_mask=padding)
+            mask = (~padding).unsqueeze(-1).float()
+            pooled = (hidden * mask).sum(1) / mask.sum(1)
+            pooled = torch.nn.functional.normalize(pooled, dim=1)
+        return pooled.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def _drive(clients: int, queries: int, embed) -> dict:
+    """Run ``clients`` threads issuing ``queries`` sequential queries each."""
+    samples: List[float] = []
+    lock = threading.Lock()
+
+    def client(index: int) -> None:
+        local = []
+        for i in range(queries):
+            question = f"client {index} asks question number {i} about solar panel efficiency and storage"
+            start = time.perf_counter()
+            embed(question)
+            local.append(time.perf_counter() - start)
+        with lock:
+            samples.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {"queries_per_sec": clients * queries / elapsed, **summarize(samples)}
+
+
+def run(clients: int, queries: int, max_wait_ms: float) -> None:
+    """
+    Run both modes and print a comparison.
+
+    Args:
+        clients (int): Concurrent callers
+        queries (int): Queries per caller
+        max_wait_ms (float): Batching window of the server
+    """
+    model = TransformerEmbeddings()
+    model.embed_query("warm up")
+    print(f"{clients} concurrent clients x {queries} queries")
+
+    results = {"in-process (batch 1)": _drive(clients, queries, model.embed_query)}
+    with tempfile.TemporaryDirectory() as tmp:
+        server = EmbeddingServer(model, os.path.join(tmp, "embed.sock"), model_name="toy", max_wait_ms=max_wait_ms)
+        server.start()
+        try:
+            remote = RemoteEmbeddings(server.address)
+            results[f"server ({max_wait_ms:g} ms window)"] = _drive(clients, queries, remote.embed_query)
+            batches, texts = server.batcher.batches, server.batcher.texts
+        finally:
+            server.shutdown()
+
+    for name, stats in results.items():
+        print(f"{name:28s} {stats['queries_per_sec']:8.1f} q/s  p50 {stats['p50_ms']:7.1f} ms  "
+              f"p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms")
+    print(f"server batches: {batches} for {texts} texts ({texts / max(batches, 1):.1f} texts/batch)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the micro-batching embedding server.")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per caller")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Server batching window")
+    args = parser.parse_args()
+    run(args.clients, args.queries, args.max_wait_ms)
@@ -0,0 +1,81 @@
+"""
+HNSW Parameter Sweep Benchmark
+
+Builds HNSW indexes over a synthetic clustered collection for a grid of
+graph degrees (M), build ef and search ef values, and reports recall@k
+against an exact brute-force search together with query latency, plus the
+time taken by an offline rebuild of a stored collection.
+
+Usage:
+    python -m benchmarks.hnsw_sweep --chunks 50000 --m 8 16 32 --search-ef 10 50 100 200
+"""
+
+import argparse
+import tempfile
+import time
+from typing import List
+from unittest.mock import patch
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+from config import settings
+from logger import logger
+import utils
+
+
+def run(chunks: int, queries: int, k: int, m: List[int], construction_ef: List[int], search_ef: List[int]) -> None:
+    """
+    Run the sweep and the rebuild and print the results.
+
+    Args:
+        chunks (int): Vectors in the synthetic collection
+        queries (int): Sampled queries per parameter set
+        k (int): Results per query
+        m (List[int]): Graph degrees to try
+        construction_ef (List[int]): Build ef values to try
+        search_ef (List[int]): Query ef values to try
+    """
+    import hnsw
+
+    logger.remove()
+    rng = np.random.default_rng(0)
+    dim = settings.embedding_dim
+    # Clustered vectors are harder for HNSW than uniform noise, like real embeddings
+    centers = rng.normal(size=(max(chunks // 200, 1), dim))
+    vectors = centers[rng.integers(len(centers), size=chunks)] + 0.5 * rng.normal(size=(chunks, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    query_vectors = hnsw.sample_queries(vectors, queries)
+
+    print(f"{chunks} chunks of {dim}-d clustered vectors, {queries} queries, recall@{k}")
+    results = hnsw.sweep(vectors, query_vectors, m=m, construction_ef=construction_ef, search_ef=search_ef, k=k)
+    print(hnsw.format_sweep(results, k))
+
+    docs = [utils.Document(page_content=f"chunk {i}", metadata={"source": "bench.pdf"}) for i in range(chunks)]
+    ids = [str(i) for i in range(chunks)]
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "chroma_path", tmp), \
+            patch.object(settings, "vector_backend", "chroma"):
+        utils.invalidate_db()
+        db = utils.get_db("bench")
+        for i in range(0, chunks, 5000):
+            utils.add_embedded_documents(db, docs[i:i + 5000], vectors[i:i + 5000].tolist(), ids[i:i + 5000])
+        overrides = {"bench": {"m": max(m), "construction_ef": max(construction_ef)}}
+        with patch.object(settings, "hnsw_collection_params", overrides):
+            start = time.perf_counter()
+            hnsw.rebuild("bench")
+            print(f"  rebuilding {chunks} chunks with {overrides['bench']} from stored embeddings: "
+                  f"{time.perf_counter() - start:.1f} s")
+        utils.invalidate_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HNSW recall and latency across index parameters.")
+    parser.add_argument("--chunks", type=int, default=50000, help="Vectors in the synthetic collection")
+    parser.add_argument("--queries", type=int, default=200, help="Sampled queries per parameter set")
+    parser.add_argument("--k", type=int, default=settings.top_k, help="Results per query")
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32], help="Graph degrees to try")
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100], help="Build ef values to try")
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100, 200], help="Query ef values to try")
+    args = parser.parse_args()
+    run(args.chunks, args.queries, args.k, args.m, args.construction_ef, args.search_ef)
@@ -0,0 +1,94 @@
+"""
+Metadata Filter Benchmark
+
+Compares a query restricted to one source file when the filter is applied
+after retrieval (search the whole collection, then drop other files' chunks)
+with the filter pushed down into the vector search, on the same synthetic
+collection: query latency and how many of the top-k slots hold chunks of
+the requested file.
+
+Usage:
+    python -m benchmarks.metadata_filters --chunks 100000 --files 500
+    python -m benchmarks.metadata_filters --backend chroma --chunks 20000
+"""
+
+import argparse
+import tempfile
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+from benchmarks.common import summarize
+from config import settings
+from logger import logger
+import utils
+
+
+def run(chunks: int, files: int, queries: int, backend: str) -> None:
+    """
+    Run both variants and print the comparison.
+
+    Args:
+        chunks (int): Chunks stored in the collection
+        files (int): Source files the chunks are spread over
+        queries (int): Timed queries per variant
+        backend (str): Vector store backend ("chroma" or "flat")
+    """
+    from filters import build_where, chunk_metadata
+    from models import QueryRequest
+
+    logger.remove()
+    rng = np.random.default_rng(0)
+    dim = settings.embedding_dim
+    vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = rng.normal(size=(queries, dim)).astype(np.float32).tolist()
+    names = [f"doc{i:05d}.pdf" for i in range(files)]
+    docs = [
+        utils.Document(
+            page_content=f"chunk {i}",
+            metadata={"source": f"/data/{names[i % files]}", **chunk_metadata(names[i % files], "hash")}
+        )
+        for i in range(chunks)
+    ]
+    ids = [str(i) for i in range(chunks)]
+    k = settings.top_k
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "chroma_path", tmp), \
+            patch.object(settings, "vector_backend", backend):
+        utils.invalidate_db()
+        db = utils.get_db("bench")
+        for i in range(0, chunks, 5000):
+            utils.add_embedded_documents(db, docs[i:i + 5000], vectors[i:i + 5000].tolist(), ids[i:i + 5000])
+
+        print(f"{chunks} chunks over {files} files ({chunks // files} per file), {backend} backend, top_k {k}")
+        for name, pushed_down in (("post-filter", False), ("pushed down", True)):
+            samples, matching = [], []
+            for i, vector in enumerate(query_vectors):
+                target = names[i % files]
+                where = build_where(QueryRequest(question="Filtered question", sources=[target]))
+                start = time.perf_counter()
+                if pushed_down:
+                    hits = db.similarity_search_by_vector_with_relevance_scores(vector, k=k, filter=where)
+                else:
+                    hits = db.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+                    hits = [(doc, score) for doc, score in hits if doc.metadata["filename"] == target]
+                samples.append(time.perf_counter() - start)
+                matching.append(len(hits))
+            stats = summarize(samples)
+            print(f"  {name:12s} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+                  f"matching results {np.mean(matching):4.1f}/{k}")
+        utils.invalidate_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark post-filtering vs. pushed-down metadata filters.")
+    parser.add_argument("--chunks", type=int, default=100000, help="Chunks stored in the collection")
+    parser.add_argument("--files", type=int, default=500, help="Source files the chunks are spread over")
+    parser.add_argument("--queries", type=int, default=100, help="Timed queries per variant")
+    parser.add_argument("--backend", choices=["chroma", "flat"], default="flat", help="Vector store backend")
+    args = parser.parse_args()
+    run(args.chunks, args.files, args.queries, args.backend)
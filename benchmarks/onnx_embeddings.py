@@ -0,0 +1,116 @@
+"""
+ONNX Embedding Runtime Benchmark
+
+Compares the embedding throughput of the sentence-transformers model in
+eager PyTorch with its ONNX Runtime export, in float32 and with int8 dynamic
+quantization, for document batches (ingestion) and single questions (query
+latency), and reports the cosine agreement of each export with PyTorch.
+
+Without network access the model is a randomly initialised BERT with the
+shape of bge-small; pass --model to benchmark a downloaded model instead.
+
+Usage:
+    python -m benchmarks.onnx_embeddings --texts 512 --threads 4
+    python -m benchmarks.onnx_embeddings --model BAAI/bge-small-en-v1.5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+from benchmarks.common import _VOCABULARY, summarize, toy_sentence_transformer
+
+
+def _texts(count: int, rng: random.Random) -> List[str]:
+    """Chunk-like texts of 20 to 250 words."""
+    words = _VOCABULARY.split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(20, 250))) for _ in range(count)]
+
+
+def _throughput(embed: Callable[[List[str]], object], texts: List[str]) -> float:
+    """Texts per second embedding the whole list at once."""
+    embed(texts[:8])
+    start = time.perf_counter()
+    embed(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def run(texts: int, queries: int, threads: int, batch_size: int, model_name: str) -> None:
+    """
+    Benchmark every runtime and print the results.
+
+    Args:
+        texts (int): Documents embedded per throughput measurement
+        queries (int): Single questions embedded for the latency measurement
+        threads (int): Threads of PyTorch and ONNX Runtime
+        batch_size (int): Texts per model call
+        model_name (str): Model to load, or "" for the offline bge-small-shaped model
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    from logger import logger
+    from onnx_embeddings import OnnxEmbeddings, check_parity, export_model
+
+    logger.remove()
+    torch.set_num_threads(threads)
+    rng = random.Random(0)
+    documents = _texts(texts, rng)
+    questions = [" ".join(rng.choice(_VOCABULARY.split()) for _ in range(rng.randint(6, 16))) for _ in range(queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if model_name:
+            model = SentenceTransformer(model_name, device="cpu")
+        else:
+            model = toy_sentence_transformer(os.path.join(tmp, "model"))
+            model_name = "random bge-small-shaped BERT"
+        start = time.perf_counter()
+        export_model(model, os.path.join(tmp, "onnx"), quantize=True, model_name=model_name)
+        print(f"{model_name}: exported in {time.perf_counter() - start:.1f}s, {threads} threads, "
+              f"{texts} documents, batch size {batch_size}")
+
+        class TorchEmbeddings:
+            """sentence-transformers as utils uses it (normalized, batched)."""
+
+            def embed_documents(self, batch: List[str]) -> List[List[float]]:
+                return model.encode(batch, batch_size=batch_size, normalize_embeddings=True).tolist()
+
+            def embed_query(self, text: str) -> List[float]:
+                return self.embed_documents([text])[0]
+
+        runtimes = {"pytorch": TorchEmbeddings()}
+        for quantized in (False, True):
+            runtimes["onnx int8" if quantized else "onnx float32"] = OnnxEmbeddings(
+                os.path.join(tmp, "onnx"), quantized=quantized, threads=threads, batch_size=batch_size
+            )
+
+        baseline = None
+        for name, runtime in runtimes.items():
+            rate = _throughput(runtime.embed_documents, documents)
+            samples = []
+            for question in questions:
+                start = time.perf_counter()
+                runtime.embed_query(question)
+                samples.append(time.perf_counter() - start)
+            latency = summarize(samples)
+            baseline = baseline or rate
+            parity = "" if name == "pytorch" else (
+                f"  cosine vs pytorch min {check_parity(runtimes['pytorch'], runtime, documents[:64])['min']:.5f}"
+            )
+            print(f"  {name:13s} {rate:8.1f} docs/s ({rate / baseline:4.1f}x)  "
+                  f"query p50 {latency['p50_ms']:6.1f} ms  p95 {latency['p95_ms']:6.1f} ms{parity}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PyTorch vs. ONNX Runtime (float32 / int8) embeddings.")
+    parser.add_argument("--texts", type=int, default=512, help="Documents per throughput measurement")
+    parser.add_argument("--queries", type=int, default=50, help="Single questions for the latency measurement")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Intra-op threads")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per model call")
+    parser.add_argument("--model", default="", help="Model name (default: offline random bge-small-shaped model)")
+    args = parser.parse_args()
+    run(args.texts, args.queries, args.threads, args.batch_size, args.model)
@@ -0,0 +1,102 @@
+"""
+Parse Cache Benchmark
+
+Measures how long loading a PDF corpus takes when it is parsed with
+PyPDFLoader, parsed and written to the parse cache (first ingestion), and
+read back from the cache (re-chunking or re-indexing), plus the cache's size
+on disk. A second measurement compares serial and parallel page extraction of
+one large PDF.
+
+Usage:
+    python -m benchmarks.parse_cache --documents 20 --pages 30
+    python -m benchmarks.parse_cache --big-pages 400 --workers 4
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+from benchmarks.common import write_pdf
+from config import settings
+from logger import logger
+from manifest import file_hash
+
+
+def _pages(count: int, rng: random.Random) -> List[List[str]]:
+    """Pages of 50 lines of pseudo-random words."""
+    words = "solar wind grid battery inverter storage panel turbine demand supply energy report".split()
+    return [[" ".join(rng.choice(words) for _ in range(12)) for _ in range(50)] for _ in range(count)]
+
+
+def run(documents: int, pages: int, big_pages: int, workers: int) -> None:
+    """
+    Run both measurements and print the results.
+
+    Args:
+        documents (int): PDFs in the corpus
+        pages (int): Pages per corpus PDF
+        big_pages (int): Pages of the PDF used for the extraction comparison
+        workers (int): Processes for parallel extraction
+    """
+    from unittest.mock import patch
+
+    from langchain_community.document_loaders import PyPDFLoader
+    from ingest import load_pages
+    from parse_cache import ParseCache, iter_pdf_pages
+
+    logger.remove()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp, patch.object(settings, "chroma_path", tmp):
+        paths = []
+        for i in range(documents):
+            path = os.path.join(tmp, f"doc_{i:03d}.pdf")
+            write_pdf(path, _pages(pages, rng))
+            paths.append(path)
+        digests = [file_hash(path) for path in paths]
+        pdf_mb = sum(os.path.getsize(path) for path in paths) / 2 ** 20
+
+        def timed(load) -> float:
+            start = time.perf_counter()
+            for path, digest in zip(paths, digests):
+                load(path, digest)
+            return time.perf_counter() - start
+
+        with patch.object(settings, "pdf_parallel_min_pages", 10 ** 9):
+            parse = timed(lambda path, digest: PyPDFLoader(path).load())
+            cold = timed(load_pages)
+            warm = timed(load_pages)
+        cache_mb = ParseCache().size_bytes() / 2 ** 20
+
+        print(f"{documents} PDFs x {pages} pages ({pdf_mb:.1f} MiB of PDF)")
+        print(f"  PyPDFLoader parse       {parse:7.2f} s")
+        print(f"  parse + cache write     {cold:7.2f} s")
+        print(f"  cache read (re-chunk)   {warm:7.2f} s  ({parse / warm:.0f}x faster than parsing)")
+        print(f"  cache size              {cache_mb:7.2f} MiB")
+
+        big = os.path.join(tmp, "big.pdf")
+        write_pdf(big, _pages(big_pages, rng))
+        start = time.perf_counter()
+        serial = PyPDFLoader(big).load()
+        serial_seconds = time.perf_counter() - start
+        with patch.object(settings, "pdf_parallel_min_pages", 2):
+            start = time.perf_counter()
+            parallel = list(iter_pdf_pages(big, workers=workers))
+            parallel_seconds = time.perf_counter() - start
+        assert parallel == serial
+        print(f"{big_pages}-page PDF, {os.cpu_count()} CPUs")
+        print(f"  serial extraction       {serial_seconds:7.2f} s")
+        print(f"  {workers} processes             {parallel_seconds:7.2f} s  ({serial_seconds / parallel_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parsed document cache and parallel PDF extraction.")
+    parser.add_argument("--documents", type=int, default=20, help="PDFs in the corpus")
+    parser.add_argument("--pages", type=int, default=30, help="Pages per corpus PDF")
+    parser.add_argument("--big-pages", type=int, default=400, help="Pages of the large PDF")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Processes for parallel extraction")
+    args = parser.parse_args()
+    run(args.documents, args.pages, args.big_pages, max(args.workers, 2))
@@ -0,0 +1,127 @@
+"""
+Quantization Benchmark
+
+Measures recall@k against exact float32 search, query latency and memory per
+vector for the flat store's quantized tiers on a synthetic clustered corpus.
+"Hot" memory is what a search scans on every query (the codes for quantized
+tiers, the full vectors otherwise) and therefore what has to fit in RAM;
+full-precision vectors of a quantized tier are only read for the shortlist.
+
+Usage:
+    python -m benchmarks.quantization --chunks 100000 --multipliers 1,4,10
+    python -m benchmarks.quantization --dim 1024 --json results.json
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from typing import Dict, List
+from unittest.mock import Mock
+
+import numpy as np
+
+from benchmarks.common import summarize
+from config import settings
+from flat_store import FlatVectorStore
+import quantization
+
+
+def synthetic_corpus(chunks: int, queries: int, dim: int, seed: int = 0):
+    """
+    Build clustered unit vectors and nearby queries, like topical document chunks.
+
+    Args:
+        chunks (int): Corpus size
+        queries (int): Number of queries
+        dim (int): Vector dimensionality
+        seed (int): Random seed
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (corpus, queries) as float32 unit vectors
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(chunks // 100, 1), dim))
+    corpus = centers[rng.integers(0, len(centers), chunks)] + rng.normal(size=(chunks, dim)) * 0.8
+    picks = rng.integers(0, chunks, queries)
+    query_vectors = corpus[picks] + rng.normal(size=(queries, dim)) * 0.3
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    query_vectors = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return corpus.astype(np.float32), query_vectors.astype(np.float32)
+
+
+def run(chunks: int, queries: int, dim: int, k: int, multipliers: List[int], dtype: str) -> List[Dict]:
+    """
+    Benchmark every quantization method and rescore multiplier.
+
+    Args:
+        chunks (int): Corpus size
+        queries (int): Number of timed queries
+        dim (int): Vector dimensionality
+        k (int): Results per query
+        multipliers (List[int]): Rescore multipliers to try for quantized tiers
+        dtype (str): Storage type of the full-precision vectors
+
+    Returns:
+        List[Dict]: One result row per configuration
+    """
+    corpus, query_vectors = synthetic_corpus(chunks, queries, dim)
+    truth = np.argsort(-(query_vectors @ corpus.T), axis=1)[:, :k]
+    full_bytes = np.dtype(dtype).itemsize * dim
+
+    results = []
+    print(f"{chunks} chunks, {dim}-d, {queries} queries, recall@{k}, full vectors stored as {dtype}")
+    print(f"{'tier':8s} {'rescore':>7s} {'recall':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'hot B/vec':>10s} {'disk B/vec':>11s}")
+    for method in quantization.METHODS:
+        for multiplier in ([1] if method == "none" else multipliers):
+            with tempfile.TemporaryDirectory() as tmp:
+                store = FlatVectorStore(tmp, Mock(), dtype=dtype, quantization_method=method,
+                                        rescore_multiplier=multiplier)
+                ids = [str(i) for i in range(chunks)]
+                for i in range(0, chunks, 10000):
+                    store.add_embeddings(ids[i:i + 10000], corpus[i:i + 10000], [""] * len(ids[i:i + 10000]))
+
+                samples, hits = [], 0
+                for query, expected in zip(query_vectors, truth):
+                    start = time.perf_counter()
+                    found = store.search_by_vectors(query[None, :], k=k)[0]
+                    samples.append(time.perf_counter() - start)
+                    hits += len({row for row, _ in found} & set(expected.tolist()))
+
+            code_bytes = 0
+            if method != "none":
+                code_bytes = quantization.code_width(method, dim) + (4 if method == "int8" else 0)
+            stats = summarize(samples)
+            row = {
+                "tier": method,
+                "rescore_multiplier": multiplier if method != "none" else None,
+                "recall": hits / (queries * k),
+                "p50_ms": stats["p50_ms"],
+                "p95_ms": stats["p95_ms"],
+                "hot_bytes_per_vector": code_bytes or full_bytes,
+                "disk_bytes_per_vector": full_bytes + code_bytes
+            }
+            results.append(row)
+            print(
+                f"{method:8s} {multiplier if method != 'none' else '-':>7} {row['recall']:7.3f} "
+                f"{row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['hot_bytes_per_vector']:10d} "
+                f"{row['disk_bytes_per_vector']:11d}"
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark recall and memory of quantized vector tiers.")
+    parser.add_argument("--chunks", type=int, default=50000, help="Corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per configuration")
+    parser.add_argument("--dim", type=int, default=settings.embedding_dim, help="Vector dimensionality")
+    parser.add_argument("--k", type=int, default=settings.top_k, help="Results per query")
+    parser.add_argument("--multipliers", default="1,4,10,30", help="Comma-separated rescore multipliers")
+    parser.add_argument("--dtype", default=settings.flat_store_dtype, help="Full-precision storage type")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    rows = run(args.chunks, args.queries, args.dim, args.k, [int(m) for m in args.multipliers.split(",")], args.dtype)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
@@ -0,0 +1,101 @@
+"""
+Collection Sharding Benchmark
+
+Writes the same synthetic collection unsharded and split across several
+shards, and compares write time, single-query latency and batched query
+throughput, then measures offline re-sharding of the unsharded collection.
+Shards are searched concurrently, so the gain grows with the number of
+cores; on a single core sharding only adds merge overhead.
+
+Usage:
+    python -m benchmarks.sharding --chunks 200000 --shards 1 2 4 8
+    python -m benchmarks.sharding --backend chroma --chunks 50000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+from unittest.mock import patch
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401 (sets GROQ_API_KEY)
+from benchmarks.common import summarize
+from config import settings
+from logger import logger
+import utils
+
+
+def run(chunks: int, queries: int, batch: int, shard_counts: List[int], backend: str) -> None:
+    """
+    Run the benchmark for every shard count and print a comparison.
+
+    Args:
+        chunks (int): Chunks stored in each collection
+        queries (int): Timed single queries per shard count
+        batch (int): Queries per batched search
+        shard_counts (List[int]): Shard counts to compare (1 = unsharded)
+        backend (str): Vector store backend ("chroma" or "flat")
+    """
+    from sharding import reshard
+
+    logger.remove()
+    rng = np.random.default_rng(0)
+    dim = settings.embedding_dim
+    vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = rng.normal(size=(queries, dim)).astype(np.float32).tolist()
+    docs = [utils.Document(page_content=f"chunk {i}", metadata={"source": f"doc{i % 1000}.pdf"}) for i in range(chunks)]
+    ids = [str(i) for i in range(chunks)]
+
+    print(f"{chunks} chunks of {dim}-d vectors, {backend} backend, {os.cpu_count()} CPUs, {queries} queries")
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "chroma_path", tmp), \
+            patch.object(settings, "vector_backend", backend):
+        for shards in shard_counts:
+            collection = f"bench_{shards}"
+            utils.invalidate_db()
+            with patch.object(settings, "collection_shards", shards):
+                db = utils.get_db(collection)
+            start = time.perf_counter()
+            for i in range(0, chunks, 5000):
+                utils.add_embedded_documents(db, docs[i:i + 5000], vectors[i:i + 5000].tolist(), ids[i:i + 5000])
+            write = time.perf_counter() - start
+
+            db.similarity_search_by_vector_with_relevance_scores(query_vectors[0], k=settings.top_k)
+            samples = []
+            for vector in query_vectors:
+                start = time.perf_counter()
+                db.similarity_search_by_vector_with_relevance_scores(vector, k=settings.top_k)
+                samples.append(time.perf_counter() - start)
+            stats = summarize(samples)
+
+            start = time.perf_counter()
+            for i in range(0, queries, batch):
+                utils.search_by_vectors(collection, query_vectors[i:i + batch], k=settings.top_k)
+            rate = queries / (time.perf_counter() - start)
+            print(
+                f"  {shards:2d} shard{'s' if shards > 1 else ' '}  write {write:6.1f} s  "
+                f"p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  "
+                f"batched ({batch}/call) {rate:8.1f} queries/sec"
+            )
+
+        if shard_counts and shard_counts[0] == 1:
+            target = max(shard_counts)
+            start = time.perf_counter()
+            reshard("bench_1", target)
+            print(f"  re-sharding {chunks} chunks into {target} shards: {time.perf_counter() - start:.1f} s")
+        utils.invalidate_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark scatter-gather search over sharded collections.")
+    parser.add_argument("--chunks", type=int, default=200000, help="Chunks stored per collection")
+    parser.add_argument("--queries", type=int, default=200, help="Timed single queries per shard count")
+    parser.add_argument("--batch", type=int, default=32, help="Queries per batched search")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="Shard counts to compare")
+    parser.add_argument("--backend", choices=["chroma", "flat"], default="flat", help="Vector store backend")
+    args = parser.parse_args()
+    run(args.chunks, args.queries, args.batch, args.shards, args.backend)
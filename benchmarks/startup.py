@@ -0,0 +1,110 @@
+"""
+Startup Time Benchmark
+
+Measures, each in a fresh interpreter, how long it takes to import the main
+modules and how long it takes from process start until the first query is
+answered, with and without an explicit warm-up call. Cold runs pay for
+loading the embedding model inside the first query; warm runs pay for it in
+warm_up(). The LLM is replaced by a stub so only local startup cost is
+measured.
+
+Usage:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --fake-embeddings   # offline, no model download
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs inside the child interpreter; prints one JSON line of timings
+_CHILD = r"""
+import json, os, sys, time
+start = time.perf_counter()
+timings = {}
+mode, embeddings = sys.argv[1], sys.argv[2]
+
+if mode.startswith("import:"):
+    __import__(mode.split(":", 1)[1])
+    timings["seconds"] = time.perf_counter() - start
+else:
+    from unittest.mock import MagicMock, patch
+    import utils
+    timings["import"] = time.perf_counter() - start
+
+    if embeddings == "fake":
+        from benchmarks.common import HashEmbeddings
+        utils.embedding_model._factory = lambda: HashEmbeddings()
+
+    if mode == "setup":
+        utils.get_db("startup").add_texts(["Startup benchmark document about solar panels."], ids=["1"])
+    else:
+        if mode == "warm":
+            t = time.perf_counter()
+            utils.warm_up("startup")
+            timings["warm_up"] = time.perf_counter() - t
+
+        response = MagicMock()
+        response.choices[0].message.content = "stub answer"
+        client = MagicMock()
+        client.chat.completions.create.return_value = response
+        with patch("groq.Groq", return_value=client):
+            t = time.perf_counter()
+            utils.query_rag(utils.QueryRequest(question="solar panels", collection="startup"))
+            timings["first_query"] = time.perf_counter() - t
+        timings["total"] = time.perf_counter() - start
+
+print(json.dumps(timings))
+"""
+
+
+def _run_child(mode: str, fake: bool, workdir: str) -> dict:
+    """Run one measurement in a fresh interpreter and parse its timings."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        PYTHONPATH=root,
+        GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "benchmark"),
+        CHROMA_PATH=os.path.join(workdir, "chroma"),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, "cache.sqlite3")
+    )
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", _CHILD, mode, "fake" if fake else "real"],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(runs: int, fake: bool) -> None:
+    """
+    Run every measurement ``runs`` times and print medians.
+
+    Args:
+        runs (int): Fresh interpreters per measurement
+        fake (bool): Use the offline hashing embeddings instead of the real model
+    """
+    print(f"Median of {runs} fresh interpreters ({'fake' if fake else 'real'} embeddings)")
+    with tempfile.TemporaryDirectory() as workdir:
+        for module in ["config", "logger", "models", "utils", "ingest"]:
+            samples = [_run_child(f"import:{module}", fake, workdir)["seconds"] for _ in range(runs)]
+            print(f"import {module:30s} {statistics.median(samples) * 1000:8.1f} ms")
+
+        # Store one document first so timed runs only pay for querying
+        _run_child("setup", fake, workdir)
+        for mode in ["cold", "warm"]:
+            samples = [_run_child(mode, fake, workdir) for _ in range(runs)]
+            for key in samples[0]:
+                value = statistics.median(sample[key] for sample in samples)
+                print(f"{mode} start: {key:26s} {value * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark import time and time to first query.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use offline hashing embeddings")
+    args = parser.parse_args()
+    run(args.runs, args.fake_embeddings)
@@ -0,0 +1,291 @@
+"""
+End-to-End Benchmark Suite
+
+Generates a synthetic corpus of configurable size, ingests it file by file
+through ingest_document and answers questions through query_rag, reporting
+ingest throughput, query latency percentiles, mean time per pipeline stage and
+peak memory for each corpus size. Embeddings come from the deterministic
+HashEmbeddings and the LLM is a stub with a configurable delay, so the suite
+runs offline, without a GPU, and gives the same workload on every machine.
+
+Each corpus size runs in a fresh interpreter, so peak memory (max RSS) is
+measured per size and nothing cached by one size speeds up the next. Results
+can be written as JSON and compared with an earlier run to spot regressions
+between releases.
+
+Usage:
+    python -m benchmarks.suite --sizes 100,300,1000 --json results.json
+    python -m benchmarks.suite --backend flat --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# Topic vocabularies of the synthetic corpus; documents mix one topic with filler
+_TOPICS = {
+    "energy": "solar wind turbine battery grid inverter storage photovoltaic hydro emissions".split(),
+    "finance": "revenue margin quarter forecast dividend liquidity audit ledger invoice budget".split(),
+    "medicine": "dosage clinical trial symptom diagnosis patient therapy vaccine cardiology enzyme".split(),
+    "software": "compiler latency cache thread kernel deployment container schema query index".split(),
+    "law": "contract clause liability statute plaintiff tribunal appeal jurisdiction warranty tort".split(),
+}
+_FILLER = "the of and to in is for on with as by this that from are be at which also each".split()
+
+
+def write_corpus(directory: str, documents: int, words: int, seed: int = 0) -> List[str]:
+    """
+    Write deterministic synthetic text documents.
+
+    Every document has a topic, topic-heavy sentences and a unique reference
+    code (e.g. ``REF-00042``), so both vector and keyword retrieval have
+    something to find.
+
+    Args:
+        directory (str): Output directory
+        documents (int): Number of documents
+        words (int): Approximate words per document
+        seed (int): Random seed
+
+    Returns:
+        List[str]: Paths of the written files
+    """
+    rng = random.Random(seed)
+    topics = sorted(_TOPICS)
+    paths = []
+    for i in range(documents):
+        topic = topics[i % len(topics)]
+        sentences, count = [f"Report REF-{i:05d} on {topic}."], 0
+        while count < words:
+            sentence = [rng.choice(_TOPICS[topic]) if rng.random() < 0.4 else rng.choice(_FILLER)
+                        for _ in range(rng.randint(8, 16))]
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            count += len(sentence)
+        path = os.path.join(directory, f"doc_{i:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(" ".join(sentences))
+        paths.append(path)
+    return paths
+
+
+def make_questions(documents: int, count: int, seed: int = 1) -> List[str]:
+    """Deterministic questions mixing topic words and document reference codes."""
+    rng = random.Random(seed)
+    topics = sorted(_TOPICS)
+    questions = []
+    for _ in range(count):
+        i = rng.randrange(documents)
+        words = rng.sample(_TOPICS[topics[i % len(topics)]], 3)
+        questions.append(f"What does report REF-{i:05d} say about {' and '.join(words)}?")
+    return questions
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB elsewhere
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def run_size(documents: int, queries: int, words: int, llm_delay_ms: float, backend: str) -> Dict:
+    """
+    Ingest and query one corpus size in the current process.
+
+    Args:
+        documents (int): Documents in the corpus
+        queries (int): Timed queries
+        words (int): Approximate words per document
+        llm_delay_ms (float): Simulated LLM response time
+        backend (str): Vector store backend ("chroma" or "flat")
+
+    Returns:
+        Dict: Throughput, latency percentiles, stage means and peak memory
+    """
+    from unittest.mock import MagicMock, patch
+
+    from benchmarks.common import HashEmbeddings, summarize
+    from config import settings
+    from ingest import ingest_document
+    from logger import logger
+    from models import IngestRequest, QueryRequest
+    import metrics
+    import utils
+
+    # Console logging would dominate the timings of small stages
+    logger.remove()
+
+    # Replace only the model, keeping the embedding cache and timing layers in front of it
+    utils.embedding_model._factory = lambda: HashEmbeddings(dim=settings.embedding_dim)
+
+    def stub_completion(**kwargs):
+        time.sleep(llm_delay_ms / 1000)
+        response = MagicMock()
+        response.choices[0].message.content = "Stub answer."
+        response.usage.prompt_tokens = 0
+        response.usage.completion_tokens = 0
+        return response
+
+    client = MagicMock()
+    client.chat.completions.create.side_effect = stub_completion
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(settings, "chroma_path", os.path.join(tmp, "db")), \
+            patch.object(settings, "vector_backend", backend), \
+            patch.object(settings, "query_cache_enabled", False), \
+            patch("groq.Groq", return_value=client):
+        corpus = os.path.join(tmp, "corpus")
+        os.makedirs(corpus)
+        paths = write_corpus(corpus, documents, words)
+        corpus_mb = sum(os.path.getsize(path) for path in paths) / 2 ** 20
+        metrics.reset()
+
+        start = time.perf_counter()
+        for path in paths:
+            ingest_document(IngestRequest(file_path=path, collection="bench"))
+        ingest_seconds = time.perf_counter() - start
+        chunks = metrics.chunks.value(event="stored")
+
+        # One untimed query pays for lazy imports and tokenizer loading
+        questions = make_questions(documents, queries + 1)
+        utils.query_rag(QueryRequest(question=questions.pop(), collection="bench"))
+
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            utils.query_rag(QueryRequest(question=question, collection="bench"))
+            samples.append(time.perf_counter() - start)
+        utils.invalidate_db()
+
+    stages = {
+        stage: metrics.stage_seconds.total(stage=stage) / metrics.stage_seconds.count(stage=stage) * 1000
+        for stage in ("load", "split", "embed", "store", "query_embed", "vector_search",
+                      "keyword_search", "context_build", "llm")
+        if metrics.stage_seconds.count(stage=stage)
+    }
+    return {
+        "documents": documents,
+        "chunks": int(chunks),
+        "corpus_mb": corpus_mb,
+        "ingest_seconds": ingest_seconds,
+        "docs_per_sec": documents / ingest_seconds,
+        "chunks_per_sec": chunks / ingest_seconds,
+        "queries": queries,
+        "query": summarize(samples),
+        "stage_mean_ms": stages,
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+def _run_child(args: argparse.Namespace, documents: int) -> Dict:
+    """Run one corpus size in a fresh interpreter and parse its result."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [
+        sys.executable, "-W", "ignore", "-m", "benchmarks.suite", "--child",
+        "--sizes", str(documents), "--queries", str(args.queries), "--words", str(args.words),
+        "--llm-delay-ms", str(args.llm_delay_ms), "--backend", args.backend
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        # A fresh embedding cache per run, so every size embeds its corpus from scratch
+        env = dict(
+            os.environ,
+            GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "benchmark"),
+            EMBEDDING_CACHE_PATH=os.path.join(tmp, "embedding_cache.sqlite3")
+        )
+        result = subprocess.run(command, cwd=root, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _environment() -> Dict:
+    """Describe the machine and code version a run was made on."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+
+def compare(results: List[Dict], baseline: List[Dict]) -> None:
+    """
+    Print the relative change of key metrics against a baseline run.
+
+    Args:
+        results (List[Dict]): Results of this run
+        baseline (List[Dict]): Results of an earlier run (matched by corpus size)
+    """
+    previous = {row["documents"]: row for row in baseline}
+    print("\nChange vs. baseline (positive = slower or larger, except throughput)")
+    for row in results:
+        old = previous.get(row["documents"])
+        if old is None:
+            continue
+        changes = {
+            "docs/sec": row["docs_per_sec"] / old["docs_per_sec"] - 1,
+            "p50": row["query"]["p50_ms"] / old["query"]["p50_ms"] - 1,
+            "p95": row["query"]["p95_ms"] / old["query"]["p95_ms"] - 1,
+            "p99": row["query"]["p99_ms"] / old["query"]["p99_ms"] - 1,
+            "peak RSS": row["peak_rss_mb"] / old["peak_rss_mb"] - 1
+        }
+        print(f"{row['documents']:6d} docs  " + "  ".join(f"{name} {change:+6.1%}" for name, change in changes.items()))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point for the benchmark suite."""
+    parser = argparse.ArgumentParser(description="Offline end-to-end ingest and query benchmark.")
+    parser.add_argument("--sizes", default="100,300,1000", help="Comma-separated corpus sizes in documents")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per corpus size")
+    parser.add_argument("--words", type=int, default=1500, help="Approximate words per document")
+    parser.add_argument("--llm-delay-ms", type=float, default=0.0, help="Simulated LLM response time")
+    parser.add_argument("--backend", default="chroma", help="Vector store backend: chroma or flat")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier run")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    if args.child:
+        print(json.dumps(run_size(sizes[0], args.queries, args.words, args.llm_delay_ms, args.backend)))
+        return
+
+    print(f"{args.backend} backend, {args.words} words/doc, {args.queries} queries, LLM stub {args.llm_delay_ms} ms")
+    print(f"{'docs':>6s} {'chunks':>7s} {'docs/s':>8s} {'chunks/s':>9s} "
+          f"{'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'peak MiB':>9s}")
+    results = []
+    for documents in sizes:
+        row = _run_child(args, documents)
+        results.append(row)
+        print(
+            f"{row['documents']:6d} {row['chunks']:7d} {row['docs_per_sec']:8.1f} {row['chunks_per_sec']:9.1f} "
+            f"{row['query']['p50_ms']:8.2f} {row['query']['p95_ms']:8.2f} {row['query']['p99_ms']:8.2f} "
+            f"{row['peak_rss_mb']:9.1f}"
+        )
+    for row in results:
+        stages = "  ".join(f"{stage} {ms:.2f}" for stage, ms in row["stage_mean_ms"].items())
+        print(f"{row['documents']:6d} docs, mean ms per stage: {stages}")
+
+    config = {key: getattr(args, key) for key in ("queries", "words", "llm_delay_ms", "backend")}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"environment": _environment(), "config": config, "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
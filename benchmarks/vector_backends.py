@@ -0,0 +1,99 @@
+"""
+Vector Backend Benchmark
+
+Compares the Chroma backend with the memory-mapped flat store (float16 and
+float32 storage) on the same synthetic collection: write time, time to open
+the collection in a fresh handle, on-disk size, single-query latency and
+batched query throughput.
+
+Usage:
+    python -m benchmarks.vector_backends --chunks 50000 --queries 200
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmarks.common import summarize
+from config import settings
+import utils
+
+
+def _directory_size(path: str) -> int:
+    """Total size in bytes of the files under a directory."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+def run(chunks: int, queries: int, batch: int) -> None:
+    """
+    Run the benchmark for every backend and print a comparison.
+
+    Args:
+        chunks (int): Chunks stored in each collection
+        queries (int): Timed single queries per backend
+        batch (int): Queries per batched search (flat stores only)
+    """
+    rng = np.random.default_rng(0)
+    dim = settings.embedding_dim
+    vectors = rng.normal(size=(chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = rng.normal(size=(queries, dim)).astype(np.float32).tolist()
+    docs = [utils.Document(page_content=f"chunk {i}", metadata={"source": f"doc{i % 100}.pdf"}) for i in range(chunks)]
+    ids = [str(i) for i in range(chunks)]
+
+    print(f"{chunks} chunks of {dim}-d vectors, {queries} queries")
+    variants = [("chroma", "chroma", None), ("flat-f16", "flat", "float16"), ("flat-f32", "flat", "float32")]
+    for name, backend, dtype in variants:
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, "chroma_path", tmp), \
+                patch.object(settings, "vector_backend", backend), \
+                patch.object(settings, "flat_store_dtype", dtype or settings.flat_store_dtype):
+            utils.invalidate_db()
+            db = utils.get_db("bench")
+            start = time.perf_counter()
+            for i in range(0, chunks, 5000):
+                utils.add_embedded_documents(db, docs[i:i + 5000], vectors[i:i + 5000].tolist(), ids[i:i + 5000])
+            write = time.perf_counter() - start
+
+            # A fresh handle shows the cost of opening the collection after a restart
+            utils.invalidate_db()
+            start = time.perf_counter()
+            db = utils.get_db("bench")
+            db.similarity_search_by_vector_with_relevance_scores(query_vectors[0], k=settings.top_k)
+            first = time.perf_counter() - start
+
+            samples = []
+            for vector in query_vectors:
+                start = time.perf_counter()
+                db.similarity_search_by_vector_with_relevance_scores(vector, k=settings.top_k)
+                samples.append(time.perf_counter() - start)
+            stats = summarize(samples)
+
+            print(
+                f"{name:8s} write {write:6.1f} s  open+first query {first * 1000:8.1f} ms  "
+                f"disk {_directory_size(tmp) / 2 ** 20:7.1f} MiB  "
+                f"p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms"
+            )
+            if backend == "flat":
+                start = time.perf_counter()
+                for i in range(0, queries, batch):
+                    db.search_by_vectors(query_vectors[i:i + batch], k=settings.top_k)
+                elapsed = time.perf_counter() - start
+                print(f"{name:8s} batched search ({batch}/call) {queries / elapsed:8.1f} queries/sec")
+            utils.invalidate_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the Chroma and flat vector store backends.")
+    parser.add_argument("--chunks", type=int, default=50000, help="Chunks stored per backend")
+    parser.add_argument("--queries", type=int, default=200, help="Timed single queries per backend")
+    parser.add_argument("--batch", type=int, default=32, help="Queries per batched flat store search")
+    args = parser.parse_args()
+    run(args.chunks, args.queries, args.batch)
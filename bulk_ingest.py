@@ -0,0 +1,305 @@
+"""
+Bulk Ingestion Module
+
+This module ingests whole directories of documents at once. Loading and
+splitting run in a process pool, while the main process feeds every resulting
+chunk through one shared embedding stage in large batches and writes them to
+the vector database in batches as well.
+
+Features:
+- Directory or glob input, callable from Python or the command line
+- Parallel loading and splitting across worker processes
+- Large-batch embedding and batched vector database writes
+- Incremental re-ingestion via the collection manifest
+- Parsed pages reused from the parse cache when only chunking settings changed
+- BM25 keyword index updated with every batched write
+- Near-duplicate chunks across the whole corpus kept as source references, not stored again
+- Per-file error isolation (one bad file never aborts the run)
+- Throughput reporting in docs/sec and chunks/sec
+
+Usage:
+    python bulk_ingest.py data/corpus --collection default --workers 4
+"""
+
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from config import settings
+from logger import logger, enable_file_logging
+from models import BulkIngestReport
+from ingest import SUPPORTED_EXTENSIONS, chunking_signature, delete_chunks, load_pages, plan_update, split_documents
+from manifest import Manifest, file_hash, file_key
+from filters import chunk_metadata
+from query_cache import bump_generation
+from keyword_index import get_keyword_index
+from dedup import DedupPlan, get_dedup_index
+from utils import add_embedded_documents, embeddings, get_db
+import metrics
+
+
+def discover_files(target: str) -> List[str]:
+    """
+    Expand a directory or glob pattern into the supported files it contains.
+
+    Args:
+        target (str): Directory (searched recursively) or glob pattern
+
+    Returns:
+        List[str]: Sorted paths of supported documents
+    """
+    if os.path.isdir(target):
+        paths = glob.glob(os.path.join(target, "**", "*"), recursive=True)
+    else:
+        paths = glob.glob(target, recursive=True)
+    return sorted(
+        path for path in paths
+        if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS
+    )
+
+
+def _prepare_file(path: str, previous_hash: Optional[str]) -> Dict:
+    """
+    Hash, load and split one file (runs inside a worker process).
+
+    Metrics recorded in a worker would be lost with the process, so stage
+    timings are returned for the main process to record.
+
+    Args:
+        path (str): Path to the document
+        previous_hash (Optional[str]): Hash recorded in the manifest, if the
+            file was split with the current chunking settings
+
+    Returns:
+        Dict: File digest, chunks and load/split seconds, or ``chunks=None`` if the file is unchanged
+    """
+    digest = file_hash(path)
+    if digest == previous_hash:
+        return {"digest": digest, "chunks": None}
+    start = time.perf_counter()
+    # Files are already spread over worker processes, so each one is parsed serially
+    docs = load_pages(path, digest, parallel=False)
+    loaded = time.perf_counter()
+    chunks = split_documents(docs, chunk_metadata(path, digest))
+    return {
+        "digest": digest,
+        "chunks": chunks,
+        "load_seconds": loaded - start,
+        "split_seconds": time.perf_counter() - loaded
+    }
+
+
+class _PendingFile:
+    """Bookkeeping for a file whose chunks are waiting to be written."""
+
+    def __init__(self, path: str, key: str, digest: str, ids: List[str], stale_ids: List[str]):
+        self.path = path
+        self.key = key
+        self.digest = digest
+        self.ids = ids
+        self.stale_ids = stale_ids
+        # Buffered chunks not written (or skipped as duplicates) yet
+        self.unwritten = 0
+
+
+def bulk_ingest(
+    target: str,
+    collection: str = "default",
+    workers: Optional[int] = None,
+    embed_batch_size: Optional[int] = None,
+    write_batch_size: Optional[int] = None
+) -> BulkIngestReport:
+    """
+    Ingest every supported document under a directory or glob pattern.
+
+    Files are loaded and split in parallel worker processes. Their chunks are
+    buffered in the main process until at least ``write_batch_size`` are
+    waiting, then embedded in batches of ``embed_batch_size`` and written in
+    batches of ``write_batch_size``. Files are recorded in the manifest after
+    each write, once all of their chunks have been written. If a write fails,
+    only the files with chunks in that batch or a later one fail; their
+    chunks are noted as pending in the manifest, so the next run deletes the
+    ones already written. Chunks that nearly duplicate a stored chunk, or one
+    written earlier in the run, are only recorded as source references (see
+    ingest_document).
+
+    Args:
+        target (str): Directory (searched recursively) or glob pattern
+        collection (str): Target collection name (default: "default")
+        workers (Optional[int]): Worker processes (default: settings.ingest_workers or CPU count)
+        embed_batch_size (Optional[int]): Chunks per embedding call (default: settings.embed_batch_size)
+        write_batch_size (Optional[int]): Chunks per database write (default: settings.write_batch_size)
+
+    Returns:
+        BulkIngestReport: Counts, failures and throughput of the run
+    """
+    workers = workers or settings.ingest_workers or os.cpu_count() or 1
+    embed_batch_size = embed_batch_size or settings.embed_batch_size
+    write_batch_size = write_batch_size or settings.write_batch_size
+
+    start = time.perf_counter()
+    paths = discover_files(target)
+    report = BulkIngestReport(files_total=len(paths))
+    logger.info(f"Bulk ingesting {len(paths)} files → {collection} with {workers} workers")
+
+    manifest = Manifest(collection)
+    known = manifest.entries()
+    chunking = chunking_signature()
+    db = get_db(collection)
+    index = get_keyword_index(collection) if settings.keyword_index_enabled else None
+    dedup = get_dedup_index(collection) if settings.dedup_enabled else None
+    plan = DedupPlan()
+    buffer: List[tuple] = []
+    buffered_files: List[_PendingFile] = []
+    completed: Dict[str, Dict] = {}
+
+    def finalize(pending: _PendingFile) -> None:
+        """Delete stale chunks and queue the file's manifest entry once fully written."""
+        if pending.stale_ids:
+            delete_chunks(db, index, dedup, pending.stale_ids)
+        completed[pending.key] = {"hash": pending.digest, "chunk_ids": pending.ids, "chunking": chunking}
+        report.files_ingested += 1
+
+    def write(batch: List[tuple]) -> None:
+        """Deduplicate, embed and store one batch of buffered chunks."""
+        docs = [doc for doc, _, _ in batch]
+        batch_ids = [chunk_id for _, chunk_id, _ in batch]
+        if dedup is not None:
+            with metrics.span("dedup"):
+                docs, batch_ids = dedup.filter(plan, docs, batch_ids)
+            metrics.chunks.inc(len(batch) - len(docs), event="duplicate")
+        if docs:
+            vectors = []
+            with metrics.span("embed"):
+                for i in range(0, len(docs), embed_batch_size):
+                    texts = [doc.page_content for doc in docs[i:i + embed_batch_size]]
+                    vectors.extend(embeddings.embed_documents(texts))
+            with metrics.span("store"):
+                add_embedded_documents(db, docs, vectors, batch_ids)
+                if index is not None:
+                    index.add(batch_ids, [doc.page_content for doc in docs])
+            metrics.chunks.inc(len(docs), event="stored")
+            report.chunks_written += len(docs)
+        # Recorded per batch, so the index never points at chunks of a failed write
+        if dedup is not None:
+            dedup.record(plan)
+
+    def flush() -> None:
+        """Write the buffer batch by batch, recording each file once all of its chunks are written."""
+        if not buffered_files:
+            return
+        for start_index in range(0, len(buffer), write_batch_size):
+            batch = buffer[start_index:start_index + write_batch_size]
+            try:
+                write(batch)
+            except Exception as e:
+                # Written chunks of the unfinished files are pending in the manifest; the next run deletes them
+                plan.discard()
+                unfinished = [pending for pending in buffered_files if pending.unwritten]
+                logger.error(f"Failed to store {len(unfinished)} files: {e}")
+                for pending in unfinished:
+                    report.files_failed[pending.path] = str(e)
+                break
+            for _, _, pending in batch:
+                pending.unwritten -= 1
+                if not pending.unwritten:
+                    finalize(pending)
+            manifest.record_many(completed)
+            completed.clear()
+        else:
+            elapsed = time.perf_counter() - start
+            logger.info(f"Stored {report.chunks_written} chunks ({report.chunks_written / elapsed:.1f} chunks/sec)")
+        buffer.clear()
+        buffered_files.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for path in paths:
+            previous = known.get(file_key(path))
+            # Chunks written by a failed ingestion of this file
+            leftovers = manifest.pending(file_key(path))
+            # Files split with other chunking settings (or older chunk metadata) are split again, even if unchanged
+            unchanged = previous and previous.get("chunking") == chunking and not leftovers
+            previous_hash = previous["hash"] if unchanged else None
+            futures[pool.submit(_prepare_file, path, previous_hash)] = (path, previous, leftovers)
+
+        for future in as_completed(futures):
+            path, previous, leftovers = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Failed to load {path}: {e}")
+                report.files_failed[path] = str(e)
+                continue
+
+            if result["chunks"] is None:
+                report.files_skipped += 1
+                continue
+            metrics.record_stage("load", result["load_seconds"])
+            metrics.record_stage("split", result["split_seconds"])
+            metrics.chunks.inc(len(result["chunks"]), event="split")
+
+            key = file_key(path)
+            rewrite = previous is not None and previous.get("chunking") != chunking
+            ids, new_chunks, new_ids, stale_ids = plan_update(key, result["chunks"], previous, rewrite)
+            current = set(ids)
+            stale_ids += [chunk_id for chunk_id in leftovers if chunk_id not in current and chunk_id not in stale_ids]
+            pending = _PendingFile(path, key, result["digest"], ids, stale_ids)
+            if not new_chunks:
+                finalize(pending)
+                continue
+
+            manifest.add_pending(key, new_ids)
+            pending.unwritten = len(new_chunks)
+            buffer.extend((chunk, chunk_id, pending) for chunk, chunk_id in zip(new_chunks, new_ids))
+            buffered_files.append(pending)
+            if len(buffer) >= write_batch_size:
+                flush()
+
+    flush()
+    manifest.record_many(completed)
+    report.chunks_deduplicated = plan.chunks_skipped
+    report.bytes_deduplicated = plan.bytes_skipped
+
+    # Cached answers for this collection may now be outdated
+    if report.chunks_written or report.files_ingested:
+        bump_generation(collection)
+
+    report.seconds = time.perf_counter() - start
+    logger.success(
+        f"Bulk ingestion complete: {report.files_ingested} ingested, {report.files_skipped} unchanged, "
+        f"{len(report.files_failed)} failed, {report.chunks_written} chunks "
+        f"({report.chunks_deduplicated} near-duplicates skipped) in {report.seconds:.1f}s "
+        f"({report.docs_per_sec:.2f} docs/sec, {report.chunks_per_sec:.1f} chunks/sec)"
+    )
+    return report
+
+
+def main() -> None:
+    """Command line entry point for bulk ingestion."""
+    parser = argparse.ArgumentParser(description="Bulk ingest a directory or glob of documents.")
+    parser.add_argument("target", help="Directory (searched recursively) or glob pattern, e.g. 'docs/**/*.pdf'")
+    parser.add_argument("--collection", default="default", help="Target collection name")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes for loading and splitting")
+    parser.add_argument("--embed-batch", type=int, default=None, help="Chunks per embedding call")
+    parser.add_argument("--write-batch", type=int, default=None, help="Chunks per vector database write")
+    args = parser.parse_args()
+
+    enable_file_logging()
+    report = bulk_ingest(
+        args.target,
+        collection=args.collection,
+        workers=args.workers,
+        embed_batch_size=args.embed_batch,
+        write_batch_size=args.write_batch
+    )
+    for path, error in report.files_failed.items():
+        print(f"FAILED {path}: {error}")
+    raise SystemExit(1 if report.files_failed else 0)
+
+
+if __name__ == "__main__":
+    main()
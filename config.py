@@ -7,34 +7,135 @@ resource detection for optimal performance.
 
 Features:
 - Environment variable loading from .env file
-- Automatic GPU/CPU detection for embeddings
+- Lazy GPU/CPU detection for embeddings (torch is only imported on first use)
 - Configurable model and embedding settings
 - Path management for data and vector database
 """
 
-import torch
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+@lru_cache(maxsize=1)
+def detect_device() -> str:
+    """
+    Detect the device used for embeddings.
+
+    torch is imported here rather than at module level so that importing the
+    configuration stays cheap for code paths that never embed anything.
+
+    Returns:
+        str: 'cuda' if a GPU is available, otherwise 'cpu'
+    """
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+@lru_cache(maxsize=1)
+def has_large_gpu() -> bool:
+    """
+    Check whether a GPU with more than 3.5GB of memory is available.
+
+    Returns:
+        bool: True if the larger embedding model fits on the GPU
+    """
+    if detect_device() != "cuda":
+        return False
+    import torch
+    return torch.cuda.get_device_properties(0).total_memory > 3_500_000_000
+
+
 class Settings(BaseSettings):
     """
     Application configuration settings loaded from environment variables.
 
     This class automatically detects system capabilities (GPU/CPU) and sets
-    appropriate defaults for embeddings and models. All settings can be
-    overridden via environment variables or .env file.
+    appropriate defaults for embeddings and models. Detection runs lazily the
+    first time an embedding setting is read. All settings can be overridden
+    via environment variables or .env file.
 
     Attributes:
         groq_api_key (str): API key for Groq LLM service (required)
         default_model (str): Default LLM model for RAG queries
-        embedding_model (str): HuggingFace embedding model name
-        embedding_dim (int): Dimensionality of embedding vectors
-        embedding_device (str): Device for embedding computations ('cuda' or 'cpu')
+        groq_base_url (Optional[str]): Override of the Groq API base URL (e.g. a local stub)
+        llm_timeout_seconds (float): Timeout of a single LLM request
+        llm_max_connections (int): HTTP connection pool size of the async client
+        llm_max_concurrency (int): Maximum async LLM requests in flight per process
+        llm_max_retries (int): Retries on rate-limit, server and connection errors
+        llm_backoff_base_seconds (float): Base delay of the jittered exponential backoff
+        llm_backoff_max_seconds (float): Upper bound of a single backoff delay
+        embedding_model (str): HuggingFace embedding model name (auto-detected if unset)
+        embedding_dim (int): Dimensionality of embedding vectors (auto-detected if unset)
+        embedding_device (str): Device for embedding computations ('cuda' or 'cpu', auto-detected if unset)
+        embedding_backend (str): "local" (model loaded in-process) or "server" (shared embedding server)
+        embedding_runtime (str): "torch" (sentence-transformers) or "onnx" (ONNX Runtime export of the model)
+        embedding_onnx_path (str): Directory holding ONNX exports, one subdirectory per model
+        embedding_onnx_quantize (bool): Use the int8 dynamically quantized ONNX graph
+        embedding_onnx_threads (Optional[int]): ONNX Runtime intra-op threads (default: one per physical core)
+        embedding_onnx_batch_size (int): Texts per ONNX inference call (batched by length)
+        embedding_server_address (str): Unix socket path or tcp://host:port of the embedding server
+        embedding_server_max_batch (int): Texts that close an embedding server batch early
+        embedding_server_max_wait_ms (float): Time the embedding server waits to fill a batch
         data_folder (str): Directory for storing uploaded documents
         chroma_path (str): Path to Chroma vector database
         chunk_size (int): Size of text chunks for document splitting
         chunk_overlap (int): Overlap between consecutive chunks
+        dedup_enabled (bool): Skip near-duplicate chunks at ingestion, keeping them as source references
+        dedup_threshold (float): Estimated Jaccard similarity (MinHash) at which a chunk is a near-duplicate;
+            its number tokens must match as well
+        parse_cache_enabled (bool): Cache extracted PDF/DOCX pages by file hash under chroma_path/parse_cache
+        parse_cache_max_mb (int): Parse cache size before least recently used documents are evicted
+        pdf_parallel_min_pages (int): Page count from which PDFs are extracted in parallel processes
+        pdf_parse_workers (Optional[int]): Processes used to extract a large PDF (default: CPU count)
+        ingest_workers (Optional[int]): Processes used by bulk ingestion (default: CPU count)
+        embed_batch_size (int): Chunks per embedding call during bulk ingestion
+        write_batch_size (int): Chunks per vector database write during bulk ingestion
+        stream_ingest_threshold_mb (int): File size from which documents are ingested in streaming mode
+        ingest_memory_limit_mb (int): Memory ceiling for chunks held in flight while streaming
+        ingest_job_workers (int): Background ingestion jobs run concurrently by the app
+        jobs_path (str): Path to the SQLite table of background ingestion jobs
         top_k (int): Number of similar documents to retrieve
+        vector_backend (str): Vector store behind get_db: "chroma" or "flat" (memory-mapped exact search)
+        flat_compact_ratio (float): Tombstoned fraction that triggers flat store compaction
+        flat_search_block_rows (int): Rows scored per matrix product in flat store searches
+        flat_store_dtype (str): Storage type of new flat stores: "float16" or "float32"
+        flat_quantization (str): Quantized search tier of new flat stores: "none", "int8" or "binary"
+        flat_rescore_multiplier (int): Quantized candidates rescored exactly per requested result
+        db_handle_cache_size (int): Vector store handles kept open per process
+        collection_shards (int): Shards of a new collection (1 = unsharded; see sharding.py to re-shard)
+        shard_workers (int): Threads that search and write shards concurrently
+        hnsw_space (str): Distance of new Chroma collections: "l2", "cosine" or "ip"
+        hnsw_m (Optional[int]): HNSW graph degree of new Chroma collections (default: Chroma's)
+        hnsw_construction_ef (Optional[int]): HNSW build candidate list size of new collections (default: Chroma's)
+        hnsw_search_ef (Optional[int]): HNSW query candidate list size, also applied to existing collections
+        hnsw_collection_params (Dict[str, Dict[str, Any]]): Per-collection overrides of the four
+            settings above, e.g. {"manuals": {"m": 32, "search_ef": 200}}
+        keyword_index_enabled (bool): Maintain a BM25 keyword index during ingestion
+        rrf_k (int): Damping constant of reciprocal rank fusion in hybrid retrieval
+        keyword_min_match (float): Share of the question's IDF-weighted terms a keyword hit
+            must contain to be fused in hybrid retrieval
+        keyword_filter_oversample (int): Keyword hits ranked per requested result when a query is filtered
+        context_token_budget (int): Maximum tokens of retrieved context sent to the LLM
+        context_dedup_threshold (float): Shingle similarity at which a passage counts as a duplicate
+        context_mmr_enabled (bool): Re-rank passages with maximal marginal relevance for diversity
+        context_mmr_lambda (float): MMR weight of relevance versus diversity
+        query_cache_enabled (bool): Cache answers for repeated and paraphrased questions
+        query_cache_max_entries (int): Cached answers kept per collection
+        query_cache_ttl_seconds (int): Lifetime of a cached answer
+        query_cache_similarity_threshold (float): Cosine similarity needed to reuse an answer
+        session_working_set_size (int): Recently retrieved chunks (with embeddings) kept per chat session
+        session_reuse_distance (float): Squared L2 distance within which a working-set chunk counts as relevant
+        session_history_tokens (int): Maximum tokens of earlier chat turns sent to the LLM
+        batch_query_chunk_size (int): Questions embedded and searched together by batch_query.py
+        batch_query_concurrency (int): Batch questions answered concurrently (retrieval and LLM call)
+        embedding_cache_enabled (bool): Cache chunk embeddings on disk
+        embedding_cache_path (str): Path to the SQLite embedding cache
+        embedding_cache_max_entries (int): Maximum cached vectors before eviction
+        warm_up_on_start (bool): Load the embedding model in the background when the app starts
+        metrics_port (Optional[int]): Port of the Prometheus /metrics endpoint (disabled if unset)
+        metrics_host (str): Interface the metrics endpoint binds to
         app_title (str): Streamlit application title
         app_icon (str): Streamlit application icon
     """
@@ -42,7 +143,8 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file='.env',
         env_ignore_empty=True,
-        extra='ignore'
+        extra='ignore',
+        populate_by_name=True
     )
 
     # Required API key for Groq service
@@ -51,18 +153,33 @@ class Settings(BaseSettings):
     # Default LLM model (free and fast option)
     default_model: str = "llama-3.1-8b-instant"
 
-    # Auto-detect optimal embedding model based on GPU memory
-    if torch.cuda.is_available() and torch.cuda.get_device_properties(0).total_memory > 3_500_000_000:
-        # Use larger model for high-end GPUs (>3.5GB VRAM)
-        embedding_model: str = "BAAI/bge-large-en-v1.5"
-        embedding_dim: int = 1024
-    else:
-        # Use smaller model for CPUs or low-end GPUs
-        embedding_model: str = "BAAI/bge-small-en-v1.5"
-        embedding_dim: int = 384
+    # Async LLM client settings (connection pooling, rate limits, retries)
+    groq_base_url: Optional[str] = None
+    llm_timeout_seconds: float = 30.0
+    llm_max_connections: int = 20
+    llm_max_concurrency: int = 8
+    llm_max_retries: int = 4
+    llm_backoff_base_seconds: float = 0.5
+    llm_backoff_max_seconds: float = 8.0
+
+    # Embedding overrides (EMBEDDING_MODEL, EMBEDDING_DIM, EMBEDDING_DEVICE);
+    # when unset, the properties below auto-detect them on first access
+    embedding_model_override: Optional[str] = Field(None, validation_alias="embedding_model")
+    embedding_dim_override: Optional[int] = Field(None, validation_alias="embedding_dim")
+    embedding_device_override: Optional[str] = Field(None, validation_alias="embedding_device")
+
+    # Shared embedding server (one model per node, micro-batched across processes)
+    embedding_backend: str = "local"
+    embedding_server_address: str = "data/embedding.sock"
+    embedding_server_max_batch: int = 64
+    embedding_server_max_wait_ms: float = 5.0
 
-    # Device selection for embeddings
-    embedding_device: str = "cuda" if torch.cuda.is_available() else "cpu"
+    # Embedding runtime; ONNX Runtime with int8 weights is much faster on CPU-only nodes
+    embedding_runtime: str = "torch"
+    embedding_onnx_path: str = "data/onnx"
+    embedding_onnx_quantize: bool = True
+    embedding_onnx_threads: Optional[int] = None
+    embedding_onnx_batch_size: int = 32
 
     # File system paths
     data_folder: str = "data"
@@ -72,17 +189,134 @@ class Settings(BaseSettings):
     chunk_size: int = 1000
     chunk_overlap: int = 200
 
+    # Near-duplicate chunk elimination at ingestion (MinHash LSH per collection)
+    dedup_enabled: bool = True
+    dedup_threshold: float = 0.98
+
+    # Parsed document cache (re-chunking without re-parsing) and parallel PDF extraction
+    parse_cache_enabled: bool = True
+    parse_cache_max_mb: int = 2048
+    pdf_parallel_min_pages: int = 64
+    pdf_parse_workers: Optional[int] = None
+
+    # Bulk ingestion settings
+    ingest_workers: Optional[int] = None
+    embed_batch_size: int = 256
+    write_batch_size: int = 2000
+
+    # Streaming ingestion settings (bounded memory for very large documents)
+    stream_ingest_threshold_mb: int = 20
+    ingest_memory_limit_mb: int = 256
+
+    # Background ingestion jobs (Streamlit app)
+    ingest_job_workers: int = 2
+    jobs_path: str = "data/jobs.sqlite3"
+
     # Retrieval settings
     top_k: int = 8
+    vector_backend: str = "chroma"
+    flat_compact_ratio: float = 0.25
+    flat_search_block_rows: int = 32768
+    flat_store_dtype: str = "float16"
+    flat_quantization: str = "none"
+    flat_rescore_multiplier: int = 10
+    db_handle_cache_size: int = 32
+    keyword_index_enabled: bool = True
+    rrf_k: int = 60
+    keyword_min_match: float = 0.5
+    keyword_filter_oversample: int = 5
+
+    # Scatter-gather sharding (one logical collection split across stores)
+    collection_shards: int = 1
+    shard_workers: int = 8
+
+    # HNSW index of Chroma collections; only search_ef changes existing ones (rebuild with hnsw.py)
+    hnsw_space: str = "l2"
+    hnsw_m: Optional[int] = None
+    hnsw_construction_ef: Optional[int] = None
+    hnsw_search_ef: Optional[int] = None
+    hnsw_collection_params: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+
+    # Context assembly settings
+    context_token_budget: int = 3000
+    context_dedup_threshold: float = 0.8
+    context_mmr_enabled: bool = False
+    context_mmr_lambda: float = 0.7
+
+    # Query cache settings (exact + semantic answer reuse)
+    query_cache_enabled: bool = True
+    query_cache_max_entries: int = 1000
+    query_cache_ttl_seconds: int = 3600
+    query_cache_similarity_threshold: float = 0.95
+
+    # Chat sessions: follow-ups reuse recently retrieved chunks, history is token-budgeted
+    session_working_set_size: int = 64
+    session_reuse_distance: float = 1.0
+    session_history_tokens: int = 1000
+
+    # Batch query settings (evaluation runs, FAQ precomputation)
+    batch_query_chunk_size: int = 256
+    batch_query_concurrency: int = 8
+
+    # Embedding cache settings (skip re-embedding previously seen chunks)
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "data/embedding_cache.sqlite3"
+    embedding_cache_max_entries: int = 500_000
+
+    # Startup settings
+    warm_up_on_start: bool = True
+
+    # Metrics endpoint (Prometheus text format on /metrics)
+    metrics_port: Optional[int] = None
+    metrics_host: str = "127.0.0.1"
 
     # UI settings
     app_title: str = "RAG Search Engine"
     app_icon: str = "Lightning"
 
+    @property
+    def embedding_model(self) -> str:
+        """Embedding model: bge-large on GPUs with >3.5GB VRAM, otherwise bge-small."""
+        if self.embedding_model_override:
+            return self.embedding_model_override
+        return "BAAI/bge-large-en-v1.5" if has_large_gpu() else "BAAI/bge-small-en-v1.5"
+
+    @embedding_model.setter
+    def embedding_model(self, value: Optional[str]) -> None:
+        self.embedding_model_override = value
+
+    @embedding_model.deleter
+    def embedding_model(self) -> None:
+        self.embedding_model_override = None
+
+    @property
+    def embedding_dim(self) -> int:
+        """Dimensionality matching the auto-detected embedding model."""
+        if self.embedding_dim_override:
+            return self.embedding_dim_override
+        return 1024 if has_large_gpu() else 384
+
+    @embedding_dim.setter
+    def embedding_dim(self, value: Optional[int]) -> None:
+        self.embedding_dim_override = value
+
+    @embedding_dim.deleter
+    def embedding_dim(self) -> None:
+        self.embedding_dim_override = None
+
+    @property
+    def embedding_device(self) -> str:
+        """Device for embedding computations ('cuda' or 'cpu')."""
+        return self.embedding_device_override or detect_device()
+
+    @embedding_device.setter
+    def embedding_device(self, value: Optional[str]) -> None:
+        self.embedding_device_override = value
+
+    @embedding_device.deleter
+    def embedding_device(self) -> None:
+        self.embedding_device_override = None
+
 
 # Create global settings instance
 settings = Settings()
-
-# Debug output for configuration verification
-print(f"Free Model: {settings.default_model}")
-print(f"Embeddings: {settings.embedding_model} ({settings.embedding_dim}d) on {settings.embedding_device.upper()}")
@@ -0,0 +1,316 @@
+"""
+Context Builder Module
+
+This module turns retrieved chunks into the context sent to the LLM. Chunks are
+split with an overlap, so neighbouring chunks of one document repeat the same
+text; sending them as-is pays for those prompt tokens twice. The builder merges
+overlapping chunks back together, drops near-duplicates, optionally diversifies
+the selection with maximal marginal relevance (MMR) and packs the result into a
+fixed token budget.
+
+Features:
+- Token counting with tiktoken (character estimate when the encoding is unavailable)
+- Merging of overlapping or adjacent chunks from the same source
+- Near-duplicate removal by word shingle Jaccard similarity
+- Optional lexical MMR re-ranking for diversity
+- Packing into settings.context_token_budget in relevance order
+- Per-query report of tokens saved
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Set
+
+from langchain_core.documents import Document
+
+from config import settings
+from logger import logger
+
+# Shortest suffix/prefix match treated as chunk overlap when positions are unknown
+_MIN_OVERLAP_CHARS = 50
+
+# Smallest useful remainder of a passage cut to fit the budget
+_MIN_TRUNCATED_TOKENS = 64
+
+# Joins passages in the context, as query_rag always has
+_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Load the cl100k_base tokenizer once, or None if it cannot be loaded."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads the encoding on first use; offline hosts estimate instead
+        logger.warning(f"tiktoken unavailable ({e}), estimating tokens as characters / 4")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text.
+
+    Uses the cl100k_base encoding, which tracks the Llama 3 tokenizer closely
+    enough for budgeting; falls back to one token per four characters.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Number of tokens
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text down to at most ``max_tokens`` tokens.
+
+    Args:
+        text (str): Text to truncate
+        max_tokens (int): Token limit
+
+    Returns:
+        str: Leading part of the text within the limit
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _merge_text(first: str, second: str) -> Optional[str]:
+    """Join two chunks if one contains the other or ``second`` continues ``first``."""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    for size in range(min(len(first), len(second)) - 1, _MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+
+def _merge(keep: Document, other: Document) -> Optional[Document]:
+    """
+    Merge two chunks of the same source if they overlap or are adjacent.
+
+    Chunks carrying ``start_index`` metadata (set by split_documents) are merged
+    by position; older chunks without it fall back to matching overlapping text.
+
+    Args:
+        keep (Document): Better-ranked chunk, whose metadata the result keeps
+        other (Document): Chunk to merge into it
+
+    Returns:
+        Optional[Document]: Merged passage, or None if the chunks are not contiguous
+    """
+    a, b = keep.metadata, other.metadata
+    if a.get("source") != b.get("source"):
+        return None
+
+    if "start_index" in a and "start_index" in b:
+        if a.get("page") != b.get("page"):
+            return None
+        (start, first), (next_start, second) = sorted(
+            [(a["start_index"], keep.page_content), (b["start_index"], other.page_content)],
+            key=lambda item: item[0]
+        )
+        end = start + len(first)
+        if next_start > end + 1:
+            return None
+        if next_start + len(second) <= end:
+            text = first
+        elif next_start > end:
+            # Adjacent chunks; the splitter stripped the whitespace between them
+            text = first + " " + second
+        else:
+            text = first + second[end - next_start:]
+        return Document(page_content=text, metadata={**a, "start_index": start})
+
+    text = _merge_text(keep.page_content, other.page_content)
+    if text is None:
+        text = _merge_text(other.page_content, keep.page_content)
+    return None if text is None else Document(page_content=text, metadata=a)
+
+
+def merge_overlapping(docs: List[Document]) -> List[Document]:
+    """
+    Merge overlapping or adjacent chunks of the same source.
+
+    A merged passage takes the rank (and metadata) of its best-ranked chunk.
+
+    Args:
+        docs (List[Document]): Chunks, most relevant first
+
+    Returns:
+        List[Document]: Passages, most relevant first
+    """
+    passages: List[Document] = []
+    for doc in docs:
+        current, slot, index = doc, None, 0
+        # A chunk can bridge several earlier passages, so keep scanning after a merge
+        while index < len(passages):
+            if slot is None:
+                merged = _merge(passages[index], current)
+            else:
+                merged = _merge(current, passages[index])
+            if merged is None:
+                index += 1
+                continue
+            if slot is None:
+                slot = index
+                index += 1
+            else:
+                passages.pop(index)
+            current = merged
+            passages[slot] = current
+        if slot is None:
+            passages.append(current)
+    return passages
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    """Word n-grams used for near-duplicate detection."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def drop_near_duplicates(docs: List[Document], threshold: float = 0.8) -> List[Document]:
+    """
+    Remove passages that are nearly identical to a better-ranked one.
+
+    Args:
+        docs (List[Document]): Passages, most relevant first
+        threshold (float): Shingle Jaccard similarity at or above which a passage is dropped
+
+    Returns:
+        List[Document]: Remaining passages, most relevant first
+    """
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(_jaccard(shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def mmr_rerank(docs: List[Document], lambda_mult: float = 0.7) -> List[Document]:
+    """
+    Reorder passages with maximal marginal relevance.
+
+    Relevance is taken from the retrieval rank and redundancy from shingle
+    Jaccard similarity, so no extra embedding calls are needed.
+
+    Args:
+        docs (List[Document]): Passages, most relevant first
+        lambda_mult (float): Weight of relevance versus diversity (1.0 = rank order)
+
+    Returns:
+        List[Document]: Passages in MMR order
+    """
+    if len(docs) < 3:
+        return list(docs)
+    relevance = [1.0 - rank / len(docs) for rank in range(len(docs))]
+    shingles = [_shingles(doc.page_content) for doc in docs]
+    remaining = list(range(len(docs)))
+    selected: List[int] = []
+    while remaining:
+        def score(i: int) -> float:
+            redundancy = max((_jaccard(shingles[i], shingles[j]) for j in selected), default=0.0)
+            return lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+        best = max(remaining, key=score)
+        selected.append(best)
+        remaining.remove(best)
+    return [docs[i] for i in selected]
+
+
+class BuiltContext:
+    """
+    Context assembled for one query.
+
+    Attributes:
+        text (str): Context passed to the LLM
+        sources (List[str]): Source filenames of the included passages
+        chunks (int): Chunks retrieved
+        passages (int): Passages included in the context
+        raw_tokens (int): Tokens the plain concatenation of all chunks would have used
+        tokens (int): Tokens of the built context
+    """
+
+    def __init__(self, text: str, sources: List[str], chunks: int, passages: int, raw_tokens: int, tokens: int):
+        self.text = text
+        self.sources = sources
+        self.chunks = chunks
+        self.passages = passages
+        self.raw_tokens = raw_tokens
+        self.tokens = tokens
+
+    @property
+    def tokens_saved(self) -> int:
+        """Prompt tokens saved compared with the plain concatenation."""
+        return self.raw_tokens - self.tokens
+
+
+def build_context(docs: List[Document], token_budget: Optional[int] = None) -> BuiltContext:
+    """
+    Assemble retrieved chunks into a deduplicated, token-budgeted context.
+
+    Passages are packed in relevance order. The first passage that does not
+    fit is truncated to the remaining budget (unless fewer than
+    ``_MIN_TRUNCATED_TOKENS`` remain) and packing stops there.
+
+    Args:
+        docs (List[Document]): Retrieved chunks, most relevant first
+        token_budget (Optional[int]): Maximum context tokens (default: settings.context_token_budget)
+
+    Returns:
+        BuiltContext: Context text, sources and token accounting
+    """
+    token_budget = token_budget or settings.context_token_budget
+    raw_tokens = count_tokens("".join(doc.page_content + _SEPARATOR for doc in docs))
+
+    passages = merge_overlapping(docs)
+    passages = drop_near_duplicates(passages, settings.context_dedup_threshold)
+    if settings.context_mmr_enabled:
+        passages = mmr_rerank(passages, settings.context_mmr_lambda)
+
+    separator_tokens = count_tokens(_SEPARATOR)
+    included, used = [], 0
+    for doc in passages:
+        cost = count_tokens(doc.page_content) + separator_tokens
+        if used + cost <= token_budget:
+            included.append(doc)
+            used += cost
+            continue
+        remaining = token_budget - used - separator_tokens
+        if remaining >= _MIN_TRUNCATED_TOKENS or not included:
+            text = truncate_tokens(doc.page_content, max(remaining, 1))
+            included.append(Document(page_content=text, metadata=doc.metadata))
+        break
+
+    text = "".join(doc.page_content + _SEPARATOR for doc in included)
+    # Extract filename from source path for cleaner display
+    sources = [doc.metadata.get("source", "Unknown").split("\\")[-1] for doc in included]
+    context = BuiltContext(text, sources, len(docs), len(included), raw_tokens, count_tokens(text))
+    logger.info(
+        f"Context: {context.chunks} chunks → {context.passages} passages, "
+        f"{context.tokens} tokens ({context.tokens_saved} saved, budget {token_budget})"
+    )
+    return context
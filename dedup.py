@@ -0,0 +1,499 @@
+"""
+Near-Duplicate Chunk Module
+
+This module keeps a MinHash LSH index of the chunks stored in every
+collection, so ingestion can recognise chunks that are near-identical to one
+already stored: boilerplate headers and disclaimers, copies of the same
+document in several files, or lightly edited versions. Such chunks are not
+embedded or stored again; they are recorded as extra source references of the
+chunk they duplicate, and queries that retrieve that chunk cite all of its
+sources.
+
+Features:
+- MinHash signatures over word 3-shingles (128 permutations)
+- Locality-sensitive hashing in 16 bands of 8 rows, stored in SQLite
+- Candidates verified by estimated Jaccard similarity (settings.dedup_threshold)
+  and by identical number tokens, so chunks that differ only in facts are kept
+- Duplicates detected within one batch as well as against stored chunks
+- Duplicate text and metadata kept, so a duplicate is promoted to a stored
+  chunk when the chunk it pointed to is deleted
+- Chunks and bytes saved reported per collection
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import settings
+from filters import where_sql
+from logger import logger
+
+# SQLite limits the number of bound parameters per statement
+_PARAM_BATCH = 500
+
+# Signature layout: BANDS * ROWS MinHash values
+_BANDS = 16
+_ROWS = 8
+_PERMUTATIONS = _BANDS * _ROWS
+
+# Words per shingle
+_SHINGLE = 3
+
+_WORD_RE = re.compile(r"\w+")
+# Words containing a digit: amounts, dates, part numbers, section numbers
+_NUMBER_RE = re.compile(r"\w*\d\w*")
+
+# Fixed multiply-shift hash family, so signatures are stable across processes
+_rng = np.random.default_rng(20240601)
+_A = _rng.integers(1, 2 ** 63, size=_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=_PERMUTATIONS, dtype=np.uint64)
+
+
+def minhash(text: str) -> Optional[np.ndarray]:
+    """
+    Compute the MinHash signature of a text.
+
+    Texts are lowercased and reduced to word 3-shingles (texts of fewer than
+    three words form a single shingle), so whitespace, punctuation and case
+    differences do not matter.
+
+    Args:
+        text (str): Chunk text
+
+    Returns:
+        Optional[np.ndarray]: 128 uint32 values, or None if the text has no words
+    """
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    shingles = {" ".join(words[i:i + _SHINGLE]) for i in range(max(1, len(words) - _SHINGLE + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    # (a * x + b) mod 2^64, top 32 bits: one universal hash per permutation
+    with np.errstate(over="ignore"):
+        values = (np.outer(hashes, _A) + _B) >> np.uint64(32)
+    return values.min(axis=0).astype(np.uint32)
+
+
+def number_fingerprint(text: str) -> str:
+    """
+    Fingerprint of the number tokens of a text, in order.
+
+    Near-identical chunks that differ in an amount, date or part number are
+    different facts, although MinHash rates them above any useful threshold.
+    Requiring equal fingerprints keeps them, at the price of also keeping
+    boilerplate that differs only in numbers (e.g. "Page 3 of 10").
+
+    Args:
+        text (str): Chunk text
+
+    Returns:
+        str: Short hash of the text's number tokens
+    """
+    numbers = " ".join(_NUMBER_RE.findall(text.lower()))
+    return hashlib.blake2b(numbers.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard similarity estimated from two MinHash signatures."""
+    return float(np.count_nonzero(a == b)) / _PERMUTATIONS
+
+
+def _buckets(signature: np.ndarray) -> List[int]:
+    """LSH bucket of every band, as signed 64-bit integers (band number included)."""
+    rows = signature.reshape(_BANDS, _ROWS)
+    return [
+        int.from_bytes(hashlib.blake2b(band.to_bytes(1, "little") + rows[band].tobytes(), digest_size=8).digest(),
+                       "little", signed=True)
+        for band in range(_BANDS)
+    ]
+
+
+def _digest(text: str) -> str:
+    """Key used to find a stored chunk by its text at query time."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class DedupPlan:
+    """
+    Outcome of checking chunks against a DedupIndex, until it is recorded.
+
+    Chunks are checked before they are stored and recorded once the write
+    succeeded, so a failed write never leaves the index pointing at chunks
+    that do not exist. One plan can check several batches before recording;
+    later batches are compared with the unrecorded chunks of earlier ones.
+
+    Attributes:
+        chunks_skipped (int): Duplicates recorded through this plan
+        bytes_skipped (int): UTF-8 text bytes of those duplicates
+    """
+
+    def __init__(self):
+        self.chunks_skipped = 0
+        self.bytes_skipped = 0
+        self._canonical: List[Tuple[str, str, np.ndarray, str]] = []
+        self._duplicates: List[Tuple[str, str, Document, np.ndarray]] = []
+        self._pending: Dict[int, List[Tuple[str, Tuple[np.ndarray, str]]]] = {}
+
+    @property
+    def pending_duplicates(self) -> int:
+        """Duplicates found but not recorded yet."""
+        return len(self._duplicates)
+
+    def discard(self) -> None:
+        """Forget everything checked since the last record (e.g. after a failed write)."""
+        self._canonical.clear()
+        self._duplicates.clear()
+        self._pending.clear()
+
+
+class DedupIndex:
+    """
+    MinHash LSH index of the chunks stored in one collection.
+
+    Attributes:
+        path (str): Location of the SQLite index file
+        threshold (float): Estimated Jaccard similarity from which a chunk is a duplicate
+    """
+
+    def __init__(self, path: str, threshold: Optional[float] = None):
+        """
+        Configure the index. The database is opened on first use.
+
+        Args:
+            path (str): Path of the SQLite index file
+            threshold (Optional[float]): Duplicate threshold (default: settings.dedup_threshold)
+        """
+        self.path = path
+        self.threshold = settings.dedup_threshold if threshold is None else threshold
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Open the index database on first use (callers hold the lock)."""
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    digest TEXT,
+                    canonical_id TEXT,
+                    source TEXT,
+                    text TEXT,
+                    metadata TEXT,
+                    numbers TEXT
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_chunks_digest ON chunks (digest);
+                CREATE INDEX IF NOT EXISTS idx_chunks_canonical ON chunks (canonical_id);
+                CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks (json_extract(metadata, '$.filename'));
+                CREATE TABLE IF NOT EXISTS bands (
+                    bucket INTEGER NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    PRIMARY KEY (bucket, chunk_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_bands_chunk ON bands (chunk_id);
+                """
+            )
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def _exists(self) -> bool:
+        """Whether the index has been created (callers hold the lock)."""
+        return self._connection is not None or os.path.exists(self.path)
+
+    def _known(self, conn: sqlite3.Connection, ids: List[str]) -> Dict[str, Optional[str]]:
+        """Map indexed chunk IDs to their canonical ID (None for stored chunks)."""
+        known = {}
+        for i in range(0, len(ids), _PARAM_BATCH):
+            batch = ids[i:i + _PARAM_BATCH]
+            marks = ",".join("?" * len(batch))
+            known.update(conn.execute(f"SELECT id, canonical_id FROM chunks WHERE id IN ({marks})", batch))
+        return known
+
+    def _candidates(self, conn: sqlite3.Connection, buckets: List[int]) -> Dict[str, Tuple[np.ndarray, str]]:
+        """Signatures and number fingerprints of stored chunks sharing at least one LSH bucket."""
+        marks = ",".join("?" * len(buckets))
+        rows = conn.execute(
+            f"SELECT c.id, c.signature, c.numbers FROM bands b JOIN chunks c ON c.id = b.chunk_id "
+            f"WHERE b.bucket IN ({marks})",
+            buckets
+        ).fetchall()
+        return {
+            chunk_id: (np.frombuffer(signature, dtype=np.uint32), numbers)
+            for chunk_id, signature, numbers in rows
+        }
+
+    def _match(
+        self,
+        signature: np.ndarray,
+        numbers: str,
+        candidates: Dict[str, Tuple[np.ndarray, str]]
+    ) -> Optional[str]:
+        """Most similar candidate at or above the threshold with the same number tokens."""
+        best, best_score = None, self.threshold
+        for chunk_id, (other, other_numbers) in candidates.items():
+            if other_numbers != numbers:
+                continue
+            score = similarity(signature, other)
+            if score >= best_score:
+                best, best_score = chunk_id, score
+        return best
+
+    def filter(
+        self,
+        plan: DedupPlan,
+        chunks: List[Document],
+        ids: List[str]
+    ) -> Tuple[List[Document], List[str]]:
+        """
+        Drop chunks that nearly duplicate a stored chunk or an earlier chunk of the plan.
+
+        Nothing is written; call record() with the plan once the returned
+        chunks have been stored.
+
+        Args:
+            plan (DedupPlan): Plan collecting the outcome
+            chunks (List[Document]): Chunks about to be stored
+            ids (List[str]): Their chunk IDs
+
+        Returns:
+            Tuple[List[Document], List[str]]: Chunks and IDs that must be stored
+        """
+        if not chunks:
+            return [], []
+        with self._lock:
+            exists = self._exists()
+            conn = self._conn if exists else None
+            known = self._known(conn, list(ids)) if exists else {}
+
+            kept_chunks, kept_ids = [], []
+            for chunk, chunk_id in zip(chunks, ids):
+                signature = minhash(chunk.page_content)
+                canonical = known.get(chunk_id, "")
+                if signature is not None and chunk_id not in known:
+                    buckets = _buckets(signature)
+                    candidates = self._candidates(conn, buckets) if exists else {}
+                    for bucket in buckets:
+                        candidates.update(plan._pending.get(bucket, ()))
+                    numbers = number_fingerprint(chunk.page_content)
+                    canonical = self._match(signature, numbers, candidates)
+                if canonical:
+                    plan._duplicates.append((chunk_id, canonical, chunk, signature))
+                    continue
+
+                # Stored (or stored again when it is already indexed as a stored chunk)
+                kept_chunks.append(chunk)
+                kept_ids.append(chunk_id)
+                if signature is not None and chunk_id not in known:
+                    plan._canonical.append((chunk_id, _digest(chunk.page_content), signature, numbers))
+                    for bucket in buckets:
+                        plan._pending.setdefault(bucket, []).append((chunk_id, (signature, numbers)))
+        return kept_chunks, kept_ids
+
+    def record(self, plan: DedupPlan) -> None:
+        """
+        Add the chunks checked by a plan to the index, after they were stored.
+
+        Args:
+            plan (DedupPlan): Plan filled by filter(); emptied, totals kept
+        """
+        if not plan._canonical and not plan._duplicates:
+            return
+        chunks, bands = [], []
+        for chunk_id, digest, signature, numbers in plan._canonical:
+            chunks.append((chunk_id, signature.tobytes(), digest, None, None, None, None, numbers))
+            bands.extend((bucket, chunk_id) for bucket in _buckets(signature))
+        skipped_bytes = 0
+        for chunk_id, canonical, chunk, signature in plan._duplicates:
+            text = chunk.page_content
+            skipped_bytes += len(text.encode("utf-8"))
+            chunks.append((
+                chunk_id,
+                (signature if signature is not None else np.zeros(_PERMUTATIONS, dtype=np.uint32)).tobytes(),
+                None,
+                canonical,
+                chunk.metadata.get("source"),
+                text,
+                json.dumps(chunk.metadata, default=str),
+                number_fingerprint(text)
+            ))
+
+        with self._lock:
+            conn = self._conn
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, signature, digest, canonical_id, source, text, metadata, numbers) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                chunks
+            )
+            conn.executemany("INSERT OR IGNORE INTO bands VALUES (?, ?)", bands)
+            conn.commit()
+        plan.chunks_skipped += len(plan._duplicates)
+        plan.bytes_skipped += skipped_bytes
+        plan.discard()
+
+    def delete(self, ids: List[str]) -> Tuple[List[Document], List[str]]:
+        """
+        Remove chunks from the index, promoting the duplicates of deleted chunks.
+
+        A duplicate whose stored chunk is deleted becomes a stored chunk itself
+        (and the others point to it if they are similar enough), so the caller
+        must store the returned chunks to keep their content searchable.
+
+        Args:
+            ids (List[str]): Chunk IDs to remove (unknown IDs are ignored)
+
+        Returns:
+            Tuple[List[Document], List[str]]: Promoted chunks and their IDs
+        """
+        if not ids:
+            return [], []
+        with self._lock:
+            if not self._exists():
+                return [], []
+            conn = self._conn
+            orphaned: Dict[str, List[tuple]] = {}
+            for i in range(0, len(ids), _PARAM_BATCH):
+                batch = list(ids[i:i + _PARAM_BATCH])
+                marks = ",".join("?" * len(batch))
+                conn.execute(f"DELETE FROM bands WHERE chunk_id IN ({marks})", batch)
+                conn.execute(f"DELETE FROM chunks WHERE id IN ({marks})", batch)
+                for row in conn.execute(
+                    f"SELECT canonical_id, id, signature, text, metadata FROM chunks "
+                    f"WHERE canonical_id IN ({marks}) ORDER BY id",
+                    batch
+                ):
+                    orphaned.setdefault(row[0], []).append(row[1:])
+
+            promoted_chunks, promoted_ids = [], []
+            for duplicates in orphaned.values():
+                heads: Dict[str, Tuple[np.ndarray, str]] = {}
+                for chunk_id, blob, text, metadata in duplicates:
+                    signature = np.frombuffer(blob, dtype=np.uint32)
+                    numbers = number_fingerprint(text)
+                    head = self._match(signature, numbers, heads)
+                    if head is not None:
+                        conn.execute("UPDATE chunks SET canonical_id = ? WHERE id = ?", (head, chunk_id))
+                        continue
+                    heads[chunk_id] = (signature, numbers)
+                    conn.execute(
+                        "UPDATE chunks SET canonical_id = NULL, digest = ?, source = NULL, text = NULL, "
+                        "metadata = NULL, numbers = ? WHERE id = ?",
+                        (_digest(text), numbers, chunk_id)
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO bands VALUES (?, ?)",
+                        [(bucket, chunk_id) for bucket in _buckets(signature)]
+                    )
+                    promoted_chunks.append(Document(page_content=text, metadata=json.loads(metadata)))
+                    promoted_ids.append(chunk_id)
+            conn.commit()
+        if promoted_ids:
+            logger.info(f"Promoted {len(promoted_ids)} near-duplicate chunks whose stored copy was deleted")
+        return promoted_chunks, promoted_ids
+
+    def duplicate_sources(self, texts: List[str]) -> List[str]:
+        """
+        Sources of the duplicates of stored chunks, looked up by chunk text.
+
+        Args:
+            texts (List[str]): Texts of retrieved chunks
+
+        Returns:
+            List[str]: Source paths of their near-duplicates, in no particular order
+        """
+        if not texts:
+            return []
+        digests = sorted({_digest(text) for text in texts})
+        with self._lock:
+            if not self._exists():
+                return []
+            conn = self._conn
+            sources = set()
+            for i in range(0, len(digests), _PARAM_BATCH):
+                batch = digests[i:i + _PARAM_BATCH]
+                marks = ",".join("?" * len(batch))
+                sources.update(source for (source,) in conn.execute(
+                    f"SELECT DISTINCT d.source FROM chunks c JOIN chunks d ON d.canonical_id = c.id "
+                    f"WHERE c.digest IN ({marks}) AND d.source IS NOT NULL",
+                    batch
+                ))
+        return list(sources)
+
+    def stand_ins(self, where: Dict) -> List[str]:
+        """
+        IDs of the stored chunks standing in for duplicates that match a filter.
+
+        Duplicates are never stored, so a filter on their file can only reach
+        their text through the chunk they duplicate.
+
+        Args:
+            where (Dict): Clause from filters.build_where, evaluated on the duplicates' metadata
+
+        Returns:
+            List[str]: Canonical chunk IDs, in no particular order
+        """
+        condition, params = where_sql(where)
+        with self._lock:
+            if not self._exists():
+                return []
+            return [chunk_id for (chunk_id,) in self._conn.execute(
+                f"SELECT DISTINCT canonical_id FROM chunks WHERE canonical_id IS NOT NULL AND {condition}",
+                params
+            )]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Size of the index and what it saved.
+
+        Returns:
+            Dict[str, int]: ``stored`` chunks, ``duplicates`` not stored and
+                ``bytes_saved`` of duplicate text
+        """
+        with self._lock:
+            if not self._exists():
+                return {"stored": 0, "duplicates": 0, "bytes_saved": 0}
+            stored, duplicates, saved = self._conn.execute(
+                "SELECT COUNT(*) - COUNT(canonical_id), COUNT(canonical_id), "
+                "COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) FROM chunks"
+            ).fetchone()
+        return {"stored": stored, "duplicates": duplicates, "bytes_saved": saved}
+
+
+# One index object per file, shared by ingestion and queries in this process
+_indexes: Dict[str, DedupIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_dedup_index(collection: str = "default") -> DedupIndex:
+    """
+    Get the near-duplicate index of a collection.
+
+    Args:
+        collection (str): Name of the collection (default: "default")
+
+    Returns:
+        DedupIndex: Index stored under ``{chroma_path}/dedup/``
+    """
+    path = os.path.join(settings.chroma_path, "dedup", f"{collection}.sqlite3")
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = DedupIndex(path)
+            _indexes[path] = index
+        return index
@@ -0,0 +1,248 @@
+"""
+Embedding Cache Module
+
+This module provides a persistent, content-addressed cache that sits in front of
+the embedding model. Chunks that have already been embedded (for example when a
+document is re-ingested or uploaded into another collection) are served from
+disk instead of being sent through the model again.
+
+Features:
+- SQLite-backed storage keyed by (embedding model, normalize flag, SHA-256 of text)
+- Size-bounded eviction of least recently used entries
+- Hit/miss counters for monitoring cache effectiveness
+- Drop-in replacement for any LangChain Embeddings object
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import metrics
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches document vectors on disk.
+
+    Only ``embed_documents`` is cached, since that is where ingestion spends its
+    time. Query embeddings are passed straight through to the wrapped model.
+
+    Attributes:
+        underlying (Embeddings): The embedding model doing the actual work
+        model_name (str): Embedding model name, part of the cache key
+        normalize (bool): Whether vectors are normalized, part of the cache key
+        max_entries (int): Maximum number of vectors kept before eviction
+        hits (int): Number of texts served from the cache
+        misses (int): Number of texts that had to be embedded
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        cache_path: str,
+        model_name: Optional[str] = None,
+        normalize: bool = True,
+        max_entries: int = 500_000
+    ):
+        """
+        Configure the cache. The database is opened on first use, so
+        constructing the cache has no filesystem side effects.
+
+        Args:
+            underlying (Embeddings): Embedding model to wrap
+            cache_path (str): Path of the SQLite cache file
+            model_name (Optional[str]): Name of the embedding model
+                (default: the wrapped model's ``model_name``)
+            normalize (bool): Whether the model normalizes its output vectors
+            max_entries (int): Maximum number of cached vectors
+        """
+        self.underlying = underlying
+        self.cache_path = cache_path
+        self._model_name = model_name
+        self.normalize = normalize
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def model_name(self) -> str:
+        """Embedding model name used in cache keys."""
+        return self._model_name or self.underlying.model_name
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Open the cache database on first use (callers hold the lock)."""
+        if self._connection is None:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    normalize INTEGER NOT NULL,
+                    text_sha TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, normalize, text_sha)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        """
+        Compute the content address of a chunk of text.
+
+        Args:
+            text (str): Chunk text
+
+        Returns:
+            str: Hex SHA-256 digest of the UTF-8 encoded text
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Fetch cached vectors for the given text keys and mark them as used."""
+        found = {}
+        for start in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[start:start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT text_sha, vector FROM embeddings "
+                f"WHERE model = ? AND normalize = ? AND text_sha IN ({placeholders})",
+                [self.model_name, int(self.normalize), *batch]
+            ).fetchall()
+            for text_sha, blob in rows:
+                found[text_sha] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+        # Refresh recency so frequently reused chunks survive eviction
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND normalize = ? AND text_sha = ?",
+                [(now, self.model_name, int(self.normalize), key) for key in found]
+            )
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        """Insert freshly computed vectors into the cache."""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, normalize, text_sha, vector, last_used) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [
+                (self.model_name, int(self.normalize), key,
+                 np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for key, vector in vectors.items()
+            ]
+        )
+
+    def _evict(self) -> None:
+        """Drop least recently used entries once the cache exceeds its bound."""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        # Evict down to 90% of capacity so we don't evict on every insert
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts, computing only those not already cached.
+
+        Args:
+            texts (List[str]): Texts to embed
+
+        Returns:
+            List[List[float]]: One vector per input text, in input order
+        """
+        keys = [self.text_key(text) for text in texts]
+
+        with self._lock:
+            cached = self._lookup(list(set(keys)))
+
+        # Embed each missing text once, even if it appears several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        hits = len(texts) - sum(1 for key in keys if key in missing)
+        self.hits += hits
+        self.misses += len(missing)
+        metrics.cache_lookups.inc(hits, cache="embedding", result="hit")
+        metrics.cache_lookups.inc(len(missing), cache="embedding", result="miss")
+
+        if missing:
+            computed = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), computed))
+            with self._lock:
+                self._store(fresh)
+                self._evict()
+                self._conn.commit()
+            cached.update(fresh)
+        elif cached:
+            with self._lock:
+                self._conn.commit()
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a search query (not cached).
+
+        Args:
+            text (str): Query text
+
+        Returns:
+            List[float]: Query vector
+        """
+        return self.underlying.embed_query(text)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report cache effectiveness.
+
+        Returns:
+            Dict[str, float]: Hit and miss counts, hit rate and stored entries
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries
+        }
+
+    def clear(self) -> None:
+        """Remove every cached vector and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,475 @@
+"""
+Embedding Server Module
+
+This module lets every process on a node share one embedding model. The
+server loads the model once and listens on a Unix socket (or TCP port);
+clients send texts and receive vectors. Requests arriving from concurrent
+sessions within a short window are embedded together in one model call, so
+single-question queries no longer run at batch size 1.
+
+Set ``EMBEDDING_BACKEND=server`` to make ``utils.embeddings`` use the server
+instead of loading the model in-process, then start it with:
+
+    python embedding_server.py
+
+Features:
+- One model per node instead of one per Streamlit session or worker process
+- Dynamic micro-batching across callers (settings.embedding_server_max_batch
+  texts or settings.embedding_server_max_wait_ms, whichever comes first)
+- Length-prefixed framing with raw float32 vectors (no JSON floats)
+- Unix socket by default, ``tcp://host:port`` where Unix sockets are unavailable
+- RemoteEmbeddings client: a drop-in LangChain Embeddings with per-thread connections
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import settings
+from logger import logger
+
+_HEADER = struct.Struct("!I")
+
+# Operations that embed texts (besides "info")
+KINDS = ("documents", "query")
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """
+    Split a server address into a socket family and socket address.
+
+    Args:
+        address (str): ``tcp://host:port``, ``unix://path`` or a plain socket path
+
+    Returns:
+        Tuple: (socket family, path or (host, port))
+    """
+    if address.startswith("tcp://"):
+        host, port = address[len("tcp://"):].rsplit(":", 1)
+        return socket.AF_INET, (host, int(port))
+    if address.startswith("unix://"):
+        address = address[len("unix://"):]
+    return socket.AF_UNIX, address
+
+
+def _write_frame(stream, payload: bytes) -> None:
+    """Write one length-prefixed frame."""
+    stream.write(_HEADER.pack(len(payload)) + payload)
+
+
+def _read_frame(stream) -> Optional[bytes]:
+    """Read one length-prefixed frame, or None at end of stream."""
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    (size,) = _HEADER.unpack(header)
+    payload = stream.read(size)
+    if len(payload) < size:
+        raise ConnectionError("Connection closed in the middle of a frame")
+    return payload
+
+
+class _Request:
+    """Texts of one caller waiting to be embedded."""
+
+    __slots__ = ("kind", "texts", "future")
+
+    def __init__(self, kind: str, texts: List[str]):
+        self.kind = kind
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """
+    Collects embedding requests from many threads into batched model calls.
+
+    The first waiting request opens a batch; further requests join it until
+    ``max_batch_size`` texts are collected or ``max_wait_ms`` has passed.
+
+    Attributes:
+        model (Embeddings): Model doing the work
+        max_batch_size (int): Texts that close a batch early
+        max_wait_ms (float): Longest time a request waits for companions
+        queries_as_documents (bool): Embed queries with embed_documents, so
+            queries and documents share model calls
+        batches (int): Model batches run so far
+        texts (int): Texts embedded so far
+    """
+
+    def __init__(
+        self,
+        model: Embeddings,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        queries_as_documents: bool = False
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.queries_as_documents = queries_as_documents
+        self.batches = 0
+        self.texts = 0
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, kind: str, texts: List[str]) -> Future:
+        """
+        Queue texts for embedding.
+
+        Args:
+            kind (str): "query" or "documents"
+            texts (List[str]): Texts to embed
+
+        Returns:
+            Future: Resolves to one vector per text
+
+        Raises:
+            ValueError: If kind is not one of KINDS
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown embedding operation: {kind!r}")
+        request = _Request(kind, texts)
+        self._queue.put(request)
+        return request.future
+
+    def close(self) -> None:
+        """Stop the batching thread after the requests already queued."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _loop(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, size = [first], len(first.texts)
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            stop = False
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            try:
+                self._run(batch)
+            except Exception as e:
+                # The thread must outlive any batch, or every client waits until its timeout
+                logger.error(f"Embedding batch failed: {e}")
+                self._fail(batch, e)
+            if stop:
+                return
+
+    @staticmethod
+    def _fail(batch: List[_Request], error: Exception) -> None:
+        """Resolve every request of a batch that is still waiting with an error."""
+        for request in batch:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    def _run(self, batch: List[_Request]) -> None:
+        """Embed one batch and hand every caller its vectors."""
+        try:
+            documents = [r for r in batch if r.kind == "documents" or (r.kind == "query" and self.queries_as_documents)]
+            queries = [r for r in batch if r.kind == "query" and not self.queries_as_documents]
+            results: Dict[int, List[List[float]]] = {}
+            if documents:
+                vectors = self.model.embed_documents([text for r in documents for text in r.texts])
+                offset = 0
+                for request in documents:
+                    results[id(request)] = vectors[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            for request in queries:
+                results[id(request)] = [self.model.embed_query(text) for text in request.texts]
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        self.batches += 1
+        self.texts += sum(len(r.texts) for r in batch)
+        logger.debug(f"Embedded batch of {len(batch)} requests ({sum(len(r.texts) for r in batch)} texts)")
+        for request in batch:
+            if id(request) in results:
+                request.future.set_result(results[id(request)])
+            else:
+                request.future.set_exception(ValueError(f"Unknown embedding operation: {request.kind!r}"))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Serves one client connection; requests on it are answered in order."""
+
+    def handle(self) -> None:
+        server: "EmbeddingServer" = self.server.owner
+        while True:
+            try:
+                frame = _read_frame(self.rfile)
+            except ConnectionError:
+                return
+            if frame is None:
+                return
+            message = json.loads(frame)
+            try:
+                if message.get("op") == "info":
+                    _write_frame(self.wfile, json.dumps(server.info()).encode("utf-8"))
+                    continue
+                if message.get("op") not in KINDS:
+                    raise ValueError(f"Unknown embedding operation: {message.get('op')!r}")
+                if not isinstance(message.get("texts"), list):
+                    raise ValueError("Embedding requests need a list of texts")
+                vectors = np.asarray(
+                    server.batcher.submit(message["op"], message["texts"]).result(), dtype=np.float32
+                )
+                count, dim = vectors.shape if vectors.size else (0, 0)
+                header = json.dumps({"count": count, "dim": dim}).encode("utf-8")
+                _write_frame(self.wfile, header)
+                _write_frame(self.wfile, vectors.tobytes())
+            except Exception as e:
+                logger.error(f"Embedding request failed: {e}")
+                _write_frame(self.wfile, json.dumps({"error": str(e)}).encode("utf-8"))
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    # Every session connects at once after an app restart; the default backlog of 5 refuses some
+    request_queue_size = 128
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    request_queue_size = 128
+    allow_reuse_address = True
+
+
+class EmbeddingServer:
+    """
+    Socket server sharing one embedding model between processes.
+
+    Attributes:
+        address (str): Address the server listens on
+        model_name (str): Name reported to clients
+        batcher (MicroBatcher): Batches requests for the model
+    """
+
+    def __init__(
+        self,
+        model: Embeddings,
+        address: Optional[str] = None,
+        model_name: Optional[str] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        """
+        Bind the socket; call serve_forever() or start() to accept clients.
+
+        Args:
+            model (Embeddings): Model to serve
+            address (Optional[str]): Listen address (default: settings.embedding_server_address)
+            model_name (Optional[str]): Name reported to clients (default: settings.embedding_model)
+            max_batch_size (Optional[int]): Texts per batch (default: settings.embedding_server_max_batch)
+            max_wait_ms (Optional[float]): Batching window (default: settings.embedding_server_max_wait_ms)
+        """
+        self.address = address or settings.embedding_server_address
+        self.model_name = model_name or settings.embedding_model
+        # HuggingFaceEmbeddings embeds queries like documents unless query kwargs are set
+        queries_as_documents = not getattr(model, "query_encode_kwargs", True)
+        self.batcher = MicroBatcher(
+            model,
+            max_batch_size=max_batch_size or settings.embedding_server_max_batch,
+            max_wait_ms=max_wait_ms if max_wait_ms is not None else settings.embedding_server_max_wait_ms,
+            queries_as_documents=queries_as_documents
+        )
+
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            directory = os.path.dirname(bind_address)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # A socket file left behind by a previous server blocks bind()
+            if os.path.exists(bind_address):
+                os.remove(bind_address)
+            server_class = _UnixServer
+        else:
+            server_class = _TCPServer
+        self._server = server_class(bind_address, _Handler)
+        self._server.daemon_threads = True
+        self._server.owner = self
+        self._dim: Optional[int] = None
+
+    def info(self) -> Dict:
+        """Model name and dimensionality reported to clients."""
+        if self._dim is None:
+            self._dim = len(self.batcher.submit("query", ["dimension probe"]).result()[0])
+        return {"model": self.model_name, "dim": self._dim}
+
+    def serve_forever(self) -> None:
+        """Accept clients until shutdown() is called."""
+        logger.info(f"Embedding server for {self.model_name} listening on {self.address}")
+        self._server.serve_forever()
+
+    def start(self) -> threading.Thread:
+        """Serve from a daemon thread (used by tests and embedded setups)."""
+        thread = threading.Thread(target=self.serve_forever, name="embedding-server", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self) -> None:
+        """Stop accepting clients, finish queued requests and remove the socket file."""
+        self._server.shutdown()
+        self._server.server_close()
+        self.batcher.close()
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.remove(bind_address)
+        logger.info(f"Embedding server stopped after {self.batcher.texts} texts in {self.batcher.batches} batches")
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embeddings computed by an EmbeddingServer.
+
+    Each thread keeps its own connection, so concurrent callers reach the
+    server in parallel and can share a batch there.
+
+    Attributes:
+        address (str): Server address
+        model_name (str): Model served by the server
+        dim (int): Dimensionality of the served vectors
+    """
+
+    def __init__(self, address: Optional[str] = None, timeout: float = 60.0):
+        """
+        Connect to the server and check which model it serves.
+
+        Args:
+            address (Optional[str]): Server address (default: settings.embedding_server_address)
+            timeout (float): Socket timeout in seconds (default: 60)
+
+        Raises:
+            ConnectionError: If no server is listening at the address
+        """
+        self.address = address or settings.embedding_server_address
+        self.timeout = timeout
+        self._local = threading.local()
+        try:
+            info, _ = self._request({"op": "info"})
+        except OSError as e:
+            raise ConnectionError(
+                f"No embedding server at {self.address} ({e}); start one with `python embedding_server.py`"
+            ) from e
+        self.model_name = info["model"]
+        self.dim = info["dim"]
+        if self.model_name != settings.embedding_model:
+            logger.warning(f"Embedding server serves {self.model_name}, but settings expect {settings.embedding_model}")
+        logger.info(f"Using embedding server at {self.address} ({self.model_name}, {self.dim}d)")
+
+    def _connection(self):
+        """Socket and buffered reader/writer of the calling thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            family, address = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(address)
+            connection = (sock, sock.makefile("rb"), sock.makefile("wb"))
+            self._local.connection = connection
+        return connection
+
+    def _close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            for part in reversed(connection):
+                try:
+                    part.close()
+                except OSError:
+                    pass
+            self._local.connection = None
+
+    def _request(self, message: Dict) -> Tuple[Dict, Optional[bytes]]:
+        """
+        Send one request, reconnecting once if the server was restarted.
+
+        A connection that failed in any way, including a timeout, is closed:
+        a late reply would otherwise be read as the answer to the next request.
+        Timeouts are raised without a retry, since the server is slow rather than gone.
+        """
+        payload = json.dumps(message).encode("utf-8")
+        for attempt in range(2):
+            try:
+                _, reader, writer = self._connection()
+                _write_frame(writer, payload)
+                writer.flush()
+                header = _read_frame(reader)
+                if header is None:
+                    raise ConnectionError("Embedding server closed the connection")
+                header = json.loads(header)
+                data = _read_frame(reader) if "count" in header else None
+                return header, data
+            except OSError as e:
+                self._close()
+                if attempt or isinstance(e, TimeoutError):
+                    raise
+        raise AssertionError("unreachable")
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        header, data = self._request({"op": kind, "texts": texts})
+        if "error" in header:
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        return np.frombuffer(data, dtype=np.float32).reshape(header["count"], header["dim"]).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed("documents", list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several search queries in one request."""
+        if not texts:
+            return []
+        return self._embed("query", list(texts))
+
+
+def main() -> None:
+    """Command line entry point: load the model and serve it."""
+    parser = argparse.ArgumentParser(description="Serve one shared embedding model to every local process.")
+    parser.add_argument("--address", default=None, help="Socket path or tcp://host:port (default: settings)")
+    parser.add_argument("--max-batch", type=int, default=None, help="Texts per model batch")
+    parser.add_argument("--max-wait-ms", type=float, default=None, help="Batching window in milliseconds")
+    args = parser.parse_args()
+
+    from logger import enable_file_logging
+    from utils import _load_embedding_model
+    enable_file_logging()
+    server = EmbeddingServer(
+        _load_embedding_model(), args.address, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Metadata Filter Module
+
+This module defines the chunk metadata that retrieval can be filtered on and
+turns the filters of a QueryRequest into a Chroma-style ``where`` clause. The
+clause is applied inside the vector search of every backend (Chroma natively,
+the flat store as a precomputed row mask), so the top-k slots are spent on
+matching chunks instead of being filtered afterwards.
+
+Features:
+- Filter metadata recorded on every chunk at ingestion (filename, file type, hash, timestamp)
+- QueryRequest filters by source file, file type and ingestion date
+- Chroma ``where`` clauses ($and, $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte)
+- The same clauses evaluated in Python or translated to SQLite for other backends
+"""
+
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from models import QueryRequest
+
+# Version of the metadata written by chunk_metadata; part of ingest.chunking_signature, so
+# changing it makes the next ingestion rewrite every chunk with the current fields
+METADATA_VERSION = 1
+
+# Operators of a field condition, as SQL comparisons
+_COMPARISONS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+_FIELD_RE = re.compile(r"^\w+$")
+
+
+def normalize_filename(path: str) -> str:
+    """
+    Filename used to match source filters, independent of directory and case.
+
+    Args:
+        path (str): File path or name (Windows or POSIX separators)
+
+    Returns:
+        str: Lowercased base name, e.g. "report.pdf"
+    """
+    return os.path.basename(path.replace("\\", "/")).strip().lower()
+
+
+def normalize_file_type(file_type: str) -> str:
+    """
+    File type used to match file-type filters.
+
+    Args:
+        file_type (str): Extension with or without the dot, e.g. ".PDF" or "pdf"
+
+    Returns:
+        str: Lowercased extension without the dot
+    """
+    return file_type.strip().lower().lstrip(".")
+
+
+def chunk_metadata(file_path: str, digest: str, ingested_at: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Metadata recorded on every chunk of a file so retrieval can filter on it.
+
+    Args:
+        file_path (str): Path of the ingested file
+        digest (str): Content hash of the file (manifest.file_hash)
+        ingested_at (Optional[float]): Ingestion time as a UNIX timestamp (default: now)
+
+    Returns:
+        Dict[str, Any]: "filename", "file_type", "file_hash" and "ingested_at" (integer seconds)
+    """
+    return {
+        "filename": normalize_filename(file_path),
+        "file_type": normalize_file_type(os.path.splitext(file_path)[1]),
+        "file_hash": digest,
+        "ingested_at": int(ingested_at if ingested_at is not None else time.time())
+    }
+
+
+def build_where(request: QueryRequest) -> Optional[Dict[str, Any]]:
+    """
+    Translate the filters of a request into a Chroma-style ``where`` clause.
+
+    Args:
+        request (QueryRequest): Validated query request
+
+    Returns:
+        Optional[Dict[str, Any]]: The clause, or None if the request has no filters
+    """
+    clauses = []
+    if request.sources:
+        clauses.append({"filename": {"$in": sorted({normalize_filename(source) for source in request.sources})}})
+    if request.file_types:
+        clauses.append({"file_type": {"$in": sorted({normalize_file_type(kind) for kind in request.file_types})}})
+    if request.ingested_after is not None:
+        clauses.append({"ingested_at": {"$gte": int(request.ingested_after.timestamp())}})
+    if request.ingested_before is not None:
+        clauses.append({"ingested_at": {"$lt": int(request.ingested_before.timestamp())}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def where_key(where: Optional[Dict[str, Any]]) -> str:
+    """Canonical string of a clause, for grouping and caching by filter."""
+    return json.dumps(where, sort_keys=True) if where else ""
+
+
+def _conditions(where: Dict[str, Any]) -> List[Tuple[str, str, Any]]:
+    """
+    Flatten a clause into (field, operator, value) conditions that must all hold.
+
+    Raises:
+        ValueError: If the clause uses an unsupported operator or field name
+    """
+    conditions = []
+    for field, condition in where.items():
+        if field == "$and":
+            for clause in condition:
+                conditions.extend(_conditions(clause))
+            continue
+        if not _FIELD_RE.match(field):
+            raise ValueError(f"Unsupported filter field: {field}")
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator not in _COMPARISONS and operator not in ("$in", "$nin"):
+                raise ValueError(f"Unsupported filter operator: {operator}")
+            conditions.append((field, operator, value))
+    return conditions
+
+
+def matches(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a clause against one chunk's metadata.
+
+    Args:
+        metadata (Optional[Dict[str, Any]]): Chunk metadata
+        where (Optional[Dict[str, Any]]): Clause from build_where (None matches everything)
+
+    Returns:
+        bool: Whether the chunk satisfies every condition
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for field, operator, value in _conditions(where):
+        actual = metadata.get(field)
+        if operator == "$in":
+            ok = actual in value
+        elif operator == "$nin":
+            ok = actual not in value
+        elif actual is None:
+            ok = operator == "$ne"
+        else:
+            ok = {
+                "$eq": actual == value, "$ne": actual != value,
+                "$gt": actual > value, "$gte": actual >= value,
+                "$lt": actual < value, "$lte": actual <= value
+            }[operator]
+        if not ok:
+            return False
+    return True
+
+
+def where_sql(where: Dict[str, Any], column: str = "metadata") -> Tuple[str, List[Any]]:
+    """
+    Translate a clause into a SQLite condition on a JSON metadata column.
+
+    Args:
+        where (Dict[str, Any]): Clause from build_where
+        column (str): Column holding the JSON-encoded metadata
+
+    Returns:
+        Tuple[str, List[Any]]: (SQL condition, bound parameters)
+    """
+    parts, params = [], []
+    for field, operator, value in _conditions(where):
+        target = f"json_extract({column}, '$.{field}')"
+        if operator in ("$in", "$nin"):
+            values = list(value)
+            marks = ",".join("?" * len(values)) or "NULL"
+            parts.append(f"{target} {'IN' if operator == '$in' else 'NOT IN'} ({marks})")
+            params.extend(values)
+        else:
+            parts.append(f"{target} {_COMPARISONS[operator]} ?")
+            params.append(value)
+    return " AND ".join(parts) or "1", params
@@ -0,0 +1,708 @@
+"""
+Flat Vector Store Module
+
+This module provides a brute-force vector store for collections where an
+exact scan is fast enough and Chroma's index footprint and load time are not
+worth paying. Normalized vectors (float16 by default) live in an append-only
+file that is memory-mapped for search, so memory use follows the OS page cache
+rather than the Python heap; chunk text and metadata live in a SQLite side store.
+
+Features:
+- Drop-in LangChain VectorStore, selected with settings.vector_backend = "flat"
+- Append-only, memory-mapped float16 (or float32) vector file
+- Exact top-k via blocked matrix products and argpartition
+- Batched multi-query search
+- Optional int8 / binary quantized tier with exact rescoring of a shortlist
+- Upserts and deletes by tombstone, with automatic and manual compaction
+- Picks up writes made by other processes (e.g. bulk ingestion)
+- Metadata filters (Chroma ``where`` clauses) applied as cached row masks inside the search
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from config import settings
+from filters import where_key, where_sql
+from logger import logger
+import quantization
+
+# SQLite limits the number of bound parameters per statement
+_PARAM_BATCH = 500
+
+# Row masks of recent metadata filters kept per store
+_FILTER_CACHE_SIZE = 32
+
+# Indexes of the chunks table, created with the table and again after compaction rebuilds it
+_CHUNK_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks (id, deleted);
+-- Look up the rows of a metadata filter (see filters.py) without scanning every chunk
+CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks (json_extract(metadata, '$.filename'));
+CREATE INDEX IF NOT EXISTS idx_chunks_file_type ON chunks (json_extract(metadata, '$.file_type'));
+CREATE INDEX IF NOT EXISTS idx_chunks_ingested_at ON chunks (json_extract(metadata, '$.ingested_at'));
+"""
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so a dot product is the cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class FlatVectorStore(VectorStore):
+    """
+    Exact-search vector store backed by a memory-mapped matrix.
+
+    Row ``i`` of the vector file belongs to the ``chunks`` row with
+    ``row = i``. Upserting an ID appends a new row and tombstones the old one;
+    compaction rewrites the file without tombstoned rows. Any number of
+    processes may read a store, but only one should write to it at a time.
+
+    float16 storage halves disk and page cache use; float32 storage avoids
+    converting each block before the matrix product, which is faster on CPUs
+    where NumPy has no vectorized float16 conversion. The dtype is fixed when
+    the store is created.
+
+    With quantization ("int8" or "binary", also fixed at creation) every row
+    additionally gets a compact code. Searches scan only the codes, keep the
+    best ``k * rescore_multiplier`` candidates and rescore those against the
+    full-precision vectors, so only the codes need to stay in memory.
+
+    Attributes:
+        directory (str): Directory holding the vector file and side store
+        compact_ratio (float): Tombstoned fraction of rows that triggers compaction
+        block_rows (int): Rows scored per matrix product during search
+        rescore_multiplier (int): Candidates rescored per requested result (quantized stores)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        embedding: Embeddings,
+        compact_ratio: Optional[float] = None,
+        block_rows: Optional[int] = None,
+        dtype: Optional[str] = None,
+        quantization_method: Optional[str] = None,
+        rescore_multiplier: Optional[int] = None
+    ):
+        """
+        Open (or create) a flat store.
+
+        Args:
+            directory (str): Directory holding the store's files
+            embedding (Embeddings): Embedding model for texts and queries
+            compact_ratio (Optional[float]): Compaction trigger (default: settings.flat_compact_ratio)
+            block_rows (Optional[int]): Rows per search block (default: settings.flat_search_block_rows)
+            dtype (Optional[str]): "float16" or "float32" for a new store (default: settings.flat_store_dtype)
+            quantization_method (Optional[str]): "none", "int8" or "binary" for a new store
+                (default: settings.flat_quantization)
+            rescore_multiplier (Optional[int]): Candidates rescored per result
+                (default: settings.flat_rescore_multiplier)
+        """
+        self.directory = directory
+        self._embedding = embedding
+        self.compact_ratio = compact_ratio if compact_ratio is not None else settings.flat_compact_ratio
+        self.block_rows = block_rows or settings.flat_search_block_rows
+        self.rescore_multiplier = rescore_multiplier or settings.flat_rescore_multiplier
+        self._lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "store.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            {_CHUNK_INDEXES}
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            INSERT OR IGNORE INTO meta VALUES ('vectors_file', 'vectors-0.bin');
+            """
+        )
+        dtype = dtype or settings.flat_store_dtype
+        if dtype not in ("float16", "float32"):
+            raise ValueError(f"Unsupported flat store dtype: {dtype}. Supported: float16, float32")
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('dtype', ?)", (dtype,))
+        method = quantization_method or settings.flat_quantization
+        if method not in quantization.METHODS:
+            raise ValueError(f"Unsupported quantization: {method}. Supported: {', '.join(quantization.METHODS)}")
+        # Rows written without codes can't be scanned through a quantized tier
+        if self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]:
+            method = "none"
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('quantization', ?)", (method,))
+        self._conn.commit()
+
+        self._data_version = None
+        self._dim: Optional[int] = None
+        self._rows = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._vectors_file = ""
+        self._vectors: Optional[np.memmap] = None
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._filter_masks: "OrderedDict[Tuple[str, str, int], np.ndarray]" = OrderedDict()
+        self._refresh(force=True)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Embedding model used for texts and queries."""
+        return self._embedding
+
+    def _refresh(self, force: bool = False) -> None:
+        """Reload row count, tombstones and the mapping after writes by other connections (lock held)."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if not force and version == self._data_version:
+            return
+        self._data_version = version
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        self._dim = int(meta["dim"]) if "dim" in meta else None
+        self._dtype = np.dtype(meta["dtype"])
+        self._vectors_file = os.path.join(self.directory, meta["vectors_file"])
+        self._quantization = meta["quantization"]
+        # Codes and scales share the vector file's generation suffix
+        self._codes_file = self._vectors_file.replace("vectors-", "codes-")
+        self._scales_file = self._vectors_file.replace("vectors-", "scales-")
+        self._rows = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+        self._alive = np.ones(self._rows, dtype=bool)
+        dead = [row for (row,) in self._conn.execute("SELECT row FROM chunks WHERE deleted = 1")]
+        self._alive[dead] = False
+        self._vectors = self._codes = self._scales = None
+
+    def _matrix(self) -> Optional[np.memmap]:
+        """Memory-map the committed rows of the vector file (lock held)."""
+        if self._vectors is None and self._rows and self._dim:
+            self._vectors = np.memmap(self._vectors_file, dtype=self._dtype, mode="r", shape=(self._rows, self._dim))
+        return self._vectors
+
+    def _code_matrix(self) -> Tuple[Optional[np.memmap], Optional[np.memmap]]:
+        """Memory-map the committed rows of the code and scale files (lock held)."""
+        if self._codes is None and self._rows and self._dim and self._quantization != "none":
+            width = quantization.code_width(self._quantization, self._dim)
+            self._codes = np.memmap(self._codes_file, dtype=np.uint8, mode="r", shape=(self._rows, width))
+            if self._quantization == "int8":
+                self._scales = np.memmap(self._scales_file, dtype=np.float32, mode="r", shape=(self._rows,))
+        return self._codes, self._scales
+
+    def _append(self, path: str, data: np.ndarray) -> None:
+        """Append rows to a row-aligned file, dropping any tail left by an interrupted write (lock held)."""
+        row_bytes = data.nbytes // len(data)
+        with open(path, "ab") as f:
+            f.truncate(self._rows * row_bytes)
+            f.write(data.tobytes())
+
+    def __len__(self) -> int:
+        """Number of live (not tombstoned) chunks."""
+        with self._lock:
+            self._refresh()
+            return int(self._alive.sum())
+
+    def _live_rows(self, ids: Sequence[str]) -> List[int]:
+        """Rows currently holding the given IDs (lock held)."""
+        rows = []
+        for i in range(0, len(ids), _PARAM_BATCH):
+            batch = list(ids[i:i + _PARAM_BATCH])
+            marks = ",".join("?" * len(batch))
+            rows.extend(row for (row,) in self._conn.execute(
+                f"SELECT row FROM chunks WHERE deleted = 0 AND id IN ({marks})", batch
+            ))
+        return rows
+
+    def _tombstone(self, rows: List[int]) -> None:
+        """Mark rows deleted (lock held, caller commits)."""
+        self._conn.executemany("UPDATE chunks SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+        self._alive[rows] = False
+
+    def add_embeddings(
+        self,
+        ids: List[str],
+        vectors: Sequence[Sequence[float]],
+        texts: List[str],
+        metadatas: Optional[List[Optional[Dict]]] = None
+    ) -> List[str]:
+        """
+        Upsert chunks whose embeddings are already computed.
+
+        Args:
+            ids (List[str]): Chunk IDs
+            vectors (Sequence[Sequence[float]]): One embedding per chunk
+            texts (List[str]): Chunk texts
+            metadatas (Optional[List[Optional[Dict]]]): Chunk metadata
+
+        Returns:
+            List[str]: The stored IDs
+
+        Raises:
+            ValueError: If the vector dimension differs from the store's
+        """
+        if not ids:
+            return []
+        metadatas = metadatas or [None] * len(ids)
+        # Within one call the last occurrence of an ID wins
+        last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+        order = sorted(last.values())
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32)[order])
+
+        with self._lock:
+            self._refresh()
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self._dim),))
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match store dimension {self._dim}")
+
+            self._tombstone(self._live_rows([ids[i] for i in order]))
+
+            self._append(self._vectors_file, matrix.astype(self._dtype))
+            if self._quantization != "none":
+                codes, scales = quantization.encode(self._quantization, matrix)
+                self._append(self._codes_file, codes)
+                if scales is not None:
+                    self._append(self._scales_file, scales)
+
+            start = self._rows
+            self._conn.executemany(
+                "INSERT INTO chunks (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (start + n, ids[i], texts[i], json.dumps(metadatas[i]) if metadatas[i] else None)
+                    for n, i in enumerate(order)
+                ]
+            )
+            self._conn.commit()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._rows += len(order)
+            self._alive = np.concatenate([self._alive, np.ones(len(order), dtype=bool)])
+            self._vectors = self._codes = self._scales = None
+            self._maybe_compact()
+        return [ids[i] for i in order]
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        """
+        Embed and upsert texts.
+
+        Args:
+            texts (Iterable[str]): Texts to store
+            metadatas (Optional[List[Dict]]): Metadata per text
+            ids (Optional[List[str]]): IDs per text (default: random)
+
+        Returns:
+            List[str]: The stored IDs
+        """
+        texts = list(texts)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        return self.add_embeddings(ids, self._embedding.embed_documents(texts), texts, metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Tombstone chunks by ID; the store compacts itself once enough are dead.
+
+        Args:
+            ids (Optional[List[str]]): IDs to delete (unknown IDs are ignored)
+
+        Returns:
+            Optional[bool]: True once the IDs are gone
+        """
+        if not ids:
+            return True
+        with self._lock:
+            self._refresh()
+            self._tombstone(self._live_rows(ids))
+            self._conn.commit()
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._maybe_compact()
+        return True
+
+    def _maybe_compact(self) -> None:
+        """Compact when the tombstoned fraction exceeds compact_ratio (lock held)."""
+        if self._rows and (self._rows - self._alive.sum()) / self._rows > self.compact_ratio:
+            self.compact()
+
+    def compact(self) -> int:
+        """
+        Rewrite the store without tombstoned rows.
+
+        The live rows are copied into new vector (and code) files, and the side
+        store is renumbered and pointed at them in one transaction, so a crash
+        at any point leaves either the old or the new store intact.
+
+        Returns:
+            int: Number of rows reclaimed
+        """
+        with self._lock:
+            self._refresh()
+            dead = self._rows - int(self._alive.sum())
+            if not dead:
+                return 0
+            keep = np.flatnonzero(self._alive)
+            generation = uuid.uuid4().hex[:8]
+            codes, scales = self._code_matrix()
+            sources = [(self._matrix(), self._vectors_file, "vectors"), (codes, self._codes_file, "codes"),
+                       (scales, self._scales_file, "scales")]
+            old_files = [path for data, path, _ in sources if data is not None]
+            for data, _, prefix in sources:
+                if data is None:
+                    continue
+                with open(os.path.join(self.directory, f"{prefix}-{generation}.bin"), "wb") as f:
+                    for start in range(0, len(keep), self.block_rows):
+                        f.write(np.ascontiguousarray(data[keep[start:start + self.block_rows]]).tobytes())
+
+            conn = self._conn
+            conn.execute("CREATE TEMP TABLE remap (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+            conn.executemany("INSERT INTO remap VALUES (?, ?)", ((int(old), new) for new, old in enumerate(keep)))
+            conn.executescript(
+                f"""
+                BEGIN;
+                CREATE TABLE chunks_compacted (
+                    row INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT,
+                    deleted INTEGER NOT NULL DEFAULT 0
+                );
+                INSERT INTO chunks_compacted (row, id, text, metadata)
+                    SELECT remap.new, chunks.id, chunks.text, chunks.metadata
+                    FROM chunks JOIN remap ON remap.old = chunks.row;
+                DROP TABLE chunks;
+                ALTER TABLE chunks_compacted RENAME TO chunks;
+                {_CHUNK_INDEXES}
+                UPDATE meta SET value = 'vectors-{generation}.bin' WHERE key = 'vectors_file';
+                COMMIT;
+                DROP TABLE remap;
+                """
+            )
+
+            self._refresh(force=True)
+            for old_file in old_files:
+                try:
+                    os.remove(old_file)
+                except OSError as e:
+                    # Another process may still map it (Windows); it is unreferenced either way
+                    logger.warning(f"Could not remove old vector file {old_file}: {e}")
+            logger.info(f"Compacted {self.directory}: reclaimed {dead} rows, {len(keep)} remain")
+            return dead
+
+    def _filter_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """
+        Rows whose metadata satisfies a filter (lock held).
+
+        Rows are append-only and a row's metadata never changes, so a mask
+        stays valid until rows are appended or the store is compacted; masks
+        of recent filters are cached under that key.
+        """
+        key = (where_key(where), self._vectors_file, self._rows)
+        mask = self._filter_masks.get(key)
+        if mask is not None:
+            self._filter_masks.move_to_end(key)
+            return mask
+        condition, params = where_sql(where)
+        mask = np.zeros(self._rows, dtype=bool)
+        rows = [row for (row,) in self._conn.execute(f"SELECT row FROM chunks WHERE {condition}", params)]
+        mask[rows] = True
+        self._filter_masks[key] = mask
+        while len(self._filter_masks) > _FILTER_CACHE_SIZE:
+            self._filter_masks.popitem(last=False)
+        return mask
+
+    def _top_k(
+        self,
+        score_block: Callable[[int, int], np.ndarray],
+        queries: int,
+        rows: int,
+        alive: np.ndarray,
+        k: int
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Blocked top-k selection over all rows.
+
+        Args:
+            score_block (Callable[[int, int], np.ndarray]): Scores rows [start, stop) for every query
+            queries (int): Number of queries
+            rows (int): Rows in the store
+            alive (np.ndarray): Live-row mask
+            k (int): Results per query
+
+        Returns:
+            List[List[Tuple[int, float]]]: Per query, (row, score) pairs, best first
+        """
+        best_scores = np.full((queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((queries, 0), dtype=np.int64)
+        for start in range(0, rows, self.block_rows):
+            stop = min(start + self.block_rows, rows)
+            scores = score_block(start, stop)
+            scores[:, ~alive[start:stop]] = -np.inf
+
+            # Keep only this block's top k before merging with the running best
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                block_rows = top + start
+            else:
+                block_rows = np.broadcast_to(np.arange(start, stop), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, block_rows], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        results = []
+        for scores, found in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([(int(found[i]), float(scores[i])) for i in order if scores[i] > -np.inf])
+        return results
+
+    def search_by_vectors(
+        self,
+        queries: Sequence[Sequence[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k cosine search for several queries at once.
+
+        The matrix is scored in blocks of ``block_rows`` rows, so at most one
+        float32 block is materialized at a time; the rest stays in the page cache.
+        Quantized stores scan their codes instead and rescore the shortlist
+        exactly, so the returned similarities are always full precision.
+
+        A metadata filter masks out non-matching rows during the scan. When it
+        leaves no more than ``block_rows`` rows, only those rows are read and
+        scored exactly, so narrow queries skip the rest of the matrix.
+
+        Args:
+            queries (Sequence[Sequence[float]]): Query embeddings
+            k (int): Results per query
+            filter (Optional[Dict[str, Any]]): Chroma-style ``where`` clause on chunk metadata
+
+        Returns:
+            List[List[Tuple[int, float]]]: Per query, (row, cosine similarity) pairs, best first
+        """
+        query_matrix = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        with self._lock:
+            self._refresh()
+            matrix, alive, rows = self._matrix(), self._alive, self._rows
+            codes, scales = self._code_matrix()
+            method = self._quantization
+            if filter and matrix is not None:
+                alive = alive & self._filter_mask(filter)
+        if matrix is None or k <= 0:
+            return [[] for _ in query_matrix]
+
+        if filter:
+            selected = np.flatnonzero(alive)
+            if len(selected) <= self.block_rows:
+                exact = query_matrix @ np.asarray(matrix[selected], dtype=np.float32).T
+                results = []
+                for scores in exact:
+                    order = np.argsort(-scores)[:k]
+                    results.append([(int(selected[i]), float(scores[i])) for i in order])
+                return results
+
+        if method == "none":
+            # float16 blocks are converted into one reused buffer; float32 blocks are used in place
+            buffer = np.empty((min(rows, self.block_rows), matrix.shape[1]), dtype=np.float32)
+
+            def exact_block(start: int, stop: int) -> np.ndarray:
+                block = matrix[start:stop]
+                if block.dtype != np.float32:
+                    np.copyto(buffer[:stop - start], block)
+                    block = buffer[:stop - start]
+                return query_matrix @ block.T
+
+            return self._top_k(exact_block, len(query_matrix), rows, alive, k)
+
+        query_codes = quantization.encode(method, query_matrix)[0] if method == "binary" else None
+
+        def code_block(start: int, stop: int) -> np.ndarray:
+            block_scales = scales[start:stop] if scales is not None else None
+            return quantization.score(method, codes[start:stop], block_scales, query_matrix, query_codes)
+
+        shortlist = self._top_k(code_block, len(query_matrix), rows, alive, k * self.rescore_multiplier)
+
+        # Rescore each shortlist against the full-precision vectors
+        results = []
+        for query, candidates in zip(query_matrix, shortlist):
+            candidate_rows = np.sort(np.array([row for row, _ in candidates], dtype=np.int64))
+            exact = np.asarray(matrix[candidate_rows], dtype=np.float32) @ query
+            order = np.argsort(-exact)[:k]
+            results.append([(int(candidate_rows[i]), float(exact[i])) for i in order])
+        return results
+
+    def _documents(self, rows: Iterable[int]) -> Dict[int, Tuple[str, Document]]:
+        """Fetch the ID and document stored in each row."""
+        rows = list(rows)
+        found = {}
+        with self._lock:
+            for i in range(0, len(rows), _PARAM_BATCH):
+                batch = rows[i:i + _PARAM_BATCH]
+                marks = ",".join("?" * len(batch))
+                for row, chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({marks})", batch
+                ):
+                    found[row] = (chunk_id, Document(
+                        id=chunk_id, page_content=text, metadata=json.loads(metadata) if metadata else {}
+                    ))
+        return found
+
+    def similarity_search_by_vectors_with_relevance_scores(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Batched form of similarity_search_by_vector_with_relevance_scores.
+
+        Args:
+            embeddings (Sequence[Sequence[float]]): Query embeddings
+            k (int): Results per query
+            filter (Optional[Dict[str, Any]]): Chroma-style ``where`` clause on chunk metadata
+
+        Returns:
+            List[List[Tuple[Document, float]]]: Per query, (document, distance) pairs, best first
+        """
+        hits = self.search_by_vectors(embeddings, k, filter)
+        documents = self._documents({row for result in hits for row, _ in result})
+        # Squared L2 distance of unit vectors, matching Chroma's default metric
+        return [
+            [(documents[row][1], 2.0 - 2.0 * score) for row, score in result if row in documents]
+            for result in hits
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the chunks closest to an embedding.
+
+        Args:
+            embedding (List[float]): Query embedding
+            k (int): Number of results
+            filter (Optional[Dict[str, Any]]): Chroma-style ``where`` clause on chunk metadata
+
+        Returns:
+            List[Tuple[Document, float]]: (document, squared L2 distance) pairs, best first
+        """
+        return self.similarity_search_by_vectors_with_relevance_scores([embedding], k, filter)[0]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Embed a query and return (document, distance) pairs, best first."""
+        return self.similarity_search_by_vector_with_relevance_scores(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        """Embed a query and return the closest documents."""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        """Return the documents closest to an embedding."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        """Map squared L2 distances of unit vectors to a 0-1 relevance score."""
+        return self._euclidean_relevance_score_fn
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> Dict[str, List]:
+        """
+        Read stored chunks, Chroma style.
+
+        Args:
+            ids (Optional[Sequence[str]]): IDs to read (default: all, in insertion order)
+            limit (Optional[int]): Maximum chunks to return
+            offset (Optional[int]): Chunks to skip
+            include (Optional[List[str]]): Documents and metadatas are always
+                returned; add "embeddings" to also read the (normalized) vectors
+
+        Returns:
+            Dict[str, List]: "ids", "documents" and "metadatas" lists, plus "embeddings" if requested
+        """
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = self._live_rows(list(ids))
+                records = []
+                for i in range(0, len(rows), _PARAM_BATCH):
+                    batch = rows[i:i + _PARAM_BATCH]
+                    marks = ",".join("?" * len(batch))
+                    records.extend(self._conn.execute(
+                        f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({marks}) ORDER BY row", batch
+                    ))
+            else:
+                records = self._conn.execute(
+                    "SELECT row, id, text, metadata FROM chunks WHERE deleted = 0 ORDER BY row LIMIT ? OFFSET ?",
+                    (-1 if limit is None else limit, offset or 0)
+                ).fetchall()
+            found = {
+                "ids": [record[1] for record in records],
+                "documents": [record[2] for record in records],
+                "metadatas": [json.loads(record[3]) if record[3] else None for record in records]
+            }
+            if include and "embeddings" in include:
+                matrix = self._matrix()
+                rows = [record[0] for record in records]
+                found["embeddings"] = matrix[rows].astype(np.float32) if rows else np.zeros((0, self._dim or 0))
+        return found
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        directory: str = "flat_store",
+        **kwargs: Any
+    ) -> "FlatVectorStore":
+        """Create a store in ``directory`` and add texts to it."""
+        store = cls(directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
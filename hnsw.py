@@ -0,0 +1,376 @@
+"""
+HNSW Index Module
+
+This module manages the approximate nearest neighbour (HNSW) index
+parameters of Chroma collections. The parameters come from settings, with
+per-collection overrides, and are applied when get_db creates a collection.
+Because the distance space and graph parameters are fixed once a collection
+exists, an offline rebuild re-creates a collection from its stored
+embeddings (nothing is re-embedded). A sweep measures recall@k against exact
+search and query latency for a grid of parameter sets, so the accuracy/speed
+trade-off can be chosen deliberately.
+
+Features:
+- Space, M, construction_ef and search_ef from settings, per collection
+- search_ef applied to existing collections on open
+- Distances of every space reported on the squared-L2 scale retrieval expects
+- Offline rebuild from stored embeddings, also compacting deleted entries
+  (python hnsw.py rebuild <collection>); flat stores are compacted instead
+- Recall@k / p95 latency sweep against a brute-force baseline
+  (python hnsw.py sweep <collection> --m 16 32 --search-ef 10 50 100)
+"""
+
+import argparse
+import itertools
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+from logger import logger
+
+SPACES = ("l2", "cosine", "ip")
+
+# Parameter names and the Chroma collection metadata key of each
+_METADATA_KEYS = {"space": "hnsw:space", "m": "hnsw:M", "construction_ef": "hnsw:construction_ef",
+                  "search_ef": "hnsw:search_ef"}
+
+
+def hnsw_params(collection: str) -> Dict[str, Any]:
+    """
+    HNSW parameters of a collection: settings merged with its overrides.
+
+    Args:
+        collection (str): Collection name
+
+    Returns:
+        Dict[str, Any]: "space" plus any of "m", "construction_ef", "search_ef" that are
+            set (unset ones use Chroma's defaults)
+
+    Raises:
+        ValueError: If an override names an unknown parameter or the space is unsupported
+    """
+    params = {
+        "space": settings.hnsw_space,
+        "m": settings.hnsw_m,
+        "construction_ef": settings.hnsw_construction_ef,
+        "search_ef": settings.hnsw_search_ef
+    }
+    overrides = settings.hnsw_collection_params.get(collection, {})
+    unknown = set(overrides) - set(_METADATA_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown HNSW parameters for {collection}: {', '.join(sorted(unknown))}")
+    params.update(overrides)
+    if params["space"] not in SPACES:
+        raise ValueError(f"Unsupported HNSW space: {params['space']}. Supported: {', '.join(SPACES)}")
+    return {name: value for name, value in params.items() if value is not None}
+
+
+def collection_metadata(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Chroma collection metadata that creates an index with the given parameters.
+
+    Args:
+        params (Dict[str, Any]): Parameters from hnsw_params
+
+    Returns:
+        Dict[str, Any]: ``hnsw:*`` metadata entries
+    """
+    return {_METADATA_KEYS[name]: value for name, value in params.items()}
+
+
+def apply_search_ef(collection: Any, search_ef: Optional[int]) -> None:
+    """
+    Change the query-time candidate list size of an existing Chroma collection.
+
+    Unlike the other parameters, search_ef doesn't change the graph, so it
+    can be adjusted without a rebuild. The new value is persisted, but an
+    index a process has already loaded keeps searching with the old one, so
+    this runs when a store is opened. Chroma versions without collection
+    configuration keep the value the collection was created with.
+
+    Args:
+        collection (chromadb.Collection): Open collection
+        search_ef (Optional[int]): Wanted value (None keeps the current one)
+    """
+    configuration = getattr(collection, "configuration", None)
+    if search_ef is None or not configuration or not configuration.get("hnsw"):
+        return
+    if configuration["hnsw"].get("ef_search") == search_ef:
+        return
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+        logger.info(f"search_ef of {collection.name} set to {search_ef}")
+    except Exception as e:
+        logger.warning(f"Could not change search_ef of {collection.name}; rebuild it to apply: {e}")
+
+
+def distance_scale(store: Any) -> float:
+    """
+    Factor that converts a store's distances to squared L2 distances.
+
+    Embeddings are normalized, so squared L2 distance is exactly twice the
+    cosine and inner-product distances; scaling keeps the relevance cutoff
+    and shard merging valid whatever space a collection uses.
+
+    Args:
+        store (VectorStore): Chroma, flat or sharded store
+
+    Returns:
+        float: 1.0 for l2 spaces (and non-Chroma stores), 2.0 for cosine and ip
+    """
+    from sharding import ShardedStore
+
+    if isinstance(store, ShardedStore):
+        store = store.shards[0]
+    metadata = getattr(getattr(store, "_collection", None), "metadata", None)
+    if not isinstance(metadata, dict):
+        return 1.0
+    return 1.0 if metadata.get("hnsw:space", "l2") == "l2" else 2.0
+
+
+def _stores(db: Any) -> List[Any]:
+    """The single-collection stores behind a (possibly sharded) store."""
+    from sharding import ShardedStore
+
+    return list(db.shards) if isinstance(db, ShardedStore) else [db]
+
+
+def _copy(source: Any, target: Any, batch_size: int) -> int:
+    """Copy every entry of one Chroma collection into another, embeddings included."""
+    copied = 0
+    while True:
+        batch = source.get(limit=batch_size, offset=copied, include=["embeddings", "documents", "metadatas"])
+        if not batch["ids"]:
+            return copied
+        target.add(
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            documents=batch["documents"],
+            metadatas=[metadata or None for metadata in batch["metadatas"]]
+        )
+        copied += len(batch["ids"])
+
+
+def rebuild(collection: str, batch_size: int = 1000) -> int:
+    """
+    Re-create a collection's index with its current HNSW parameters, offline.
+
+    Each Chroma collection (each shard of a sharded one) is copied with its
+    stored embeddings into a new collection created with
+    ``hnsw_params(collection)``, which then replaces the original. The copy
+    also drops entries deleted from the old graph. An interrupted rebuild is
+    finished or discarded on the next run. Flat stores have no graph and are
+    compacted instead. Run it while nothing writes to the collection.
+
+    Args:
+        collection (str): Collection to rebuild
+        batch_size (int): Entries copied per read
+
+    Returns:
+        int: Number of chunks in the rebuilt collection
+    """
+    import utils
+    from flat_store import FlatVectorStore
+
+    db = utils.get_db(collection)
+    params = hnsw_params(collection)
+    total = 0
+    for store in _stores(db):
+        if isinstance(store, FlatVectorStore):
+            store.compact()
+            total += len(store)
+            continue
+
+        client = store._client
+        staging = f"{collection}-rebuild"
+        names = {getattr(c, "name", c) for c in client.list_collections()}
+        if staging in names:
+            if collection in names:
+                # Incomplete copy from an interrupted run
+                client.delete_collection(staging)
+            else:
+                # The previous run copied everything but stopped before the rename
+                client.get_collection(staging).modify(name=collection)
+                total += client.get_collection(collection).count()
+                continue
+
+        source = client.get_collection(collection)
+        metadata = {key: value for key, value in (source.metadata or {}).items() if not key.startswith("hnsw:")}
+        metadata.update(collection_metadata(params))
+        start = time.perf_counter()
+        target = client.create_collection(staging, metadata=metadata)
+        copied = _copy(source, target, batch_size)
+        client.delete_collection(collection)
+        target.modify(name=collection)
+        total += copied
+        logger.info(f"Rebuilt {collection} ({copied} chunks) in {time.perf_counter() - start:.1f}s")
+
+    utils.invalidate_db(collection)
+    logger.success(f"Collection {collection} rebuilt with {params}")
+    return total
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length."""
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, block: int = 256) -> List[set]:
+    """Brute-force top-k row indices of each (unit) query over unit vectors."""
+    found = []
+    for start in range(0, len(queries), block):
+        scores = queries[start:start + block] @ vectors.T
+        top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+        found.extend(set(row.tolist()) for row in top)
+    return found
+
+
+def sweep(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    m: Sequence[Optional[int]] = (None,),
+    construction_ef: Sequence[Optional[int]] = (None,),
+    search_ef: Sequence[Optional[int]] = (None,),
+    k: int = 8,
+    space: str = "l2"
+) -> List[Dict[str, Any]]:
+    """
+    Measure recall@k and query latency of HNSW parameter sets.
+
+    One temporary index is built per parameter set. Recall is the fraction
+    of the exact top-k (brute force) that the index returns.
+
+    Args:
+        vectors (np.ndarray): Stored embeddings, one row per chunk
+        queries (np.ndarray): Query embeddings
+        m (Sequence[Optional[int]]): Graph degrees to try (None = Chroma's default)
+        construction_ef (Sequence[Optional[int]]): Build candidate list sizes to try
+        search_ef (Sequence[Optional[int]]): Query candidate list sizes to try
+        k (int): Results per query
+        space (str): Distance space of the temporary indexes
+
+    Returns:
+        List[Dict[str, Any]]: One row per parameter set with "m", "construction_ef",
+            "search_ef", "build_seconds", "recall", "p50_ms" and "p95_ms"
+    """
+    import chromadb
+
+    # Embeddings are stored normalized, where every space ranks like cosine similarity
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    queries = _normalize(np.asarray(queries, dtype=np.float32))
+    exact = _exact_top_k(vectors, queries, k)
+    ids = [str(i) for i in range(len(vectors))]
+    client = chromadb.EphemeralClient()
+
+    results = []
+    for graph_m, build_ef, ef in itertools.product(m, construction_ef, search_ef):
+        params = {"space": space, "m": graph_m, "construction_ef": build_ef, "search_ef": ef}
+        name = f"sweep-{uuid.uuid4().hex[:12]}"
+        # search_ef is set at creation: modify() doesn't reach an index that is already loaded
+        index = client.create_collection(
+            name, metadata=collection_metadata({key: value for key, value in params.items() if value is not None})
+        )
+        try:
+            start = time.perf_counter()
+            for i in range(0, len(vectors), 5000):
+                index.add(ids=ids[i:i + 5000], embeddings=vectors[i:i + 5000])
+            build_seconds = time.perf_counter() - start
+            samples, recalls = [], []
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                found = index.query(query_embeddings=[query], n_results=k, include=[])["ids"][0]
+                samples.append(time.perf_counter() - start)
+                recalls.append(len(expected & {int(chunk_id) for chunk_id in found}) / len(expected))
+            latencies = np.asarray(samples) * 1000
+            results.append({
+                "m": graph_m,
+                "construction_ef": build_ef,
+                "search_ef": ef,
+                "build_seconds": build_seconds,
+                "recall": float(np.mean(recalls)),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95))
+            })
+        finally:
+            client.delete_collection(name)
+    return results
+
+
+def format_sweep(results: List[Dict[str, Any]], k: int) -> str:
+    """Render sweep results as a text table."""
+    lines = [f"{'M':>6} {'constr_ef':>10} {'search_ef':>10} {'build s':>8} {f'recall@{k}':>10} {'p50 ms':>8} {'p95 ms':>8}"]
+    for row in results:
+        lines.append(
+            f"{str(row['m'] or 'default'):>6} {str(row['construction_ef'] or 'default'):>10} "
+            f"{str(row['search_ef'] or 'default'):>10} {row['build_seconds']:8.1f} {row['recall']:10.4f} "
+            f"{row['p50_ms']:8.2f} {row['p95_ms']:8.2f}"
+        )
+    return "\n".join(lines)
+
+
+def _stored_vectors(collection: str, limit: Optional[int], batch_size: int = 5000) -> np.ndarray:
+    """Read the stored embeddings of a collection (up to ``limit``)."""
+    import utils
+
+    db = utils.get_db(collection)
+    rows = []
+    while limit is None or len(rows) < limit:
+        size = batch_size if limit is None else min(batch_size, limit - len(rows))
+        batch = db.get(limit=size, offset=len(rows), include=["embeddings"])
+        if not len(batch["ids"]):
+            break
+        rows.extend(np.asarray(vector, dtype=np.float32) for vector in batch["embeddings"])
+    return np.vstack(rows) if rows else np.zeros((0, settings.embedding_dim), dtype=np.float32)
+
+
+def sample_queries(vectors: np.ndarray, count: int, seed: int = 0) -> np.ndarray:
+    """
+    Query vectors resembling real questions about a collection.
+
+    Each query is the normalized midpoint of two random stored vectors, so it
+    lies among the data without being identical to any stored chunk.
+
+    Args:
+        vectors (np.ndarray): Stored embeddings
+        count (int): Queries to draw
+        seed (int): Random seed
+
+    Returns:
+        np.ndarray: ``count`` query vectors
+    """
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(0, len(vectors), size=(count, 2))
+    return _normalize(vectors[pairs[:, 0]] + vectors[pairs[:, 1]])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild HNSW indexes or sweep their parameters.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild", help="Re-create a collection with its current HNSW settings")
+    rebuild_parser.add_argument("collection", nargs="?", default="default", help="Collection name")
+    rebuild_parser.add_argument("--batch-size", type=int, default=1000, help="Entries copied per read")
+    sweep_parser = commands.add_parser("sweep", help="Measure recall@k and latency of HNSW parameter sets")
+    sweep_parser.add_argument("collection", nargs="?", default="default", help="Collection whose embeddings to use")
+    sweep_parser.add_argument("--m", type=int, nargs="+", default=[None], help="Graph degrees to try")
+    sweep_parser.add_argument("--construction-ef", type=int, nargs="+", default=[None], help="Build ef values to try")
+    sweep_parser.add_argument("--search-ef", type=int, nargs="+", default=[None], help="Query ef values to try")
+    sweep_parser.add_argument("--k", type=int, default=settings.top_k, help="Results per query")
+    sweep_parser.add_argument("--queries", type=int, default=200, help="Sampled queries")
+    sweep_parser.add_argument("--limit", type=int, default=None, help="Use at most this many stored chunks")
+    sweep_parser.add_argument("--space", choices=SPACES, default=None, help="Space (default: the collection's)")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild(args.collection, args.batch_size)
+    else:
+        stored = _stored_vectors(args.collection, args.limit)
+        if not len(stored):
+            parser.error(f"Collection {args.collection} has no stored embeddings")
+        space = args.space or hnsw_params(args.collection)["space"]
+        logger.info(f"Sweeping {len(stored)} chunks of {args.collection} with {args.queries} queries ({space})")
+        rows = sweep(stored, sample_queries(stored, args.queries), args.m, args.construction_ef, args.search_ef,
+                     args.k, space)
+        print(format_sweep(rows, args.k))
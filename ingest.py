@@ -8,23 +8,381 @@ automatic text extraction, chunking, and embedding generation.
 Features:
 - Multi-format document loading (PDF, DOCX, TXT, MD)
 - Intelligent text chunking with overlap
-- Automatic embedding generation
+- Automatic embedding generation (cached chunks are not re-embedded)
 - Vector database storage with metadata preservation
+- BM25 keyword index kept in sync with the vector database
+- Incremental, idempotent re-ingestion driven by a per-collection manifest
+- Streaming, bounded-memory ingestion for very large documents
 - Comprehensive logging for monitoring
+- Per-stage timing (load, split, embed, store) and chunk counters
+- Progress callbacks with cooperative cancellation between batches
+- Parsed-page cache, so re-chunking a corpus does not parse files again
+- Parallel page extraction for large PDFs
+- Near-duplicate chunks (MinHash LSH) kept as source references instead of being stored again
+- Filename, file type, content hash and ingestion time recorded on every chunk for filtered retrieval
 """
 
 import os
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from config import settings
 from logger import logger
 from models import IngestRequest
 from utils import embeddings, get_db
+from embedding_cache import CachedEmbeddings
+from manifest import Manifest, chunk_ids, file_hash, file_key
+from query_cache import bump_generation
+from keyword_index import KeywordIndex, get_keyword_index
+from dedup import DedupIndex, DedupPlan, get_dedup_index
+from filters import METADATA_VERSION, chunk_metadata
+from parse_cache import CACHED_EXTENSIONS, ParseCache, iter_pdf_pages
+import metrics
 
 # Document loading imports
 from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
 
+# File extensions accepted by get_loader
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt", ".md")
 
-def ingest_document(request: IngestRequest) -> None:
+# Progress callback: (pages loaded, chunks embedded and stored, total new chunks or None if unknown yet)
+ProgressCallback = Callable[[int, int, Optional[int]], None]
+
+
+class IngestCancelled(Exception):
+    """Raised by a progress callback to stop an ingestion at the next batch boundary."""
+
+
+def get_loader(file_path: str):
+    """
+    Create the document loader matching a file's extension.
+
+    Args:
+        file_path (str): Path to the document
+
+    Returns:
+        BaseLoader: LangChain loader for the document
+
+    Raises:
+        ValueError: If the file extension is not supported
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".pdf":
+        return PyPDFLoader(file_path)
+    elif ext == ".docx":
+        return Docx2txtLoader(file_path)
+    elif ext in [".txt", ".md"]:
+        return TextLoader(file_path, encoding="utf-8")
+    raise ValueError(f"Unsupported file format: {ext}. Supported: .pdf, .docx, .txt, .md")
+
+
+def _parse_cache(file_path: str) -> Optional[ParseCache]:
+    """Parse cache for a file, or None if caching is disabled or not worth it for its type."""
+    if settings.parse_cache_enabled and os.path.splitext(file_path)[1].lower() in CACHED_EXTENSIONS:
+        return ParseCache()
+    return None
+
+
+def load_pages(file_path: str, digest: str, parallel: bool = True) -> List[Document]:
+    """
+    Load all pages of a document, from the parse cache when possible.
+
+    Args:
+        file_path (str): Path to the document
+        digest (str): Content hash of the file (manifest.file_hash)
+        parallel (bool): Extract large PDFs in worker processes (default: True)
+
+    Returns:
+        List[Document]: Pages or sections, as the file's loader produces them
+
+    Raises:
+        ValueError: If the file extension is not supported
+    """
+    loader = get_loader(file_path)
+    cache = _parse_cache(file_path)
+    if cache is not None:
+        docs = cache.get(digest, file_path)
+        if docs is not None:
+            logger.info(f"Loaded {len(docs)} pages from the parse cache")
+            return docs
+
+    pages = iter_pdf_pages(file_path) if parallel and file_path.lower().endswith(".pdf") else None
+    docs = list(pages) if pages is not None else loader.load()
+    if cache is not None:
+        cache.put(digest, docs)
+    return docs
+
+
+def iter_pages(file_path: str, digest: str) -> Iterator[Document]:
+    """
+    Iterate over the pages of a document without holding them all in memory.
+
+    Cached documents are read back lazily; others are parsed (large PDFs in
+    parallel) and written to the parse cache as they pass through.
+
+    Args:
+        file_path (str): Path to the document
+        digest (str): Content hash of the file (manifest.file_hash)
+
+    Returns:
+        Iterator[Document]: Pages or sections in document order
+
+    Raises:
+        ValueError: If the file extension is not supported
+    """
+    loader = get_loader(file_path)
+    cache = _parse_cache(file_path)
+    if cache is not None:
+        pages = cache.iter(digest, file_path)
+        if pages is not None:
+            logger.info("Streaming pages from the parse cache")
+            return pages
+
+    pages = iter_pdf_pages(file_path) if file_path.lower().endswith(".pdf") else None
+    if pages is None:
+        pages = loader.lazy_load()
+    return cache.write_through(digest, pages) if cache is not None else iter(pages)
+
+
+def chunking_signature() -> str:
+    """
+    Chunking settings recorded with every file in the manifest.
+
+    A file whose signature differs from the current settings is split again
+    (from the parse cache) even if its content is unchanged, and all of its
+    chunks are rewritten, so they also pick up new chunk metadata fields
+    (see filters.METADATA_VERSION).
+
+    Returns:
+        str: ``"<chunk_size>/<chunk_overlap>/m<metadata version>"``
+    """
+    return f"{settings.chunk_size}/{settings.chunk_overlap}/m{METADATA_VERSION}"
+
+
+def split_documents(docs: List[Document], metadata: Optional[Dict] = None) -> List[Document]:
+    """
+    Split loaded pages into overlapping chunks.
+
+    Args:
+        docs (List[Document]): Pages or sections produced by a loader
+        metadata (Optional[Dict]): Extra metadata set on every chunk (see filters.chunk_metadata)
+
+    Returns:
+        List[Document]: Chunks sized according to the chunking settings, each with
+            its character offset in the page as ``start_index`` metadata
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        # Lets the context builder merge overlapping chunks by position
+        add_start_index=True
+    )
+    chunks = splitter.split_documents(docs)
+    if metadata:
+        for chunk in chunks:
+            chunk.metadata.update(metadata)
+    return chunks
+
+
+def plan_update(
+    key: str,
+    chunks: List[Document],
+    previous: Optional[Dict],
+    rewrite: bool = False
+) -> Tuple[List[str], List[Document], List[str], List[str]]:
+    """
+    Work out which chunks of a file must be written and which deleted.
+
+    Args:
+        key (str): Manifest key of the file
+        chunks (List[Document]): Current chunks of the file
+        previous (Optional[Dict]): Manifest entry from the last ingestion, if any
+        rewrite (bool): Write unchanged chunks too, e.g. to update their metadata
+
+    Returns:
+        Tuple: (all chunk IDs, chunks to add, IDs of chunks to add, stale IDs to delete)
+    """
+    ids = chunk_ids(key, [chunk.page_content for chunk in chunks])
+    old_ids = set(previous["chunk_ids"]) if previous else set()
+    reusable = set() if rewrite else old_ids
+    new_chunks = [chunk for chunk_id, chunk in zip(ids, chunks) if chunk_id not in reusable]
+    new_ids = [chunk_id for chunk_id in ids if chunk_id not in reusable]
+    stale_ids = list(old_ids - set(ids))
+    return ids, new_chunks, new_ids, stale_ids
+
+
+def stream_window_size() -> int:
+    """
+    Number of chunks held in flight per window when streaming.
+
+    Derived from ``settings.ingest_memory_limit_mb`` using a conservative
+    per-chunk estimate: the chunk text as a Python string, its embedding as a
+    list of Python floats, and document/metadata overhead.
+
+    Returns:
+        int: Chunks per window (at least 1)
+    """
+    per_chunk = settings.chunk_size * 4 + settings.embedding_dim * 32 + 2048
+    return max(1, settings.ingest_memory_limit_mb * 1024 * 1024 // per_chunk)
+
+
+def _store_chunks(
+    db,
+    index: Optional[KeywordIndex],
+    chunks: List[Document],
+    ids: List[str],
+    dedup: Optional[DedupIndex] = None,
+    plan: Optional[DedupPlan] = None
+) -> None:
+    """
+    Write chunks to the vector database and the keyword index.
+
+    The vector store embeds the chunks itself; that time is recorded under
+    the "embed" stage and excluded from "store". With a near-duplicate index,
+    chunks that duplicate a stored one are only recorded as references.
+
+    Args:
+        db (VectorStore): Target vector database instance
+        index (Optional[KeywordIndex]): Keyword index to update alongside the database
+        chunks (List[Document]): Chunks to write
+        ids (List[str]): Chunk IDs, one per chunk
+        dedup (Optional[DedupIndex]): Near-duplicate index of the collection
+        plan (Optional[DedupPlan]): Accumulates the chunks and bytes skipped (required with dedup)
+    """
+    if dedup is not None:
+        with metrics.span("dedup"):
+            chunks, ids = dedup.filter(plan, chunks, ids)
+        metrics.chunks.inc(plan.pending_duplicates, event="duplicate")
+    if chunks:
+        with metrics.span("store"):
+            db.add_documents(chunks, ids=ids)
+            if index is not None:
+                index.add(ids, [chunk.page_content for chunk in chunks])
+        metrics.chunks.inc(len(chunks), event="stored")
+    if dedup is not None:
+        dedup.record(plan)
+
+
+def delete_chunks(db, index: Optional[KeywordIndex], dedup: Optional[DedupIndex], ids: List[str]) -> None:
+    """
+    Delete chunks from the vector database, the keyword index and the near-duplicate index.
+
+    Near-duplicates of a deleted chunk lose their stored copy, so one of them
+    is promoted and stored in its place.
+
+    Args:
+        db (VectorStore): Vector database instance
+        index (Optional[KeywordIndex]): Keyword index to update alongside the database
+        dedup (Optional[DedupIndex]): Near-duplicate index of the collection
+        ids (List[str]): Chunk IDs to delete
+    """
+    with metrics.span("store"):
+        db.delete(ids=ids)
+        if index is not None:
+            index.delete(ids)
+    metrics.chunks.inc(len(ids), event="deleted")
+    if dedup is not None:
+        promoted, promoted_ids = dedup.delete(ids)
+        if promoted:
+            _store_chunks(db, index, promoted, promoted_ids)
+
+
+def _log_dedup(plan: Optional[DedupPlan]) -> None:
+    """Report the chunks and bytes an ingestion did not store thanks to deduplication."""
+    if plan is not None and plan.chunks_skipped:
+        logger.info(
+            f"Near-duplicate chunks: {plan.chunks_skipped} not stored again "
+            f"({plan.bytes_skipped / 1024:.1f} KiB of text saved)"
+        )
+
+
+def _ingest_streaming(
+    pages_iter: Iterator[Document],
+    key: str,
+    previous: Optional[Dict],
+    db,
+    index: Optional[KeywordIndex] = None,
+    progress: Optional[ProgressCallback] = None,
+    dedup: Optional[DedupIndex] = None,
+    plan: Optional[DedupPlan] = None,
+    metadata: Optional[Dict] = None,
+    rewrite: bool = False,
+    manifest: Optional[Manifest] = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Load, split and store a document one window of chunks at a time.
+
+    Pages are pulled lazily from the iterator and split individually (which
+    yields the same chunks as splitting the whole document), so at most one
+    window of chunks and their embeddings is in memory at any point.
+
+    Args:
+        pages_iter (Iterator[Document]): Pages of the document (see iter_pages)
+        key (str): Manifest key of the file
+        previous (Optional[Dict]): Manifest entry from the last ingestion, if any
+        db (VectorStore): Target vector database instance
+        index (Optional[KeywordIndex]): Keyword index to update alongside the database
+        progress (Optional[ProgressCallback]): Called after every page
+        dedup (Optional[DedupIndex]): Near-duplicate index of the collection
+        plan (Optional[DedupPlan]): Accumulates the chunks and bytes skipped as duplicates
+        metadata (Optional[Dict]): Extra metadata set on every chunk (see filters.chunk_metadata)
+        rewrite (bool): Write unchanged chunks too, e.g. to update their metadata
+        manifest (Optional[Manifest]): Manifest that notes each window as pending before it is written
+
+    Returns:
+        Tuple[List[str], List[str]]: (all chunk IDs, stale IDs to delete)
+    """
+    window_size = stream_window_size()
+    old_ids = set(previous["chunk_ids"]) if previous else set()
+    reusable = set() if rewrite else old_ids
+    seen = Counter()
+    ids = []
+    window, window_ids = [], []
+    pages = added = 0
+
+    while True:
+        with metrics.span("load"):
+            page = next(pages_iter, None)
+        if page is None:
+            break
+        pages += 1
+        with metrics.span("split"):
+            page_chunks = split_documents([page], metadata)
+        metrics.chunks.inc(len(page_chunks), event="split")
+        for chunk in page_chunks:
+            chunk_id = chunk_ids(key, [chunk.page_content], seen)[0]
+            ids.append(chunk_id)
+            if chunk_id in reusable:
+                continue
+            window.append(chunk)
+            window_ids.append(chunk_id)
+
+            # Flush a full window so memory stays bounded
+            if len(window) >= window_size:
+                if manifest is not None:
+                    manifest.add_pending(key, window_ids)
+                _store_chunks(db, index, window, window_ids, dedup, plan)
+                added += len(window)
+                logger.info(f"Streamed {added} chunks after {pages} pages")
+                window, window_ids = [], []
+        if progress is not None:
+            progress(pages, added, None)
+
+    if window:
+        if manifest is not None:
+            manifest.add_pending(key, window_ids)
+        _store_chunks(db, index, window, window_ids, dedup, plan)
+        added += len(window)
+    if progress is not None:
+        progress(pages, added, added)
+
+    stale_ids = list(old_ids - set(ids))
+    logger.info(f"Streamed {pages} pages: {added} new chunks, {len(stale_ids)} stale, {len(ids) - added} unchanged")
+    return ids, stale_ids
+
+
+def ingest_document(request: IngestRequest, progress: Optional[ProgressCallback] = None) -> None:
     """
     Ingest a document into the vector database.
 
@@ -32,43 +390,129 @@ def ingest_document(request: IngestRequest) -> None:
     manageable chunks, generates embeddings, and stores the vectors in the
     specified collection for later retrieval.
 
+    Re-ingestion is incremental: files whose content hash and chunking
+    settings match the collection manifest are skipped, and changed files only
+    add their new chunks and delete the stale ones. Parsed pages are cached
+    by content hash, so files split again after a chunking change are not
+    parsed again. Files of at least
+    ``settings.stream_ingest_threshold_mb`` are streamed page by page in
+    bounded-memory windows instead of being loaded whole.
+
+    New chunks are embedded and stored in batches of ``settings.embed_batch_size``
+    and ``progress`` is called after each batch (after each page when
+    streaming). A callback may raise IngestCancelled to stop the ingestion;
+    the file is then not recorded in the manifest. Chunks are noted as
+    pending in the manifest before they are written, and the next ingestion
+    of the file deletes the pending chunks that are no longer part of it.
+
+    With ``settings.dedup_enabled``, chunks that nearly duplicate a chunk
+    already stored in the collection (estimated Jaccard similarity of at least
+    ``settings.dedup_threshold``) are not embedded or stored; they are kept
+    as extra source references of the stored chunk.
+
+    Every chunk records the file's normalized name, type, content hash and
+    ingestion time (see filters.chunk_metadata), which QueryRequest filters
+    match inside the vector search.
+
     Args:
         request (IngestRequest): Validated ingestion request containing file path and collection
+        progress (Optional[ProgressCallback]): Receives (pages loaded, chunks stored, total new chunks)
 
     Raises:
         ValueError: If the file extension is not supported
+        IngestCancelled: If the progress callback cancelled the ingestion
         Exception: If document loading, splitting, or storage fails
 
     Note:
         Supported formats: PDF (.pdf), Word (.docx), Text (.txt, .md)
         Documents are split into overlapping chunks for better context preservation
+        Chunk IDs are derived from file path and chunk text, so writes are idempotent
     """
     logger.info(f"Ingesting: {request.file_path} → {request.collection}")
 
-    # Determine file type and create appropriate loader
-    ext = os.path.splitext(request.file_path)[1].lower()
-    if ext == ".pdf":
-        loader = PyPDFLoader(request.file_path)
-    elif ext == ".docx":
-        loader = Docx2txtLoader(request.file_path)
-    elif ext in [".txt", ".md"]:
-        loader = TextLoader(request.file_path, encoding="utf-8")
-    else:
-        raise ValueError(f"Unsupported file format: {ext}. Supported: .pdf, .docx, .txt, .md")
-
-    # Load document content
-    docs = loader.load()
-    logger.info(f"Loaded {len(docs)} pages/sections from document")
+    # Reject unsupported file types before doing any work
+    get_loader(request.file_path)
 
-    # Split document into chunks with overlap for context preservation
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=settings.chunk_size,
-        chunk_overlap=settings.chunk_overlap
-    )
-    chunks = splitter.split_documents(docs)
-    logger.info(f"Split document into {len(chunks)} chunks")
+    # Skip files that are already ingested with identical content and chunking
+    key = file_key(request.file_path)
+    digest = file_hash(request.file_path)
+    chunking = chunking_signature()
+    manifest = Manifest(request.collection)
+    previous = manifest.get(key)
+    # Chunks written by a cancelled or failed ingestion of this file
+    pending = manifest.pending(key)
+    if previous and previous["hash"] == digest:
+        if previous.get("chunking") != chunking:
+            logger.info(f"Chunking settings or chunk metadata changed since last ingestion, splitting again: {request.file_path}")
+        elif not pending:
+            logger.info(f"Unchanged since last ingestion, skipping: {request.file_path}")
+            return
+        else:
+            logger.info(f"Cleaning up after an unfinished ingestion: {request.file_path}")
+    # Chunks split with other settings (or older metadata) are all written again
+    rewrite = previous is not None and previous.get("chunking") != chunking
 
-    # Store chunks in vector database with embeddings
+    cached = isinstance(embeddings, CachedEmbeddings)
+    hits_before, misses_before = (embeddings.hits, embeddings.misses) if cached else (0, 0)
     db = get_db(request.collection)
-    db.add_documents(chunks)
+    index = get_keyword_index(request.collection) if settings.keyword_index_enabled else None
+    dedup = get_dedup_index(request.collection) if settings.dedup_enabled else None
+    plan = DedupPlan() if dedup is not None else None
+    metadata = chunk_metadata(request.file_path, digest)
+
+    try:
+        # Stream large documents window by window to bound peak memory
+        stream = request.stream
+        if stream is None:
+            stream = os.path.getsize(request.file_path) >= settings.stream_ingest_threshold_mb * 1024 * 1024
+        if stream:
+            logger.info(f"Streaming ingestion with windows of {stream_window_size()} chunks")
+            ids, stale_ids = _ingest_streaming(
+                iter_pages(request.file_path, digest), key, previous, db, index, progress, dedup, plan, metadata,
+                rewrite, manifest
+            )
+        else:
+            # Load document content (parsed pages are cached by file hash)
+            with metrics.span("load"):
+                docs = load_pages(request.file_path, digest)
+            logger.info(f"Loaded {len(docs)} pages/sections from document")
+
+            # Split document into chunks with overlap for context preservation
+            with metrics.span("split"):
+                chunks = split_documents(docs, metadata)
+            metrics.chunks.inc(len(chunks), event="split")
+            logger.info(f"Split document into {len(chunks)} chunks")
+
+            # Diff deterministic chunk IDs against the previous version of the file
+            ids, new_chunks, new_ids, stale_ids = plan_update(key, chunks, previous, rewrite)
+            logger.info(f"{len(new_ids)} new chunks, {len(stale_ids)} stale chunks, {len(ids) - len(new_ids)} unchanged")
+
+            # Store new chunks in vector database with embeddings, batch by batch
+            if progress is not None:
+                progress(len(docs), 0, len(new_chunks))
+            manifest.add_pending(key, new_ids)
+            batch_size = settings.embed_batch_size
+            for start in range(0, len(new_chunks), batch_size):
+                _store_chunks(
+                    db, index, new_chunks[start:start + batch_size], new_ids[start:start + batch_size], dedup, plan
+                )
+                if progress is not None:
+                    progress(len(docs), min(start + batch_size, len(new_chunks)), len(new_chunks))
+
+        # Drop chunks that no longer exist in the file, including those of unfinished ingestions
+        current = set(ids)
+        stale_ids += [chunk_id for chunk_id in pending if chunk_id not in current and chunk_id not in stale_ids]
+        if stale_ids:
+            delete_chunks(db, index, dedup, stale_ids)
+        manifest.record(key, digest, ids, chunking)
+        _log_dedup(plan)
+    finally:
+        # Cached answers for this collection may now be outdated
+        bump_generation(request.collection)
+
+    # Report how much embedding work the cache saved
+    if cached:
+        hits = embeddings.hits - hits_before
+        misses = embeddings.misses - misses_before
+        logger.info(f"Embedding cache: {hits} chunks reused, {misses} newly embedded")
     logger.success("Ingestion complete!")
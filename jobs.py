@@ -0,0 +1,255 @@
+"""
+Ingestion Job Queue Module
+
+This module runs document ingestion in the background so the Streamlit app
+stays responsive while large files are processed. Jobs are recorded in a
+SQLite table and executed by a small thread pool; their progress (pages
+loaded, chunks embedded) is written back to the table, where any session can
+read it, including one that reconnects after a page refresh.
+
+Features:
+- Persistent job table that survives page refreshes and app restarts
+- Worker thread pool sized by settings.ingest_job_workers
+- Per-job progress from ingest_document's progress callback
+- Cancellation of queued and running jobs
+- Jobs interrupted by a restart are queued again on startup
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set
+
+from config import settings
+from logger import logger
+from models import IngestJob, IngestRequest
+from ingest import IngestCancelled, ingest_document
+
+# Column order of the jobs table, matching the IngestJob fields
+_COLUMNS = (
+    "id", "file_path", "collection", "status", "pages", "chunks_done", "chunks_total",
+    "error", "created_at", "started_at", "finished_at"
+)
+
+
+class JobQueue:
+    """
+    Persistent queue of background ingestion jobs.
+
+    Create one per process (the app keeps it in ``st.cache_resource``); every
+    Streamlit session shares it.
+
+    Attributes:
+        path (str): Location of the SQLite job table
+        workers (int): Jobs ingested concurrently
+    """
+
+    def __init__(self, path: Optional[str] = None, workers: Optional[int] = None):
+        """
+        Open the job table and start the worker pool.
+
+        Jobs left queued or running by a previous process are queued again.
+
+        Args:
+            path (Optional[str]): Job table location (default: settings.jobs_path)
+            workers (Optional[int]): Concurrent jobs (default: settings.ingest_job_workers)
+        """
+        self.path = path or settings.jobs_path
+        self.workers = workers or settings.ingest_job_workers
+        self._lock = threading.Lock()
+        self._cancel_requested: Set[str] = set()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                collection TEXT NOT NULL,
+                status TEXT NOT NULL,
+                pages INTEGER NOT NULL DEFAULT 0,
+                chunks_done INTEGER NOT NULL DEFAULT 0,
+                chunks_total INTEGER,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-job")
+        self._resume()
+
+    def _update(self, job_id: str, **fields) -> None:
+        """Write fields of one job."""
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _resume(self) -> None:
+        """Queue jobs again that a previous process left unfinished."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status IN ('queued', 'running')"
+            )
+            self._conn.commit()
+        for (job_id,) in rows:
+            self._pool.submit(self._run, job_id)
+        if rows:
+            logger.info(f"Resumed {len(rows)} unfinished ingestion jobs")
+
+    def submit(self, file_path: str, collection: str = "default") -> IngestJob:
+        """
+        Queue a document for background ingestion.
+
+        Args:
+            file_path (str): Path to the document
+            collection (str): Target collection name (default: "default")
+
+        Returns:
+            IngestJob: The queued job
+        """
+        job = IngestJob(id=uuid.uuid4().hex, file_path=file_path, collection=collection, created_at=time.time())
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                tuple(getattr(job, name) for name in _COLUMNS)
+            )
+            self._conn.commit()
+        self._pool.submit(self._run, job.id)
+        logger.info(f"Queued ingestion job {job.id}: {file_path} → {collection}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """
+        Look up a job.
+
+        Args:
+            job_id (str): Job identifier
+
+        Returns:
+            Optional[IngestJob]: The job, or None if it does not exist
+        """
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return IngestJob(**dict(zip(_COLUMNS, row))) if row else None
+
+    def list(self, limit: int = 50) -> List[IngestJob]:
+        """
+        Most recent jobs, newest first.
+
+        Args:
+            limit (int): Maximum number of jobs (default: 50)
+
+        Returns:
+            List[IngestJob]: Jobs in any state
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [IngestJob(**dict(zip(_COLUMNS, row))) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job.
+
+        A queued job is cancelled immediately; a running job stops at its next
+        progress report (after the current batch of chunks).
+
+        Args:
+            job_id (str): Job identifier
+
+        Returns:
+            bool: True if the job was queued or running
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[0] not in ("queued", "running"):
+                return False
+            if row[0] == "queued":
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (time.time(), job_id)
+                )
+                self._conn.commit()
+            else:
+                self._cancel_requested.add(job_id)
+        logger.info(f"Cancellation requested for ingestion job {job_id}")
+        return True
+
+    def clear_finished(self) -> int:
+        """
+        Delete finished, failed and cancelled jobs from the table.
+
+        Returns:
+            int: Number of jobs removed
+        """
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled')"
+            ).rowcount
+            self._conn.commit()
+        return removed
+
+    def _run(self, job_id: str) -> None:
+        """Ingest one job's document (runs in a worker thread)."""
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            # Cancelled (or cleared) while waiting in the queue
+            if row is None or row[0] != "queued":
+                return
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), job_id)
+            )
+            self._conn.commit()
+        job = self.get(job_id)
+
+        def progress(pages: int, chunks_done: int, chunks_total: Optional[int]) -> None:
+            if job_id in self._cancel_requested:
+                raise IngestCancelled(job_id)
+            self._update(job_id, pages=pages, chunks_done=chunks_done, chunks_total=chunks_total)
+
+        try:
+            ingest_document(IngestRequest(file_path=job.file_path, collection=job.collection), progress)
+        except IngestCancelled:
+            logger.info(f"Ingestion job {job_id} cancelled: {job.file_path}")
+            self._update(job_id, status="cancelled", finished_at=time.time())
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        else:
+            current = self.get(job_id)
+            # Unchanged files are skipped without any progress report
+            total = current.chunks_total if current.chunks_total is not None else current.chunks_done
+            self._update(job_id, status="done", chunks_total=total, finished_at=time.time())
+        finally:
+            self._cancel_requested.discard(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the worker pool and close the job table.
+
+        Queued jobs stay queued and are resumed by the next JobQueue on the
+        same table.
+
+        Args:
+            wait (bool): Wait for running jobs to finish and close the table (default: True)
+        """
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        if wait:
+            with self._lock:
+                self._conn.close()
@@ -0,0 +1,322 @@
+"""
+Keyword Index Module
+
+This module maintains a BM25 inverted index for every collection, next to the
+vector database. Dense retrieval with small embedding models is weak at exact
+terms such as part numbers, error codes and names; the keyword index catches
+those, and reciprocal rank fusion merges both result lists into one ranking.
+
+Features:
+- Compact SQLite inverted index (term → chunk ID, term frequency)
+- Incremental updates keyed by the same chunk IDs as the vector database
+- Okapi BM25 scoring
+- Minimum share of matched query terms, to drop hits sharing one common word
+- Tokenization that keeps identifiers like "ERR-4012" or "v2.1.3" intact
+- Reciprocal rank fusion of several rankings
+- Rebuild from an existing collection (python keyword_index.py <collection>)
+"""
+
+import argparse
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from config import settings
+from logger import logger
+
+# SQLite limits the number of bound parameters per statement
+_PARAM_BATCH = 500
+
+# Words too common to help ranking; dropped to keep the index compact
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what when where which who why will with how do does did can".split()
+)
+
+# Alphanumeric runs, optionally joined by - _ . / (part numbers, versions, paths)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Compound identifiers are indexed whole and by their parts, so "ERR-4012"
+    matches queries for "err-4012" as well as "4012".
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        List[str]: Lowercased terms, stopwords removed
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token not in _STOPWORDS:
+            terms.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in _STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Hashable]:
+    """
+    Merge several rankings with reciprocal rank fusion.
+
+    Each item scores ``sum(1 / (k + rank))`` over the rankings it appears in,
+    so items ranked well by several retrievers rise to the top without having
+    to calibrate their raw scores against each other.
+
+    Args:
+        rankings (Sequence[Sequence[Hashable]]): Rankings, best item first
+        k (int): Damping constant (default: 60)
+
+    Returns:
+        List[Hashable]: Items ordered by fused score
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index of one collection.
+
+    Attributes:
+        path (str): Location of the SQLite index file
+        k1 (float): BM25 term frequency saturation
+        b (float): BM25 document length normalization
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        """
+        Configure the index. The database is opened on first use.
+
+        Args:
+            path (str): Path of the SQLite index file
+            k1 (float): BM25 term frequency saturation (default: 1.5)
+            b (float): BM25 document length normalization (default: 0.75)
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Open the index database on first use (callers hold the lock)."""
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    id TEXT PRIMARY KEY,
+                    length INTEGER NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);
+                CREATE TABLE IF NOT EXISTS stats (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO stats VALUES ('doc_count', 0), ('total_length', 0);
+                """
+            )
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def _delete(self, conn: sqlite3.Connection, ids: List[str]) -> None:
+        """Remove documents and their postings, keeping the stats in sync (caller commits)."""
+        for i in range(0, len(ids), _PARAM_BATCH):
+            batch = ids[i:i + _PARAM_BATCH]
+            marks = ",".join("?" * len(batch))
+            count, length = conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE id IN ({marks})", batch
+            ).fetchone()
+            if not count:
+                continue
+            conn.execute(f"DELETE FROM postings WHERE doc_id IN ({marks})", batch)
+            conn.execute(f"DELETE FROM docs WHERE id IN ({marks})", batch)
+            conn.execute("UPDATE stats SET value = value - ? WHERE key = 'doc_count'", (count,))
+            conn.execute("UPDATE stats SET value = value - ? WHERE key = 'total_length'", (length,))
+
+    def add(self, ids: List[str], texts: List[str]) -> None:
+        """
+        Index chunks, replacing any already indexed under the same IDs.
+
+        Args:
+            ids (List[str]): Chunk IDs, as stored in the vector database
+            texts (List[str]): Chunk texts
+        """
+        if not ids:
+            return
+        docs, postings = [], []
+        for chunk_id, text in zip(ids, texts):
+            terms = Counter(tokenize(text))
+            docs.append((chunk_id, sum(terms.values())))
+            postings.extend((term, chunk_id, tf) for term, tf in terms.items())
+
+        with self._lock:
+            conn = self._conn
+            self._delete(conn, list(ids))
+            conn.executemany("INSERT INTO docs VALUES (?, ?)", docs)
+            conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+            conn.execute("UPDATE stats SET value = value + ? WHERE key = 'doc_count'", (len(docs),))
+            conn.execute(
+                "UPDATE stats SET value = value + ? WHERE key = 'total_length'",
+                (sum(length for _, length in docs),)
+            )
+            conn.commit()
+
+    def delete(self, ids: List[str]) -> None:
+        """
+        Remove chunks from the index.
+
+        Args:
+            ids (List[str]): Chunk IDs to remove (unknown IDs are ignored)
+        """
+        if not ids:
+            return
+        with self._lock:
+            conn = self._conn
+            self._delete(conn, list(ids))
+            conn.commit()
+
+    def search(self, query: str, k: int = 8, min_match: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Rank indexed chunks against a query with BM25.
+
+        ``min_match`` drops chunks that contain less than that share of the
+        query terms, each term weighted by its IDF. Terms missing from the
+        index still count towards the total, so a chunk matching only the
+        common words of a query doesn't pass.
+
+        Args:
+            query (str): Query text
+            k (int): Number of results (default: 8)
+            min_match (float): Share of the query's IDF weight a chunk must match (default: 0, any match)
+
+        Returns:
+            List[Tuple[str, float]]: (chunk ID, BM25 score) pairs, best first
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            # Collections ingested before the index existed simply have no keyword hits
+            if self._connection is None and not os.path.exists(self.path):
+                return []
+            conn = self._conn
+            stats = dict(conn.execute("SELECT key, value FROM stats"))
+            if not stats["doc_count"]:
+                return []
+            marks = ",".join("?" * len(terms))
+            document_frequency = dict(conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", terms
+            ))
+            rows = conn.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p "
+                f"JOIN docs d ON d.id = p.doc_id WHERE p.term IN ({marks})",
+                terms
+            ).fetchall()
+
+        count = stats["doc_count"]
+        average_length = stats["total_length"] / count or 1.0
+        idf = {}
+        for term in terms:
+            df = document_frequency.get(term, 0)
+            idf[term] = math.log(1 + (count - df + 0.5) / (df + 0.5))
+        scores: Dict[str, float] = {}
+        matched: Dict[str, float] = {}
+        for term, doc_id, tf, length in rows:
+            norm = self.k1 * (1 - self.b + self.b * length / average_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            matched[doc_id] = matched.get(doc_id, 0.0) + idf[term]
+        if min_match > 0:
+            floor = min_match * sum(idf.values())
+            scores = {doc_id: score for doc_id, score in scores.items() if matched[doc_id] >= floor}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def __len__(self) -> int:
+        """Number of indexed chunks."""
+        with self._lock:
+            if self._connection is None and not os.path.exists(self.path):
+                return 0
+            return self._conn.execute("SELECT value FROM stats WHERE key = 'doc_count'").fetchone()[0]
+
+
+# One index object per file, shared by ingestion and queries in this process
+_indexes: Dict[str, KeywordIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_keyword_index(collection: str = "default") -> KeywordIndex:
+    """
+    Get the keyword index of a collection.
+
+    Args:
+        collection (str): Name of the collection (default: "default")
+
+    Returns:
+        KeywordIndex: Index stored under ``{chroma_path}/keyword_index/``
+    """
+    path = os.path.join(settings.chroma_path, "keyword_index", f"{collection}.sqlite3")
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = KeywordIndex(path)
+            _indexes[path] = index
+        return index
+
+
+def rebuild_keyword_index(collection: str = "default", batch_size: int = 1000) -> int:
+    """
+    Index every chunk already stored in a collection.
+
+    Useful for collections ingested before keyword indexing was enabled.
+
+    Args:
+        collection (str): Name of the collection (default: "default")
+        batch_size (int): Chunks read from the vector database per request
+
+    Returns:
+        int: Number of chunks indexed
+    """
+    from utils import get_db
+
+    db = get_db(collection)
+    index = get_keyword_index(collection)
+    offset = 0
+    while True:
+        batch = db.get(limit=batch_size, offset=offset, include=["documents"])
+        if not batch["ids"]:
+            break
+        index.add(batch["ids"], batch["documents"])
+        offset += len(batch["ids"])
+    logger.success(f"Keyword index of {collection} rebuilt with {offset} chunks")
+    return offset
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the BM25 keyword index of a collection.")
+    parser.add_argument("collection", nargs="?", default="default", help="Collection name")
+    args = parser.parse_args()
+    rebuild_keyword_index(args.collection)
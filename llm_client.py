@@ -0,0 +1,183 @@
+"""
+Async LLM Client Module
+
+This module provides a long-lived asynchronous Groq client for serving many
+concurrent questions from a single process. Connections are pooled and reused
+across requests, concurrency is capped to stay under Groq rate limits, and
+rate-limit or server errors are retried with jittered exponential backoff.
+
+Features:
+- One pooled AsyncGroq client per event loop (HTTP keep-alive reuse), closed with its loop
+- Request timeouts and connection limits from Settings
+- Semaphore-based concurrency limit
+- Retries with full-jitter backoff on 429, 5xx, timeouts and connection errors
+- Configurable base URL, so it can be pointed at a local stub server in tests
+"""
+
+import asyncio
+import random
+import weakref
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from config import settings
+from logger import logger
+import metrics
+
+# HTTP status codes worth retrying
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class AsyncLLMClient:
+    """
+    Pooled, rate-limited async client for Groq chat completions.
+
+    Attributes:
+        max_concurrency (int): Maximum requests in flight at once
+        max_retries (int): Retries after the first attempt on retryable errors
+        backoff_base (float): Base delay in seconds for exponential backoff
+        backoff_max (float): Upper bound for a single backoff delay
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0
+    ):
+        """
+        Create the client and its connection pool.
+
+        Args:
+            api_key (str): Groq API key
+            base_url (Optional[str]): Override of the Groq API base URL
+            timeout (float): Per-request timeout in seconds
+            max_connections (int): Size of the HTTP connection pool
+            max_concurrency (int): Maximum requests in flight at once
+            max_retries (int): Retries after the first attempt
+            backoff_base (float): Base delay in seconds for exponential backoff
+            backoff_max (float): Upper bound for a single backoff delay
+        """
+        from groq import AsyncGroq
+
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        # Retries are handled here, with jitter, instead of inside the SDK
+        self._client = AsyncGroq(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=0,
+            http_client=self._http
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        """Delay before the next attempt: Retry-After if given, else full jitter."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def complete(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """
+        Request a chat completion, retrying transient failures.
+
+        Args:
+            messages (List[Dict[str, str]]): Chat messages
+            **kwargs: Extra completion parameters (temperature, max_tokens, ...)
+
+        Returns:
+            str: Content of the first completion choice
+
+        Raises:
+            groq.APIError: If the request still fails after all retries, or fails
+                with a non-retryable error
+        """
+        from groq import APIConnectionError, APIStatusError, APITimeoutError
+
+        kwargs.setdefault("model", settings.default_model)
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await self._client.chat.completions.create(messages=messages, **kwargs)
+                metrics.record_llm_usage(getattr(response, "usage", None))
+                return response.choices[0].message.content
+            except (APIStatusError, APITimeoutError, APIConnectionError) as e:
+                status = getattr(e, "status_code", None)
+                retryable = status is None or status in _RETRYABLE_STATUS
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                retry_after = e.response.headers.get("retry-after") if status is not None else None
+                delay = self._backoff(attempt, retry_after)
+                attempt += 1
+                logger.warning(f"Groq request failed ({status or type(e).__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        """Close the underlying connection pool."""
+        await self._http.aclose()
+
+
+# One client per event loop: httpx pools and asyncio primitives are loop-bound
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[AsyncLLMClient, AsyncIterator[None]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def _close_on_shutdown(client: AsyncLLMClient) -> AsyncIterator[None]:
+    """Async generator that closes a client when its loop finalizes async generators."""
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def get_async_llm() -> AsyncLLMClient:
+    """
+    Get the shared async client for the running event loop.
+
+    Must be called from inside a coroutine. The client is created on first
+    use with limits taken from Settings and reused for every later request.
+    It is closed when the loop shuts down its async generators, which
+    ``asyncio.run()`` does before closing the loop.
+
+    Returns:
+        AsyncLLMClient: Pooled client bound to the current event loop
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        client = AsyncLLMClient(
+            api_key=settings.groq_api_key,
+            base_url=settings.groq_base_url,
+            timeout=settings.llm_timeout_seconds,
+            max_connections=settings.llm_max_connections,
+            max_concurrency=settings.llm_max_concurrency,
+            max_retries=settings.llm_max_retries,
+            backoff_base=settings.llm_backoff_base_seconds,
+            backoff_max=settings.llm_backoff_max_seconds
+        )
+        closer = _close_on_shutdown(client)
+        # Running it to its yield registers it with the loop (which holds it weakly, hence the entry)
+        try:
+            closer.asend(None).send(None)
+        except StopIteration:
+            pass
+        entry = _clients[loop] = (client, closer)
+    return entry[0]
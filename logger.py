@@ -8,18 +8,21 @@ Features:
 - Colored console output for development
 - File logging with automatic rotation and retention
 - Timestamped log files for better organization
+- Structured JSON lines file for metric records (see metrics.py)
+- No filesystem side effects on import (file logging is enabled explicitly)
 """
 
 import os
 from loguru import logger
 import sys
 from datetime import datetime
+from typing import Optional
 
-# Create logs directory if it doesn't exist
-os.makedirs("logs", exist_ok=True)
+# Path of the active log file, set once file logging is enabled
+log_file: Optional[str] = None
 
-# Generate timestamped log file name
-log_file = f"logs/app_{datetime.now().strftime('%Y%m%d_%H%M')}.log"
+# Path of the JSON lines file receiving metric records
+metrics_log_file: Optional[str] = None
 
 # Remove default logger configuration
 logger.remove()
@@ -32,13 +35,57 @@ logger.add(
     format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | {message}"
 )
 
-# Add file handler with rotation and retention for production logging
-logger.add(
-    log_file,
-    level="DEBUG",
-    rotation="10 MB",  # Rotate when file reaches 10MB
-    retention="7 days"  # Keep logs for 7 days
-)
+
+def enable_file_logging(directory: str = "logs") -> str:
+    """
+    Start writing logs to a timestamped, rotated file.
+
+    Metric records (log records with ``extra["metric"]`` set) go to a separate
+    ``metrics_*.jsonl`` file in the same directory, one JSON object per line,
+    so they can be shipped to a log pipeline without parsing free text.
+
+    Entry points (the Streamlit app and command line tools) call this once at
+    startup; importing the module alone never touches the filesystem. Calling
+    it again is a no-op.
+
+    Args:
+        directory (str): Directory for log files (default: "logs")
+
+    Returns:
+        str: Path of the active log file
+    """
+    global log_file, metrics_log_file
+    if log_file is not None:
+        return log_file
+
+    # Create logs directory if it doesn't exist
+    os.makedirs(directory, exist_ok=True)
+
+    # Generate timestamped log file names
+    stamp = datetime.now().strftime('%Y%m%d_%H%M')
+    log_file = os.path.join(directory, f"app_{stamp}.log")
+    metrics_log_file = os.path.join(directory, f"metrics_{stamp}.jsonl")
+
+    # Add file handler with rotation and retention for production logging
+    logger.add(
+        log_file,
+        level="DEBUG",
+        rotation="10 MB",  # Rotate when file reaches 10MB
+        retention="7 days",  # Keep logs for 7 days
+        filter=lambda record: "metric" not in record["extra"]
+    )
+
+    # Structured metric records, serialized as JSON by loguru
+    logger.add(
+        metrics_log_file,
+        level="DEBUG",
+        rotation="10 MB",
+        retention="7 days",
+        serialize=True,
+        filter=lambda record: "metric" in record["extra"]
+    )
+    return log_file
+
 
 # Log initialization confirmation
 logger.info("Logger ready — All actions will be tracked")
@@ -0,0 +1,244 @@
+"""
+Ingestion Manifest Module
+
+This module keeps a per-collection manifest of every ingested file, recording
+the file's content hash and the IDs of the chunks it produced. The manifest
+makes re-ingestion incremental and idempotent: unchanged files are skipped and
+changed files only replace the chunks that actually differ.
+
+Features:
+- Streaming SHA-256 hashing of source files
+- Deterministic, content-derived chunk IDs
+- SQLite persistence next to the vector database, one row per file
+- Per-file lookups and updates, independent of the manifest's size
+- Pending chunk IDs of unfinished ingestions, so their chunks can be cleaned up
+- Thread-safe updates
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import closing
+from typing import Dict, List, Optional
+
+from config import settings
+
+# Serializes manifest updates from concurrent ingestions in this process
+_lock = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    """
+    Compute the SHA-256 digest of a file without loading it into memory.
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_key(path: str) -> str:
+    """
+    Normalize a file path into the key used by the manifest.
+
+    Args:
+        path (str): Path to the file, absolute or relative
+
+    Returns:
+        str: Absolute, normalized path
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+def chunk_ids(key: str, texts: List[str], seen: Optional[Counter] = None) -> List[str]:
+    """
+    Derive deterministic IDs for the chunks of a file.
+
+    IDs depend only on the file key and the chunk text, so an unchanged chunk
+    keeps its ID across re-ingestions. Identical chunks within one file are
+    told apart by their occurrence number.
+
+    Args:
+        key (str): Manifest key of the source file
+        texts (List[str]): Chunk texts in document order
+        seen (Optional[Counter]): Occurrence counts carried over from earlier
+            calls, so a file can be processed in several windows
+
+    Returns:
+        List[str]: One ID per chunk
+    """
+    seen = Counter() if seen is None else seen
+    ids = []
+    for text in texts:
+        occurrence = seen[text]
+        seen[text] += 1
+        material = f"{key}\x00{occurrence}\x00{text}".encode("utf-8")
+        ids.append(hashlib.sha256(material).hexdigest()[:32])
+    return ids
+
+
+class Manifest:
+    """
+    File manifest for a single vector database collection.
+
+    Each entry maps a file key to ``{"hash": <sha256>, "chunk_ids": [...]}``,
+    plus the ``"chunking"`` settings the chunks were split with. Chunks an
+    ingestion is about to write are noted as pending until the file is
+    recorded, so chunks of a cancelled or failed ingestion can be found.
+
+    Attributes:
+        collection (str): Collection the manifest describes
+        path (str): Location of the manifest SQLite file
+    """
+
+    def __init__(self, collection: str = "default"):
+        """
+        Bind the manifest to a collection.
+
+        Args:
+            collection (str): Name of the collection (default: "default")
+        """
+        self.collection = collection
+        self.path = os.path.join(settings.chroma_path, "manifests", f"{collection}.sqlite3")
+
+    def _exists(self) -> bool:
+        """Whether there is a manifest to read (callers hold the lock)."""
+        return os.path.exists(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the manifest database, creating it if needed (callers hold the lock)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (key TEXT PRIMARY KEY, entry TEXT NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS pending (
+                key TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (key, chunk_id)
+            ) WITHOUT ROWID;
+            """
+        )
+        return conn
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up the manifest entry of a file.
+
+        Args:
+            key (str): Manifest key of the file
+
+        Returns:
+            Optional[Dict]: Entry with "hash", "chunk_ids" and "chunking", or None if unknown
+        """
+        with _lock:
+            if not self._exists():
+                return None
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT entry FROM files WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def entries(self) -> Dict[str, Dict]:
+        """
+        Read every entry of the manifest at once.
+
+        Returns:
+            Dict[str, Dict]: File keys mapped to their entries
+        """
+        with _lock:
+            if not self._exists():
+                return {}
+            with closing(self._connect()) as conn:
+                return {key: json.loads(entry) for key, entry in conn.execute("SELECT key, entry FROM files")}
+
+    def record(self, key: str, digest: str, ids: List[str], chunking: Optional[str] = None) -> None:
+        """
+        Store the hash and chunk IDs of an ingested file.
+
+        Args:
+            key (str): Manifest key of the file
+            digest (str): Content hash of the file
+            ids (List[str]): IDs of all chunks now stored for the file
+            chunking (Optional[str]): Chunking settings the file was split with
+        """
+        entry = {"hash": digest, "chunk_ids": ids}
+        if chunking is not None:
+            entry["chunking"] = chunking
+        self.record_many({key: entry})
+
+    def pending(self, key: str) -> List[str]:
+        """
+        IDs of chunks written for a file since it was last recorded.
+
+        Args:
+            key (str): Manifest key of the file
+
+        Returns:
+            List[str]: Chunk IDs of unfinished ingestions (empty after a completed one)
+        """
+        with _lock:
+            if not self._exists():
+                return []
+            with closing(self._connect()) as conn:
+                return [chunk_id for (chunk_id,) in conn.execute("SELECT chunk_id FROM pending WHERE key = ?", (key,))]
+
+    def add_pending(self, key: str, ids: List[str]) -> None:
+        """
+        Note chunks about to be written for a file, before writing them.
+
+        Args:
+            key (str): Manifest key of the file
+            ids (List[str]): IDs of the chunks to be written
+        """
+        if not ids:
+            return
+        with _lock, closing(self._connect()) as conn:
+            conn.executemany("INSERT OR IGNORE INTO pending VALUES (?, ?)", [(key, chunk_id) for chunk_id in ids])
+            conn.commit()
+
+    def record_many(self, records: Dict[str, Dict]) -> None:
+        """
+        Store several entries in a single transaction, clearing their pending chunks.
+
+        Args:
+            records (Dict[str, Dict]): File keys mapped to {"hash", "chunk_ids", "chunking"} entries
+        """
+        if not records:
+            return
+        rows = [(key, json.dumps(entry)) for key, entry in records.items()]
+        with _lock, closing(self._connect()) as conn:
+            conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?)", rows)
+            conn.executemany("DELETE FROM pending WHERE key = ?", [(key,) for key in records])
+            conn.commit()
+
+    def forget(self, key: str) -> Optional[Dict]:
+        """
+        Remove a file and its pending chunks from the manifest.
+
+        Args:
+            key (str): Manifest key of the file
+
+        Returns:
+            Optional[Dict]: The removed entry, or None if the file was unknown
+        """
+        with _lock:
+            if not self._exists():
+                return None
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT entry FROM files WHERE key = ?", (key,)).fetchone()
+                conn.execute("DELETE FROM files WHERE key = ?", (key,))
+                conn.execute("DELETE FROM pending WHERE key = ?", (key,))
+                conn.commit()
+        return json.loads(row[0]) if row is not None else None
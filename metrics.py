@@ -0,0 +1,319 @@
+"""
+Metrics Module
+
+This module collects per-stage latencies and pipeline counters for ingestion
+and queries, and exposes them in the Prometheus text format. Every update is
+also emitted as a structured log record (``extra["metric"]`` is set), which
+logger.py writes to a JSON lines file once file logging is enabled.
+
+Features:
+- Timing spans for pipeline stages (load, split, embed, store, query_embed,
+  vector_search, keyword_search, context_build, llm)
+- Exclusive stage times: a nested stage is not counted in its parent's time
+- Counters for chunks, LLM and context tokens, and cache lookups
+- Thread-safe, dependency-free registry rendered in the Prometheus text format
+- Optional HTTP endpoint serving /metrics from a background thread
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from logger import logger
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    """Format a label set as ``{a="x",b="y"}`` (empty string if there are no labels)."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    """Format a sample value, using integers where possible."""
+    if math.isinf(value):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """
+    Monotonically increasing count, optionally split by labels.
+
+    Attributes:
+        name (str): Metric name
+        help (str): Description shown in the Prometheus output
+        labels (Tuple[str, ...]): Label names
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """
+        Add to the count of a label set.
+
+        Args:
+            amount (float): Non-negative increment (default: 1)
+            **labels (str): Value of every label name
+        """
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        logger.bind(metric=self.name, value=amount, **labels).debug(f"{self.name} +{amount}")
+
+    def value(self, **labels: str) -> float:
+        """Current count of a label set."""
+        return self._values.get(tuple(str(labels[name]) for name in self.labels), 0)
+
+    def render(self) -> List[str]:
+        """Prometheus text lines of this counter."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {_number(value)}")
+        return lines
+
+    def reset(self) -> None:
+        """Forget all counts."""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, optionally split by labels.
+
+    Attributes:
+        name (str): Metric name
+        help (str): Description shown in the Prometheus output
+        labels (Tuple[str, ...]): Label names
+        buckets (Tuple[float, ...]): Bucket upper bounds
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # Per label set: [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Record one observation.
+
+        Args:
+            value (float): Observed value (seconds for latencies)
+            **labels (str): Value of every label name
+        """
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+        logger.bind(metric=self.name, value=value, **labels).debug(f"{self.name} {value * 1000:.1f} ms")
+
+    def count(self, **labels: str) -> int:
+        """Number of observations of a label set."""
+        state = self._values.get(tuple(str(labels[name]) for name in self.labels))
+        return int(state[-1]) if state else 0
+
+    def total(self, **labels: str) -> float:
+        """Sum of the observations of a label set."""
+        state = self._values.get(tuple(str(labels[name]) for name in self.labels))
+        return state[-2] if state else 0.0
+
+    def render(self) -> List[str]:
+        """Prometheus text lines of this histogram."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    labels = _label_text(self.labels, key, f'le="{_number(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {_number(count)}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(state[-2])}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {_number(state[-1])}")
+        return lines
+
+    def reset(self) -> None:
+        """Forget all observations."""
+        with self._lock:
+            self._values.clear()
+
+
+# Pipeline metrics shared by ingestion and queries
+stage_seconds = Histogram(
+    "rag_stage_seconds", "Time spent in a pipeline stage, excluding nested stages", ["stage"]
+)
+time_to_first_token = Histogram(
+    "rag_time_to_first_token_seconds", "Time from the start of a streamed query to its first answer token"
+)
+chunks = Counter(
+    "rag_chunks_total", "Chunks split, stored, skipped as duplicates and deleted during ingestion, and retrieved or packed per query", ["event"]
+)
+llm_tokens = Counter("rag_llm_tokens_total", "Tokens reported by the LLM API", ["kind"])
+context_tokens = Counter(
+    "rag_context_tokens_total", "Context tokens sent to the LLM, and tokens saved by context assembly", ["kind"]
+)
+cache_lookups = Counter("rag_cache_lookups_total", "Query, embedding and parse cache lookups by result", ["cache", "result"])
+
+REGISTRY = (stage_seconds, time_to_first_token, chunks, llm_tokens, context_tokens, cache_lookups)
+
+
+class _Frame:
+    """An open span; accumulates the time of spans nested inside it."""
+
+    __slots__ = ("stage", "children")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.children = 0.0
+
+
+# Innermost open span of the current thread or asyncio task
+_current_span: ContextVar[Optional[_Frame]] = ContextVar("rag_current_span", default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a pipeline stage and record it in ``rag_stage_seconds``.
+
+    Time spent in spans nested inside this one is attributed to the nested
+    stage only, so stages add up to the wall time of the request instead of
+    counting work twice (e.g. the embedding that Chroma performs inside a
+    store). A span nested directly inside a span of the same stage is merged
+    into it.
+
+    Args:
+        stage (str): Stage name used as the ``stage`` label
+
+    Note:
+        Spans must open and close in the same thread or task; generators that
+        yield to their caller should time stages with record_stage instead.
+    """
+    parent = _current_span.get()
+    if parent is not None and parent.stage == stage:
+        yield
+        return
+
+    frame = _Frame(stage)
+    token = _current_span.set(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_span.reset(token)
+        if parent is not None:
+            parent.children += elapsed
+        record_stage(stage, elapsed - frame.children)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """
+    Record the duration of a stage that was timed by the caller.
+
+    Args:
+        stage (str): Stage name used as the ``stage`` label
+        seconds (float): Duration of the stage
+    """
+    stage_seconds.observe(max(seconds, 0.0), stage=stage)
+
+
+def record_llm_usage(usage) -> None:
+    """
+    Count prompt and completion tokens from an LLM API usage object.
+
+    Args:
+        usage: ``usage`` of a Groq/OpenAI response (ignored if missing)
+    """
+    for kind in ("prompt", "completion"):
+        value = getattr(usage, f"{kind}_tokens", None)
+        if isinstance(value, int):
+            llm_tokens.inc(value, kind=kind)
+
+
+def render() -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+        str: Metrics text, ending with a newline
+    """
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def reset() -> None:
+    """Clear every metric (used by tests and benchmarks)."""
+    for metric in REGISTRY:
+        metric.reset()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the Prometheus text on /metrics."""
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes are frequent; keep them out of the application log
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Start the /metrics endpoint in a daemon thread.
+
+    Calling it again returns the running server, so entry points that are
+    re-executed (like Streamlit scripts) can call it unconditionally.
+
+    Args:
+        port (int): Port to listen on (0 picks a free port)
+        host (str): Interface to bind (default: "127.0.0.1")
+
+    Returns:
+        ThreadingHTTPServer: Running server; ``server_address`` holds the bound port
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            logger.info(f"Metrics endpoint: http://{host}:{_server.server_address[1]}/metrics")
+        return _server
@@ -12,8 +12,9 @@ Features:
 - Type hints for better IDE support
 """
 
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 
 class QueryRequest(BaseModel):
@@ -27,11 +28,21 @@ class QueryRequest(BaseModel):
         question (str): The user's search question (required, auto-cleaned)
         collection (Optional[str]): Vector database collection name (default: "default")
         top_k (Optional[int]): Number of similar documents to retrieve (1-20, default: 8)
+        retrieval_mode (str): "vector", "keyword" (BM25) or "hybrid" (both, fused; default)
+        sources (Optional[List[str]]): Only search chunks of these files (names or paths, case-insensitive)
+        file_types (Optional[List[str]]): Only search chunks of these file types, e.g. ["pdf", ".docx"]
+        ingested_after (Optional[datetime]): Only search chunks ingested at or after this time
+        ingested_before (Optional[datetime]): Only search chunks ingested before this time
     """
 
     question: str = Field(..., description="User's question")
     collection: Optional[str] = "default"
     top_k: Optional[int] = Field(8, ge=1, le=20)
+    retrieval_mode: Literal["vector", "keyword", "hybrid"] = "hybrid"
+    sources: Optional[List[str]] = None
+    file_types: Optional[List[str]] = None
+    ingested_after: Optional[datetime] = None
+    ingested_before: Optional[datetime] = None
 
     def model_post_init(self, __context):
         """
@@ -67,7 +78,141 @@ class IngestRequest(BaseModel):
     Attributes:
         file_path (str): Path to the document file to be ingested
         collection (Optional[str]): Vector database collection name (default: "default")
+        stream (Optional[bool]): Force streaming ingestion on or off (default: by file size)
     """
 
     file_path: str = Field(..., description="Path to document")
     collection: Optional[str] = "default"
+    stream: Optional[bool] = None
+
+
+class BulkIngestReport(BaseModel):
+    """
+    Summary of a bulk ingestion run.
+
+    Attributes:
+        files_total (int): Number of files discovered
+        files_ingested (int): Files whose chunks were written
+        files_skipped (int): Files unchanged since their last ingestion
+        files_failed (Dict[str, str]): Failed file paths mapped to their error
+        chunks_written (int): Chunks embedded and stored
+        chunks_deduplicated (int): Near-duplicate chunks recorded as references instead of stored
+        bytes_deduplicated (int): Text bytes of those chunks
+        seconds (float): Wall-clock duration of the run
+    """
+
+    files_total: int = 0
+    files_ingested: int = 0
+    files_skipped: int = 0
+    files_failed: Dict[str, str] = Field(default_factory=dict)
+    chunks_written: int = 0
+    chunks_deduplicated: int = 0
+    bytes_deduplicated: int = 0
+    seconds: float = 0.0
+
+    @property
+    def docs_per_sec(self) -> float:
+        """Files processed (ingested or skipped) per second."""
+        return (self.files_ingested + self.files_skipped) / self.seconds if self.seconds else 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        """Chunks embedded and stored per second."""
+        return self.chunks_written / self.seconds if self.seconds else 0.0
+
+
+class BatchQueryResult(BaseModel):
+    """
+    Outcome of one question of a batch query run (one line of its output file).
+
+    Attributes:
+        id (str): Identifier of the question within the batch
+        question (str): Question text
+        collection (str): Collection that was searched
+        status (str): "ok", or "failed" if retrieval or the LLM call failed
+        answer (Optional[str]): Answer with source attribution, as query_rag returns it
+        sources (List[str]): Source filenames of the context
+        cached (Optional[str]): "exact" or "semantic" if served from the query cache
+        error (Optional[str]): Failure message of a failed question
+        timings_ms (Dict[str, float]): Milliseconds per stage; batched stages
+            (embed, vector_search) are split evenly across their batch
+    """
+
+    id: str
+    question: str
+    collection: str = "default"
+    status: Literal["ok", "failed"] = "ok"
+    answer: Optional[str] = None
+    sources: List[str] = Field(default_factory=list)
+    cached: Optional[Literal["exact", "semantic"]] = None
+    error: Optional[str] = None
+    timings_ms: Dict[str, float] = Field(default_factory=dict)
+
+
+class BatchQueryReport(BaseModel):
+    """
+    Summary of a batch query run.
+
+    Attributes:
+        total (int): Questions in the input
+        skipped (int): Questions already answered by an earlier run
+        answered (int): Questions answered in this run
+        failed (int): Questions that failed in this run (retried on resume)
+        seconds (float): Wall-clock duration of the run
+    """
+
+    total: int = 0
+    skipped: int = 0
+    answered: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def questions_per_sec(self) -> float:
+        """Questions answered or failed per second."""
+        return (self.answered + self.failed) / self.seconds if self.seconds else 0.0
+
+
+class IngestJob(BaseModel):
+    """
+    State of a background ingestion job.
+
+    Attributes:
+        id (str): Job identifier
+        file_path (str): Path to the document being ingested
+        collection (str): Target collection name
+        status (str): "queued", "running", "done", "failed" or "cancelled"
+        pages (int): Pages or sections loaded so far
+        chunks_done (int): New chunks embedded and stored so far
+        chunks_total (Optional[int]): New chunks to store, once known
+        error (Optional[str]): Failure message of a failed job
+        created_at (float): Submission time (Unix seconds)
+        started_at (Optional[float]): Time the job started running
+        finished_at (Optional[float]): Time the job finished, failed or was cancelled
+    """
+
+    id: str
+    file_path: str
+    collection: str = "default"
+    status: Literal["queued", "running", "done", "failed", "cancelled"] = "queued"
+    pages: int = 0
+    chunks_done: int = 0
+    chunks_total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job has reached a final state."""
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def progress(self) -> float:
+        """Fraction of new chunks stored (0.0 until the total is known, 1.0 when done)."""
+        if self.status == "done":
+            return 1.0
+        if not self.chunks_total:
+            return 0.0
+        return min(self.chunks_done / self.chunks_total, 1.0)
@@ -0,0 +1,366 @@
+"""
+ONNX Runtime Embeddings Module
+
+This module runs the configured sentence-transformers model with ONNX Runtime
+instead of eager PyTorch, which is considerably faster on CPU-only nodes. The
+model is exported to ONNX once (optionally with int8 dynamic quantization of
+its weights) and stored next to the other data files; later processes only
+load the exported graph and tokenizer, without importing torch at all.
+
+Features:
+- One-time export of the transformer to ONNX, with dynamic batch and sequence axes
+- Optional int8 dynamic quantization (onnxruntime.quantization)
+- Tuned session: all graph optimizations, configurable intra-op threads
+- Length-sorted batching, so each batch is padded only to its longest text
+- CLS, mean or max pooling as configured by the model, L2-normalized output
+- Drop-in LangChain Embeddings replacement for HuggingFaceEmbeddings
+- Parity check against the PyTorch model (python onnx_embeddings.py check)
+
+Usage:
+    python onnx_embeddings.py export [--no-quantize]
+    python onnx_embeddings.py check
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import settings
+from logger import logger
+
+# Written next to the exported graphs; describes how to tokenize and pool
+_CONFIG_FILE = "onnx_config.json"
+
+# Pooling modes the exported model can use
+_POOLING_MODES = ("cls", "mean", "max")
+
+# Texts used by the parity check when none are given
+_PARITY_TEXTS = [
+    "What is the warranty period for the inverter?",
+    "Replace the air filter every 500 operating hours or when the pressure alarm ERR-4012 appears.",
+    "The supplier shall deliver the goods within thirty (30) days of receiving a purchase order.",
+    "Quarterly revenue grew 12% year over year, driven by storage and grid services.",
+    "short",
+    "Safety notice: disconnect both AC and DC sides before opening the enclosure. " * 8
+]
+
+
+def model_dir(model_name: Optional[str] = None) -> str:
+    """
+    Directory holding the exported model.
+
+    Args:
+        model_name (Optional[str]): Model name (default: settings.embedding_model)
+
+    Returns:
+        str: ``{embedding_onnx_path}/{model name with / replaced by --}``
+    """
+    name = (model_name or settings.embedding_model).replace("/", "--")
+    return os.path.join(settings.embedding_onnx_path, name)
+
+
+def _pooling_mode(model) -> str:
+    """Pooling mode of a SentenceTransformer, across sentence-transformers versions."""
+    from sentence_transformers import models
+
+    for module in model:
+        if isinstance(module, models.Pooling):
+            mode = getattr(module, "pooling_mode", None)
+            if not isinstance(mode, str):
+                # Older releases expose one flag per mode
+                flags = {
+                    "cls": getattr(module, "pooling_mode_cls_token", False),
+                    "mean": getattr(module, "pooling_mode_mean_tokens", False),
+                    "max": getattr(module, "pooling_mode_max_tokens", False)
+                }
+                enabled = [name for name, on in flags.items() if on]
+                mode = enabled[0] if len(enabled) == 1 else "+".join(enabled)
+            if mode not in _POOLING_MODES:
+                raise ValueError(f"Unsupported pooling mode for ONNX export: {mode}")
+            return mode
+    return "mean"
+
+
+def export_model(model, output_dir: str, quantize: bool = True, model_name: Optional[str] = None) -> str:
+    """
+    Export a sentence-transformers model to ONNX.
+
+    Writes ``model.onnx`` (float32), ``model.int8.onnx`` when quantizing,
+    the tokenizer as ``tokenizer.json`` and the pooling configuration.
+
+    Args:
+        model: SentenceTransformer instance, or a model name to load on CPU
+        output_dir (str): Target directory
+        quantize (bool): Also write an int8 dynamically quantized graph (requires the onnx package)
+        model_name (Optional[str]): Name recorded with the export (default: the name passed as model)
+
+    Returns:
+        str: The output directory
+
+    Raises:
+        ValueError: If the model's pooling mode is not supported
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if isinstance(model, str):
+        model_name = model_name or model
+        model = SentenceTransformer(model, device="cpu")
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    transformer = model[0].auto_model
+    tokenizer = model.tokenizer
+    input_names = [name for name in tokenizer.model_input_names
+                   if name in ("input_ids", "attention_mask", "token_type_ids")]
+
+    class _Encoder(torch.nn.Module):
+        """Transformer body returning token embeddings, with positional inputs for the exporter."""
+
+        def __init__(self, body):
+            super().__init__()
+            self.body = body
+
+        def forward(self, *inputs):
+            return self.body(**dict(zip(input_names, inputs))).last_hidden_state
+
+    # Padded example, so the traced attention mask path is the general one
+    example = tokenizer(["export example text", "short"], padding=True, return_tensors="pt")
+    encoder = _Encoder(transformer).eval()
+    dynamic = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            tuple(example[name] for name in input_names),
+            os.path.join(output_dir, "model.onnx"),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes={name: dynamic for name in input_names + ["token_embeddings"]},
+            opset_version=17,
+            dynamo=False
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            os.path.join(output_dir, "model.onnx"),
+            os.path.join(output_dir, "model.int8.onnx"),
+            weight_type=QuantType.QInt8
+        )
+
+    tokenizer.save_pretrained(output_dir)
+    config = {
+        "model": model_name or os.path.basename(os.path.normpath(output_dir)),
+        "pooling": _pooling_mode(model),
+        "max_length": model.max_seq_length,
+        "inputs": input_names,
+        "dim": (getattr(model, "get_embedding_dimension", None) or model.get_sentence_embedding_dimension)()
+    }
+    with open(os.path.join(output_dir, _CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    logger.info(
+        f"Exported {config['model']} to ONNX{' (+ int8)' if quantize else ''} in "
+        f"{time.perf_counter() - start:.1f}s: {output_dir}"
+    )
+    return output_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed with ONNX Runtime.
+
+    Attributes:
+        model_name (str): Name of the exported model
+        path (str): Directory of the export
+        quantized (bool): Whether the int8 graph is used
+        batch_size (int): Texts per inference call
+        dim (int): Embedding dimensionality
+    """
+
+    def __init__(
+        self,
+        path: str,
+        quantized: bool = True,
+        threads: Optional[int] = None,
+        batch_size: int = 32
+    ):
+        """
+        Load an exported model.
+
+        Args:
+            path (str): Directory written by export_model
+            quantized (bool): Use the int8 graph (default: True)
+            threads (Optional[int]): Intra-op threads (default: ONNX Runtime's choice, one per physical core)
+            batch_size (int): Texts per inference call (default: 32)
+
+        Raises:
+            FileNotFoundError: If the export or the requested graph is missing
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, _CONFIG_FILE), encoding="utf-8") as f:
+            config = json.load(f)
+        graph = os.path.join(path, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(graph):
+            raise FileNotFoundError(f"No {'int8 ' if quantized else ''}ONNX graph in {path}")
+
+        self.model_name = config["model"]
+        self.path = path
+        self.quantized = quantized
+        self.batch_size = batch_size
+        self.dim = config["dim"]
+        self._pooling = config["pooling"]
+        self._inputs = config["inputs"]
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self._tokenizer.no_padding()
+        self._tokenizer.enable_truncation(max_length=config["max_length"])
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = onnxruntime.InferenceSession(graph, options, providers=["CPUExecutionProvider"])
+
+    def _embed_batch(self, encodings) -> np.ndarray:
+        """Pad a batch to its longest text, run the graph and pool."""
+        width = max(len(encoding.ids) for encoding in encodings)
+        feeds = {name: np.zeros((len(encodings), width), dtype=np.int64) for name in self._inputs}
+        for row, encoding in enumerate(encodings):
+            length = len(encoding.ids)
+            values = {"input_ids": encoding.ids, "attention_mask": encoding.attention_mask,
+                      "token_type_ids": encoding.type_ids}
+            for name in self._inputs:
+                feeds[name][row, :length] = values[name]
+        tokens = self._session.run(None, feeds)[0]
+
+        mask = feeds["attention_mask"][:, :, None].astype(tokens.dtype)
+        if self._pooling == "cls":
+            pooled = tokens[:, 0]
+        elif self._pooling == "max":
+            pooled = np.where(mask > 0, tokens, -np.inf).max(axis=1)
+        else:
+            pooled = (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, batching them by token length to minimize padding.
+
+        Args:
+            texts (List[str]): Texts to embed
+
+        Returns:
+            List[List[float]]: One normalized vector per text, in input order
+        """
+        if not texts:
+            return []
+        encodings = self._tokenizer.encode_batch(list(texts))
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors[batch] = self._embed_batch([encodings[i] for i in batch])
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed one question (queries are embedded like documents, as with HuggingFaceEmbeddings)."""
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many questions in length-sorted batches."""
+        return self.embed_documents(texts)
+
+
+def load_onnx_embeddings(model_name: Optional[str] = None) -> OnnxEmbeddings:
+    """
+    Load the ONNX export of the configured model, exporting it on first use.
+
+    Args:
+        model_name (Optional[str]): Model name (default: settings.embedding_model)
+
+    Returns:
+        OnnxEmbeddings: Model configured by the embedding_onnx_* settings
+    """
+    model_name = model_name or settings.embedding_model
+    path = model_dir(model_name)
+    quantize = settings.embedding_onnx_quantize
+    graph = os.path.join(path, "model.int8.onnx" if quantize else "model.onnx")
+    if not os.path.exists(graph) or not os.path.exists(os.path.join(path, _CONFIG_FILE)):
+        logger.info(f"No ONNX export of {model_name} yet, exporting to {path}")
+        export_model(model_name, path, quantize=quantize)
+
+    start = time.perf_counter()
+    model = OnnxEmbeddings(
+        path,
+        quantized=quantize,
+        threads=settings.embedding_onnx_threads,
+        batch_size=settings.embedding_onnx_batch_size
+    )
+    logger.info(
+        f"Embeddings: {model_name} ({model.dim}d) on ONNX Runtime "
+        f"{'int8' if quantize else 'float32'} loaded in {time.perf_counter() - start:.1f}s"
+    )
+    return model
+
+
+def check_parity(reference: Embeddings, candidate: Embeddings, texts: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Compare two embedding models by the cosine similarity of their vectors.
+
+    Args:
+        reference (Embeddings): Model taken as correct (the PyTorch model)
+        candidate (Embeddings): Model under test (the ONNX model)
+        texts (Optional[List[str]]): Texts to embed (default: a small built-in set)
+
+    Returns:
+        Dict[str, float]: ``min`` and ``mean`` cosine similarity over the texts
+    """
+    texts = texts or _PARITY_TEXTS
+    expected = np.asarray(reference.embed_documents(texts), dtype=np.float64)
+    actual = np.asarray(candidate.embed_documents(texts), dtype=np.float64)
+    cosine = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    return {"min": float(cosine.min()), "mean": float(cosine.mean())}
+
+
+def main() -> None:
+    """Command line entry point: export the model or check it against PyTorch."""
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check its accuracy.")
+    parser.add_argument("command", choices=["export", "check"], help="export the model, or compare it with PyTorch")
+    parser.add_argument("--model", default=None, help="Model name (default: settings.embedding_model)")
+    parser.add_argument("--no-quantize", action="store_true", help="Only write (and check) the float32 graph")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Lowest cosine similarity accepted by check")
+    args = parser.parse_args()
+
+    if args.model:
+        settings.embedding_model = args.model
+    model_name = settings.embedding_model
+    if args.command == "export":
+        export_model(model_name, model_dir(model_name), quantize=not args.no_quantize)
+        return
+
+    from utils import _load_torch_embeddings
+
+    reference = _load_torch_embeddings()
+    failed = False
+    for quantized in ([False] if args.no_quantize else [False, True]):
+        candidate = OnnxEmbeddings(model_dir(model_name), quantized=quantized)
+        parity = check_parity(reference, candidate)
+        ok = parity["min"] >= args.min_cosine
+        failed |= not ok
+        print(f"{'int8' if quantized else 'float32':8s} cosine vs PyTorch: min {parity['min']:.5f}  "
+              f"mean {parity['mean']:.5f}  {'OK' if ok else 'FAIL'}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Parsed Document Cache Module
+
+This module keeps the pages extracted from source documents, keyed by the
+SHA-256 of the file contents, so re-chunking or re-indexing a corpus (e.g.
+after tuning chunk_size) does not parse any PDF or DOCX a second time. Each
+document is stored as one gzip-compressed JSON lines file next to the vector
+database, and is read back lazily so streaming ingestion stays bounded in
+memory. Large PDFs are extracted in parallel, one page range per process.
+
+Features:
+- Content-hash keys: moved or copied files hit the cache, edited files miss it
+- Compact gzip JSON lines storage, written atomically
+- Lazy page iteration and write-through caching for streaming ingestion
+- Size limit with least-recently-used eviction
+- Parallel per-page PDF text extraction, identical to PyPDFLoader's output
+"""
+
+import gzip
+import json
+import os
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+from config import settings
+from logger import logger
+import metrics
+
+# Extensions worth caching; plain text is cheaper to read than to decompress
+CACHED_EXTENSIONS = (".pdf", ".docx")
+
+
+def _encode(page: Document) -> str:
+    """One JSON line for a page; the source path is restored on read."""
+    metadata = {name: value for name, value in page.metadata.items() if name != "source"}
+    return json.dumps({"page_content": page.page_content, "metadata": metadata}, ensure_ascii=False) + "\n"
+
+
+def _decode(line: str, source: str) -> Document:
+    """Rebuild a page, pointing its source at the file being ingested."""
+    record = json.loads(line)
+    return Document(page_content=record["page_content"], metadata={**record["metadata"], "source": source})
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed document pages.
+
+    Attributes:
+        path (str): Directory holding one ``<sha256>.jsonl.gz`` file per document
+        max_bytes (int): Cache size above which least recently used entries are evicted
+    """
+
+    def __init__(self, path: Optional[str] = None, max_mb: Optional[int] = None):
+        """
+        Bind the cache to its directory.
+
+        Args:
+            path (Optional[str]): Cache directory (default: ``parse_cache`` under settings.chroma_path)
+            max_mb (Optional[int]): Size limit in MiB (default: settings.parse_cache_max_mb)
+        """
+        self.path = path or os.path.join(settings.chroma_path, "parse_cache")
+        self.max_bytes = (max_mb or settings.parse_cache_max_mb) * 1024 * 1024
+
+    def _entry(self, digest: str) -> str:
+        return os.path.join(self.path, f"{digest}.jsonl.gz")
+
+    def _open(self, digest: str):
+        """Open an entry for reading and mark it recently used, or return None on a miss."""
+        entry = self._entry(digest)
+        try:
+            stream = gzip.open(entry, "rt", encoding="utf-8")
+            os.utime(entry)
+        except FileNotFoundError:
+            metrics.cache_lookups.inc(cache="parse", result="miss")
+            return None
+        metrics.cache_lookups.inc(cache="parse", result="hit")
+        return stream
+
+    def _discard(self, digest: str, error: Exception) -> None:
+        """Remove an unreadable entry so the document is parsed again next time."""
+        logger.warning(f"Discarding unreadable parse cache entry {digest[:12]}: {error}")
+        try:
+            os.remove(self._entry(digest))
+        except OSError:
+            pass
+
+    def get(self, digest: str, source: str) -> Optional[List[Document]]:
+        """
+        Read all cached pages of a document.
+
+        Args:
+            digest (str): Content hash of the file (manifest.file_hash)
+            source (str): Path of the file, stored as each page's ``source`` metadata
+
+        Returns:
+            Optional[List[Document]]: The pages, or None if the document is not cached
+        """
+        stream = self._open(digest)
+        if stream is None:
+            return None
+        try:
+            with stream:
+                return [_decode(line, source) for line in stream]
+        except (OSError, EOFError, ValueError, KeyError) as e:
+            self._discard(digest, e)
+            return None
+
+    def iter(self, digest: str, source: str) -> Optional[Iterator[Document]]:
+        """
+        Iterate over the cached pages of a document without loading them all.
+
+        Args:
+            digest (str): Content hash of the file
+            source (str): Path of the file, stored as each page's ``source`` metadata
+
+        Returns:
+            Optional[Iterator[Document]]: Lazy page iterator, or None if the document is not cached
+        """
+        stream = self._open(digest)
+        if stream is None:
+            return None
+
+        def pages() -> Iterator[Document]:
+            try:
+                with stream:
+                    for line in stream:
+                        yield _decode(line, source)
+            except (OSError, EOFError, ValueError, KeyError) as e:
+                self._discard(digest, e)
+                raise
+        return pages()
+
+    def put(self, digest: str, pages: List[Document]) -> None:
+        """
+        Store the pages of a document, replacing any existing entry.
+
+        Failures are logged and otherwise ignored; the cache is an optimization.
+
+        Args:
+            digest (str): Content hash of the file
+            pages (List[Document]): Pages as produced by the loader
+        """
+        for _ in self.write_through(digest, pages):
+            pass
+
+    def write_through(self, digest: str, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        Pass pages through while writing them to the cache.
+
+        The entry only becomes visible once the iterator is exhausted, so an
+        interrupted ingestion never leaves a partial document in the cache.
+
+        Args:
+            digest (str): Content hash of the file
+            pages (Iterable[Document]): Pages as produced by the loader
+
+        Yields:
+            Document: The same pages, unchanged
+        """
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{self._entry(digest)}.{uuid.uuid4().hex}.tmp"
+        stream = gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6)
+        try:
+            for page in pages:
+                if stream is not None:
+                    try:
+                        stream.write(_encode(page))
+                    except (TypeError, ValueError, OSError) as e:
+                        logger.warning(f"Not caching parsed pages of {digest[:12]}: {e}")
+                        stream.close()
+                        stream = None
+                yield page
+            if stream is not None:
+                stream.close()
+                stream = None
+                os.replace(tmp_path, self._entry(digest))
+                self._evict()
+        finally:
+            if stream is not None:
+                stream.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache fits its size limit."""
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".jsonl.gz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                continue
+            total -= size
+
+    def size_bytes(self) -> int:
+        """Disk space used by cached documents."""
+        if not os.path.isdir(self.path):
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in os.listdir(self.path) if name.endswith(".jsonl.gz")
+        )
+
+    def clear(self) -> None:
+        """Delete every cached document."""
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if name.endswith(".jsonl.gz"):
+                os.remove(os.path.join(self.path, name))
+
+
+def _extract_page_texts(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages ``start..stop-1`` of a PDF (runs in a worker process)."""
+    import pypdf
+
+    reader = pypdf.PdfReader(file_path)
+    texts = []
+    for number in range(start, stop):
+        page = reader.pages[number]
+        # Same call and cleanup as PyPDFLoader without image extraction
+        if pypdf.__version__.startswith("3"):
+            text = page.extract_text()
+        else:
+            text = page.extract_text(extraction_mode="plain")
+        texts.append(text.strip())
+    return texts
+
+
+def iter_pdf_pages(file_path: str, workers: Optional[int] = None) -> Optional[Iterator[Document]]:
+    """
+    Extract a large PDF's pages in parallel worker processes, in page order.
+
+    Pages are split into ranges that are extracted concurrently; at most two
+    ranges per worker are in flight, so memory stays bounded when the caller
+    consumes pages slowly (as streaming ingestion does). The pages equal
+    those of PyPDFLoader, metadata included.
+
+    Args:
+        file_path (str): Path to the PDF
+        workers (Optional[int]): Worker processes (default: settings.pdf_parse_workers or CPU count)
+
+    Returns:
+        Optional[Iterator[Document]]: Page iterator, or None if the PDF has fewer
+            than ``settings.pdf_parallel_min_pages`` pages, cannot be opened, or
+            only one worker is available
+    """
+    import pypdf
+    from langchain_community.document_loaders import PyPDFLoader
+
+    workers = workers or settings.pdf_parse_workers or os.cpu_count() or 1
+    try:
+        reader = pypdf.PdfReader(file_path)
+        total = len(reader.pages)
+        labels = reader.page_labels
+    except Exception:
+        # Let the regular loader report unreadable files
+        return None
+    if total < settings.pdf_parallel_min_pages or workers < 2:
+        return None
+
+    def pages() -> Iterator[Document]:
+        # The loader's first page carries the document-level metadata shared by all pages
+        first = next(iter(PyPDFLoader(file_path).lazy_load()))
+        yield first
+
+        step = max(1, min(32, (total - 1) // (workers * 4) + 1))
+        ranges = deque((start, min(start + step, total)) for start in range(1, total, step))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            while ranges or in_flight:
+                while ranges and len(in_flight) < workers * 2:
+                    start, stop = ranges.popleft()
+                    in_flight.append((start, pool.submit(_extract_page_texts, file_path, start, stop)))
+                start, future = in_flight.popleft()
+                for number, text in enumerate(future.result(), start):
+                    yield Document(
+                        page_content=text,
+                        metadata={**first.metadata, "page": number, "page_label": labels[number]}
+                    )
+
+    logger.info(f"Extracting {total} PDF pages with {workers} processes")
+    return pages()
@@ -0,0 +1,245 @@
+"""
+Query Cache Module
+
+This module provides a two-level answer cache in front of the RAG pipeline.
+The first level matches normalized questions exactly; the second level finds
+paraphrased questions by cosine similarity between query embeddings. Entries
+are scoped per collection and invalidated whenever that collection is written.
+
+Features:
+- Exact matching on the normalized question and query parameters
+- Semantic matching above a configurable cosine similarity threshold, only
+  between questions with the same numbers and identifiers (years, part numbers)
+- TTL expiry and per-collection LRU bounds
+- Ingest-aware invalidation via per-collection generation markers, which also
+  works when ingestion runs in another process
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from dedup import number_fingerprint
+from models import QueryRequest
+
+
+def _generation_path(collection: str) -> str:
+    """Location of the generation marker for a collection."""
+    return os.path.join(settings.chroma_path, "generations", collection)
+
+
+def bump_generation(collection: str) -> None:
+    """
+    Mark a collection as changed, invalidating every cached answer for it.
+
+    Called by ingestion after writing to or deleting from a collection.
+
+    Args:
+        collection (str): Name of the modified collection
+    """
+    path = _generation_path(collection)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+
+
+def current_generation(collection: str) -> str:
+    """
+    Read the generation marker of a collection.
+
+    Args:
+        collection (str): Name of the collection
+
+    Returns:
+        str: Opaque token that changes on every write ("" if never written)
+    """
+    try:
+        with open(_generation_path(collection), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a question for exact matching.
+
+    Lowercases, collapses whitespace and drops trailing punctuation, so
+    "What is RAG?" and "what is  rag" share a cache entry.
+
+    Args:
+        question (str): Raw question text
+
+    Returns:
+        str: Normalized question
+    """
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+class _CollectionCache:
+    """Entries of a single collection, valid for one generation."""
+
+    def __init__(self, generation: str):
+        self.generation = generation
+        # (answer, question embedding, number fingerprint, creation time) by (params, question)
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[str, Optional[np.ndarray], str, float]]" = OrderedDict()
+
+
+class QueryCache:
+    """
+    Two-level (exact + semantic) cache of generated answers.
+
+    Attributes:
+        max_entries (int): Maximum entries per collection before LRU eviction
+        ttl_seconds (float): Lifetime of an entry
+        similarity_threshold (float): Minimum cosine similarity for a semantic hit
+        hits (Dict[str, int]): Hit counts per level ("exact", "semantic")
+        misses (int): Lookups that found nothing
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95):
+        """
+        Args:
+            max_entries (int): Maximum entries per collection (default: 1000)
+            ttl_seconds (float): Lifetime of an entry in seconds (default: 3600)
+            similarity_threshold (float): Minimum cosine similarity for a semantic hit (default: 0.95)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self._collections: Dict[str, _CollectionCache] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _params_key(request: QueryRequest) -> str:
+        """Every request field except the question and collection, e.g. top_k."""
+        return repr(sorted(request.model_dump(exclude={"question", "collection"}).items()))
+
+    def _collection(self, collection: str) -> _CollectionCache:
+        """Entries of a collection, dropped if the collection changed since (caller holds lock)."""
+        generation = current_generation(collection)
+        cache = self._collections.get(collection)
+        if cache is None or cache.generation != generation:
+            cache = _CollectionCache(generation)
+            self._collections[collection] = cache
+        return cache
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl_seconds
+
+    def get_exact(self, request: QueryRequest) -> Optional[str]:
+        """
+        Look up an answer for exactly the same (normalized) question.
+
+        Args:
+            request (QueryRequest): Incoming query
+
+        Returns:
+            Optional[str]: Cached answer, or None on a miss
+        """
+        key = (self._params_key(request), normalize_question(request.question))
+        with self._lock:
+            cache = self._collection(request.collection)
+            entry = cache.entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[3]):
+                del cache.entries[key]
+                return None
+            cache.entries.move_to_end(key)
+            self.hits["exact"] += 1
+            return entry[0]
+
+    def get_similar(self, request: QueryRequest, vector: List[float]) -> Optional[str]:
+        """
+        Look up an answer for the most similar previously asked question.
+
+        Embeddings barely separate questions that differ only in a number
+        ("revenue in 2022" vs. "in 2023"), so only questions with the same
+        number and identifier tokens are compared.
+
+        Args:
+            request (QueryRequest): Incoming query
+            vector (List[float]): Normalized embedding of the question
+
+        Returns:
+            Optional[str]: Cached answer above the similarity threshold, or None
+        """
+        params = self._params_key(request)
+        numbers = number_fingerprint(request.question)
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            cache = self._collection(request.collection)
+            best_key, best_score = None, self.similarity_threshold
+            for key, (_, cached_vector, cached_numbers, created) in list(cache.entries.items()):
+                if key[0] != params or cached_vector is None or cached_numbers != numbers:
+                    continue
+                if self._expired(created):
+                    del cache.entries[key]
+                    continue
+                score = float(np.dot(query, cached_vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            cache.entries.move_to_end(best_key)
+            self.hits["semantic"] += 1
+            return cache.entries[best_key][0]
+
+    def put(self, request: QueryRequest, vector: Optional[List[float]], answer: str) -> None:
+        """
+        Store a generated answer.
+
+        Args:
+            request (QueryRequest): Query that produced the answer
+            vector (Optional[List[float]]): Normalized question embedding (enables semantic hits)
+            answer (str): Answer to cache
+        """
+        key = (self._params_key(request), normalize_question(request.question))
+        cached_vector = np.asarray(vector, dtype=np.float32) if vector is not None else None
+        with self._lock:
+            cache = self._collection(request.collection)
+            cache.entries[key] = (answer, cached_vector, number_fingerprint(request.question), time.time())
+            cache.entries.move_to_end(key)
+            while len(cache.entries) > self.max_entries:
+                cache.entries.popitem(last=False)
+
+    def invalidate(self, collection: Optional[str] = None) -> None:
+        """
+        Drop cached answers held by this process.
+
+        Args:
+            collection (Optional[str]): Collection to clear, or None to clear everything
+        """
+        with self._lock:
+            if collection is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(collection, None)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Report cache effectiveness.
+
+        Returns:
+            Dict[str, float]: Hits per level, misses and overall hit rate
+        """
+        hits = self.hits["exact"] + self.hits["semantic"]
+        total = hits + self.misses
+        return {
+            "exact_hits": self.hits["exact"],
+            "semantic_hits": self.hits["semantic"],
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0
+        }
@@ -0,0 +1,195 @@
+"""
+Chat Session Module
+
+This module keeps the per-conversation state of the chat: a working set of
+the chunks retrieved in recent turns together with their embeddings, and the
+turns themselves. Follow-up questions usually need the chunks that were just
+fetched, so they are scored against the working set first and the vector
+store is only searched when the working set can't supply enough relevant
+chunks. Earlier turns are sent to the LLM within a token budget.
+
+Features:
+- LRU working set of retrieved chunks and their stored embeddings
+- Working-set distances as squared L2, the scale of the relevance cutoff
+- Embeddings fetched from the store only for chunks not already in the set
+- Working set dropped when the collection is written or the filters change
+- Chat history compacted to a token budget, most recent turns first
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import settings
+from context_builder import count_tokens, truncate_tokens
+from filters import where_key
+from query_cache import current_generation
+
+# Shortest useful remainder of a turn cut to fit the history budget
+_MIN_TRUNCATED_TOKENS = 32
+
+
+class ChatSession:
+    """
+    Working set and history of one conversation.
+
+    Attributes:
+        max_chunks (int): Chunks kept in the working set before LRU eviction
+        reuse_distance (float): Squared L2 distance within which a chunk counts as relevant
+        history_tokens (int): Token budget of the history sent to the LLM
+        turns (List[Dict[str, str]]): Completed turns as chat messages, oldest first
+        hits (int): Questions answered from the working set alone
+        misses (int): Questions that needed a vector store search
+    """
+
+    def __init__(
+        self,
+        max_chunks: Optional[int] = None,
+        reuse_distance: Optional[float] = None,
+        history_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            max_chunks (Optional[int]): Working set size (default: settings.session_working_set_size)
+            reuse_distance (Optional[float]): Relevance cutoff (default: settings.session_reuse_distance)
+            history_tokens (Optional[int]): History budget (default: settings.session_history_tokens)
+        """
+        self.max_chunks = max_chunks if max_chunks is not None else settings.session_working_set_size
+        self.reuse_distance = reuse_distance if reuse_distance is not None else settings.session_reuse_distance
+        self.history_tokens = history_tokens if history_tokens is not None else settings.session_history_tokens
+        self.turns: List[Dict[str, str]] = []
+        self.hits = 0
+        self.misses = 0
+        self._chunks: "OrderedDict[str, Tuple[Document, np.ndarray]]" = OrderedDict()
+        self._scope: Optional[Tuple[str, str, str]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def bind(self, collection: str, where: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Scope the working set to a collection and filter.
+
+        The set is emptied when either changes, or when the collection was
+        written since its chunks were retrieved (they may have been replaced).
+
+        Args:
+            collection (str): Collection of the current question
+            where (Optional[Dict[str, Any]]): Filter of the current question (see filters.build_where)
+        """
+        scope = (collection, where_key(where), current_generation(collection))
+        with self._lock:
+            if scope != self._scope:
+                self._chunks.clear()
+                self._scope = scope
+
+    def search(self, query_vector: Sequence[float], k: int) -> Optional[List[Tuple[Document, float]]]:
+        """
+        Answer a vector search from the working set if it holds enough relevant chunks.
+
+        Args:
+            query_vector (Sequence[float]): Embedding of the question
+            k (int): Results wanted
+
+        Returns:
+            Optional[List[Tuple[Document, float]]]: ``k`` (document, squared L2 distance) pairs,
+                best first; None if fewer than ``k`` chunks are within ``reuse_distance``
+        """
+        with self._lock:
+            if len(self._chunks) < k:
+                self.misses += 1
+                return None
+            chunk_ids = list(self._chunks)
+            matrix = np.stack([self._chunks[chunk_id][1] for chunk_id in chunk_ids])
+            distances = ((matrix - np.asarray(query_vector, dtype=np.float32)) ** 2).sum(axis=1)
+            best = np.argsort(distances, kind="stable")[:k]
+            if distances[best[-1]] > self.reuse_distance:
+                self.misses += 1
+                return None
+            self.hits += 1
+            for i in best:
+                self._chunks.move_to_end(chunk_ids[i])
+            return [(self._chunks[chunk_ids[i]][0], float(distances[i])) for i in best]
+
+    def missing(self, hits: List[Tuple[Document, float]]) -> List[str]:
+        """
+        IDs of search results whose embeddings the working set doesn't hold yet.
+
+        Args:
+            hits (List[Tuple[Document, float]]): Vector search results
+
+        Returns:
+            List[str]: Chunk IDs to fetch embeddings for
+        """
+        with self._lock:
+            return [doc.id for doc, _ in hits if doc.id and doc.id not in self._chunks]
+
+    def remember(self, hits: List[Tuple[Document, float]], vectors: Dict[str, Sequence[float]]) -> None:
+        """
+        Add search results to the working set, evicting the least recently used chunks.
+
+        Args:
+            hits (List[Tuple[Document, float]]): Vector search results
+            vectors (Dict[str, Sequence[float]]): Stored embeddings of the results not yet in the set, by ID
+        """
+        with self._lock:
+            for doc, _ in hits:
+                if doc.id in self._chunks:
+                    self._chunks.move_to_end(doc.id)
+                elif doc.id in vectors and vectors[doc.id] is not None:
+                    self._chunks[doc.id] = (doc, np.asarray(vectors[doc.id], dtype=np.float32))
+            while len(self._chunks) > self.max_chunks:
+                self._chunks.popitem(last=False)
+
+    def record_turn(self, question: str, answer: str) -> None:
+        """
+        Append a completed question and answer to the history.
+
+        Args:
+            question (str): The user's question
+            answer (str): The answer, without source attribution
+        """
+        with self._lock:
+            self.turns.append({"role": "user", "content": question})
+            self.turns.append({"role": "assistant", "content": answer})
+
+    def history(self, max_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Recent turns as chat messages within a token budget.
+
+        Turns are taken newest first until the budget is spent; the oldest
+        one that doesn't fit is cut short if a useful part of it fits.
+
+        Args:
+            max_tokens (Optional[int]): Token budget (default: history_tokens)
+
+        Returns:
+            List[Dict[str, str]]: Messages in conversation order (empty for a new session)
+        """
+        remaining = self.history_tokens if max_tokens is None else max_tokens
+        with self._lock:
+            turns = list(self.turns)
+        messages = []
+        for message in reversed(turns):
+            tokens = count_tokens(message["content"])
+            if tokens > remaining:
+                if remaining >= _MIN_TRUNCATED_TOKENS:
+                    messages.append({"role": message["role"], "content": truncate_tokens(message["content"], remaining)})
+                break
+            messages.append(message)
+            remaining -= tokens
+        # An answer without its question would read as an unprompted statement
+        if messages and messages[-1]["role"] == "assistant":
+            messages.pop()
+        return messages[::-1]
+
+    def clear(self) -> None:
+        """Forget the working set and the history."""
+        with self._lock:
+            self._chunks.clear()
+            self._scope = None
+            self.turns.clear()
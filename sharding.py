@@ -0,0 +1,482 @@
+"""
+Collection Sharding Module
+
+This module splits one logical collection across several vector stores
+(shards) so that a collection too large for one Chroma index or flat store
+can still be searched quickly. Chunks are routed to a shard by a stable hash
+of their source file, so all chunks of a file live together and re-ingesting
+the file upserts into the same shard. Queries search every shard concurrently
+and merge the per-shard results into one global top-k by distance.
+
+get_db returns a ShardedStore for sharded collections, which implements the
+same LangChain VectorStore interface as a single store, so callers that use
+QueryRequest.collection see no difference.
+
+Features:
+- Stable routing of chunks to shards by source file
+- Parallel writes to the shards touched by an ingestion batch
+- Scatter-gather vector search merged into a global top-k
+- Batched multi-query search across all shards
+- Shard layout (count and generation) persisted per collection
+- Offline re-sharding into a new generation (python sharding.py <collection> --shards N)
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from config import settings
+from logger import logger
+from manifest import file_key
+
+T = TypeVar("T")
+
+# Searches and writes of all shards run here; created on first use
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _shard_pool() -> ThreadPoolExecutor:
+    """Thread pool shared by every sharded collection."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.shard_workers, thread_name_prefix="shard")
+        return _pool
+
+
+def shard_of(source: str, shards: int) -> int:
+    """
+    Pick the shard of a source file.
+
+    The hash is computed from the normalized absolute path, so it is stable
+    across processes and restarts (unlike Python's built-in hash).
+
+    Args:
+        source (str): Source file path (chunk metadata "source")
+        shards (int): Number of shards
+
+    Returns:
+        int: Shard number in ``range(shards)``
+    """
+    digest = hashlib.sha1(file_key(source).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def layout_dir(collection: str) -> str:
+    """Directory holding the shards and layout file of a collection."""
+    return os.path.join(os.path.abspath(settings.chroma_path), "shards", collection)
+
+
+def shard_path(collection: str, generation: int, shard: int) -> str:
+    """Persist directory of one shard of one layout generation."""
+    return os.path.join(layout_dir(collection), f"g{generation}-{shard}")
+
+
+def read_layout(collection: str) -> Optional[Dict[str, int]]:
+    """
+    Read the shard layout of a collection.
+
+    Args:
+        collection (str): Collection name
+
+    Returns:
+        Optional[Dict[str, int]]: {"shards": count, "generation": number}, or None if unsharded
+    """
+    try:
+        with open(os.path.join(layout_dir(collection), "layout.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_layout(collection: str, shards: int, generation: int) -> Dict[str, int]:
+    """
+    Atomically replace the shard layout of a collection.
+
+    Args:
+        collection (str): Collection name
+        shards (int): Number of shards
+        generation (int): Layout generation; each re-shard writes into a new one
+
+    Returns:
+        Dict[str, int]: The written layout
+    """
+    layout = {"shards": shards, "generation": generation}
+    os.makedirs(layout_dir(collection), exist_ok=True)
+    path = os.path.join(layout_dir(collection), "layout.json")
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(layout, f)
+    os.replace(tmp, path)
+    return layout
+
+
+class ShardedStore(VectorStore):
+    """
+    One logical collection spread over several vector stores.
+
+    Writes are grouped by shard and the touched shards are written in
+    parallel; deletes are broadcast because chunk IDs don't name their file.
+    Distances of all backends are squared L2 distances of unit vectors, so
+    per-shard results can be merged directly.
+
+    Attributes:
+        collection (str): Logical collection name
+        shards (List[VectorStore]): One store per shard, in shard order
+        generation (int): Layout generation the shards belong to
+    """
+
+    def __init__(self, collection: str, shards: List[VectorStore], embedding: Embeddings, generation: int = 0):
+        """
+        Wrap already opened shard stores.
+
+        Args:
+            collection (str): Logical collection name
+            shards (List[VectorStore]): One store per shard, in shard order
+            embedding (Embeddings): Embedding model for texts and queries
+            generation (int): Layout generation the shards belong to
+        """
+        if not shards:
+            raise ValueError("A sharded collection needs at least one shard")
+        self.collection = collection
+        self.shards = shards
+        self.generation = generation
+        self._embedding = embedding
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Embedding model used for texts and queries."""
+        return self._embedding
+
+    def _scatter(self, work: Callable[[VectorStore, Any], T], items: Iterable[Tuple[int, Any]]) -> List[T]:
+        """Run ``work(shard, item)`` for each (shard number, item) pair concurrently."""
+        items = list(items)
+        if len(items) == 1:
+            shard, item = items[0]
+            return [work(self.shards[shard], item)]
+        pool = _shard_pool()
+        return list(pool.map(lambda pair: work(self.shards[pair[0]], pair[1]), items))
+
+    def _broadcast(self, work: Callable[[VectorStore], T]) -> List[T]:
+        """Run ``work(shard)`` on every shard concurrently; results in shard order."""
+        return self._scatter(lambda shard, _: work(shard), ((i, None) for i in range(len(self.shards))))
+
+    def _route(self, documents: Sequence[Document]) -> Dict[int, List[int]]:
+        """Group document positions by the shard of their source file."""
+        groups: Dict[int, List[int]] = {}
+        for position, doc in enumerate(documents):
+            source = (doc.metadata or {}).get("source", "")
+            groups.setdefault(shard_of(source, len(self.shards)), []).append(position)
+        return groups
+
+    def __len__(self) -> int:
+        """Number of chunks across all shards."""
+        return sum(self._broadcast(_count))
+
+    def add_embedded(self, documents: List[Document], vectors: List[List[float]], ids: List[str]) -> None:
+        """
+        Store documents whose embeddings have already been computed.
+
+        Args:
+            documents (List[Document]): Chunks to store
+            vectors (List[List[float]]): One embedding per chunk
+            ids (List[str]): One ID per chunk
+        """
+        from utils import add_embedded_documents
+
+        def write(shard: VectorStore, positions: List[int]) -> None:
+            add_embedded_documents(
+                shard,
+                [documents[i] for i in positions],
+                [vectors[i] for i in positions],
+                [ids[i] for i in positions]
+            )
+
+        self._scatter(write, self._route(documents).items())
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """
+        Embed documents once and write them to their shards in parallel.
+
+        Args:
+            documents (List[Document]): Chunks to store
+            ids (Optional[List[str]]): One ID per chunk (default: random UUIDs)
+
+        Returns:
+            List[str]: IDs of the stored chunks
+        """
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in documents]
+        if not documents:
+            return ids
+        vectors = self._embedding.embed_documents([doc.page_content for doc in documents])
+        self.add_embedded(list(documents), vectors, ids)
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        """Embed and store texts; see add_documents."""
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        return self.add_documents(
+            [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)],
+            ids=ids
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete chunks by ID from every shard."""
+        if not ids:
+            return False
+        self._broadcast(lambda shard: shard.delete(ids=ids))
+        return True
+
+    def similarity_search_by_vectors_with_relevance_scores(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Search every shard with a batch of queries and merge the results.
+
+        Args:
+            embeddings (Sequence[Sequence[float]]): Query embeddings
+            k (int): Results per query
+            filter (Optional[Dict[str, Any]]): Chroma-style ``where`` clause, applied in every shard
+
+        Returns:
+            List[List[Tuple[Document, float]]]: Per query, (document, distance) pairs, best first
+        """
+        from utils import search_store
+
+        embeddings = [list(vector) for vector in embeddings]
+        per_shard = self._broadcast(lambda shard: search_store(shard, embeddings, k, filter))
+        return [
+            heapq.nsmallest(k, (hit for hits in per_shard for hit in hits[query]), key=lambda hit: hit[1])
+            for query in range(len(embeddings))
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """
+        Find the chunks closest to an embedding across all shards.
+
+        Args:
+            embedding (List[float]): Query embedding
+            k (int): Number of results
+            filter (Optional[Dict[str, Any]]): Chroma-style ``where`` clause, applied in every shard
+
+        Returns:
+            List[Tuple[Document, float]]: (document, squared L2 distance) pairs, best first
+        """
+        per_shard = self._broadcast(
+            lambda shard: shard.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+        )
+        return heapq.nsmallest(k, (hit for hits in per_shard for hit in hits), key=lambda hit: hit[1])
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Embed a query and return (document, distance) pairs, best first."""
+        return self.similarity_search_by_vector_with_relevance_scores(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        """Embed a query and return the closest documents."""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Document]:
+        """Return the documents closest to an embedding."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        """Map squared L2 distances of unit vectors to a 0-1 relevance score."""
+        return self._euclidean_relevance_score_fn
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> Dict[str, List]:
+        """
+        Read stored chunks, Chroma style.
+
+        Lookups by ID ask every shard concurrently; paging walks the shards
+        in order, so ``limit``/``offset`` page through the whole collection.
+
+        Args:
+            ids (Optional[Sequence[str]]): IDs to read (default: all)
+            limit (Optional[int]): Maximum chunks to return
+            offset (Optional[int]): Chunks to skip
+            include (Optional[List[str]]): Fields to return ("documents", "metadatas", "embeddings")
+
+        Returns:
+            Dict[str, List]: "ids", "documents" and "metadatas" lists, plus "embeddings" if requested
+        """
+        include = include or ["documents", "metadatas"]
+        fields = ["ids", "documents", "metadatas"] + (["embeddings"] if "embeddings" in include else [])
+        found: Dict[str, List] = {field: [] for field in fields}
+
+        def extend(batch: Dict) -> None:
+            for field in fields:
+                values = batch.get(field)
+                found[field].extend(list(values) if values is not None else [None] * len(batch["ids"]))
+
+        if ids is not None:
+            ids = list(ids)
+            for batch in self._broadcast(lambda shard: shard.get(ids=ids, include=include)):
+                extend(batch)
+            return found
+
+        skip = offset or 0
+        remaining = limit
+        for shard in self.shards:
+            if remaining is not None and remaining <= 0:
+                break
+            count = _count(shard)
+            if skip >= count:
+                skip -= count
+                continue
+            batch = shard.get(limit=remaining, offset=skip, include=include)
+            extend(batch)
+            skip = 0
+            if remaining is not None:
+                remaining -= len(batch["ids"])
+        return found
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[Dict]] = None,
+        **kwargs: Any
+    ) -> "ShardedStore":
+        """Not supported; sharded collections are opened with utils.get_db."""
+        raise NotImplementedError("Sharded collections are opened with utils.get_db")
+
+
+def _count(store: VectorStore) -> int:
+    """Number of chunks in a single (unsharded) store."""
+    from flat_store import FlatVectorStore
+
+    if isinstance(store, FlatVectorStore):
+        return len(store)
+    return store._collection.count()
+
+
+def reshard(collection: str, shards: int, batch_size: int = 1000) -> int:
+    """
+    Copy a collection into a new set of shards, offline.
+
+    Chunks are copied with their stored embeddings (nothing is re-embedded)
+    into a new layout generation; the layout file is switched atomically once
+    the copy is complete, and the previous shards (or the unsharded store)
+    are deleted afterwards. Run it while nothing writes to the collection;
+    processes that already opened the collection must be restarted.
+
+    Args:
+        collection (str): Collection to re-shard (sharded or not)
+        shards (int): New number of shards
+        batch_size (int): Chunks copied per read
+
+    Returns:
+        int: Number of chunks copied
+
+    Raises:
+        ValueError: If shards is less than 1
+    """
+    import utils
+
+    if shards < 1:
+        raise ValueError("shards must be at least 1")
+    backend = settings.vector_backend
+    old = read_layout(collection)
+    source = utils.get_db(collection)
+    generation = old["generation"] + 1 if old else 1
+    target = ShardedStore(
+        collection,
+        [utils.open_store(shard_path(collection, generation, i), collection, backend) for i in range(shards)],
+        utils.embeddings,
+        generation
+    )
+
+    copied = 0
+    while True:
+        batch = source.get(limit=batch_size, offset=copied, include=["documents", "metadatas", "embeddings"])
+        if not batch["ids"]:
+            break
+        documents = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(batch["documents"], batch["metadatas"])
+        ]
+        vectors = [[float(x) for x in vector] for vector in batch["embeddings"]]
+        target.add_embedded(documents, vectors, list(batch["ids"]))
+        copied += len(batch["ids"])
+        logger.info(f"Re-sharding {collection}: {copied} chunks copied")
+
+    # The new layout is live once written; then drop the data it replaced
+    write_layout(collection, shards, generation)
+    if old:
+        for i in range(old["shards"]):
+            path = shard_path(collection, old["generation"], i)
+            utils.drop_store(path, collection, backend)
+            shutil.rmtree(path, ignore_errors=True)
+    else:
+        utils.drop_store(os.path.abspath(settings.chroma_path), collection, backend)
+    utils.invalidate_db(collection)
+    logger.success(f"Collection {collection} re-sharded into {shards} shards ({copied} chunks)")
+    return copied
+
+
+def main() -> None:
+    """Command line entry point for offline re-sharding."""
+    parser = argparse.ArgumentParser(description="Re-shard a collection offline.")
+    parser.add_argument("collection", nargs="?", default="default", help="Collection name")
+    parser.add_argument("--shards", type=int, required=True, help="New number of shards")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Chunks copied per read")
+    args = parser.parse_args()
+    reshard(args.collection, args.shards, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
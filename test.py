@@ -6,9 +6,16 @@ Run with: python -m pytest test.py -v
 """
 
 import pytest
+import asyncio
+import json
 import os
+import subprocess
+import sys
 import tempfile
-from unittest.mock import Mock, patch
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, Mock, patch
 
 # Import application modules
 from config import settings
@@ -73,21 +80,23 @@ class TestLogger:
 class TestUtils:
     """Test utility functions."""
 
+    @patch.object(settings, 'query_cache_enabled', False)
+    @patch('utils.embeddings')
     @patch('utils.get_db')
     @patch('groq.Groq')
-    def test_query_rag_success(self, mock_groq_class, mock_get_db):
+    def test_query_rag_success(self, mock_groq_class, mock_get_db, mock_embeddings):
         """Test successful RAG query."""
         # Mock the database
         mock_db = Mock()
         mock_docs = [
             Mock(page_content="Test content", metadata={"source": "test.pdf"})
         ]
-        mock_db.similarity_search_with_score.return_value = [(mock_docs[0], 0.1)]
+        mock_db.similarity_search_by_vector_with_relevance_scores.return_value = [(mock_docs[0], 0.1)]
         mock_get_db.return_value = mock_db
 
         # Mock Groq client
         mock_client = Mock()
-        mock_response = Mock()
+        mock_response = MagicMock()
         mock_response.choices[0].message.content = "Test answer"
         mock_client.chat.completions.create.return_value = mock_response
         mock_groq_class.return_value = mock_client
@@ -99,7 +108,9 @@ class TestUtils:
         assert "Test answer" in result
         assert "test.pdf" in result
 
-    def test_query_rag_no_relevant_docs(self):
+    @patch.object(settings, 'query_cache_enabled', False)
+    @patch('utils.embeddings')
+    def test_query_rag_no_relevant_docs(self, mock_embeddings):
         """Test RAG query with no relevant documents."""
         from utils import query_rag
         request = QueryRequest(question="nonexistent topic")
@@ -107,12 +118,592 @@ class TestUtils:
         # Mock empty results
         with patch('utils.get_db') as mock_get_db:
             mock_db = Mock()
-            mock_db.similarity_search_with_score.return_value = []
+            mock_db.similarity_search_by_vector_with_relevance_scores.return_value = []
             mock_get_db.return_value = mock_db
 
             result = query_rag(request)
             assert "No relevant information found" in result
 
+    @patch.object(settings, 'query_cache_enabled', False)
+    @patch('utils.embeddings')
+    @patch('utils.get_db')
+    @patch('groq.Groq')
+    def test_query_rag_stream_yields_tokens_then_sources(self, mock_groq_class, mock_get_db, mock_embeddings):
+        """Test streaming RAG query."""
+        mock_db = Mock()
+        mock_db.similarity_search_by_vector_with_relevance_scores.return_value = [
+            (Mock(page_content="Test content", metadata={"source": "test.pdf"}), 0.1)
+        ]
+        mock_get_db.return_value = mock_db
+
+        chunks = []
+        for token in ["Test", None, " answer"]:
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = token
+            chunks.append(chunk)
+        mock_groq_class.return_value.chat.completions.create.return_value = iter(chunks)
+
+        from utils import query_rag_stream
+        pieces = list(query_rag_stream(QueryRequest(question="What is AI?")))
+
+        assert pieces == ["Test", " answer", "\n\nSources: test.pdf"]
+        assert mock_groq_class.return_value.chat.completions.create.call_args.kwargs["stream"] is True
+
+    @patch.object(settings, 'query_cache_enabled', False)
+    @patch('utils.embeddings')
+    @patch('utils.get_db')
+    @patch('groq.Groq')
+    def test_query_rag_stream_handles_groq_failure(self, mock_groq_class, mock_get_db, mock_embeddings):
+        """Test that a failing stream degrades to the usual message."""
+        mock_db = Mock()
+        mock_db.similarity_search_by_vector_with_relevance_scores.return_value = [
+            (Mock(page_content="Test content", metadata={"source": "test.pdf"}), 0.1)
+        ]
+        mock_get_db.return_value = mock_db
+        mock_groq_class.return_value.chat.completions.create.side_effect = RuntimeError("down")
+
+        from utils import query_rag_stream
+        assert list(query_rag_stream(QueryRequest(question="What is AI?"))) == [
+            "Temporary issue. Try again in 10 seconds."
+        ]
+
+    @patch('chromadb.PersistentClient')
+    @patch('langchain_community.vectorstores.Chroma')
+    def test_get_db_reuses_handles(self, mock_chroma_class, mock_client_class):
+        """Test that vector store handles are cached per collection."""
+        from utils import get_db, invalidate_db
+        invalidate_db()
+        mock_chroma_class.side_effect = lambda **kwargs: Mock()
+
+        first = get_db("docs")
+        assert get_db("docs") is first
+        assert get_db("other") is not first
+        mock_client_class.assert_called_once()
+
+        invalidate_db("docs")
+        assert get_db("docs") is not first
+        invalidate_db()
+
+    @patch('chromadb.PersistentClient')
+    @patch('langchain_community.vectorstores.Chroma')
+    def test_get_db_evicts_least_recently_used(self, mock_chroma_class, mock_client_class):
+        """Test LRU eviction of vector store handles."""
+        from utils import get_db, invalidate_db
+        invalidate_db()
+        mock_chroma_class.side_effect = lambda **kwargs: Mock()
+
+        with patch.object(settings, 'db_handle_cache_size', 2):
+            first = get_db("one")
+            get_db("two")
+            get_db("one")
+            get_db("three")
+            assert get_db("one") is first
+            assert mock_chroma_class.call_count == 3
+            get_db("two")
+            assert mock_chroma_class.call_count == 4
+        invalidate_db()
+
+
+class TestQueryCache:
+    """Test the exact and semantic query cache."""
+
+    def test_exact_hit_ignores_case_and_punctuation(self):
+        """Test that normalized questions share an entry."""
+        from query_cache import QueryCache
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            cache = QueryCache()
+            cache.put(QueryRequest(question="What is RAG?"), [1.0, 0.0], "answer")
+            assert cache.get_exact(QueryRequest(question="what  is rag")) == "answer"
+            assert cache.get_exact(QueryRequest(question="What is RAG?", top_k=3)) is None
+            assert cache.get_exact(QueryRequest(question="What is RAG?", collection="other")) is None
+
+    def test_semantic_hit_above_threshold(self):
+        """Test that similar question embeddings reuse an answer."""
+        from query_cache import QueryCache
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            cache = QueryCache(similarity_threshold=0.9)
+            cache.put(QueryRequest(question="What is RAG?"), [1.0, 0.0], "answer")
+            request = QueryRequest(question="Explain RAG")
+            assert cache.get_similar(request, [0.95, 0.312]) == "answer"
+            assert cache.get_similar(request, [0.6, 0.8]) is None
+            assert cache.stats()["semantic_hits"] == 1
+
+    def test_semantic_hit_needs_same_numbers(self):
+        """Test that questions differing only in a number never share an answer."""
+        from query_cache import QueryCache
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            cache = QueryCache(similarity_threshold=0.9)
+            cache.put(QueryRequest(question="What was the revenue in 2022?"), [1.0, 0.0], "revenue 2022")
+            assert cache.get_similar(QueryRequest(question="What was the revenue in 2023?"), [1.0, 0.0]) is None
+            assert cache.get_similar(QueryRequest(question="Revenue in 2022?"), [0.99, 0.141]) == "revenue 2022"
+            cache.put(QueryRequest(question="Warranty of part PN-4012?"), [0.0, 1.0], "PN-4012")
+            assert cache.get_similar(QueryRequest(question="Warranty of part PN-4013?"), [0.0, 1.0]) is None
+
+    def test_ttl_and_lru_expiry(self):
+        """Test that entries expire by age and by LRU bound."""
+        from query_cache import QueryCache
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            cache = QueryCache(max_entries=2, ttl_seconds=60)
+            for question in ["first one", "second one", "third one"]:
+                cache.put(QueryRequest(question=question), None, question)
+            assert cache.get_exact(QueryRequest(question="first one")) is None
+            assert cache.get_exact(QueryRequest(question="third one")) == "third one"
+            with patch('query_cache.time.time', return_value=__import__('time').time() + 120):
+                assert cache.get_exact(QueryRequest(question="third one")) is None
+
+    def test_ingest_invalidates_collection(self):
+        """Test that bumping a collection's generation drops only its entries."""
+        from query_cache import QueryCache, bump_generation
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            cache = QueryCache()
+            cache.put(QueryRequest(question="What is RAG?"), None, "a")
+            cache.put(QueryRequest(question="What is RAG?", collection="other"), None, "b")
+            bump_generation("default")
+            assert cache.get_exact(QueryRequest(question="What is RAG?")) is None
+            assert cache.get_exact(QueryRequest(question="What is RAG?", collection="other")) == "b"
+
+    @patch('utils.embeddings')
+    @patch('utils.get_db')
+    @patch('groq.Groq')
+    def test_query_rag_reuses_cached_answer(self, mock_groq_class, mock_get_db, mock_embeddings):
+        """Test that repeated questions skip search and LLM until the next ingest."""
+        from query_cache import QueryCache, bump_generation
+        from utils import query_rag
+        mock_embeddings.embed_query.return_value = [1.0, 0.0]
+        mock_db = Mock()
+        mock_db.similarity_search_by_vector_with_relevance_scores.return_value = [
+            (Mock(page_content="Context", metadata={"source": "a.pdf"}), 0.1)
+        ]
+        mock_get_db.return_value = mock_db
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = "Cached answer"
+        mock_groq_class.return_value.chat.completions.create.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch('utils.query_cache', QueryCache()):
+            first = query_rag(QueryRequest(question="What is RAG?"))
+            assert query_rag(QueryRequest(question="what is rag")) == first
+            assert query_rag(QueryRequest(question="Tell me about RAG")) == first
+            assert mock_groq_class.return_value.chat.completions.create.call_count == 1
+
+            bump_generation("default")
+            query_rag(QueryRequest(question="What is RAG?"))
+            assert mock_groq_class.return_value.chat.completions.create.call_count == 2
+
+
+class TestChatSession:
+    """Test the per-conversation working set and token-budgeted history."""
+
+    def test_history_is_token_budgeted(self):
+        """Test that the newest turns are kept, cut to the budget and start with a question."""
+        from context_builder import count_tokens
+        from session import ChatSession
+        session = ChatSession(history_tokens=200)
+        assert session.history() == []
+        for i in range(5):
+            session.record_turn(f"Question {i}?", f"Answer {i} " + "detail " * 60)
+        history = session.history()
+        assert history[-1]["content"].startswith("Answer 4") and history[0]["role"] == "user"
+        assert sum(count_tokens(message["content"]) for message in history) <= 200
+        assert len(session.history(max_tokens=10000)) == 10
+
+    def test_follow_up_reuses_working_set(self):
+        """Test that a follow-up is answered from the working set until the collection or filters change."""
+        from langchain_core.documents import Document
+        from benchmarks.common import HashEmbeddings
+        from query_cache import bump_generation
+        from session import ChatSession
+        import utils
+        model = HashEmbeddings()
+        texts = [f"section {i} of the pump manual covers valve {i % 5}" for i in range(40)]
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'vector_backend', 'flat'):
+            utils.invalidate_db()
+            utils.add_embedded_documents(
+                utils.get_db("manuals"), [Document(page_content=text, metadata={"source": "m.pdf"}) for text in texts],
+                model.embed_documents(texts), [str(i) for i in range(40)]
+            )
+            session = ChatSession(reuse_distance=2.0)
+            request = QueryRequest(question="valve 3 in the pump manual", collection="manuals", top_k=4)
+            vector = model.embed_query(request.question)
+            first = utils._session_vector_hits(request, vector, session)
+            assert len(session) == 4 and session.misses == 1
+
+            with patch('utils.search_store', side_effect=AssertionError("store searched")):
+                again = utils._session_vector_hits(request, vector, session)
+            assert session.hits == 1
+            assert [score for _, score in again] == pytest.approx([score for _, score in first], abs=1e-3)
+
+            bump_generation("manuals")
+            utils._session_vector_hits(request, vector, session)
+            filtered = QueryRequest(question=request.question, collection="manuals", top_k=4, sources=["other.pdf"])
+            assert utils._session_vector_hits(filtered, vector, session) == [] and len(session) == 0
+            assert session.misses == 3
+            utils.invalidate_db()
+
+    @patch('utils.embeddings')
+    @patch('utils.get_db')
+    @patch('groq.Groq')
+    def test_query_rag_sends_history_and_skips_cache(self, mock_groq_class, mock_get_db, mock_embeddings):
+        """Test that follow-ups carry earlier turns to the LLM and bypass the query cache."""
+        from query_cache import QueryCache
+        from session import ChatSession
+        from utils import query_rag
+        mock_embeddings.embed_query.return_value = [1.0, 0.0]
+        mock_db = Mock()
+        mock_db._collection.query.return_value = {
+            "ids": [["c1"]], "documents": [["Context"]], "metadatas": [[{"source": "a.pdf"}]], "distances": [[0.1]]
+        }
+        mock_db.get.return_value = {"ids": ["c1"], "embeddings": [[1.0, 0.0]]}
+        mock_get_db.return_value = mock_db
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = "RAG retrieves, then generates."
+        create = mock_groq_class.return_value.chat.completions.create
+        create.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch('utils.query_cache', QueryCache()):
+            session = ChatSession()
+            query_rag(QueryRequest(question="What is RAG?", retrieval_mode="vector", top_k=1), session)
+            query_rag(QueryRequest(question="What is RAG?", retrieval_mode="vector", top_k=1), session)
+            assert create.call_count == 2
+            messages = create.call_args.kwargs["messages"]
+            assert messages[1:3] == [
+                {"role": "user", "content": "What is RAG?"},
+                {"role": "assistant", "content": "RAG retrieves, then generates."}
+            ]
+            # The follow-up was served from the working set
+            assert mock_db._collection.query.call_count == 1 and session.hits == 1
+
+
+class _StubGroqHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible chat completions endpoint."""
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with server.lock:
+            server.calls += 1
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+            status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        if status == 200:
+            body = {
+                "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Stub answer"}}]
+            }
+        else:
+            body = {"error": {"message": "rate limited"}}
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncQuery:
+    """Test the async query path against a local stub of the Groq API."""
+
+    @pytest.fixture
+    def stub_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGroqHandler)
+        server.lock = threading.Lock()
+        server.calls, server.in_flight, server.peak = 0, 0, 0
+        server.statuses, server.delay = [], 0.0
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    def _client(self, server, **kwargs):
+        from llm_client import AsyncLLMClient
+        return AsyncLLMClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}", **kwargs)
+
+    def test_retries_rate_limited_requests(self, stub_server):
+        """Test that a 429 is retried and the later success is returned."""
+        stub_server.statuses = [429, 503]
+
+        async def run():
+            client = self._client(stub_server, backoff_base=0.01)
+            try:
+                return await client.complete([{"role": "user", "content": "hi"}])
+            finally:
+                await client.aclose()
+
+        assert asyncio.run(run()) == "Stub answer"
+        assert stub_server.calls == 3
+
+    def test_concurrency_is_bounded(self, stub_server):
+        """Test that no more than max_concurrency requests are in flight."""
+        stub_server.delay = 0.05
+
+        async def run():
+            client = self._client(stub_server, max_concurrency=3)
+            try:
+                return await asyncio.gather(*[
+                    client.complete([{"role": "user", "content": str(i)}]) for i in range(12)
+                ])
+            finally:
+                await client.aclose()
+
+        assert asyncio.run(run()) == ["Stub answer"] * 12
+        assert stub_server.peak <= 3
+
+    @patch.object(settings, 'query_cache_enabled', False)
+    @patch('utils.embeddings')
+    @patch('utils.get_db')
+    def test_aquery_rag_end_to_end(self, mock_get_db, mock_embeddings, stub_server):
+        """Test the async RAG query with retrieval and the pooled client."""
+        mock_db = Mock()
+        mock_db.similarity_search_by_vector_with_relevance_scores.return_value = [
+            (Mock(page_content="Test content", metadata={"source": "test.pdf"}), 0.1)
+        ]
+        mock_get_db.return_value = mock_db
+
+        from utils import aquery_rag
+        with patch.object(settings, 'groq_base_url', f"http://127.0.0.1:{stub_server.server_port}"):
+            answer = asyncio.run(aquery_rag(QueryRequest(question="What is AI?")))
+
+        assert answer == "Stub answer\n\nSources: test.pdf"
+
+    def test_pooled_client_closed_with_its_loop(self):
+        """Test that each event loop gets one client, closed when asyncio.run() finishes."""
+        from llm_client import get_async_llm
+
+        async def run():
+            return get_async_llm(), get_async_llm()
+
+        first, again = asyncio.run(run())
+        assert first is again and first._http.is_closed
+        second, _ = asyncio.run(run())
+        assert second is not first and second._http.is_closed
+
+
+class TestBatchQuery:
+    """Test bulk question answering with resumable JSONL output."""
+
+    @pytest.fixture
+    def stub_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGroqHandler)
+        server.lock = threading.Lock()
+        server.calls, server.in_flight, server.peak = 0, 0, 0
+        server.statuses, server.delay = [], 0.0
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    @pytest.mark.parametrize("backend", ["chroma", "flat"])
+    def test_search_by_vectors_matches_single_searches(self, backend):
+        """Test that a bulk vector search returns what one search per vector returns."""
+        from langchain_core.documents import Document
+        from benchmarks.common import HashEmbeddings
+        from utils import add_embedded_documents, get_db, invalidate_db, search_by_vectors
+        model = HashEmbeddings()
+        texts = ["solar panels", "wind turbines", "battery storage", "grid inverters"]
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'vector_backend', backend), \
+                patch('utils.embeddings', model):
+            db = get_db("bulk")
+            add_embedded_documents(
+                db, [Document(page_content=text, metadata={"source": f"{i}.txt"}) for i, text in enumerate(texts)],
+                model.embed_documents(texts), [str(i) for i in range(len(texts))]
+            )
+            queries = model.embed_documents(["solar", "battery", "wind"])
+            bulk = search_by_vectors("bulk", queries, k=2)
+            single = [db.similarity_search_by_vector_with_relevance_scores(query, k=2) for query in queries]
+            assert [[doc.page_content for doc, _ in hits] for hits in bulk] == \
+                [[doc.page_content for doc, _ in hits] for hits in single]
+            assert bulk[0][0][0].metadata["source"] == single[0][0][0].metadata["source"]
+            assert [score for _, score in bulk[1]] == pytest.approx([score for _, score in single[1]], abs=1e-4)
+            invalidate_db()
+
+    @patch.object(settings, 'query_cache_enabled', False)
+    def test_batch_streams_results_and_resumes(self, stub_server):
+        """Test one embedding pass per chunk, per-item results, and resuming after failures and a crash."""
+        from batch_query import run_batch
+        hit = (Mock(page_content="Test content", metadata={"source": "test.pdf"}), 0.1)
+        questions = [QueryRequest(question=f"Question number {i}?", retrieval_mode="vector") for i in range(3)]
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'groq_base_url', f"http://127.0.0.1:{stub_server.server_port}"), \
+                patch('utils.embed_queries', side_effect=lambda qs: [[1.0, 0.0]] * len(qs)) as embed, \
+                patch('utils.search_by_vectors', side_effect=lambda c, vs, k, where=None, squared_l2=False: [[hit]] * len(vs)) as search, \
+                patch('utils.get_db', side_effect=AssertionError("store opened despite precomputed hits")):
+            output = os.path.join(tmp, "answers.jsonl")
+            # The first LLM call is rejected with a non-retryable error
+            stub_server.statuses = [400]
+            report = run_batch(questions, output, concurrency=2)
+            assert (report.total, report.answered, report.failed, report.skipped) == (3, 2, 1, 0)
+            assert embed.call_count == 1 and len(embed.call_args[0][0]) == 3
+            assert search.call_count == 1
+
+            with open(output, encoding="utf-8") as f:
+                results = [json.loads(line) for line in f]
+            ok = [r for r in results if r["status"] == "ok"]
+            assert [r["answer"] for r in ok] == ["Stub answer\n\nSources: test.pdf"] * 2
+            assert ok[0]["sources"] == ["test.pdf"]
+            assert {"embed", "vector_search", "retrieval", "llm", "total"} <= set(ok[0]["timings_ms"])
+            failed = next(r for r in results if r["status"] == "failed")
+
+            # A crash mid-write leaves a partial line; the rerun drops it and only retries the failure
+            with open(output, "a", encoding="utf-8") as f:
+                f.write('{"id": "2", "sta')
+            report = run_batch(questions, output)
+            assert (report.answered, report.failed, report.skipped) == (1, 0, 2)
+            assert embed.call_args[0][0] == [questions[int(failed["id"]) - 1].question]
+            with open(output, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            assert len(lines) == 4 and (lines[-1]["id"], lines[-1]["status"]) == (failed["id"], "ok")
+
+    def test_load_requests_validates_lines(self):
+        """Test JSONL input parsing, default ids and error reporting."""
+        from batch_query import load_requests
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "questions.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('{"id": "faq-1", "question": "What is solar power?", "collection": "energy"}\n\n')
+                f.write('{"question": "How do batteries work?", "top_k": 3}\n')
+            items = load_requests(path)
+            assert [item_id for item_id, _ in items] == ["faq-1", "3"]
+            assert (items[0][1].collection, items[1][1].top_k) == ("energy", 3)
+
+            with open(path, "a", encoding="utf-8") as f:
+                f.write('{"question": ""}\n')
+            with pytest.raises(ValueError, match="questions.jsonl:4"):
+                load_requests(path)
+
+
+class TestMetrics:
+    """Test stage timing, counters and the Prometheus endpoint."""
+
+    def test_spans_exclude_nested_stages(self):
+        """Test exclusive stage times, same-stage merging and structured records."""
+        import metrics
+        metrics.reset()
+        records = []
+        sink = logger.add(records.append, level="DEBUG", filter=lambda record: "metric" in record["extra"])
+        try:
+            with metrics.span("store"):
+                time.sleep(0.01)
+                with metrics.span("embed"):
+                    with metrics.span("embed"):
+                        time.sleep(0.05)
+        finally:
+            logger.remove(sink)
+
+        assert metrics.stage_seconds.count(stage="embed") == 1
+        assert metrics.stage_seconds.total(stage="embed") >= 0.05
+        assert 0.01 <= metrics.stage_seconds.total(stage="store") < 0.05
+        assert [r.record["extra"]["stage"] for r in records] == ["embed", "store"]
+        assert records[0].record["extra"]["metric"] == "rag_stage_seconds"
+
+        text = metrics.render()
+        assert '# TYPE rag_stage_seconds histogram' in text
+        assert 'rag_stage_seconds_count{stage="embed"} 1' in text
+        assert 'rag_stage_seconds_bucket{stage="embed",le="+Inf"} 1' in text
+        assert 'rag_stage_seconds_bucket{stage="embed",le="0.01"} 0' in text
+
+    @patch('utils.embeddings')
+    @patch('utils.get_db')
+    @patch('groq.Groq')
+    def test_query_records_stages_tokens_and_cache(self, mock_groq_class, mock_get_db, mock_embeddings):
+        """Test that a query records every stage, token usage and cache lookups."""
+        import metrics
+        from query_cache import QueryCache
+        from utils import query_rag
+        metrics.reset()
+        mock_embeddings.embed_query.return_value = [1.0, 0.0]
+        mock_get_db.return_value.similarity_search_by_vector_with_relevance_scores.return_value = [
+            (Mock(page_content="Context", metadata={"source": "a.pdf"}), 0.1)
+        ]
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = "Answer"
+        mock_response.usage.prompt_tokens = 120
+        mock_response.usage.completion_tokens = 30
+        mock_groq_class.return_value.chat.completions.create.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch('utils.query_cache', QueryCache()):
+            query_rag(QueryRequest(question="What is RAG?"))
+            query_rag(QueryRequest(question="What is RAG?"))
+
+        for stage in ("query_embed", "vector_search", "keyword_search", "context_build", "llm"):
+            assert metrics.stage_seconds.count(stage=stage) == 1, stage
+        assert metrics.llm_tokens.value(kind="prompt") == 120
+        assert metrics.llm_tokens.value(kind="completion") == 30
+        assert metrics.chunks.value(event="retrieved") == 1
+        assert metrics.cache_lookups.value(cache="query", result="miss") == 1
+        assert metrics.cache_lookups.value(cache="query", result="exact") == 1
+
+    def test_metrics_endpoint(self):
+        """Test that the endpoint serves the Prometheus text on /metrics only."""
+        import urllib.error
+        import urllib.request
+        import metrics
+        metrics.reset()
+        metrics.llm_tokens.inc(5, kind="prompt")
+        server = metrics.serve(0)
+        assert metrics.serve(0) is server
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'rag_llm_tokens_total{kind="prompt"} 5' in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+
+
+class TestStartup:
+    """Test lazy imports and model loading."""
+
+    def test_import_has_no_heavy_side_effects(self):
+        """Test that importing utils loads neither torch nor the model nor log files."""
+        code = (
+            "import os, sys; import utils; "
+            "assert 'torch' not in sys.modules; "
+            "assert 'sentence_transformers' not in sys.modules; "
+            "assert 'chromadb' not in sys.modules; "
+            "assert not utils.embedding_model.loaded; "
+            "assert not os.path.exists('logs')"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, GROQ_API_KEY="test", PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+            result = subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, capture_output=True, text=True)
+            assert result.returncode == 0, result.stderr
+
+    def test_lazy_embeddings_load_once(self):
+        """Test that the model factory runs once, on first use."""
+        from utils import LazyEmbeddings
+        model = Mock()
+        model.embed_query.return_value = [1.0]
+        factory = Mock(return_value=model)
+
+        lazy = LazyEmbeddings(factory)
+        factory.assert_not_called()
+        assert lazy.embed_query("a") == [1.0]
+        lazy.embed_documents(["b"])
+        factory.assert_called_once()
+        assert lazy.loaded
+
 
 class TestIngest:
     """Test document ingestion functionality."""
@@ -142,18 +733,1233 @@ class TestIngest:
         mock_splitter_class.return_value = mock_splitter
 
         # Mock database
-        with patch('ingest.get_db') as mock_get_db:
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch('ingest.get_db') as mock_get_db:
             mock_db = Mock()
             mock_get_db.return_value = mock_db
+            path = os.path.join(tmp, "test.pdf")
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4")
 
             from ingest import ingest_document
-            request = IngestRequest(file_path="test.pdf")
+            from manifest import chunk_ids, file_key
+            request = IngestRequest(file_path=path)
             ingest_document(request)
 
             # Verify calls
             mock_loader.load.assert_called_once()
             mock_splitter.split_documents.assert_called_once_with(mock_docs)
-            mock_db.add_documents.assert_called_once_with(mock_chunks)
+            mock_db.add_documents.assert_called_once_with(
+                mock_chunks, ids=chunk_ids(file_key(path), ["Chunk content"])
+            )
+
+    def _ingest_text(self, tmp, text, mock_db):
+        """Write a text file and ingest it against a mocked database."""
+        path = os.path.join(tmp, "notes.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        with patch('ingest.get_db', return_value=mock_db):
+            from ingest import ingest_document
+            ingest_document(IngestRequest(file_path=path))
+
+    def test_reingest_unchanged_file_is_skipped(self):
+        """Test that ingesting the same file twice stores its chunks once."""
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            mock_db = Mock()
+            self._ingest_text(tmp, "Some notes about the project.", mock_db)
+            self._ingest_text(tmp, "Some notes about the project.", mock_db)
+
+            mock_db.add_documents.assert_called_once()
+            mock_db.delete.assert_not_called()
+
+    def test_reingest_changed_file_replaces_stale_chunks(self):
+        """Test that a changed file only adds new chunks and deletes stale ones."""
+        first = "A" * 900 + "\n\n" + "B" * 900
+        second = "A" * 900 + "\n\n" + "C" * 900
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            mock_db = Mock()
+            self._ingest_text(tmp, first, mock_db)
+            first_ids = mock_db.add_documents.call_args.kwargs["ids"]
+            self._ingest_text(tmp, second, mock_db)
+
+            added = mock_db.add_documents.call_args
+            assert [chunk.page_content for chunk in added.args[0]] == ["C" * 900]
+            mock_db.delete.assert_called_once_with(ids=[first_ids[1]])
+
+    def test_ingest_updates_keyword_index(self):
+        """Test that the keyword index follows added and stale chunks."""
+        from keyword_index import get_keyword_index
+        # The filler chunks are near-duplicates of each other
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'dedup_enabled', False):
+            mock_db = Mock()
+            self._ingest_text(tmp, "Pump fails with ERR-4012.\n\n" + "x " * 600, mock_db)
+            index = get_keyword_index()
+            assert [chunk_id for chunk_id, _ in index.search("ERR-4012")] == \
+                mock_db.add_documents.call_args.kwargs["ids"][:1]
+
+            self._ingest_text(tmp, "Pump fails with ERR-5000.\n\n" + "x " * 600, mock_db)
+            assert index.search("4012") == []
+            assert len(index.search("5000")) == 1
+            assert len(index) == 3
+
+    def test_streaming_ingest_flushes_windows(self):
+        """Test that streaming writes bounded windows with the same chunk IDs."""
+        from langchain_core.documents import Document
+        from manifest import chunk_ids, file_key
+        pages = [Document(page_content=f"Page {i} text.", metadata={"page": i}) for i in range(5)]
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch('ingest.get_loader') as mock_get_loader, \
+                patch('ingest.stream_window_size', return_value=2), \
+                patch('ingest.get_db') as mock_get_db:
+            mock_get_loader.return_value.lazy_load.return_value = iter(pages)
+            mock_db = Mock()
+            mock_get_db.return_value = mock_db
+            path = os.path.join(tmp, "big.pdf")
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4")
+
+            from ingest import ingest_document
+            ingest_document(IngestRequest(file_path=path, stream=True))
+
+            mock_get_loader.return_value.load.assert_not_called()
+            windows = [c.args[0] for c in mock_db.add_documents.call_args_list]
+            assert [len(w) for w in windows] == [2, 2, 1]
+            ids = [i for c in mock_db.add_documents.call_args_list for i in c.kwargs["ids"]]
+            assert ids == chunk_ids(file_key(path), [p.page_content for p in pages])
+
+    def test_ingest_reports_progress_and_cancels(self):
+        """Test batch progress reports and that a cancelled file is not recorded."""
+        from ingest import IngestCancelled, ingest_document
+        from manifest import Manifest, file_key
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'embed_batch_size', 2), \
+                patch('ingest.get_db') as mock_get_db:
+            path = os.path.join(tmp, "notes.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(f"Paragraph {i} " + "word " * 180 for i in range(5)))
+
+            reports = []
+            ingest_document(IngestRequest(file_path=path), lambda *report: reports.append(report))
+            total = reports[0][2]
+            assert total >= 3
+            assert reports == [(1, done, total) for done in [0] + list(range(2, total, 2)) + [total]]
+            assert mock_get_db.return_value.add_documents.call_count == len(reports) - 1
+
+            def cancel(pages, done, total):
+                if done:
+                    raise IngestCancelled()
+
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n\nChanged.")
+            previous = Manifest("default").get(file_key(path))
+            with pytest.raises(IngestCancelled):
+                ingest_document(IngestRequest(file_path=path), cancel)
+            assert Manifest("default").get(file_key(path)) == previous
+
+    def test_cancelled_ingest_leaves_no_orphans(self):
+        """Test that chunks written by a cancelled ingestion are deleted by the next one."""
+        from benchmarks.common import HashEmbeddings
+        from ingest import IngestCancelled, ingest_document
+        from manifest import Manifest, file_key
+        import utils
+        model = HashEmbeddings()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'vector_backend', 'flat'), \
+                patch.object(settings, 'dedup_enabled', False), \
+                patch.object(settings, 'embed_batch_size', 2), \
+                patch('utils.embeddings', model), \
+                patch('ingest.embeddings', model):
+            utils.invalidate_db()
+            path = os.path.join(tmp, "notes.txt")
+
+            def write(version):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("\n\n".join(f"Version {version} paragraph {i} " + "word " * 180 for i in range(5)))
+
+            def cancel(pages, done, total):
+                if done:
+                    raise IngestCancelled()
+
+            write(1)
+            ingest_document(IngestRequest(file_path=path))
+            write(2)
+            with pytest.raises(IngestCancelled):
+                ingest_document(IngestRequest(file_path=path), cancel)
+            manifest = Manifest("default")
+            assert len(manifest.pending(file_key(path))) > 0
+
+            write(3)
+            ingest_document(IngestRequest(file_path=path))
+            stored = set(utils.get_db().get()["ids"])
+            assert stored == set(manifest.get(file_key(path))["chunk_ids"])
+            assert manifest.pending(file_key(path)) == []
+            utils.invalidate_db()
+
+
+class TestParseCache:
+    """Test the parsed document cache and parallel PDF extraction."""
+
+    def test_parallel_pdf_pages_match_loader(self):
+        """Test that parallel extraction yields exactly PyPDFLoader's pages."""
+        from langchain_community.document_loaders import PyPDFLoader
+        from benchmarks.common import write_pdf
+        from parse_cache import iter_pdf_pages
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'pdf_parallel_min_pages', 4):
+            path = os.path.join(tmp, "report.pdf")
+            write_pdf(path, [[f"Page {i} covers solar panel maintenance", "and inverter checks"] for i in range(12)])
+            assert list(iter_pdf_pages(path, workers=2)) == PyPDFLoader(path).load()
+            # Small PDFs and single workers are left to the regular loader
+            assert iter_pdf_pages(path, workers=1) is None
+            with patch.object(settings, 'pdf_parallel_min_pages', 13):
+                assert iter_pdf_pages(path, workers=2) is None
+
+    def test_rechunking_reads_parse_cache(self):
+        """Test that a chunking change re-splits a file from the cache without parsing it."""
+        from benchmarks.common import write_pdf
+        from ingest import ingest_document
+        from parse_cache import ParseCache
+        from manifest import file_hash
+        # Repeated lines split into near-duplicate chunks, which are tested in TestDedup
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'dedup_enabled', False):
+            path = os.path.join(tmp, "manual.pdf")
+            write_pdf(path, [["Solar panels need cleaning"] * 8, ["Inverters need firmware updates"] * 8])
+            mock_db = Mock()
+            with patch('ingest.get_db', return_value=mock_db):
+                ingest_document(IngestRequest(file_path=path))
+                first = mock_db.add_documents.call_args.args[0]
+                assert len(first) == 2
+
+                with patch('ingest.PyPDFLoader') as loader, patch.object(settings, 'chunk_size', 100), \
+                        patch.object(settings, 'chunk_overlap', 10):
+                    ingest_document(IngestRequest(file_path=path))
+                    loader.return_value.load.assert_not_called()
+                    resplit = mock_db.add_documents.call_args.args[0]
+                    assert len(resplit) > 2 and resplit[0].metadata["source"] == path
+                    mock_db.delete.assert_called_once()
+
+                    # Same content and chunking: skipped entirely
+                    ingest_document(IngestRequest(file_path=path))
+                    assert mock_db.add_documents.call_count == 2
+
+            cache = ParseCache()
+            # Both pages fit in one chunk each at the default chunk size
+            assert [page.page_content for page in cache.get(file_hash(path), path)] == [doc.page_content for doc in first]
+
+    def test_eviction_and_unreadable_entries(self):
+        """Test least recently used eviction and that corrupt entries count as misses."""
+        from langchain_core.documents import Document
+        from parse_cache import ParseCache
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ParseCache(tmp, max_mb=1)
+            pages = [Document(page_content=os.urandom(600).hex(), metadata={"page": 0, "source": "a.pdf"})]
+            cache.put("old", pages)
+            # Room for one entry only
+            cache.max_bytes = cache.size_bytes() * 3 // 2
+            os.utime(os.path.join(tmp, "old.jsonl.gz"), (0, 0))
+            cache.put("new", pages)
+            assert cache.get("old", "a.pdf") is None
+            assert cache.get("new", "b.pdf")[0].metadata == {"page": 0, "source": "b.pdf"}
+
+            # An interrupted write leaves nothing behind
+            stream = cache.write_through("partial", iter(pages))
+            next(stream)
+            stream.close()
+            assert sorted(os.listdir(tmp)) == ["new.jsonl.gz"]
+
+            with open(os.path.join(tmp, "new.jsonl.gz"), "wb") as f:
+                f.write(b"not gzip")
+            assert cache.get("new", "b.pdf") is None
+            assert os.listdir(tmp) == []
+
+
+class TestManifest:
+    """Test the per-collection ingestion manifest."""
+
+    def test_chunk_ids_are_deterministic(self):
+        """Test that chunk IDs depend only on file and chunk text."""
+        from manifest import chunk_ids
+        assert chunk_ids("a.txt", ["x", "y"]) == chunk_ids("a.txt", ["x", "y"])
+        assert chunk_ids("a.txt", ["x"]) != chunk_ids("b.txt", ["x"])
+
+    def test_duplicate_chunks_get_distinct_ids(self):
+        """Test that repeated chunks within a file do not collide."""
+        from manifest import chunk_ids
+        ids = chunk_ids("a.txt", ["same", "same"])
+        assert ids[0] != ids[1]
+
+    def test_record_and_forget(self):
+        """Test manifest persistence per collection."""
+        from manifest import Manifest
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp):
+            Manifest("docs").record("a.txt", "hash", ["1", "2"])
+            assert Manifest("docs").get("a.txt") == {"hash": "hash", "chunk_ids": ["1", "2"]}
+            assert Manifest("other").get("a.txt") is None
+            Manifest("docs").forget("a.txt")
+            assert Manifest("docs").get("a.txt") is None
+            assert Manifest("docs").forget("a.txt") is None
+
+
+class TestKeywordIndex:
+    """Test the BM25 keyword index and hybrid retrieval."""
+
+    def test_tokenize_keeps_identifiers(self):
+        """Test that part numbers are indexed whole and by their parts."""
+        from keyword_index import tokenize
+        assert tokenize("The pump shows ERR-4012 in v2.1") == ["pump", "shows", "err-4012", "err", "4012", "v2.1", "v2", "1"]
+
+    def test_bm25_ranking_and_updates(self):
+        """Test ranking, replacement and deletion of indexed chunks."""
+        from keyword_index import KeywordIndex
+        with tempfile.TemporaryDirectory() as tmp:
+            index = KeywordIndex(os.path.join(tmp, "kw", "test.sqlite3"))
+            assert index.search("pump") == []
+
+            index.add(["a", "b", "c"], [
+                "The pump reported error ERR-4012 twice.",
+                "General maintenance of the pump and valves.",
+                "Valves should be checked yearly."
+            ])
+            assert [chunk_id for chunk_id, _ in index.search("ERR-4012 pump")] == ["a", "b"]
+            assert index.search("valves", k=1)[0][0] in {"b", "c"}
+
+            assert [chunk_id for chunk_id, _ in index.search("ERR-4012 pump", min_match=0.5)] == ["a"]
+            assert index.search("pump ERR-9999", min_match=0.5) == []
+
+            index.add(["a"], ["Replaced text without the code."])
+            assert index.search("4012") == []
+            index.delete(["b", "missing"])
+            assert len(index) == 2
+            assert index.search("pump") == []
+
+    def test_reciprocal_rank_fusion(self):
+        """Test that items ranked by both retrievers come first."""
+        from keyword_index import reciprocal_rank_fusion
+        assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]]) == ["c", "a", "b", "d"]
+
+    @patch('utils.get_keyword_index')
+    @patch('utils.get_db')
+    def test_hybrid_retrieval_fuses_both_rankings(self, mock_get_db, mock_get_index):
+        """Test vector, keyword and hybrid retrieval modes."""
+        mock_db = Mock()
+        mock_db.similarity_search_by_vector_with_relevance_scores.return_value = [
+            (Mock(page_content="Vector hit", metadata={"source": "a.pdf"}), 0.2),
+            (Mock(page_content="Shared hit", metadata={"source": "b.pdf"}), 0.3),
+            (Mock(page_content="Irrelevant", metadata={"source": "c.pdf"}), 1.8)
+        ]
+        mock_db.get.return_value = {
+            "ids": ["k2", "k1"],
+            "documents": ["Shared hit", "Keyword hit ERR-4012"],
+            "metadatas": [{"source": "b.pdf"}, {"source": "d.pdf"}]
+        }
+        mock_get_db.return_value = mock_db
+        mock_get_index.return_value.search.return_value = [("k1", 4.0), ("k2", 2.0)]
+
+        from utils import _retrieve_documents
+
+        def texts(mode):
+            request = QueryRequest(question="What is ERR-4012?", retrieval_mode=mode)
+            return [doc.page_content for doc in _retrieve_documents(request, [0.1])]
+
+        assert texts("vector") == ["Vector hit", "Shared hit"]
+        assert texts("keyword") == ["Keyword hit ERR-4012", "Shared hit"]
+        assert texts("hybrid") == ["Shared hit", "Vector hit", "Keyword hit ERR-4012"]
+        assert mock_get_index.return_value.search.call_args.kwargs["min_match"] == settings.keyword_min_match
+
+        mock_get_index.return_value.search.side_effect = RuntimeError("corrupt index")
+        assert texts("hybrid") == ["Vector hit", "Shared hit"]
+        # Keyword mode falls back to the vector search rather than answering without context
+        assert texts("keyword") == ["Vector hit", "Shared hit"]
+
+
+class TestMetadataFilters:
+    """Test source, file-type and ingestion-date filters pushed into the vector search."""
+
+    def test_where_clause_and_matching(self):
+        """Test translating request filters into a where clause, in Python and SQLite."""
+        import sqlite3
+        from datetime import datetime, timedelta
+        from filters import build_where, chunk_metadata, matches, where_sql
+        now = datetime.now()
+        request = QueryRequest(question="What changed?", sources=["C:\\Docs\\Report.PDF", "notes.md"],
+                               file_types=[".PDF"], ingested_after=now - timedelta(days=1))
+        where = build_where(request)
+        assert where["$and"][0] == {"filename": {"$in": ["notes.md", "report.pdf"]}}
+        assert build_where(QueryRequest(question="What changed?")) is None
+
+        metadata = chunk_metadata("/data/report.pdf", "abc", ingested_at=now.timestamp())
+        assert metadata == {"filename": "report.pdf", "file_type": "pdf", "file_hash": "abc",
+                            "ingested_at": int(now.timestamp())}
+        old = dict(metadata, ingested_at=int((now - timedelta(days=2)).timestamp()))
+        assert matches(metadata, where) and not matches(old, where)
+        assert not matches(dict(metadata, filename="other.pdf"), where)
+
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE chunks (row INTEGER, metadata TEXT)")
+        conn.executemany("INSERT INTO chunks VALUES (?, ?)", [(0, json.dumps(metadata)), (1, json.dumps(old))])
+        condition, params = where_sql(where)
+        assert [row for (row,) in conn.execute(f"SELECT row FROM chunks WHERE {condition}", params)] == [0]
+
+    @pytest.mark.parametrize("backend", ["chroma", "flat"])
+    def test_filters_applied_inside_search(self, backend):
+        """Test that filtered searches fill top_k with matching chunks on every backend."""
+        from datetime import datetime, timedelta
+        from benchmarks.common import HashEmbeddings
+        from filters import build_where
+        from ingest import ingest_document
+        from utils import _retrieve_documents, get_db, invalidate_db, search_by_vectors
+        model = HashEmbeddings()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', os.path.join(tmp, "db")), \
+                patch.object(settings, 'vector_backend', backend), \
+                patch.object(settings, 'dedup_enabled', False), \
+                patch.object(settings, 'chunk_size', 100), \
+                patch.object(settings, 'chunk_overlap', 0), \
+                patch('utils.embeddings', model), \
+                patch('ingest.embeddings', model):
+            for name, topic in [("solar.txt", "solar"), ("wind.md", "wind"), ("grid.txt", "grid")]:
+                with open(os.path.join(tmp, name), "w", encoding="utf-8") as f:
+                    f.write(" ".join(f"{topic} panel number {i} output report." for i in range(40)))
+                ingest_document(IngestRequest(file_path=os.path.join(tmp, name)))
+            metadata = get_db().get(limit=1)["metadatas"][0]
+            assert set(metadata) >= {"source", "filename", "file_type", "file_hash", "ingested_at"}
+
+            query = model.embed_query("solar panel output")
+            request = QueryRequest(question="wind?", top_k=6, sources=["WIND.MD"])
+            hits = get_db().similarity_search_by_vector_with_relevance_scores(query, k=6, filter=build_where(request))
+            assert len(hits) == 6 and {doc.metadata["filename"] for doc, _ in hits} == {"wind.md"}
+            if backend == "flat":
+                # More matching rows than one block: the mask is applied during the blocked scan
+                get_db().block_rows = 4
+                masked = get_db().similarity_search_by_vector_with_relevance_scores(
+                    query, k=6, filter=build_where(request)
+                )
+                assert {doc.metadata["filename"] for doc, _ in masked} == {"wind.md"}
+                assert [score for _, score in masked] == pytest.approx([score for _, score in hits], abs=1e-4)
+
+            where = build_where(QueryRequest(question="text?", file_types=["txt"]))
+            bulk = search_by_vectors("default", [query, query], k=8, where=where)
+            assert len(bulk[1]) == 8 and {doc.metadata["file_type"] for doc, _ in bulk[1]} == {"txt"}
+            future = build_where(QueryRequest(question="new?", ingested_after=datetime.now() + timedelta(hours=1)))
+            assert search_by_vectors("default", [query], k=4, where=future) == [[]]
+
+            keyword = QueryRequest(question="grid panel report", retrieval_mode="keyword", sources=["solar.txt"])
+            docs = _retrieve_documents(keyword, query)
+            assert docs and {doc.metadata["filename"] for doc in docs} == {"solar.txt"}
+            invalidate_db()
+
+    def test_old_chunks_rewritten_and_duplicated_files_found(self):
+        """Test that chunks without filter metadata are rewritten and fully deduplicated files stay searchable."""
+        from benchmarks.common import HashEmbeddings
+        from ingest import ingest_document
+        from utils import _retrieve_documents, get_db, invalidate_db
+        model = HashEmbeddings()
+        text = " ".join(f"Pump {i} needs its seal checked every month." for i in range(12))
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', os.path.join(tmp, "db")), \
+                patch.object(settings, 'vector_backend', 'flat'), \
+                patch.object(settings, 'keyword_index_enabled', False), \
+                patch('utils.embeddings', model), \
+                patch('ingest.embeddings', model):
+            paths = [os.path.join(tmp, name) for name in ("pumps.txt", "copy.txt")]
+            for path in paths:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(text)
+            # Ingested before chunks carried filter metadata
+            with patch('ingest.METADATA_VERSION', 0), patch('ingest.chunk_metadata', return_value={}):
+                ingest_document(IngestRequest(file_path=paths[0]))
+            assert "filename" not in get_db().get()["metadatas"][0]
+
+            for path in paths:
+                ingest_document(IngestRequest(file_path=path))
+            stored = get_db().get()
+            assert len(stored["ids"]) == 1 and stored["metadatas"][0]["filename"] == "pumps.txt"
+
+            # copy.txt has no stored chunk of its own; the chunk it duplicates stands in for it
+            request = QueryRequest(question="seal?", retrieval_mode="vector", sources=["copy.txt"])
+            docs = _retrieve_documents(request, model.embed_query("pump seal"))
+            assert [doc.page_content for doc in docs] == [text]
+            invalidate_db()
+
+
+class TestDedup:
+    """Test near-duplicate chunk elimination."""
+
+    @staticmethod
+    def _paragraph(seed, words=120):
+        """Pseudo-random text that shares few shingles with other seeds."""
+        import random
+        rng = random.Random(seed)
+        vocabulary = "pump valve seal motor bearing filter pressure flow sensor alarm reset check".split()
+        return " ".join(rng.choice(vocabulary) + str(rng.randint(0, 99)) for _ in range(words))
+
+    def test_filter_record_and_promotion(self):
+        """Test detection within a batch and against stored chunks, and promotion on delete."""
+        from langchain_core.documents import Document
+        from dedup import DedupIndex, DedupPlan, minhash, similarity
+        text = self._paragraph(1)
+        edited = text.replace(text.split()[60], text.split()[60] + " replaced", 1)
+        assert similarity(minhash(text), minhash(edited)) >= 0.9
+        assert similarity(minhash(text), minhash(self._paragraph(2))) < 0.2
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index = DedupIndex(os.path.join(tmp, "dedup", "test.sqlite3"), threshold=0.9)
+            plan = DedupPlan()
+            chunks = [
+                Document(page_content=text, metadata={"source": "a.pdf"}),
+                Document(page_content=self._paragraph(2), metadata={"source": "a.pdf"}),
+                Document(page_content=edited.upper(), metadata={"source": "b.pdf"})
+            ]
+            kept, kept_ids = index.filter(plan, chunks, ["a1", "a2", "b1"])
+            assert kept_ids == ["a1", "a2"]
+            index.record(plan)
+            assert plan.chunks_skipped == 1 and plan.bytes_skipped == len(edited)
+
+            # Stored chunks are kept on re-check; new copies match them
+            kept, kept_ids = index.filter(plan, [chunks[0], Document(page_content=text, metadata={"source": "c.pdf"})],
+                                          ["a1", "c1"])
+            assert kept_ids == ["a1"]
+            index.record(plan)
+            assert sorted(index.duplicate_sources([text])) == ["b.pdf", "c.pdf"]
+            assert index.stats()["stored"] == 2 and index.stats()["duplicates"] == 2
+
+            # Deleting the stored chunk promotes one duplicate and points the other at it
+            promoted, promoted_ids = index.delete(["a1"])
+            assert promoted_ids == ["b1"] and promoted[0].metadata == {"source": "b.pdf"}
+            assert index.duplicate_sources([edited.upper()]) == ["c.pdf"]
+
+    def test_chunks_differing_in_numbers_are_kept(self):
+        """Test that near-identical text with a different amount is not skipped as a duplicate."""
+        from langchain_core.documents import Document
+        from dedup import DedupIndex, DedupPlan, minhash, similarity
+        clause = ("The supplier shall deliver the goods described in schedule A to the buyer's warehouse "
+                  "within thirty days of the order date, and the buyer shall pay the total contract price of "
+                  "{amount} euros within sixty days of receiving a correct invoice, failing which interest "
+                  "accrues at the statutory rate until payment is made in full by the buyer to the supplier "
+                  "and all disputes are settled by the courts of the supplier's registered seat")
+        first, second = clause.format(amount="120,000"), clause.format(amount="95,000")
+        assert similarity(minhash(first), minhash(second)) >= 0.9
+        with tempfile.TemporaryDirectory() as tmp:
+            index = DedupIndex(os.path.join(tmp, "dedup", "test.sqlite3"), threshold=0.9)
+            plan = DedupPlan()
+            chunks = [Document(page_content=text, metadata={"source": name})
+                      for text, name in [(first, "a.pdf"), (second, "b.pdf"), (first, "c.pdf")]]
+            kept, kept_ids = index.filter(plan, chunks, ["a1", "b1", "c1"])
+            assert kept_ids == ["a1", "b1"]
+
+    def test_ingest_skips_duplicates_and_cites_their_sources(self):
+        """Test that a copied section is not stored again but still cited as a source."""
+        from ingest import ingest_document
+        from utils import _retrieve_context
+        text = self._paragraph(3, words=80)
+        with tempfile.TemporaryDirectory() as tmp, patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'keyword_index_enabled', False):
+            mock_db = Mock()
+            for name, body in [("a.txt", text), ("b.txt", self._paragraph(4, words=80) + "\n\n" + text)]:
+                path = os.path.join(tmp, name)
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(body)
+                with patch('ingest.get_db', return_value=mock_db):
+                    ingest_document(IngestRequest(file_path=path))
+            stored = [doc.page_content for call in mock_db.add_documents.call_args_list for doc in call.args[0]]
+            assert stored.count(text) == 1 and len(stored) == 2
+
+            hit = mock_db.add_documents.call_args_list[0].args[0][0]
+            mock_db.similarity_search_by_vector_with_relevance_scores.return_value = [(hit, 0.1)]
+            with patch('utils.get_db', return_value=mock_db):
+                _, sources = _retrieve_context(QueryRequest(question="pump?", retrieval_mode="vector"), [0.1])
+            assert sorted(os.path.basename(source) for source in sources) == ["a.txt", "b.txt"]
+
+
+class TestContextBuilder:
+    """Test token-budgeted context assembly."""
+
+    def _chunks(self):
+        from ingest import split_documents
+        from langchain_core.documents import Document
+        text = " ".join(f"Sentence number {i} talks about topic {i % 7}." for i in range(200))
+        return text, split_documents([Document(page_content=text, metadata={"source": "C:\\docs\\a.txt"})])
+
+    def test_overlapping_chunks_merge_back(self):
+        """Test that shuffled overlapping chunks merge into the original text."""
+        from context_builder import merge_overlapping
+        from langchain_core.documents import Document
+        text, chunks = self._chunks()
+        shuffled = chunks[::2] + chunks[1::2]
+        assert [doc.page_content for doc in merge_overlapping(shuffled)] == [text]
+
+        # Chunks stored before start_index existed merge by overlapping text
+        plain = [Document(page_content=c.page_content, metadata={"source": "a.txt"}) for c in chunks[:3]]
+        assert len(merge_overlapping(plain)) == 1
+
+        other = Document(page_content=chunks[1].page_content, metadata={"source": "b.txt"})
+        assert len(merge_overlapping([chunks[0], other])) == 2
+
+    def test_near_duplicates_and_mmr(self):
+        """Test duplicate removal and diversity re-ranking."""
+        from context_builder import drop_near_duplicates, mmr_rerank
+        from langchain_core.documents import Document
+        docs = [
+            Document(page_content="Solar panels convert sunlight into electricity for homes.", metadata={"source": "a"}),
+            Document(page_content="Solar panels convert sunlight into electricity for homes!", metadata={"source": "b"}),
+            Document(page_content="Solar panels convert sunlight into electricity for most homes.", metadata={"source": "c"}),
+            Document(page_content="Wind turbines need regular maintenance.", metadata={"source": "d"})
+        ]
+        assert [doc.metadata["source"] for doc in drop_near_duplicates(docs)] == ["a", "c", "d"]
+        assert [doc.metadata["source"] for doc in mmr_rerank(docs[1:], 0.5)] == ["b", "d", "c"]
+
+    def test_budget_and_savings(self):
+        """Test packing into the token budget and the savings report."""
+        from context_builder import build_context, count_tokens
+        text, chunks = self._chunks()
+        full = build_context(chunks[:4], token_budget=100000)
+        assert full.passages == 1
+        assert full.tokens < full.raw_tokens
+        assert full.sources == ["a.txt"]
+
+        small = build_context(chunks[:4], token_budget=200)
+        assert count_tokens(small.text) <= 200
+        assert small.text.strip() and text.startswith(small.text.strip())
+        assert small.tokens_saved == small.raw_tokens - small.tokens
+
+
+class TestFlatStore:
+    """Test the memory-mapped flat vector store backend."""
+
+    @pytest.mark.parametrize("dtype", ["float16", "float32"])
+    def test_exact_batched_top_k(self, dtype):
+        """Test that blocked search matches a brute-force scan for several queries."""
+        import numpy as np
+        from flat_store import FlatVectorStore
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(257, 16)).astype(np.float32)
+        queries = rng.normal(size=(5, 16)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FlatVectorStore(tmp, Mock(), block_rows=50, dtype=dtype)
+            store.add_embeddings([str(i) for i in range(257)], vectors, [f"text {i}" for i in range(257)])
+
+            unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            expected = np.argsort(-(queries @ unit.T), axis=1)[:, :5]
+            results = store.search_by_vectors(queries, k=5)
+            assert [[row for row, _ in result] for result in results] == expected.tolist()
+
+            docs = store.similarity_search_by_vector_with_relevance_scores(queries[0].tolist(), k=2)
+            assert docs[0][0].page_content == f"text {expected[0][0]}"
+            assert 0.0 <= docs[0][1] <= docs[1][1] <= 4.0
+
+    def test_upsert_delete_and_compaction(self):
+        """Test tombstones, upserts, compaction and visibility to another handle."""
+        import numpy as np
+        from flat_store import FlatVectorStore
+        vectors = np.eye(8, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FlatVectorStore(tmp, Mock(), compact_ratio=0.5)
+            reader = FlatVectorStore(tmp, Mock())
+            store.add_embeddings([str(i) for i in range(8)], vectors, [f"text {i}" for i in range(8)],
+                                 [{"source": f"{i}.txt"} for i in range(8)])
+
+            store.delete(ids=["0", "1", "missing"])
+            store.add_embeddings(["2"], vectors[:1], ["replaced"])
+            assert len(store) == 6
+            assert store.get(ids=["2"])["documents"] == ["replaced"]
+            assert store.search_by_vectors(vectors[:1], k=1)[0][0][0] == 8
+            assert len(reader) == 6
+
+            store.delete(ids=["3", "4"])
+            assert store._rows == 4  # compacted once more than half the rows were dead
+            assert sorted(store.get()["ids"]) == ["2", "5", "6", "7"]
+            assert reader.similarity_search_by_vector(vectors[7].tolist(), k=1)[0].metadata == {"source": "7.txt"}
+            assert len([name for name in os.listdir(tmp) if name.endswith(".bin")]) == 1
+            # The rebuilt table keeps the metadata filter indexes
+            indexes = {name for (name,) in store._conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            assert {"idx_chunks_id", "idx_chunks_filename", "idx_chunks_file_type", "idx_chunks_ingested_at"} <= indexes
+
+    @pytest.mark.parametrize("method", ["int8", "binary"])
+    def test_quantized_tier_rescores_exactly(self, method):
+        """Test that quantized candidates are rescored at full precision, also after compaction."""
+        import numpy as np
+        from flat_store import FlatVectorStore
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(300, 128)).astype(np.float32)
+        queries = vectors[:4] + rng.normal(size=(4, 128)).astype(np.float32) * 0.5
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FlatVectorStore(tmp, Mock(), dtype="float32", block_rows=64, quantization_method=method)
+            store.add_embeddings([str(i) for i in range(300)], vectors, [""] * 300)
+
+            for query in queries:
+                exact = unit @ (query / np.linalg.norm(query))
+                result = store.search_by_vectors([query], k=3)[0]
+                assert result[0][0] == int(np.argmax(exact))
+                assert [score for _, score in result] == pytest.approx([exact[row] for row, _ in result], abs=1e-5)
+
+                # A shortlist covering every row makes the search exact
+                store.rescore_multiplier = 100
+                assert [row for row, _ in store.search_by_vectors([query], k=3)[0]] == np.argsort(-exact)[:3].tolist()
+                store.rescore_multiplier = 10
+
+            store.delete(ids=[str(i) for i in range(1, 150)])
+            assert store._rows == 151
+            assert store.search_by_vectors(vectors[200:201], k=1)[0][0][0] == 200 - 149
+
+    def test_quantization_fixed_at_creation(self):
+        """Test that a populated store without codes is never switched to a quantized tier."""
+        import numpy as np
+        from flat_store import FlatVectorStore
+        with tempfile.TemporaryDirectory() as tmp:
+            FlatVectorStore(tmp, Mock()).add_embeddings(["a"], np.ones((1, 8)), ["text"])
+            reopened = FlatVectorStore(tmp, Mock(), quantization_method="binary")
+            assert reopened._quantization == "none"
+            assert reopened.search_by_vectors(np.ones((1, 8)), k=1)[0][0][0] == 0
+
+    def test_hamming_without_popcount_ufunc(self, monkeypatch):
+        """Test that binary codes are compared the same way on NumPy versions before 2.0."""
+        import numpy as np
+        from quantization import encode, hamming
+        rng = np.random.default_rng(2)
+        codes, _ = encode("binary", rng.normal(size=(50, 100)).astype(np.float32))
+        expected = hamming(codes, codes[0])
+        monkeypatch.delattr(np, "bitwise_count", raising=False)
+        assert hamming(codes, codes[0]).tolist() == expected.tolist()
+        assert expected[0] == 0 and expected.dtype == np.int32
+
+    def test_get_db_uses_flat_backend(self):
+        """Test ingestion and retrieval end to end through get_db."""
+        from benchmarks.common import HashEmbeddings
+        from flat_store import FlatVectorStore
+        from ingest import ingest_document
+        from utils import _retrieve_documents, get_db, invalidate_db
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'vector_backend', 'flat'), \
+                patch('utils.embeddings', HashEmbeddings()), \
+                patch('ingest.embeddings', HashEmbeddings()):
+            path = os.path.join(tmp, "solar.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("Solar panels convert sunlight into electricity.")
+            ingest_document(IngestRequest(file_path=path))
+
+            assert isinstance(get_db(), FlatVectorStore)
+            request = QueryRequest(question="How do solar panels work?", retrieval_mode="vector")
+            docs = _retrieve_documents(request, HashEmbeddings().embed_query(request.question))
+            assert [doc.metadata["source"] for doc in docs] == [path]
+            invalidate_db()
+
+
+class TestSharding:
+    """Test scatter-gather sharding of a logical collection."""
+
+    @staticmethod
+    def _ingest(tmp, collection, count=6):
+        """Ingest a few files of pseudo-random text into a collection."""
+        import random
+        from ingest import ingest_document
+        rng = random.Random(0)
+        words = "solar wind grid battery inverter storage panel turbine".split()
+        for i in range(count):
+            path = os.path.join(tmp, f"doc_{i}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(" ".join(rng.choice(words) + str(rng.randint(0, 99)) for _ in range(400)))
+            ingest_document(IngestRequest(file_path=path, collection=collection))
+
+    def test_sharded_collection_matches_single_store(self):
+        """Test routing by source, merged top-k, batched search, get and delete."""
+        import numpy as np
+        from benchmarks.common import HashEmbeddings
+        from sharding import ShardedStore, shard_of
+        from utils import get_db, invalidate_db, search_by_vectors
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', os.path.join(tmp, "db")), \
+                patch.object(settings, 'vector_backend', 'flat'), \
+                patch.object(settings, 'dedup_enabled', False), \
+                patch('utils.embeddings', HashEmbeddings()), \
+                patch('ingest.embeddings', HashEmbeddings()):
+            self._ingest(tmp, "plain")
+            with patch.object(settings, 'collection_shards', 3):
+                self._ingest(tmp, "sharded")
+            single, sharded = get_db("plain"), get_db("sharded")
+            assert isinstance(sharded, ShardedStore) and len(sharded.shards) == 3
+            assert len(sharded) == len(single)
+            for number, shard in enumerate(sharded.shards):
+                assert all(shard_of(meta["source"], 3) == number for meta in shard.get()["metadatas"])
+
+            # A dense random query, so no two chunks tie
+            query = np.random.default_rng(0).normal(size=len(HashEmbeddings().embed_query("solar"))).tolist()
+            expected = single.similarity_search_by_vector_with_relevance_scores(query, k=5)
+            merged = sharded.similarity_search_by_vector_with_relevance_scores(query, k=5)
+            assert [doc.page_content for doc, _ in merged] == [doc.page_content for doc, _ in expected]
+            assert [score for _, score in merged] == pytest.approx([score for _, score in expected], abs=1e-3)
+            batched = search_by_vectors("sharded", [query, query], k=5)
+            assert [doc.page_content for doc, _ in batched[1]] == [doc.page_content for doc, _ in merged]
+
+            ids = single.get()["ids"]
+            assert sorted(sharded.get(ids=ids[:4])["ids"]) == sorted(ids[:4])
+            pages = [sharded.get(limit=5, offset=offset)["ids"] for offset in range(0, len(ids), 5)]
+            assert sorted(chunk_id for page in pages for chunk_id in page) == sorted(ids)
+            sharded.delete(ids=ids[:4])
+            assert len(sharded) == len(ids) - 4
+            invalidate_db()
+
+    def test_reshard_offline(self):
+        """Test copying an unsharded collection into shards and re-sharding it again."""
+        from benchmarks.common import HashEmbeddings
+        from sharding import layout_dir, read_layout, reshard
+        from utils import _retrieve_documents, get_db, invalidate_db
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', os.path.join(tmp, "db")), \
+                patch.object(settings, 'vector_backend', 'flat'), \
+                patch.object(settings, 'dedup_enabled', False), \
+                patch('utils.embeddings', HashEmbeddings()), \
+                patch('ingest.embeddings', HashEmbeddings()):
+            self._ingest(tmp, "default")
+            request = QueryRequest(question=get_db().get(limit=1)["documents"][0], retrieval_mode="vector")
+            query = HashEmbeddings().embed_query(request.question)
+            before = [doc.page_content for doc in _retrieve_documents(request, query)]
+            assert before[0] == request.question
+            total = len(get_db())
+
+            assert reshard("default", 3) == total
+            assert read_layout("default") == {"shards": 3, "generation": 1}
+            assert not os.path.exists(os.path.join(settings.chroma_path, "flat", "default"))
+            assert [doc.page_content for doc in _retrieve_documents(request, query)] == before
+
+            assert reshard("default", 2) == total
+            assert sorted(os.listdir(layout_dir("default"))) == ["g2-0", "g2-1", "layout.json"]
+            assert len(get_db()) == total
+            assert [doc.page_content for doc in _retrieve_documents(request, query)] == before
+            invalidate_db()
+
+
+class TestHnsw:
+    """Test HNSW parameters, offline rebuilds and the recall/latency sweep."""
+
+    def test_params_apply_on_create_and_rebuild(self):
+        """Test per-collection parameters, search_ef on open and a rebuild into another space."""
+        from langchain_core.documents import Document
+        from benchmarks.common import HashEmbeddings
+        from hnsw import distance_scale, hnsw_params, rebuild
+        from utils import _retrieve_documents, add_embedded_documents, get_db, invalidate_db
+        model = HashEmbeddings()
+        texts = [f"maintenance step {i} for pump model {i % 7}" for i in range(60)]
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'vector_backend', 'chroma'), \
+                patch('utils.embeddings', model):
+            add_embedded_documents(
+                get_db("manuals"), [Document(page_content=text, metadata={"source": "m.pdf"}) for text in texts],
+                model.embed_documents(texts), [str(i) for i in range(60)]
+            )
+            get_db("manuals").delete(ids=["0", "1"])
+            assert get_db("manuals")._collection.metadata == {"hnsw:space": "l2"}
+
+            overrides = {"manuals": {"space": "cosine", "m": 8, "construction_ef": 40, "search_ef": 20}}
+            with patch.object(settings, 'hnsw_collection_params', overrides):
+                assert hnsw_params("other") == {"space": "l2"}
+                assert rebuild("manuals") == 58
+                db = get_db("manuals")
+                assert db._collection.metadata == {"hnsw:space": "cosine", "hnsw:M": 8,
+                                                   "hnsw:construction_ef": 40, "hnsw:search_ef": 20}
+                assert distance_scale(db) == 2.0
+
+                # Cosine distances are scaled back to the L2 cutoff used for relevance
+                request = QueryRequest(question=texts[5], collection="manuals", retrieval_mode="vector", top_k=3)
+                docs = _retrieve_documents(request, model.embed_query(texts[5]))
+                assert docs[0].page_content == texts[5]
+
+            with patch.object(settings, 'hnsw_search_ef', 64):
+                invalidate_db()
+                assert get_db("manuals")._collection.configuration["hnsw"]["ef_search"] == 64
+            with patch.object(settings, 'hnsw_collection_params', {"manuals": {"ef": 10}}):
+                with pytest.raises(ValueError):
+                    hnsw_params("manuals")
+            invalidate_db()
+
+    def test_sweep_measures_recall_against_exact_search(self):
+        """Test that a larger search_ef never lowers recall and reaches the exact result."""
+        import numpy as np
+        from hnsw import sample_queries, sweep
+        vectors = np.random.default_rng(0).normal(size=(600, 16)).astype(np.float32)
+        queries = sample_queries(vectors, 20)
+        results = sweep(vectors, queries, m=[4], construction_ef=[16], search_ef=[2, 200], k=5)
+        assert [(row["m"], row["search_ef"]) for row in results] == [(4, 2), (4, 200)]
+        assert results[1]["recall"] > results[0]["recall"] and results[1]["recall"] >= 0.95
+        assert all(row["p95_ms"] >= row["p50_ms"] > 0 for row in results)
+
+
+class _CountingEmbeddings:
+    """Deterministic stand-in model that records its batch sizes."""
+
+    query_encode_kwargs = {}
+
+    def __init__(self):
+        self.batches = []
+
+    @staticmethod
+    def vector(text):
+        return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+    def embed_documents(self, texts):
+        if "boom" in texts:
+            raise ValueError("model failure")
+        if "slow" in texts:
+            time.sleep(0.5)
+        self.batches.append(len(texts))
+        time.sleep(0.02)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class TestEmbeddingServer:
+    """Test the shared, micro-batching embedding server."""
+
+    def test_concurrent_requests_share_batches(self):
+        """Test that concurrent callers get their own vectors from shared model calls."""
+        from embedding_server import EmbeddingServer, RemoteEmbeddings
+        model = _CountingEmbeddings()
+        with tempfile.TemporaryDirectory() as tmp:
+            address = os.path.join(tmp, "embed.sock")
+            server = EmbeddingServer(model, address, model_name="fake", max_batch_size=64, max_wait_ms=50)
+            server.start()
+            try:
+                client = RemoteEmbeddings(address)
+                assert (client.model_name, client.dim) == ("fake", 2)
+                results = {}
+
+                def ask(i):
+                    results[i] = client.embed_query(f"question {i}" * (i + 1))
+
+                model.batches.clear()
+                threads = [threading.Thread(target=ask, args=(i,)) for i in range(16)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                assert all(results[i] == model.vector(f"question {i}" * (i + 1)) for i in range(16))
+                assert sum(model.batches) == 16 and len(model.batches) < 16
+
+                texts = ["alpha", "beta", "gamma delta"]
+                assert client.embed_documents(texts) == [model.vector(text) for text in texts]
+                assert client.embed_documents([]) == []
+            finally:
+                server.shutdown()
+            assert not os.path.exists(address)
+
+    def test_errors_and_missing_server(self):
+        """Test that model errors reach the caller and a missing server is reported."""
+        from embedding_server import EmbeddingServer, RemoteEmbeddings
+        with tempfile.TemporaryDirectory() as tmp:
+            address = os.path.join(tmp, "embed.sock")
+            with pytest.raises(ConnectionError, match="embedding_server.py"):
+                RemoteEmbeddings(address)
+
+            server = EmbeddingServer(_CountingEmbeddings(), address, model_name="fake", max_wait_ms=1)
+            server.start()
+            try:
+                client = RemoteEmbeddings(address)
+                with pytest.raises(RuntimeError, match="model failure"):
+                    client.embed_documents(["ok", "boom"])
+                assert client.embed_query("still works") == _CountingEmbeddings.vector("still works")
+            finally:
+                server.shutdown()
+
+    def test_unknown_operation_is_rejected(self):
+        """Test that a malformed request gets an error and the batcher keeps serving."""
+        import socket
+        from embedding_server import EmbeddingServer, RemoteEmbeddings, _Request, _read_frame, _write_frame
+        with tempfile.TemporaryDirectory() as tmp:
+            address = os.path.join(tmp, "embed.sock")
+            server = EmbeddingServer(_CountingEmbeddings(), address, model_name="fake", max_wait_ms=1)
+            server.start()
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(address)
+                    reader, writer = sock.makefile("rb"), sock.makefile("wb")
+                    _write_frame(writer, json.dumps({"op": "Query", "texts": ["x"]}).encode("utf-8"))
+                    writer.flush()
+                    assert "Unknown embedding operation" in json.loads(_read_frame(reader))["error"]
+
+                # A request that slipped past validation fails alone instead of killing the batcher
+                stray = _Request("Query", ["x"])
+                server.batcher._queue.put(stray)
+                with pytest.raises(ValueError):
+                    stray.future.result(timeout=5)
+                assert RemoteEmbeddings(address).embed_query("fine") == _CountingEmbeddings.vector("fine")
+            finally:
+                server.shutdown()
+
+    def test_timed_out_connection_is_replaced(self):
+        """Test that a timeout drops the thread's connection, so its late reply can't answer the next request."""
+        from embedding_server import EmbeddingServer, RemoteEmbeddings
+        with tempfile.TemporaryDirectory() as tmp:
+            address = os.path.join(tmp, "embed.sock")
+            server = EmbeddingServer(_CountingEmbeddings(), address, model_name="fake", max_wait_ms=1)
+            server.start()
+            try:
+                client = RemoteEmbeddings(address, timeout=0.2)
+                with pytest.raises(TimeoutError):
+                    client.embed_query("slow")
+                time.sleep(0.5)
+                assert client.embed_query("next question") == _CountingEmbeddings.vector("next question")
+            finally:
+                server.shutdown()
+
+
+class TestOnnxEmbeddings:
+    """Test the ONNX Runtime embedding runtime."""
+
+    def test_export_matches_pytorch(self):
+        """Test that float32 and int8 exports agree with sentence-transformers in input order."""
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("onnx")
+        from benchmarks.common import toy_sentence_transformer
+        from onnx_embeddings import OnnxEmbeddings, check_parity, export_model
+        with tempfile.TemporaryDirectory() as tmp:
+            model = toy_sentence_transformer(os.path.join(tmp, "model"), dim=32, layers=2, heads=2, pooling="mean")
+            export_model(model, os.path.join(tmp, "onnx"), quantize=True, model_name="toy")
+
+            class Reference:
+                def embed_documents(self, texts):
+                    return model.encode(texts, normalize_embeddings=True).tolist()
+
+            texts = ["the pump fails", "replace the filter every 500 hours " * 10, "solar"]
+            for quantized, minimum in [(False, 0.9999), (True, 0.99)]:
+                onnx = OnnxEmbeddings(os.path.join(tmp, "onnx"), quantized=quantized, batch_size=2)
+                assert onnx.model_name == "toy" and onnx.dim == 32
+                assert check_parity(Reference(), onnx, texts)["min"] >= minimum
+                assert onnx.embed_queries(texts[:1]) == [onnx.embed_query(texts[0])]
+
+    def test_runtime_setting_selects_loader_and_cache_key(self):
+        """Test that EMBEDDING_RUNTIME=onnx loads the export and keys int8 vectors separately."""
+        import utils
+        with patch.object(settings, 'embedding_runtime', 'onnx'), \
+                patch('onnx_embeddings.load_onnx_embeddings', return_value="onnx model") as load:
+            assert utils._load_embedding_model() == "onnx model"
+            load.assert_called_once()
+            assert utils.embedding_model.model_name == f"{settings.embedding_model}+int8"
+            with patch.object(settings, 'embedding_onnx_quantize', False):
+                assert utils.embedding_model.model_name == settings.embedding_model
+
+
+class TestEmbeddingCache:
+    """Test the persistent embedding cache."""
+
+    def _fake_embeddings(self):
+        """Embeddings stub returning the text length as a 2-d vector."""
+        fake = Mock()
+        fake.embed_documents.side_effect = lambda texts: [[float(len(t)), 1.0] for t in texts]
+        return fake
+
+    def test_second_call_hits_cache(self):
+        """Test that previously embedded texts are not embedded again."""
+        from embedding_cache import CachedEmbeddings
+        fake = self._fake_embeddings()
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CachedEmbeddings(fake, os.path.join(tmp, "cache.db"), model_name="m")
+            first = cache.embed_documents(["alpha", "beta"])
+            second = cache.embed_documents(["beta", "gamma", "alpha"])
+
+            assert second == [first[1], [5.0, 1.0], first[0]]
+            fake.embed_documents.assert_called_with(["gamma"])
+            assert cache.hits == 2
+            assert cache.misses == 3
+
+    def test_cache_keyed_by_model(self):
+        """Test that vectors from another model are never reused."""
+        from embedding_cache import CachedEmbeddings
+        fake = self._fake_embeddings()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            CachedEmbeddings(fake, path, model_name="small").embed_documents(["alpha"])
+            other = CachedEmbeddings(fake, path, model_name="large")
+            other.embed_documents(["alpha"])
+            assert other.misses == 1
+
+    def test_eviction_bounds_size(self):
+        """Test that the cache evicts old entries past its size bound."""
+        from embedding_cache import CachedEmbeddings
+        fake = self._fake_embeddings()
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = CachedEmbeddings(fake, os.path.join(tmp, "cache.db"), model_name="m", max_entries=10)
+            cache.embed_documents([f"text {i}" for i in range(25)])
+            assert cache.stats()["entries"] <= 10
+
+
+class TestBulkIngest:
+    """Test parallel bulk ingestion."""
+
+    def _write_corpus(self, tmp):
+        """Create two valid text files and one undecodable file."""
+        corpus = os.path.join(tmp, "corpus")
+        os.makedirs(os.path.join(corpus, "nested"))
+        for name, text in [("a.txt", "Alpha document."), ("nested/b.md", "Beta document.")]:
+            with open(os.path.join(corpus, name), "w", encoding="utf-8") as f:
+                f.write(text)
+        with open(os.path.join(corpus, "bad.txt"), "wb") as f:
+            f.write(b"\xff\xfe\xfa")
+        with open(os.path.join(corpus, "ignored.xyz"), "w") as f:
+            f.write("not a document")
+        return corpus
+
+    def test_discover_files(self):
+        """Test directory expansion keeps only supported formats."""
+        from bulk_ingest import discover_files
+        with tempfile.TemporaryDirectory() as tmp:
+            corpus = self._write_corpus(tmp)
+            names = [os.path.basename(p) for p in discover_files(corpus)]
+            assert names == ["a.txt", "bad.txt", "b.md"]
+            assert len(discover_files(os.path.join(corpus, "*.txt"))) == 2
+
+    def test_bulk_ingest_isolates_failures_and_skips_unchanged(self):
+        """Test batched writes, per-file failures and incremental re-runs."""
+        from bulk_ingest import bulk_ingest
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch('bulk_ingest.get_db') as mock_get_db, \
+                patch('bulk_ingest.embeddings') as mock_embeddings:
+            mock_db = Mock()
+            mock_get_db.return_value = mock_db
+            mock_embeddings.embed_documents.side_effect = lambda texts: [[0.0, 1.0] for _ in texts]
+            corpus = self._write_corpus(tmp)
+
+            report = bulk_ingest(corpus, workers=2, write_batch_size=1)
+            assert report.files_total == 3
+            assert report.files_ingested == 2
+            assert list(report.files_failed) == [os.path.join(corpus, "bad.txt")]
+            assert report.chunks_written == 2
+            assert mock_db._collection.upsert.call_count == 2
+
+            report = bulk_ingest(corpus, workers=2)
+            assert report.files_skipped == 2
+            assert report.chunks_written == 0
+
+    def test_failed_write_fails_only_unwritten_files(self):
+        """Test that files written before a failed batch are recorded and the failed file's chunks are cleaned up."""
+        from bulk_ingest import bulk_ingest
+        from manifest import Manifest, file_key
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(settings, 'chroma_path', tmp), \
+                patch.object(settings, 'dedup_enabled', False), \
+                patch('bulk_ingest.get_db') as mock_get_db, \
+                patch('bulk_ingest.get_keyword_index'), \
+                patch('bulk_ingest.add_embedded_documents') as mock_add, \
+                patch('bulk_ingest.embeddings') as mock_embeddings:
+            mock_embeddings.embed_documents.side_effect = lambda texts: [[0.0, 1.0] for _ in texts]
+            mock_add.side_effect = [None, RuntimeError("disk full")]
+            corpus = os.path.join(tmp, "corpus")
+            os.makedirs(corpus)
+            short, long = os.path.join(corpus, "a.txt"), os.path.join(corpus, "b.txt")
+            with open(short, "w", encoding="utf-8") as f:
+                f.write("Alpha document.")
+            with open(long, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(f"Paragraph {i} " + "word " * 180 for i in range(3)))
+
+            # One buffer of four chunks: a.txt and the first chunk of b.txt, then the rest of b.txt
+            report = bulk_ingest(corpus, workers=1, write_batch_size=2)
+            assert report.files_ingested == 1
+            assert list(report.files_failed) == [long]
+            manifest = Manifest("default")
+            assert manifest.get(file_key(short)) is not None and manifest.get(file_key(long)) is None
+            written = mock_add.call_args_list[0].args[3][1]
+            assert written in manifest.pending(file_key(long))
+
+            with open(long, "w", encoding="utf-8") as f:
+                f.write("Changed beta document.")
+            mock_add.side_effect = None
+            report = bulk_ingest(corpus, workers=1, write_batch_size=2)
+            assert report.files_ingested == 1 and report.files_skipped == 1
+            assert written in mock_get_db.return_value.delete.call_args.kwargs["ids"]
+            assert manifest.pending(file_key(long)) == []
+
+
+class TestJobQueue:
+    """Test background ingestion jobs."""
+
+    def _wait(self, queue, job_id, timeout=10):
+        """Poll a job until it reaches a final state."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = queue.get(job_id)
+            if job.finished:
+                return job
+            time.sleep(0.02)
+        raise AssertionError(f"job {job_id} did not finish")
+
+    def test_jobs_run_with_progress_and_persist(self):
+        """Test progress reporting, failures and reading jobs from a new queue."""
+        from jobs import JobQueue
+
+        def fake_ingest(request, progress):
+            if request.file_path == "bad.pdf":
+                raise ValueError("Unsupported file format")
+            progress(4, 0, 6)
+            progress(4, 6, 6)
+
+        with tempfile.TemporaryDirectory() as tmp, patch('jobs.ingest_document', side_effect=fake_ingest):
+            queue = JobQueue(os.path.join(tmp, "jobs.sqlite3"), workers=2)
+            good = queue.submit("good.pdf")
+            bad = queue.submit("bad.pdf", collection="other")
+            job = self._wait(queue, good.id)
+            assert (job.status, job.pages, job.chunks_done, job.chunks_total, job.progress) == ("done", 4, 6, 6, 1.0)
+            job = self._wait(queue, bad.id)
+            assert (job.status, job.collection, job.error) == ("failed", "other", "Unsupported file format")
+            queue.shutdown()
+
+            # A new queue (e.g. after a restart) sees the same jobs, newest first
+            queue = JobQueue(os.path.join(tmp, "jobs.sqlite3"))
+            assert [job.id for job in queue.list()] == [bad.id, good.id]
+            assert queue.clear_finished() == 2
+            assert queue.list() == []
+            queue.shutdown()
+
+    def test_cancel_queued_and_running_jobs(self):
+        """Test that queued jobs never start and running jobs stop at the next report."""
+        from jobs import JobQueue
+        started = threading.Event()
+
+        def slow_ingest(request, progress):
+            started.set()
+            for done in range(1000):
+                progress(1, done, 1000)
+                time.sleep(0.01)
+
+        with tempfile.TemporaryDirectory() as tmp, patch('jobs.ingest_document', side_effect=slow_ingest) as ingest:
+            queue = JobQueue(os.path.join(tmp, "jobs.sqlite3"), workers=1)
+            running = queue.submit("a.pdf")
+            queued = queue.submit("b.pdf")
+            assert started.wait(5)
+            assert queue.cancel(queued.id)
+            assert queue.get(queued.id).status == "cancelled"
+            assert queue.cancel(running.id)
+            job = self._wait(queue, running.id)
+            assert job.status == "cancelled" and job.chunks_done < 999
+            assert not queue.cancel(running.id)
+            queue.shutdown()
+            assert ingest.call_count == 1
+
+    def test_interrupted_jobs_resume(self):
+        """Test that jobs left running by a previous process are queued again."""
+        import sqlite3
+        from jobs import JobQueue
+        with tempfile.TemporaryDirectory() as tmp, patch('jobs.ingest_document') as ingest:
+            path = os.path.join(tmp, "jobs.sqlite3")
+            queue = JobQueue(path)
+            job = queue.submit("a.pdf")
+            self._wait(queue, job.id)
+            queue.shutdown()
+            with sqlite3.connect(path) as conn:
+                conn.execute("UPDATE jobs SET status = 'running'")
+
+            queue = JobQueue(path)
+            assert self._wait(queue, job.id).status == "done"
+            assert ingest.call_count == 2
+            queue.shutdown()
 
 
 class TestIntegration:
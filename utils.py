@@ -7,46 +7,809 @@ integration with Groq for generating context-aware answers.
 
 Features:
 - Vector similarity search with relevance filtering
-- Context aggregation from multiple documents
+- Hybrid BM25 + vector retrieval fused with reciprocal rank fusion
+- Lazy embedding model loading with optional explicit warm-up
+- Optional shared embedding server instead of an in-process model
+- Optional ONNX Runtime (int8 quantized) embedding runtime for CPU nodes
+- Persistent embedding cache in front of the embedding model
+- Process-wide, thread-safe registry of vector store handles
+- Pluggable vector store backend (Chroma or memory-mapped flat exact search)
+- Configurable HNSW index parameters of Chroma collections (see hnsw.py)
+- Scatter-gather search of sharded collections (see sharding.py)
+- Exact and semantic answer caching with ingest-aware invalidation
+- Token-budgeted context assembly with overlap deduplication
 - Groq LLM integration with error handling
-- Source attribution for answers
+- Token streaming with time-to-first-token logging
+- Per-stage latency spans, token and cache counters (see metrics.py)
+- Asyncio query path with a pooled, rate-limited Groq client
+- Batched question embedding and bulk vector search (see batch_query.py)
+- Source attribution for answers, including files of deduplicated chunks
+- Source, file-type and ingestion-date filters applied inside the vector search
+- Chat sessions: follow-ups reuse recently retrieved chunks, history is token-budgeted (see session.py)
 - Graceful degradation on API failures
 """
 
 from config import settings
 from logger import logger
 from models import QueryRequest
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-import openai
+from embedding_cache import CachedEmbeddings
+from query_cache import QueryCache
+from keyword_index import get_keyword_index, reciprocal_rank_fusion
+from dedup import get_dedup_index
+from context_builder import build_context
+from filters import build_where, matches
+from session import ChatSession
+import hnsw
+import metrics
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import os
+import threading
 import time
 
-# Initialize embeddings model with device optimization
-embeddings = HuggingFaceEmbeddings(
-    model_name=settings.embedding_model,
-    model_kwargs={"device": settings.embedding_device},
-    encode_kwargs={"normalize_embeddings": True}
+if TYPE_CHECKING:
+    import chromadb
+    from langchain_core.vectorstores import VectorStore
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Embeddings proxy that loads the real model on first use.
+
+    Importing this module stays cheap: torch, sentence-transformers and the
+    model weights are only loaded when something is actually embedded, or
+    when warm_up() is called explicitly.
+
+    Attributes:
+        model_name (str): Name of the embedding model that will be loaded
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        """
+        Args:
+            factory (Callable[[], Embeddings]): Builds the real embedding model
+        """
+        self._factory = factory
+        self._model: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self) -> str:
+        # Quantized vectors differ slightly, so they get their own embedding cache entries
+        if settings.embedding_runtime == "onnx" and settings.embedding_onnx_quantize:
+            return f"{settings.embedding_model}+int8"
+        return settings.embedding_model
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the real model has been loaded yet."""
+        return self._model is not None
+
+    def load(self) -> Embeddings:
+        """
+        Load the real model if needed (thread-safe, happens once).
+
+        Returns:
+            Embeddings: The loaded embedding model
+        """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with metrics.span("embed"):
+            return self.load().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+
+def _load_torch_embeddings() -> Embeddings:
+    """Load the sentence-transformers model with PyTorch on the detected device."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    start = time.perf_counter()
+    model = HuggingFaceEmbeddings(
+        model_name=settings.embedding_model,
+        model_kwargs={"device": settings.embedding_device},
+        encode_kwargs={"normalize_embeddings": True}
+    )
+    logger.info(
+        f"Embeddings: {settings.embedding_model} ({settings.embedding_dim}d) on "
+        f"{settings.embedding_device.upper()} loaded in {time.perf_counter() - start:.1f}s"
+    )
+    return model
+
+
+def _load_embedding_model() -> Embeddings:
+    """Initialize embeddings model with the configured runtime (PyTorch or ONNX Runtime)."""
+    if settings.embedding_runtime == "onnx":
+        from onnx_embeddings import load_onnx_embeddings
+        return load_onnx_embeddings()
+    return _load_torch_embeddings()
+
+
+def _connect_embedding_server() -> Embeddings:
+    """Use the node's shared embedding server (embedding_server.py) instead of loading the model."""
+    from embedding_server import RemoteEmbeddings
+    return RemoteEmbeddings(settings.embedding_server_address)
+
+
+# Embedding model, loaded (or connected to) lazily on first use
+embedding_model = LazyEmbeddings(
+    _connect_embedding_server if settings.embedding_backend == "server" else _load_embedding_model
+)
+embeddings: Embeddings = embedding_model
+
+# Serve previously embedded chunks from disk instead of recomputing them
+if settings.embedding_cache_enabled:
+    embeddings = CachedEmbeddings(
+        embedding_model,
+        cache_path=settings.embedding_cache_path,
+        normalize=True,
+        max_entries=settings.embedding_cache_max_entries
+    )
+
+
+# Answer cache shared by every query in this process
+query_cache = QueryCache(
+    max_entries=settings.query_cache_max_entries,
+    ttl_seconds=settings.query_cache_ttl_seconds,
+    similarity_threshold=settings.query_cache_similarity_threshold
 )
 
 
-def get_db(collection: str = "default") -> Chroma:
+def warm_up(collection: str = "default") -> float:
     """
-    Get or create a Chroma vector database instance.
+    Load the embedding model and open a collection ahead of the first query.
+
+    Calling this at startup moves the one-off model loading cost out of the
+    first user request, making query latency predictable.
+
+    Args:
+        collection (str): Collection to open (default: "default")
+
+    Returns:
+        float: Seconds spent warming up
+    """
+    start = time.perf_counter()
+    embedding_model.embed_query("warm up")
+    get_db(collection)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Warm-up complete in {elapsed:.1f}s")
+    return elapsed
+
+
+# Process-wide registry of open vector store handles, keyed by (path, collection, backend)
+_db_handles: "OrderedDict[Tuple[str, str, str], VectorStore]" = OrderedDict()
+_db_clients: Dict[str, "chromadb.ClientAPI"] = {}
+_db_lock = threading.RLock()
+
+
+def _chroma_client(path: str) -> "chromadb.ClientAPI":
+    """One persistent client per directory, shared by all its collections."""
+    import chromadb
+
+    with _db_lock:
+        client = _db_clients.get(path)
+        if client is None:
+            client = chromadb.PersistentClient(path=path)
+            _db_clients[path] = client
+        return client
+
+
+def open_store(path: str, collection: str, backend: str) -> "VectorStore":
+    """
+    Open a single (unsharded) vector store without caching the handle.
+
+    Args:
+        path (str): Persist directory
+        collection (str): Collection name
+        backend (str): "chroma" or "flat"
+
+    Returns:
+        VectorStore: The opened store
+
+    Raises:
+        ValueError: If backend names an unknown backend
+    """
+    if backend == "flat":
+        from flat_store import FlatVectorStore
+        return FlatVectorStore(os.path.join(path, "flat", collection), embeddings)
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+
+        # HNSW parameters take effect when the collection is created; search_ef also later
+        params = hnsw.hnsw_params(collection)
+        db = Chroma(
+            client=_chroma_client(path),
+            embedding_function=embeddings,
+            collection_name=collection,
+            collection_metadata=hnsw.collection_metadata(params)
+        )
+        hnsw.apply_search_ef(db._collection, params.get("search_ef"))
+        return db
+    raise ValueError(f"Unknown vector backend: {backend}. Supported: chroma, flat")
+
+
+def _store_exists(path: str, collection: str, backend: str) -> bool:
+    """Whether an unsharded store of the collection already exists under path."""
+    if backend == "flat":
+        return os.path.exists(os.path.join(path, "flat", collection, "store.sqlite3"))
+    if backend == "chroma":
+        names = {getattr(c, "name", c) for c in _chroma_client(path).list_collections()}
+        return collection in names
+    return False
+
+
+def drop_store(path: str, collection: str, backend: str) -> None:
+    """
+    Delete the data of a single (unsharded) vector store.
+
+    Args:
+        path (str): Persist directory
+        collection (str): Collection name
+        backend (str): "chroma" or "flat"
+    """
+    import shutil
+
+    if backend == "flat":
+        shutil.rmtree(os.path.join(path, "flat", collection), ignore_errors=True)
+    elif backend == "chroma" and _store_exists(path, collection, backend):
+        _chroma_client(path).delete_collection(collection)
+
+
+def get_db(collection: str = "default") -> "VectorStore":
+    """
+    Get or create a vector database instance.
+
+    The backend is chosen by ``settings.vector_backend``: "chroma" (default)
+    or "flat", a memory-mapped exact-search store kept under
+    ``{chroma_path}/flat/{collection}``. Both expose the same LangChain
+    VectorStore interface, so callers don't need to know which is in use.
+
+    New Chroma collections are created with the HNSW parameters of
+    ``hnsw.hnsw_params(collection)``; see hnsw.py to rebuild existing ones.
+
+    Sharded collections (see sharding.py) are returned as a ShardedStore
+    over one store per shard, with the same interface. New collections are
+    sharded when ``settings.collection_shards`` is greater than 1; existing
+    unsharded collections stay unsharded until re-sharded.
+
+    Handles are cached per (persist directory, collection, backend) and
+    reused across queries and ingestions, so the persistent client and
+    collection are only opened once per process. The least recently used
+    handle is evicted once more than ``settings.db_handle_cache_size`` are open.
 
     Args:
         collection (str): Name of the collection to access (default: "default")
 
     Returns:
-        Chroma: Configured Chroma vector database instance
+        VectorStore: Configured vector database instance
+
+    Raises:
+        ValueError: If settings.vector_backend names an unknown backend
+    """
+    import sharding
+
+    path = os.path.abspath(settings.chroma_path)
+    backend = settings.vector_backend
+    key = (path, collection, backend)
+    with _db_lock:
+        db = _db_handles.get(key)
+        if db is not None:
+            _db_handles.move_to_end(key)
+            return db
+
+        layout = sharding.read_layout(collection)
+        if layout is None and settings.collection_shards > 1 and not _store_exists(path, collection, backend):
+            layout = sharding.write_layout(collection, settings.collection_shards, generation=1)
+        if layout is not None:
+            db = sharding.ShardedStore(
+                collection,
+                [
+                    open_store(sharding.shard_path(collection, layout["generation"], i), collection, backend)
+                    for i in range(layout["shards"])
+                ],
+                embeddings,
+                layout["generation"]
+            )
+        else:
+            db = open_store(path, collection, backend)
+
+        _db_handles[key] = db
+        while len(_db_handles) > settings.db_handle_cache_size:
+            _db_handles.popitem(last=False)
+        return db
+
+
+def invalidate_db(collection: Optional[str] = None) -> None:
+    """
+    Drop cached vector store handles so the next get_db call reopens them.
+
+    Call this after a collection is deleted or recreated outside of get_db.
+
+    Args:
+        collection (Optional[str]): Collection to drop, or None to drop every handle
+    """
+    with _db_lock:
+        if collection is None:
+            _db_handles.clear()
+            _db_clients.clear()
+            return
+        for key in [key for key in _db_handles if key[1] == collection]:
+            del _db_handles[key]
+        # Clients of the collection's shard directories (see sharding.py)
+        prefix = os.path.join(os.path.abspath(settings.chroma_path), "shards", collection) + os.sep
+        for path in [path for path in _db_clients if path.startswith(prefix)]:
+            del _db_clients[path]
+
+
+def add_embedded_documents(
+    db: "VectorStore",
+    documents: List[Document],
+    vectors: List[List[float]],
+    ids: List[str]
+) -> None:
+    """
+    Store documents whose embeddings have already been computed.
+
+    Bypasses the collection's embedding function so callers that embed in
+    large shared batches (such as bulk ingestion) don't embed twice.
+
+    Args:
+        db (VectorStore): Target vector database instance
+        documents (List[Document]): Chunks to store
+        vectors (List[List[float]]): One embedding per chunk
+        ids (List[str]): One ID per chunk
+    """
+    from flat_store import FlatVectorStore
+    from sharding import ShardedStore
+
+    if isinstance(db, ShardedStore):
+        db.add_embedded(documents, vectors, ids)
+        return
+    if isinstance(db, FlatVectorStore):
+        db.add_embeddings(ids, vectors, [doc.page_content for doc in documents], [doc.metadata for doc in documents])
+        return
+    db._collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=[doc.page_content for doc in documents],
+        metadatas=[doc.metadata or None for doc in documents]
+    )
+
+
+def _cached_answer(request: QueryRequest, use_cache: bool = True) -> Tuple[Optional[str], Optional[List[float]]]:
+    """
+    Look the request up in the query cache, embedding the question if needed.
+
+    Args:
+        request (QueryRequest): Validated query request
+        use_cache (bool): Consult the cache at all (False only embeds the question)
+
+    Returns:
+        Tuple: (cached answer or None, question embedding or None on an exact hit)
+    """
+    use_cache = use_cache and settings.query_cache_enabled
+    # Serve repeated questions without embedding, searching or calling the LLM
+    if use_cache:
+        cached = query_cache.get_exact(request)
+        if cached is not None:
+            logger.info("Answer served from query cache (exact match)")
+            metrics.cache_lookups.inc(cache="query", result="exact")
+            return cached, None
+
+    # Embed the question once; reused for the semantic cache and the search
+    with metrics.span("query_embed"):
+        query_vector = embeddings.embed_query(request.question)
+    if use_cache:
+        cached = query_cache.get_similar(request, query_vector)
+        if cached is not None:
+            logger.info("Answer served from query cache (similar question)")
+            metrics.cache_lookups.inc(cache="query", result="semantic")
+            return cached, query_vector
+        metrics.cache_lookups.inc(cache="query", result="miss")
+    return None, query_vector
+
+
+# Runs keyword searches alongside the vector search of hybrid queries
+_retrieval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+
+def _keyword_search(request: QueryRequest, min_match: float = 0.0) -> List[Document]:
+    """
+    Rank the collection's chunks against the question with BM25.
+
+    Args:
+        request (QueryRequest): Validated query request
+        min_match (float): Share of the question's IDF weight a chunk must match (see KeywordIndex.search)
+
+    Returns:
+        List[Document]: Matching chunks, best first
+    """
+    where = build_where(request)
+    # The keyword index has no metadata, so filtered searches rank extra hits and drop the rest
+    k = request.top_k * (settings.keyword_filter_oversample if where else 1)
+    with metrics.span("keyword_search"):
+        hits = get_keyword_index(request.collection).search(request.question, k=k, min_match=min_match)
+        if not hits:
+            return []
+        ids = [chunk_id for chunk_id, _ in hits]
+        found = get_db(request.collection).get(ids=ids, include=["documents", "metadatas"])
+    by_id = {
+        chunk_id: Document(page_content=text, metadata=metadata or {})
+        for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        if matches(metadata, where)
+    }
+    return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id][:request.top_k]
+
+
+def embed_queries(questions: List[str]) -> List[List[float]]:
+    """
+    Embed many questions with as few model calls as possible.
+
+    Args:
+        questions (List[str]): Questions to embed
+
+    Returns:
+        List[List[float]]: One query vector per question, in order
+    """
+    if not questions:
+        return []
+    model = embedding_model.load()
+    with metrics.span("query_embed"):
+        if hasattr(model, "embed_queries"):
+            return model.embed_queries(questions)
+        # HuggingFaceEmbeddings embeds queries like documents unless query kwargs are set
+        if not getattr(model, "query_encode_kwargs", True):
+            return model.embed_documents(questions)
+        return [model.embed_query(question) for question in questions]
+
+
+def search_store(
+    db: "VectorStore",
+    query_vectors: List[List[float]],
+    k: int,
+    where: Optional[Dict] = None
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Run many vector searches against one store in a single call.
+
+    Args:
+        db (VectorStore): Vector database instance (Chroma, flat or sharded)
+        query_vectors (List[List[float]]): Query embeddings
+        k (int): Results per query
+        where (Optional[Dict]): Metadata filter applied inside the search (see filters.build_where)
+
+    Returns:
+        List[List[Tuple[Document, float]]]: Per query, (document, distance) pairs, best first
     """
-    return Chroma(
-        persist_directory=settings.chroma_path,
-        embedding_function=embeddings,
-        collection_name=collection
+    from flat_store import FlatVectorStore
+    from sharding import ShardedStore
+
+    if isinstance(db, (FlatVectorStore, ShardedStore)):
+        return db.similarity_search_by_vectors_with_relevance_scores(query_vectors, k=k, filter=where)
+    found = db._collection.query(
+        query_embeddings=query_vectors, n_results=k, where=where, include=["documents", "metadatas", "distances"]
     )
+    return [
+        [
+            (Document(id=chunk_id, page_content=text, metadata=metadata or {}), distance)
+            for chunk_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+        ]
+        for ids, texts, metadatas, distances in zip(
+            found["ids"], found["documents"], found["metadatas"], found["distances"]
+        )
+    ]
+
 
+def search_by_vectors(
+    collection: str,
+    query_vectors: List[List[float]],
+    k: int,
+    where: Optional[Dict] = None,
+    squared_l2: bool = False
+) -> List[List[Tuple[Document, float]]]:
+    """
+    Run many vector searches against one collection in a single call.
+
+    Args:
+        collection (str): Collection name
+        query_vectors (List[List[float]]): Query embeddings
+        k (int): Results per query
+        where (Optional[Dict]): Metadata filter applied inside the search (see filters.build_where)
+        squared_l2 (bool): Return squared L2 distances, as the ``vector_hits`` of
+            _retrieve_context expect, instead of the collection's own
 
-def query_rag(request: QueryRequest) -> str:
+    Returns:
+        List[List[Tuple[Document, float]]]: Per query, (document, distance) pairs, best first
+    """
+    if not query_vectors:
+        return []
+    db = get_db(collection)
+    with metrics.span("vector_search"):
+        results = search_store(db, query_vectors, k, where)
+    if squared_l2:
+        scale = hnsw.distance_scale(db)
+        results = [[(doc, score * scale) for doc, score in hits] for hits in results]
+    return results
+
+
+def _stand_in_hits(request: QueryRequest, query_vector: List[float]) -> List[Tuple[Document, float]]:
+    """
+    Stored chunks whose near-duplicates match a ``sources`` filter, scored against the question.
+
+    A file whose chunks were skipped as near-duplicates has no stored chunk
+    with its own filename, so the filtered vector search can't find its text.
+    The chunks it duplicates are read back by ID and scored exactly, as
+    squared L2 distances. Keyword search doesn't do this.
+
+    Args:
+        request (QueryRequest): Validated query request
+        query_vector (List[float]): Embedding of the question
+
+    Returns:
+        List[Tuple[Document, float]]: (document, distance) pairs, in no particular order
+    """
+    if not (settings.dedup_enabled and request.sources):
+        return []
+    ids = get_dedup_index(request.collection).stand_ins(build_where(request))
+    if not ids:
+        return []
+    db = get_db(request.collection)
+    found = db.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+    if not found["ids"]:
+        return []
+    matrix = np.asarray(found["embeddings"], dtype=np.float32)
+    distances = ((matrix - np.asarray(query_vector, dtype=np.float32)) ** 2).sum(axis=1)
+    return [
+        (Document(page_content=text, metadata=metadata or {}, id=chunk_id), float(distance))
+        for chunk_id, text, metadata, distance in zip(found["ids"], found["documents"], found["metadatas"], distances)
+    ]
+
+
+def _vector_documents(
+    request: QueryRequest,
+    query_vector: List[float],
+    vector_hits: Optional[List[Tuple[Document, float]]] = None
+) -> List[Document]:
+    """
+    Vector search of a request, without chunks beyond the relevance cutoff.
+
+    Args:
+        request (QueryRequest): Validated query request
+        query_vector (List[float]): Embedding of the question
+        vector_hits (Optional[List[Tuple[Document, float]]]): Results of a
+            vector search the caller already ran, with squared L2 distances; skips the search
+
+    Returns:
+        List[Document]: Up to ``top_k`` chunks, most relevant first
+    """
+    if vector_hits is not None:
+        docs_with_scores = vector_hits
+    else:
+        # Retrieve vector database for the specified collection
+        db = get_db(request.collection)
+
+        # Perform similarity search with relevance scores, restricted to chunks matching the filters
+        with metrics.span("vector_search"):
+            docs_with_scores = db.similarity_search_by_vector_with_relevance_scores(
+                query_vector, k=request.top_k, filter=build_where(request)
+            )
+        scale = hnsw.distance_scale(db)
+        docs_with_scores = [(doc, score * scale) for doc, score in docs_with_scores]
+
+    # Files filtered on may only exist as near-duplicates of other files' chunks
+    stand_ins = _stand_in_hits(request, query_vector)
+    if stand_ins:
+        seen = {doc.page_content for doc, _ in docs_with_scores}
+        docs_with_scores = sorted(
+            list(docs_with_scores) + [hit for hit in stand_ins if hit[0].page_content not in seen],
+            key=lambda hit: hit[1]
+        )[:request.top_k]
+
+    # Skip documents with low relevance (higher score = less relevant, on the squared L2 scale)
+    return [doc for doc, score in docs_with_scores if score <= 1.5]
+
+
+def _retrieve_documents(
+    request: QueryRequest,
+    query_vector: List[float],
+    vector_hits: Optional[List[Tuple[Document, float]]] = None
+) -> List[Document]:
+    """
+    Retrieve the most relevant chunks using the request's retrieval mode.
+
+    In hybrid mode the keyword search runs in a worker thread while the vector
+    search runs in the calling thread, and both rankings are merged with
+    reciprocal rank fusion. The request's metadata filters are part of the
+    vector search itself, so all ``top_k`` slots go to matching chunks.
+
+    Vector hits are held to the distance cutoff. BM25 scores have no
+    comparable scale, so in hybrid mode a keyword hit must instead contain
+    ``settings.keyword_min_match`` of the question's IDF-weighted terms. If
+    the keyword search fails, hybrid mode uses the vector results and keyword
+    mode falls back to a vector search.
+
+    Args:
+        request (QueryRequest): Validated query request
+        query_vector (List[float]): Embedding of the question
+        vector_hits (Optional[List[Tuple[Document, float]]]): Results of a
+            vector search the caller already ran (e.g. in bulk), with squared L2
+            distances; skips the search
+
+    Returns:
+        List[Document]: Up to ``top_k`` chunks, most relevant first
+    """
+    keyword_future = None
+    if request.retrieval_mode != "vector":
+        min_match = settings.keyword_min_match if request.retrieval_mode == "hybrid" else 0.0
+        keyword_future = _retrieval_pool.submit(_keyword_search, request, min_match)
+
+    vector_docs = []
+    if request.retrieval_mode != "keyword":
+        vector_docs = _vector_documents(request, query_vector, vector_hits)
+
+    if keyword_future is None:
+        return vector_docs
+    try:
+        keyword_docs = keyword_future.result()
+    except Exception as e:
+        # A broken keyword index must not take retrieval down with it
+        if request.retrieval_mode == "keyword":
+            logger.warning(f"Keyword search failed, falling back to vector search: {e}")
+            return _vector_documents(request, query_vector, vector_hits)
+        logger.warning(f"Keyword search failed, using vector results only: {e}")
+        keyword_docs = []
+    if request.retrieval_mode == "keyword":
+        return keyword_docs
+
+    # Identical chunk text is the same hit, whichever retriever found it
+    by_text = {doc.page_content: doc for doc in keyword_docs + vector_docs}
+    fused = reciprocal_rank_fusion(
+        [[doc.page_content for doc in vector_docs], [doc.page_content for doc in keyword_docs]],
+        k=settings.rrf_k
+    )
+    return [by_text[text] for text in fused[:request.top_k]]
+
+
+def _session_vector_hits(
+    request: QueryRequest,
+    query_vector: List[float],
+    session: ChatSession
+) -> Optional[List[Tuple[Document, float]]]:
+    """
+    Vector search of a chat question, served from the session's working set when possible.
+
+    The working set answers the search when it holds ``top_k`` chunks within
+    ``settings.session_reuse_distance`` of the question. Otherwise the
+    collection is searched, and only the embeddings of results the working
+    set doesn't hold yet are read back from the store.
+
+    Args:
+        request (QueryRequest): Validated query request
+        query_vector (List[float]): Embedding of the question
+        session (ChatSession): Conversation the question belongs to
+
+    Returns:
+        Optional[List[Tuple[Document, float]]]: (document, squared L2 distance) pairs,
+            best first; None in keyword mode, which doesn't search vectors
+    """
+    if request.retrieval_mode == "keyword":
+        return None
+    db = get_db(request.collection)
+    where = build_where(request)
+    session.bind(request.collection, where)
+    reused = session.search(query_vector, request.top_k)
+    if reused is not None:
+        metrics.cache_lookups.inc(cache="session", result="hit")
+        return reused
+    metrics.cache_lookups.inc(cache="session", result="miss")
+
+    with metrics.span("vector_search"):
+        hits = search_store(db, [query_vector], request.top_k, where)[0]
+        missing = session.missing(hits)
+        vectors = {}
+        if missing:
+            found = db.get(ids=missing, include=["embeddings"])
+            vectors = dict(zip(found["ids"], found["embeddings"]))
+    session.remember(hits, vectors)
+    scale = hnsw.distance_scale(db)
+    return [(doc, score * scale) for doc, score in hits]
+
+
+def _retrieve_context(
+    request: QueryRequest,
+    query_vector: List[float],
+    vector_hits: Optional[List[Tuple[Document, float]]] = None
+) -> Tuple[str, List[str]]:
+    """
+    Search the collection and assemble the relevant chunks into a context.
+
+    Overlapping chunks are merged, near-duplicates dropped and the result is
+    packed into ``settings.context_token_budget`` tokens. Sources include
+    the files of near-duplicate chunks that were not stored at ingestion.
+
+    Args:
+        request (QueryRequest): Validated query request
+        query_vector (List[float]): Embedding of the question
+        vector_hits (Optional[List[Tuple[Document, float]]]): Precomputed vector search results,
+            with squared L2 distances (see search_by_vectors)
+
+    Returns:
+        Tuple[str, List[str]]: (context text, source filenames)
+    """
+    docs = _retrieve_documents(request, query_vector, vector_hits)
+    with metrics.span("context_build"):
+        context = build_context(docs)
+    metrics.chunks.inc(len(docs), event="retrieved")
+    metrics.chunks.inc(context.passages, event="packed")
+    metrics.context_tokens.inc(context.tokens, kind="sent")
+    metrics.context_tokens.inc(context.tokens_saved, kind="saved")
+    sources = context.sources
+    if settings.dedup_enabled and docs:
+        # Near-duplicates skipped at ingestion are cited with the chunk that stands in for them
+        duplicates = get_dedup_index(request.collection).duplicate_sources([doc.page_content for doc in docs])
+        sources = sources + [source.split("\\")[-1] for source in duplicates]
+    return context.text, sources
+
+
+def _llm_messages(
+    context: str,
+    question: str,
+    history: Optional[List[Dict[str, str]]] = None
+) -> List[Dict[str, str]]:
+    """Build the chat messages sent to Groq, after earlier turns of the conversation if any."""
+    return [
+        {"role": "system", "content": "Use only the provided context. Answer accurately and concisely."},
+        *(history or []),
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"}
+    ]
+
+
+# Separates an answer from its source attribution
+_SOURCES_PREFIX = "\n\nSources: "
+
+
+def _format_sources(sources: List[str]) -> str:
+    """Source attribution appended to every answer."""
+    return _SOURCES_PREFIX + " | ".join(set(sources))
+
+
+def _start_turn(
+    request: QueryRequest,
+    session: Optional[ChatSession]
+) -> Tuple[List[Dict[str, str]], Optional[str], Optional[List[float]]]:
+    """
+    Earlier turns of the conversation, cached answer and question embedding.
+
+    Follow-up questions depend on the conversation, so only standalone
+    questions are looked up in the query cache. A cached answer is recorded
+    as the session's next turn.
+
+    Args:
+        request (QueryRequest): Validated query request
+        session (Optional[ChatSession]): Conversation the question belongs to, if any
+
+    Returns:
+        Tuple: (history messages, cached answer or None, question embedding or None)
+    """
+    history = session.history() if session is not None else []
+    cached, query_vector = _cached_answer(request, use_cache=not history)
+    if cached is not None and session is not None:
+        session.record_turn(request.question, cached.split(_SOURCES_PREFIX)[0])
+    return history, cached, query_vector
+
+
+def query_rag(request: QueryRequest, session: Optional[ChatSession] = None) -> str:
     """
     Perform a RAG query using vector similarity search and LLM generation.
 
@@ -56,31 +819,24 @@ def query_rag(request: QueryRequest) -> str:
 
     Args:
         request (QueryRequest): Validated query request containing question and parameters
+        session (Optional[ChatSession]): Chat session of a follow-up question; its working
+            set is searched before the collection and its history is sent to the LLM
 
     Returns:
         str: Generated answer with source attribution, or error message on failure
 
     Note:
+        - Answers are served from the query cache for repeated or paraphrased questions
         - Filters out low-relevance results (score > 1.5)
         - Uses context-only prompting for accuracy
         - Gracefully handles API failures with user-friendly messages
     """
-    # Retrieve vector database for the specified collection
-    db = get_db(request.collection)
+    history, cached, query_vector = _start_turn(request, session)
+    if cached is not None:
+        return cached
 
-    # Perform similarity search with relevance scores
-    docs_with_scores = db.similarity_search_with_score(request.question, k=request.top_k)
-
-    # Aggregate context from relevant documents
-    context = ""
-    sources = []
-    for doc, score in docs_with_scores:
-        # Skip documents with low relevance (higher score = less relevant)
-        if score > 1.5:
-            continue
-        context += doc.page_content + "\n\n"
-        # Extract filename from source path for cleaner display
-        sources.append(doc.metadata.get("source", "Unknown").split("\\")[-1])
+    vector_hits = _session_vector_hits(request, query_vector, session) if session is not None else None
+    context, sources = _retrieve_context(request, query_vector, vector_hits)
 
     # Handle case where no relevant context was found
     if not context.strip():
@@ -91,21 +847,156 @@ def query_rag(request: QueryRequest) -> str:
         from groq import Groq
         client = Groq(api_key=settings.groq_api_key)
 
-        response = client.chat.completions.create(
-            model=settings.default_model,
-            messages=[
-                {"role": "system", "content": "Use only the provided context. Answer accurately and concisely."},
-                {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {request.question}"}
-            ],
-            temperature=0.1,  # Low temperature for consistent, factual answers
-            max_tokens=1000
-        )
+        with metrics.span("llm"):
+            response = client.chat.completions.create(
+                model=settings.default_model,
+                messages=_llm_messages(context, request.question, history),
+                temperature=0.1,  # Low temperature for consistent, factual answers
+                max_tokens=1000
+            )
+        metrics.record_llm_usage(getattr(response, "usage", None))
         answer = response.choices[0].message.content
         logger.success("Answer generated with FREE Groq Llama-3.1")
+        if session is not None:
+            session.record_turn(request.question, answer)
 
         # Return answer with source attribution
-        return answer + "\n\nSources: " + " | ".join(set(sources))
+        answer = answer + _format_sources(sources)
+        if settings.query_cache_enabled and not history:
+            query_cache.put(request, query_vector, answer)
+        return answer
+
+    except Exception as e:
+        logger.error(f"Groq failed: {e}")
+        return "Temporary issue. Try again in 10 seconds."
+
+
+def query_rag_stream(request: QueryRequest, session: Optional[ChatSession] = None) -> Iterator[str]:
+    """
+    Perform a RAG query, yielding the answer token by token as Groq generates it.
+
+    Behaves like query_rag (same cache, retrieval and prompt), but the LLM
+    response is streamed so callers can render text immediately. The source
+    attribution is yielded as the final piece. Time to first token, measured
+    from the start of the request, is logged separately.
+
+    Args:
+        request (QueryRequest): Validated query request containing question and parameters
+        session (Optional[ChatSession]): Chat session of a follow-up question (see query_rag)
+
+    Yields:
+        str: Pieces of the answer; concatenated they equal query_rag's output
+    """
+    start = time.perf_counter()
+    history, cached, query_vector = _start_turn(request, session)
+    if cached is not None:
+        yield cached
+        return
+
+    vector_hits = _session_vector_hits(request, query_vector, session) if session is not None else None
+    context, sources = _retrieve_context(request, query_vector, vector_hits)
+
+    # Handle case where no relevant context was found
+    if not context.strip():
+        yield "No relevant information found in the documents."
+        return
+
+    parts = []
+    # Timed by hand: a span must not stay open while this generator is suspended
+    llm_start = time.perf_counter()
+    try:
+        from groq import Groq
+        client = Groq(api_key=settings.groq_api_key)
+
+        stream = client.chat.completions.create(
+            model=settings.default_model,
+            messages=_llm_messages(context, request.question, history),
+            temperature=0.1,  # Low temperature for consistent, factual answers
+            max_tokens=1000,
+            stream=True
+        )
+        for chunk in stream:
+            # Groq reports token usage on the last chunk of a stream
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage is not None:
+                metrics.record_llm_usage(usage)
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if not token:
+                continue
+            if not parts:
+                first_token = time.perf_counter() - start
+                logger.info(f"Time to first token: {first_token * 1000:.0f} ms")
+                metrics.time_to_first_token.observe(first_token)
+            parts.append(token)
+            yield token
+    except Exception as e:
+        metrics.record_stage("llm", time.perf_counter() - llm_start)
+        logger.error(f"Groq failed: {e}")
+        if not parts:
+            yield "Temporary issue. Try again in 10 seconds."
+        else:
+            yield "\n\n(Answer interrupted. Try again in 10 seconds.)"
+        return
+
+    metrics.record_stage("llm", time.perf_counter() - llm_start)
+    if session is not None:
+        session.record_turn(request.question, "".join(parts))
+
+    # Attach source attribution once the answer is complete
+    suffix = _format_sources(sources)
+    yield suffix
+    logger.success(f"Answer streamed with FREE Groq Llama-3.1 in {time.perf_counter() - start:.1f}s")
+    if settings.query_cache_enabled and not history:
+        query_cache.put(request, query_vector, "".join(parts) + suffix)
+
+
+async def aquery_rag(request: QueryRequest, session: Optional[ChatSession] = None) -> str:
+    """
+    Asynchronous variant of query_rag for serving many concurrent questions.
 
+    Embedding and vector search run in the default thread pool executor, so
+    the event loop is never blocked by them. The LLM call goes through the
+    shared async client, which pools connections, caps concurrency and retries
+    rate-limit and server errors with jittered backoff.
+
+    Args:
+        request (QueryRequest): Validated query request containing question and parameters
+        session (Optional[ChatSession]): Chat session of a follow-up question (see query_rag)
+
+    Returns:
+        str: Generated answer with source attribution, or error message on failure
+    """
+    from llm_client import get_async_llm
+
+    history, cached, query_vector = await asyncio.to_thread(_start_turn, request, session)
+    if cached is not None:
+        return cached
+
+    vector_hits = None
+    if session is not None:
+        vector_hits = await asyncio.to_thread(_session_vector_hits, request, query_vector, session)
+    context, sources = await asyncio.to_thread(_retrieve_context, request, query_vector, vector_hits)
+
+    # Handle case where no relevant context was found
+    if not context.strip():
+        return "No relevant information found in the documents."
+
+    try:
+        with metrics.span("llm"):
+            answer = await get_async_llm().complete(
+                _llm_messages(context, request.question, history),
+                temperature=0.1,  # Low temperature for consistent, factual answers
+                max_tokens=1000
+            )
+        logger.success("Answer generated with FREE Groq Llama-3.1 (async)")
     except Exception as e:
         logger.error(f"Groq failed: {e}")
         return "Temporary issue. Try again in 10 seconds."
+    if session is not None:
+        session.record_turn(request.question, answer)
+
+    # Return answer with source attribution
+    answer = answer + _format_sources(sources)
+    if settings.query_cache_enabled and not history:
+        query_cache.put(request, query_vector, answer)
+    return answer